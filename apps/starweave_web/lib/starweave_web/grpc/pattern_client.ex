@@ -19,7 +19,15 @@ defmodule StarweaveWeb.GRPC.PatternClient do
   @behaviour StarweaveWeb.GRPCClientBehaviour
 
   alias Starweave.PatternService.Stub, as: PatternServiceStub
-  alias Starweave.{PatternRequest, Pattern, PatternResponse, StatusRequest}
+  alias Starweave.{
+    PatternRequest,
+    Pattern,
+    PatternResponse,
+    PatternBatchRequest,
+    PatternBatchResponse,
+    StatusRequest,
+    TrendRequest
+  }
 
   @default_endpoint "localhost:50052"
   @default_timeout 10_000
@@ -105,6 +113,36 @@ defmodule StarweaveWeb.GRPC.PatternClient do
     end
   end
 
+  @doc """
+  Gets the heavy hitters and label counts of patterns recently streamed to the server.
+
+  The server summarizes StreamPatterns traffic in sliding-window sketches, so
+  trends are answered in constant memory instead of retaining every event.
+
+  ## Parameters
+    - opts: Optional keyword list for additional options
+      - `:endpoint` - The gRPC server endpoint (default: from config or "localhost:50052")
+      - `:timeout` - Request timeout in milliseconds (default: from config or 10_000)
+      - `:window_seconds` - How far back to look (default: all the server keeps)
+      - `:top_k` - Heavy hitters to return (default: the server's)
+      - `:keys` - Pattern keys to estimate counts for (default: [])
+
+  ## Returns
+    - `{:ok, TrendResponse.t()}` on success
+    - `{:error, term()}` on failure
+  """
+  def get_trends(opts \\ []) do
+    request = build_trend_request(opts)
+
+    with endpoint <- get_endpoint(opts),
+         channel_opts <- build_channel_opts(opts),
+         {:ok, channel} <- create_channel(endpoint, channel_opts) do
+      result = PatternServiceStub.get_trends(channel, request, timeout: channel_opts[:timeout])
+      close_channel(channel)
+      result
+    end
+  end
+
   @doc """
   Streams multiple patterns to the gRPC server and collects responses.
 
@@ -131,6 +169,43 @@ defmodule StarweaveWeb.GRPC.PatternClient do
     end
   end
 
+  @doc """
+  Recognizes a list of patterns with a single RecognizePatterns call.
+
+  Use this instead of one `analyze_pattern/2` call per pattern for bulk work.
+  Responses come back in the order of `patterns`. A pattern the server cannot
+  recognize gets a response with its `error` field set; the rest of the batch
+  is still processed.
+
+  ## Parameters
+    - patterns: A list of pattern maps (id, data, metadata)
+    - opts: Optional keyword list for additional options
+      - `:endpoint` - The gRPC server endpoint (default: from config or "localhost:50052")
+      - `:timeout` - Request timeout in milliseconds (default: from config or 10_000)
+      - `:context` - Context strings sent with every pattern (default: [])
+
+  ## Returns
+    - `{:ok, [PatternResponse.t()]}` on success
+    - `{:error, term()}` on failure
+  """
+  def recognize_patterns(patterns, opts \\ []) when is_list(patterns) do
+    request = build_batch_request(patterns, Keyword.get(opts, :context, []))
+
+    with endpoint <- get_endpoint(opts),
+         channel_opts <- build_channel_opts(opts),
+         {:ok, channel} <- create_channel(endpoint, channel_opts) do
+      result =
+        PatternServiceStub.recognize_patterns(channel, request, timeout: channel_opts[:timeout])
+
+      close_channel(channel)
+
+      case result do
+        {:ok, %PatternBatchResponse{responses: responses}} -> {:ok, responses}
+        {:error, reason} -> {:error, reason}
+      end
+    end
+  end
+
   # Public helper functions
 
   @doc """
@@ -142,6 +217,17 @@ defmodule StarweaveWeb.GRPC.PatternClient do
     request
   end
 
+  @doc """
+  Builds a PatternBatchRequest from a list of pattern maps, with the same
+  context strings for every pattern.
+  """
+  @spec build_batch_request([map()], [String.t()]) :: %PatternBatchRequest{}
+  def build_batch_request(patterns, context \\ []) when is_list(patterns) do
+    %PatternBatchRequest{
+      requests: Enum.map(patterns, &%{build_pattern_request(&1) | context: context})
+    }
+  end
+
   @doc """
   Builds a StatusRequest with the given detailed flag.
   """
@@ -150,6 +236,18 @@ defmodule StarweaveWeb.GRPC.PatternClient do
     %StatusRequest{detailed: detailed}
   end
 
+  @doc """
+  Builds a TrendRequest from `:window_seconds`, `:top_k` and `:keys` options.
+  """
+  @spec build_trend_request(keyword()) :: %TrendRequest{}
+  def build_trend_request(opts \\ []) do
+    %TrendRequest{
+      window_seconds: Keyword.get(opts, :window_seconds, 0) / 1,
+      top_k: Keyword.get(opts, :top_k, 0),
+      keys: Enum.map(Keyword.get(opts, :keys, []), &to_string/1)
+    }
+  end
+
   @doc """
   Formats gRPC errors into human-readable strings.
   """
@@ -178,7 +276,7 @@ defmodule StarweaveWeb.GRPC.PatternClient do
           id: to_string(Map.get(pattern, :id, "")),
           data: to_string(Map.get(pattern, :data, "")),
           metadata: metadata,
-          timestamp: System.system_time(:second) / 1_000_000_000
+          timestamp: System.system_time(:millisecond) / 1_000
         },
         context: []
       }
@@ -329,7 +427,7 @@ defmodule StarweaveWeb.GRPC.PatternClient do
         id: Map.get(pattern, :id, ""),
         data: Map.get(pattern, :data, ""),
         metadata: metadata,
-        timestamp: System.system_time(:second) / 1_000_000_000
+        timestamp: System.system_time(:millisecond) / 1_000
       },
       context: opts[:context] || []
     }
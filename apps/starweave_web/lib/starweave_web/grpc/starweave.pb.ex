@@ -64,6 +64,98 @@ defmodule Starweave.PatternResponse do
   field(:metadata, 5, repeated: true, type: Starweave.PatternResponse.MetadataEntry, map: true)
 end
 
+defmodule Starweave.PatternBatchRequest do
+  @moduledoc false
+
+  use Protobuf, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:requests, 1, repeated: true, type: Starweave.PatternRequest)
+end
+
+defmodule Starweave.PatternBatchResponse do
+  @moduledoc false
+
+  use Protobuf, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:responses, 1, repeated: true, type: Starweave.PatternResponse)
+end
+
+defmodule Starweave.IngestRequest do
+  @moduledoc false
+
+  use Protobuf, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:patterns, 1, repeated: true, type: Starweave.Pattern)
+end
+
+defmodule Starweave.IngestResponse do
+  @moduledoc false
+
+  use Protobuf, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:received, 1, type: :int64)
+  field(:added, 2, type: :int64)
+  field(:replaced, 3, type: :int64)
+  field(:rejected, 4, type: :int64)
+  field(:total, 5, type: :int64)
+  field(:seconds, 6, type: :double)
+  field(:patterns_per_second, 7, type: :double, json_name: "patternsPerSecond")
+  field(:error, 8, type: :string)
+end
+
+defmodule Starweave.TrendRequest do
+  @moduledoc false
+
+  use Protobuf, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:window_seconds, 1, type: :double, json_name: "windowSeconds")
+  field(:top_k, 2, type: :int32, json_name: "topK")
+  field(:keys, 3, repeated: true, type: :string)
+end
+
+defmodule Starweave.HeavyHitter do
+  @moduledoc false
+
+  use Protobuf, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:key, 1, type: :string)
+  field(:count, 2, type: :int64)
+  field(:error, 3, type: :int64)
+end
+
+defmodule Starweave.LabelTrend do
+  @moduledoc false
+
+  use Protobuf, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:label, 1, type: :string)
+  field(:count, 2, type: :int64)
+  field(:distinct, 3, type: :int64)
+end
+
+defmodule Starweave.TrendResponse.EstimatesEntry do
+  @moduledoc false
+
+  use Protobuf, map: true, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:key, 1, type: :string)
+  field(:value, 2, type: :int64)
+end
+
+defmodule Starweave.TrendResponse do
+  @moduledoc false
+
+  use Protobuf, protoc_gen_elixir_version: "0.15.0", syntax: :proto3
+
+  field(:window_seconds, 1, type: :double, json_name: "windowSeconds")
+  field(:total, 2, type: :int64)
+  field(:hitters, 3, repeated: true, type: Starweave.HeavyHitter)
+  field(:labels, 4, repeated: true, type: Starweave.LabelTrend)
+  field(:estimates, 5, repeated: true, type: Starweave.TrendResponse.EstimatesEntry, map: true)
+  field(:late, 6, type: :int64)
+  field(:error, 7, type: :string)
+end
+
 defmodule Starweave.StatusRequest do
   @moduledoc false
 
@@ -99,9 +191,15 @@ defmodule Starweave.PatternService.Service do
 
   rpc(:RecognizePattern, Starweave.PatternRequest, Starweave.PatternResponse)
 
+  rpc(:RecognizePatterns, Starweave.PatternBatchRequest, Starweave.PatternBatchResponse)
+
   rpc(:StreamPatterns, stream(Starweave.PatternRequest), stream(Starweave.PatternResponse))
 
   rpc(:GetStatus, Starweave.StatusRequest, Starweave.StatusResponse)
+
+  rpc(:IngestPatterns, stream(Starweave.IngestRequest), Starweave.IngestResponse)
+
+  rpc(:GetTrends, Starweave.TrendRequest, Starweave.TrendResponse)
 end
 
 defmodule Starweave.PatternService.Stub do
@@ -29,6 +29,32 @@ defmodule StarweaveWeb.GRPC.PatternClientUnitTest do
       assert request.pattern.metadata == []
     end
 
+    test "build_batch_request/2 creates one PatternRequest per pattern, in order" do
+      second = %{@test_pattern | id: "test-pattern-2"}
+      request = PatternClient.build_batch_request([@test_pattern, second], ["strategy=jaccard"])
+
+      assert %Starweave.PatternBatchRequest{requests: [first_request, second_request]} = request
+      assert first_request.pattern.id == "test-pattern-1"
+      assert second_request.pattern.id == "test-pattern-2"
+      assert first_request.context == ["strategy=jaccard"]
+      assert PatternClient.build_batch_request([]).requests == []
+    end
+
+    test "build_trend_request/1 creates a TrendRequest with server defaults for missing options" do
+      request = PatternClient.build_trend_request(window_seconds: 60, top_k: 5, keys: ["hello", :world])
+
+      assert %Starweave.TrendRequest{window_seconds: 60.0, top_k: 5, keys: ["hello", "world"]} = request
+
+      assert %Starweave.TrendRequest{window_seconds: 0.0, top_k: 0, keys: []} =
+               PatternClient.build_trend_request()
+    end
+
+    test "build_pattern_request/1 timestamps patterns in seconds since the epoch" do
+      request = PatternClient.build_pattern_request(@test_pattern)
+
+      assert_in_delta request.pattern.timestamp, System.system_time(:millisecond) / 1_000, 60
+    end
+
     test "build_status_request/1 creates a valid StatusRequest" do
       assert %Starweave.StatusRequest{detailed: true} = PatternClient.build_status_request(true)
       assert %Starweave.StatusRequest{detailed: false} = PatternClient.build_status_request(false)
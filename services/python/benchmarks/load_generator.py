@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Load generator for the STARWEAVE gRPC services.
+
+Drives a weighted mix of RecognizePattern, StreamPatterns, GetStatus,
+GenerateImage and GenerateImageVariations calls against a running server and
+reports throughput, latency percentiles, error rates and a per-interval time
+series as JSON.
+
+Two load models are supported:
+
+* closed loop (``--mode closed``): N clients each issue a call, wait for it to
+  finish and immediately issue the next. The level of a stage is the number
+  of concurrent clients.
+* open loop (``--mode open``): calls arrive at a fixed rate regardless of how
+  fast the server answers. The level of a stage is the arrival rate in calls
+  per second. Latency is measured from each call's scheduled start, so a
+  server that falls behind is not hidden by coordinated omission.
+
+Load follows a schedule of stages given as ``DURATION:LEVEL`` (hold) or
+``DURATION:START-END`` (linear ramp), e.g. ``--stages 10s:1-50,30s:50,10s:50-0``.
+
+Usage (from services/python):
+    python benchmarks/load_generator.py --mode closed --stages 30s:16 \\
+        --mix RecognizePattern=8,StreamPatterns=1,GetStatus=1
+    python benchmarks/load_generator.py --mode open --stages 10s:10-200 \\
+        --target localhost:50052 --output results.json
+    python benchmarks/load_generator.py --mix GenerateImage=1 --stages 60s:2 \\
+        --image-target localhost:50051 --prompts-file prompts.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starweave_pb2
+import starweave_pb2_grpc
+from server.metrics import percentile
+
+RPCS = ("RecognizePattern", "StreamPatterns", "GetStatus", "GenerateImage", "GenerateImageVariations")
+IMAGE_RPCS = ("GenerateImage", "GenerateImageVariations")
+
+DEFAULT_PROMPTS = (
+    "A beautiful sunset over a mountain lake, digital art",
+    "A lighthouse on a rocky coast during a storm",
+    "A cozy reading nook with plants and warm light",
+    "A futuristic city skyline at night, neon reflections",
+)
+
+
+@dataclass
+class Stage:
+    """One segment of the load schedule."""
+    duration: float
+    start: float
+    end: float
+
+    def level(self, elapsed: float) -> float:
+        if self.duration <= 0:
+            return self.end
+        fraction = min(1.0, max(0.0, elapsed / self.duration))
+        return self.start + (self.end - self.start) * fraction
+
+
+def parse_duration(text: str) -> float:
+    """Parse "500ms", "30s", "2m" or a bare number of seconds."""
+    text = text.strip()
+    for suffix, scale in (("ms", 0.001), ("s", 1.0), ("m", 60.0)):
+        if text.endswith(suffix):
+            return float(text[:-len(suffix)]) * scale
+    return float(text)
+
+
+def parse_stages(spec: str) -> List[Stage]:
+    """Parse a comma-separated list of DURATION:LEVEL or DURATION:START-END stages."""
+    stages = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        duration, _, level = item.partition(":")
+        if not level:
+            raise ValueError(f"Stage {item!r} must look like DURATION:LEVEL or DURATION:START-END")
+        start, _, end = level.partition("-")
+        stages.append(Stage(parse_duration(duration), float(start), float(end or start)))
+    if not stages:
+        raise ValueError("At least one stage is required")
+    return stages
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "key=weight,key=weight" into a dict; a bare key gets weight 1."""
+    weights = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, _, weight = item.partition("=")
+        weights[key.strip()] = float(weight) if weight else 1.0
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError(f"Invalid weight spec: {spec!r}")
+    return weights
+
+
+class Schedule:
+    """Load level as a function of time since the run started."""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self.duration = sum(stage.duration for stage in stages)
+
+    def level(self, elapsed: float) -> float:
+        for stage in self.stages:
+            if elapsed < stage.duration:
+                return stage.level(elapsed)
+            elapsed -= stage.duration
+        return self.stages[-1].end
+
+
+class WeightedChoice:
+    """Deterministic weighted sampling from a fixed set of options."""
+
+    def __init__(self, weights: Dict, rng: random.Random):
+        self.options = list(weights)
+        self.weights = [weights[option] for option in self.options]
+        self._rng = rng
+
+    def pick(self):
+        return self._rng.choices(self.options, weights=self.weights, k=1)[0]
+
+
+class Workload:
+    """Builds requests for each RPC from the configured prompt and pattern mixes."""
+
+    def __init__(self, args, rng: random.Random):
+        self.args = args
+        self._rng = rng
+        self.rpcs = WeightedChoice(parse_weights(args.mix), rng)
+        unknown = set(self.rpcs.options) - set(RPCS)
+        if unknown:
+            raise ValueError(f"Unknown RPCs in mix: {', '.join(sorted(unknown))}")
+        self.pattern_sizes = WeightedChoice(
+            {int(size): weight for size, weight in parse_weights(args.pattern_sizes).items()}, rng)
+        self.prompts = WeightedChoice(self._load_prompts(args.prompts_file), rng)
+        self._counter = 0
+
+    @staticmethod
+    def _load_prompts(path: Optional[str]) -> Dict[str, float]:
+        """Read prompts, one per line, optionally prefixed with "weight<TAB>"."""
+        if not path:
+            return {prompt: 1.0 for prompt in DEFAULT_PROMPTS}
+        prompts = {}
+        with open(path, "r") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line.strip() or line.startswith("#"):
+                    continue
+                weight, tab, prompt = line.partition("\t")
+                if tab:
+                    prompts[prompt] = float(weight)
+                else:
+                    prompts[line] = 1.0
+        if not prompts:
+            raise ValueError(f"No prompts found in {path}")
+        return prompts
+
+    def _next_id(self) -> int:
+        self._counter += 1
+        return self._counter
+
+    def pattern_request(self) -> starweave_pb2.PatternRequest:
+        index = self._next_id()
+        size = self.pattern_sizes.pick()
+        return starweave_pb2.PatternRequest(
+            pattern=starweave_pb2.Pattern(
+                id=f"load-{index}",
+                data=self._rng.getrandbits(8 * size).to_bytes(size, "little"),
+                metadata={"source": "load-generator"},
+                timestamp=time.time(),
+            )
+        )
+
+    def image_request(self) -> starweave_pb2.ImageRequest:
+        args = self.args
+        return starweave_pb2.ImageRequest(
+            prompt=self.prompts.pick(),
+            model=args.model,
+            settings=starweave_pb2.ImageSettings(
+                width=args.image_size,
+                height=args.image_size,
+                steps=args.steps,
+                guidance_scale=7.5,
+                seed=self._rng.randrange(2 ** 31),
+            ),
+            user_id="load-generator",
+        )
+
+    def variations_request(self) -> starweave_pb2.ImageVariationsRequest:
+        return starweave_pb2.ImageVariationsRequest(
+            base_request=self.image_request(),
+            num_variations=self.args.variations,
+            variation_strength=self.args.variation_strength,
+        )
+
+
+class Recorder:
+    """Collects per-call results and turns them into the JSON report."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.results: List[Tuple[str, float, float, Optional[float], str]] = []
+        self.dropped = 0
+        self.max_in_flight = 0
+        self.levels: Dict[int, float] = {}
+
+    def record(self, rpc: str, finished_at: float, latency_ms: float,
+               first_response_ms: Optional[float], status: str) -> None:
+        self.results.append((rpc, finished_at, latency_ms, first_response_ms, status))
+
+    def note_level(self, elapsed: float, level: float) -> None:
+        self.levels.setdefault(int(elapsed // self.interval), level)
+
+    @staticmethod
+    def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+        if not latencies:
+            return {}
+        return {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        }
+
+    def _summary(self, results, elapsed: float) -> Dict:
+        ok = [latency for _, _, latency, _, status in results if status == "OK"]
+        first = [first for _, _, _, first, status in results if status == "OK" and first is not None]
+        errors = defaultdict(int)
+        for _, _, _, _, status in results:
+            if status != "OK":
+                errors[status] += 1
+        summary = {
+            "requests": len(results),
+            "errors": sum(errors.values()),
+            "error_rate": round(sum(errors.values()) / len(results), 4) if results else 0.0,
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": self._latency_summary(ok),
+        }
+        if first:
+            summary["first_response_ms"] = self._latency_summary(first)
+        if errors:
+            summary["error_codes"] = dict(errors)
+        return summary
+
+    def report(self, elapsed: float) -> Dict:
+        by_rpc = defaultdict(list)
+        by_interval = defaultdict(list)
+        for result in self.results:
+            by_rpc[result[0]].append(result)
+            by_interval[int(result[1] // self.interval)].append(result)
+
+        time_series = []
+        for bucket in range(int(elapsed // self.interval) + 1):
+            results = by_interval.get(bucket, [])
+            latencies = [latency for _, _, latency, _, status in results if status == "OK"]
+            time_series.append({
+                "t": round(bucket * self.interval, 3),
+                "level": round(self.levels.get(bucket, 0.0), 2),
+                "completed": len(results),
+                "errors": sum(1 for result in results if result[4] != "OK"),
+                "throughput_rps": round(len(latencies) / self.interval, 2),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+            })
+
+        overall = self._summary(self.results, elapsed)
+        overall["dropped"] = self.dropped
+        overall["max_in_flight"] = self.max_in_flight
+        return {
+            "duration_s": round(elapsed, 3),
+            "overall": overall,
+            "rpcs": {rpc: self._summary(results, elapsed) for rpc, results in sorted(by_rpc.items())},
+            "time_series": time_series,
+        }
+
+
+class LoadGenerator:
+    """Runs the configured workload against the pattern and image services."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workload = Workload(args, random.Random(args.seed))
+        self.schedule = Schedule(parse_stages(args.stages))
+        self.recorder = Recorder(args.interval)
+        self._channels = []
+        self._pattern_stubs = []
+        self._image_stubs = []
+        self._in_flight = 0
+        self._started = 0.0
+
+    def _open_channels(self) -> None:
+        options = [
+            ("grpc.max_receive_message_length", 100 * 1024 * 1024),
+            # A local subchannel pool gives each channel its own connection
+            ("grpc.use_local_subchannel_pool", 1),
+        ]
+        image_target = self.args.image_target or self.args.target
+        for _ in range(self.args.channels):
+            channel = grpc.aio.insecure_channel(self.args.target, options=options)
+            self._channels.append(channel)
+            self._pattern_stubs.append(starweave_pb2_grpc.PatternServiceStub(channel))
+            if image_target != self.args.target:
+                channel = grpc.aio.insecure_channel(image_target, options=options)
+                self._channels.append(channel)
+            self._image_stubs.append(starweave_pb2_grpc.ImageGenerationServiceStub(channel))
+
+    async def _close_channels(self) -> None:
+        for channel in self._channels:
+            await channel.close()
+
+    def _elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    async def _call(self, rpc: str, slot: int) -> Tuple[Optional[float], str]:
+        """Issue one call; return (time to first response in ms, status)."""
+        timeout = self.args.image_timeout if rpc in IMAGE_RPCS else self.args.timeout
+        started = time.perf_counter()
+        first = None
+
+        if rpc == "RecognizePattern":
+            stub = self._pattern_stubs[slot % len(self._pattern_stubs)]
+            response = await stub.RecognizePattern(self.workload.pattern_request(), timeout=timeout)
+            return None, "APPLICATION_ERROR" if response.error else "OK"
+
+        if rpc == "GetStatus":
+            stub = self._pattern_stubs[slot % len(self._pattern_stubs)]
+            await stub.GetStatus(starweave_pb2.StatusRequest(detailed=self.args.detailed_status),
+                                 timeout=timeout)
+            return None, "OK"
+
+        if rpc == "StreamPatterns":
+            stub = self._pattern_stubs[slot % len(self._pattern_stubs)]
+            requests = [self.workload.pattern_request() for _ in range(self.args.stream_messages)]
+            status = "OK"
+            async for response in stub.StreamPatterns(iter(requests), timeout=timeout):
+                if first is None:
+                    first = (time.perf_counter() - started) * 1000
+                if response.error:
+                    status = "APPLICATION_ERROR"
+            return first, status
+
+        stub = self._image_stubs[slot % len(self._image_stubs)]
+        if rpc == "GenerateImage":
+            response = await stub.GenerateImage(self.workload.image_request(), timeout=timeout)
+            return None, "APPLICATION_ERROR" if response.error else "OK"
+
+        status = "OK"
+        async for response in stub.GenerateImageVariations(self.workload.variations_request(), timeout=timeout):
+            if first is None:
+                first = (time.perf_counter() - started) * 1000
+            if response.error:
+                status = "APPLICATION_ERROR"
+        return first, status
+
+    async def _timed_call(self, rpc: str, slot: int, scheduled: float) -> None:
+        """Run one call and record its latency measured from ``scheduled``."""
+        self._in_flight += 1
+        self.recorder.max_in_flight = max(self.recorder.max_in_flight, self._in_flight)
+        try:
+            first, status = await self._call(rpc, slot)
+        except grpc.aio.AioRpcError as e:
+            first, status = None, e.code().name
+        except Exception as e:  # Report client-side failures instead of aborting the run
+            first, status = None, type(e).__name__
+        finally:
+            self._in_flight -= 1
+        finished = time.perf_counter()
+        self.recorder.record(rpc, finished - self._started, (finished - scheduled) * 1000, first, status)
+
+    async def _run_closed(self) -> None:
+        """N clients in a loop; N follows the schedule."""
+        deadline = self._started + self.schedule.duration
+
+        async def client(index: int):
+            while time.perf_counter() < deadline:
+                if index >= round(self.schedule.level(self._elapsed())):
+                    await asyncio.sleep(0.01)
+                    continue
+                await self._timed_call(self.workload.rpcs.pick(), index, time.perf_counter())
+
+        max_clients = int(max(max(stage.start, stage.end) for stage in self.schedule.stages))
+        monitor = asyncio.ensure_future(self._monitor_levels())
+        try:
+            await asyncio.gather(*(client(i) for i in range(max_clients)))
+        finally:
+            monitor.cancel()
+
+    async def _run_open(self) -> None:
+        """Calls arrive at the scheduled rate independent of completions."""
+        rng = random.Random(self.args.seed + 1)
+        pending = set()
+        monitor = asyncio.ensure_future(self._monitor_levels())
+        next_arrival = self._started
+        index = 0
+        try:
+            while next_arrival < self._started + self.schedule.duration:
+                rate = self.schedule.level(next_arrival - self._started)
+                if rate <= 0:
+                    next_arrival += 0.01
+                    continue
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                if self._in_flight >= self.args.max_in_flight:
+                    self.recorder.dropped += 1
+                else:
+                    task = asyncio.ensure_future(
+                        self._timed_call(self.workload.rpcs.pick(), index, next_arrival))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                index += 1
+
+                next_arrival += rng.expovariate(rate) if self.args.arrival == "poisson" else 1.0 / rate
+            if pending:
+                await asyncio.wait(pending, timeout=self.args.drain_timeout)
+        finally:
+            monitor.cancel()
+            for task in pending:
+                task.cancel()
+
+    async def _monitor_levels(self) -> None:
+        while True:
+            elapsed = self._elapsed()
+            self.recorder.note_level(elapsed, self.schedule.level(elapsed))
+            await asyncio.sleep(self.args.interval / 4)
+
+    async def run(self) -> Dict:
+        self._open_channels()
+        try:
+            if self.args.wait_ready:
+                await asyncio.wait_for(
+                    asyncio.gather(*(channel.channel_ready() for channel in self._channels)),
+                    timeout=self.args.wait_ready)
+            self._started = time.perf_counter()
+            if self.args.mode == "open":
+                await self._run_open()
+            else:
+                await self._run_closed()
+            elapsed = self._elapsed()
+        finally:
+            await self._close_channels()
+
+        report = self.recorder.report(elapsed)
+        report["config"] = {
+            "mode": self.args.mode,
+            "stages": self.args.stages,
+            "mix": self.args.mix,
+            "pattern_sizes": self.args.pattern_sizes,
+            "target": self.args.target,
+            "image_target": self.args.image_target or self.args.target,
+            "seed": self.args.seed,
+        }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load against the STARWEAVE gRPC services")
+    parser.add_argument("--target", default="localhost:50051",
+                        help="Address of the pattern service (or the combined server)")
+    parser.add_argument("--image-target", default=None,
+                        help="Address of the image service if it runs separately")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed",
+                        help="closed: N concurrent clients; open: fixed arrival rate")
+    parser.add_argument("--stages", default="10s:8",
+                        help="Schedule of DURATION:LEVEL or DURATION:START-END stages; level is "
+                             "clients (closed) or calls/s (open)")
+    parser.add_argument("--mix", default="RecognizePattern=8,StreamPatterns=1,GetStatus=1",
+                        help="Weighted RPC mix, e.g. RecognizePattern=8,GenerateImage=1")
+    parser.add_argument("--pattern-sizes", default="64=6,1024=3,16384=1",
+                        help="Weighted pattern payload sizes in bytes")
+    parser.add_argument("--prompts-file", default=None,
+                        help="Prompts, one per line, optionally prefixed with 'weight<TAB>'")
+    parser.add_argument("--stream-messages", type=int, default=10, help="Messages per StreamPatterns call")
+    parser.add_argument("--detailed-status", action="store_true", help="Send GetStatus(detailed=True)")
+    parser.add_argument("--model", default="", help="Image model to request (server default if empty)")
+    parser.add_argument("--image-size", type=int, default=512, help="Image width and height")
+    parser.add_argument("--steps", type=int, default=20, help="Diffusion steps per image")
+    parser.add_argument("--variations", type=int, default=3, help="Images per GenerateImageVariations call")
+    parser.add_argument("--variation-strength", type=float, default=0.3, help="Variation strength")
+    parser.add_argument("--arrival", choices=("uniform", "poisson"), default="poisson",
+                        help="Inter-arrival distribution in open-loop mode")
+    parser.add_argument("--max-in-flight", type=int, default=10000,
+                        help="Open loop: calls beyond this many outstanding are dropped and counted")
+    parser.add_argument("--channels", type=int, default=1, help="Client channels (connections) per service")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Deadline for pattern RPCs in seconds")
+    parser.add_argument("--image-timeout", type=float, default=300.0, help="Deadline for image RPCs in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=30.0,
+                        help="Seconds to wait for outstanding calls after the schedule ends")
+    parser.add_argument("--wait-ready", type=float, default=10.0,
+                        help="Seconds to wait for channels to connect (0 to skip)")
+    parser.add_argument("--interval", type=float, default=1.0, help="Time series bucket width in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for request mix and payloads")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadGenerator(args).run())
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for STARWEAVE service hot paths, with per-machine baselines.
+
+Covers request validation, _generate_image overhead around the pipeline
+call, PNG encoding, building and serializing responses, StreamPatterns over
+an in-process channel, and model registry access under thread contention.
+The image servicer runs on the synthetic pipeline backend, so no model
+weights or GPU are needed.
+
+Each benchmark is calibrated to run for about --min-time seconds per
+repeat; the median time per operation across repeats is the reported value.
+
+Usage (from services/python):
+    python benchmarks/microbench.py run --save-baseline
+    python benchmarks/microbench.py run --output current.json
+    python benchmarks/microbench.py compare current.json --threshold 0.10
+    python benchmarks/microbench.py run --compare     # run, then compare to this machine's baseline
+
+Baselines are stored under benchmarks/baselines/<machine>.json. compare
+exits with status 1 if any benchmark is slower than its baseline by more
+than the threshold.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent import futures
+from io import BytesIO
+from typing import Callable, Dict, List
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starweave_pb2
+import starweave_pb2_grpc
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+IMAGE_SIZES = (256, 512, 768, 1024)
+
+
+def machine_id() -> str:
+    """Identify this machine for baseline files."""
+    raw = f"{platform.node()}-{platform.machine()}-py{platform.python_version()}"
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", raw)
+
+
+def default_baseline_path() -> str:
+    return os.path.join(BASELINE_DIR, f"{machine_id()}.json")
+
+
+class Benchmark:
+    """A named operation; ``run(n)`` performs n operations."""
+
+    def __init__(self, name: str, run: Callable[[int], None], ops_per_call: int = 1):
+        self.name = name
+        self.run = run
+        self.ops_per_call = ops_per_call
+
+
+def measure(benchmark: Benchmark, repeats: int, min_time: float) -> Dict[str, float]:
+    """Calibrate an iteration count, then time ``repeats`` runs of it."""
+    benchmark.run(1)  # Warm up
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        benchmark.run(iterations)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or iterations >= 1 << 24:
+            break
+        iterations = max(iterations * 2, int(iterations * min_time / max(elapsed, 1e-9)))
+
+    ops = iterations * benchmark.ops_per_call
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        benchmark.run(iterations)
+        samples.append((time.perf_counter_ns() - start) / ops)
+
+    median = statistics.median(samples)
+    return {
+        "ns_per_op": round(median, 1),
+        "ops_per_sec": round(1e9 / median, 1) if median else 0.0,
+        "min_ns_per_op": round(min(samples), 1),
+        "stdev_pct": round(100 * statistics.pstdev(samples) / median, 2) if median else 0.0,
+        "ops": ops,
+    }
+
+
+class NullPipeline:
+    """Returns a prebuilt image so only the servicer's own overhead is timed."""
+
+    name_or_path = "null"
+    dtype = "float32"
+
+    def __init__(self, image):
+        from server.pipeline_backends import SyntheticPipelineOutput
+        self._output = SyntheticPipelineOutput(images=[image])
+
+    def __call__(self, **kwargs):
+        return self._output
+
+
+class Suite:
+    """Builds the benchmarks and the fixtures they share."""
+
+    def __init__(self, stream_messages: int, contention_threads: int):
+        from server.image_generation_servicer import DEFAULT_MODEL, ImageGenerationServicer
+        from server.pipeline_backends import SyntheticBackend, SyntheticPipeline
+
+        self.stream_messages = stream_messages
+        self.contention_threads = contention_threads
+        self._model_dir = tempfile.TemporaryDirectory(prefix="starweave-bench-")
+        self.servicer = ImageGenerationServicer(
+            model_dir=self._model_dir.name,
+            enable_metrics=False,
+            backend=SyntheticBackend(step_ms=0, text_encode_ms=0, decode_ms=0, memory_mb=1),
+        )
+        self.default_model = DEFAULT_MODEL
+        self._wait_for_model(DEFAULT_MODEL)
+
+        # Deterministic, smooth images like real generations (noise would be a worst case for PNG)
+        pipe = SyntheticPipeline("bench", step_ms=0, text_encode_ms=0, decode_ms=0, memory_mb=0)
+        self.images = {
+            size: pipe(prompt="benchmark image", width=size, height=size, num_inference_steps=4,
+                       generator=_generator(0)).images[0]
+            for size in IMAGE_SIZES
+        }
+        buffer = BytesIO()
+        self.images[512].save(buffer, format="PNG")
+        self.png_512 = buffer.getvalue()
+
+        self._server = None
+        self._channel = None
+
+    def _wait_for_model(self, model_id: str, timeout: float = 60.0) -> None:
+        deadline = time.time() + timeout
+        info = self.servicer._models[model_id]
+        while not info.loaded:
+            if info.load_error:
+                raise RuntimeError(info.load_error)
+            if time.time() > deadline:
+                raise TimeoutError(f"Model {model_id} did not load")
+            time.sleep(0.01)
+
+    def close(self) -> None:
+        if self._channel is not None:
+            self._channel.close()
+        if self._server is not None:
+            self._server.stop(0)
+        self.servicer.stop()
+        self._model_dir.cleanup()
+
+    def benchmarks(self) -> List[Benchmark]:
+        return [
+            self.validate_image_request(),
+            self.generate_image_overhead(),
+            *self.png_encode(),
+            self.image_response_build(),
+            self.pattern_response_build(),
+            self.stream_patterns(),
+            self.registry_contention(),
+        ]
+
+    def validate_image_request(self) -> Benchmark:
+        request = starweave_pb2.ImageRequest(
+            prompt="A beautiful sunset over a mountain lake, digital art",
+            settings=starweave_pb2.ImageSettings(width=512, height=512, steps=25, guidance_scale=7.5, seed=1),
+        )
+        validate = self.servicer._validate_image_request
+
+        def run(n):
+            for _ in range(n):
+                validate(request)
+        return Benchmark("validate_image_request", run)
+
+    def generate_image_overhead(self) -> Benchmark:
+        pipe = NullPipeline(self.images[512])
+        settings = starweave_pb2.ImageSettings(width=512, height=512, steps=25, guidance_scale=7.5, seed=1)
+        generate = self.servicer._generate_image
+
+        def run(n):
+            for _ in range(n):
+                generate(pipe=pipe, prompt="benchmark", settings=settings, num_images_per_prompt=1)
+        return Benchmark("generate_image_overhead", run)
+
+    def png_encode(self) -> List[Benchmark]:
+        benchmarks = []
+        for size, image in self.images.items():
+            def run(n, image=image):
+                for _ in range(n):
+                    image.save(BytesIO(), format="PNG")
+            benchmarks.append(Benchmark(f"png_encode_{size}", run))
+        return benchmarks
+
+    def image_response_build(self) -> Benchmark:
+        image_data = self.png_512
+        debug_info = {f"key_{i}": str(i * 1.5) for i in range(12)}
+
+        def run(n):
+            for i in range(n):
+                response = starweave_pb2.ImageResponse(
+                    request_id=str(i),
+                    image_data=image_data,
+                    format="image/png",
+                    metadata=starweave_pb2.GenerationMetadata(
+                        model=self.default_model,
+                        generation_time_ms=1234,
+                        seed=42,
+                        debug_info=debug_info,
+                    ),
+                )
+                response.SerializeToString()
+        return Benchmark("image_response_build_serialize_512", run)
+
+    def pattern_response_build(self) -> Benchmark:
+        def run(n):
+            for i in range(n):
+                response = starweave_pb2.PatternResponse(
+                    request_id=str(i),
+                    labels=["label_a", "label_b", "label_c"],
+                    confidences={"label_a": 0.95, "label_b": 0.75, "label_c": 0.5},
+                    metadata={"processed_by": "python-server", "pattern_id": f"pattern-{i}"},
+                )
+                response.SerializeToString()
+        return Benchmark("pattern_response_build_serialize", run)
+
+    def stream_patterns(self) -> Benchmark:
+        from server.pattern_server import PatternService
+
+        # Keep per-stream INFO logging out of the measurement output
+        logging.getLogger("server.pattern_server").setLevel(logging.WARNING)
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        starweave_pb2_grpc.add_PatternServiceServicer_to_server(PatternService(), self._server)
+        port = self._server.add_insecure_port("127.0.0.1:0")
+        self._server.start()
+        self._channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+        stub = starweave_pb2_grpc.PatternServiceStub(self._channel)
+        requests = [
+            starweave_pb2.PatternRequest(
+                pattern=starweave_pb2.Pattern(id=f"bench-{i}", data=f"benchmark pattern {i}".encode())
+            )
+            for i in range(self.stream_messages)
+        ]
+
+        def run(n):
+            for _ in range(n):
+                for _response in stub.StreamPatterns(iter(requests)):
+                    pass
+        return Benchmark("stream_patterns_per_message", run, ops_per_call=len(requests))
+
+    def registry_contention(self) -> Benchmark:
+        servicer = self.servicer
+        model_id = self.default_model
+        threads = self.contention_threads
+        request = starweave_pb2.ModelRequest()
+
+        def run(n):
+            # Every thread looks up the model; one in eight calls lists all models
+            per_thread = max(1, n // threads)
+
+            def worker():
+                for i in range(per_thread):
+                    if i % 8 == 0:
+                        servicer.GetImageModels(request, None)
+                    else:
+                        servicer._get_model_info(model_id)
+
+            pool = [threading.Thread(target=worker) for _ in range(threads)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+        return Benchmark(f"model_registry_{threads}_threads", run)
+
+
+def _generator(seed: int):
+    import torch
+    return torch.Generator().manual_seed(seed)
+
+
+def run_suite(args) -> Dict:
+    from loguru import logger
+    logger.remove()  # Servicer logging would dominate the timings
+
+    suite = Suite(stream_messages=args.stream_messages, contention_threads=args.threads)
+    results = {}
+    try:
+        for benchmark in suite.benchmarks():
+            if args.filter and args.filter not in benchmark.name:
+                continue
+            results[benchmark.name] = measure(benchmark, args.repeats, args.min_time)
+            print(f"{benchmark.name:40s} {results[benchmark.name]['ns_per_op']:>14,.1f} ns/op "
+                  f"(+/- {results[benchmark.name]['stdev_pct']:.1f}%)", file=sys.stderr)
+    finally:
+        suite.close()
+
+    return {
+        "machine": machine_id(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "benchmarks": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> Dict:
+    """Compare ns/op per benchmark; positive change means slower than baseline."""
+    rows = {}
+    for name, result in sorted(current["benchmarks"].items()):
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            rows[name] = {"status": "new", "ns_per_op": result["ns_per_op"]}
+            continue
+        change = (result["ns_per_op"] - base["ns_per_op"]) / base["ns_per_op"]
+        if change > threshold:
+            status = "regression"
+        elif change < -threshold:
+            status = "improvement"
+        else:
+            status = "ok"
+        rows[name] = {
+            "status": status,
+            "baseline_ns_per_op": base["ns_per_op"],
+            "ns_per_op": result["ns_per_op"],
+            "change_pct": round(100 * change, 2),
+        }
+    for name in baseline["benchmarks"]:
+        if name not in current["benchmarks"]:
+            rows[name] = {"status": "missing"}
+    return {
+        "baseline_machine": baseline.get("machine"),
+        "threshold_pct": round(100 * threshold, 2),
+        "regressions": sorted(name for name, row in rows.items() if row["status"] == "regression"),
+        "benchmarks": rows,
+    }
+
+
+def _load(path: str) -> Dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write(path: str, data: Dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def _report_comparison(current: Dict, baseline_path: str, threshold: float) -> int:
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save-baseline first", file=sys.stderr)
+        return 2
+    result = compare(current, _load(baseline_path), threshold)
+    print(json.dumps(result, indent=2))
+    return 1 if result["regressions"] else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="STARWEAVE micro-benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--filter", default=None, help="Only run benchmarks whose name contains this")
+    run_parser.add_argument("--repeats", type=int, default=5, help="Timed repeats per benchmark")
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="Target seconds per repeat")
+    run_parser.add_argument("--stream-messages", type=int, default=100, help="Messages per StreamPatterns call")
+    run_parser.add_argument("--threads", type=int, default=8, help="Threads for the registry contention benchmark")
+    run_parser.add_argument("--output", default=None, help="Write results to this file")
+    run_parser.add_argument("--save-baseline", action="store_true",
+                            help="Store results as this machine's baseline")
+    run_parser.add_argument("--compare", action="store_true",
+                            help="Compare results against this machine's baseline")
+    run_parser.add_argument("--baseline", default=None, help="Baseline file (default: per-machine)")
+    run_parser.add_argument("--threshold", type=float, default=0.10,
+                            help="Relative slowdown flagged as a regression")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare results against a baseline")
+    compare_parser.add_argument("results", help="Results file from 'run --output'")
+    compare_parser.add_argument("--baseline", default=None, help="Baseline file (default: per-machine)")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Relative slowdown flagged as a regression")
+
+    args = parser.parse_args()
+    baseline_path = args.baseline or default_baseline_path()
+
+    if args.command == "compare":
+        return _report_comparison(_load(args.results), baseline_path, args.threshold)
+
+    results = run_suite(args)
+    if args.output:
+        _write(args.output, results)
+    if args.save_baseline:
+        _write(baseline_path, results)
+        print(f"Saved baseline to {baseline_path}", file=sys.stderr)
+    if args.compare:
+        return _report_comparison(results, baseline_path, args.threshold)
+    if not args.output and not args.save_baseline:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark the threaded and asyncio (grpc.aio) PatternService serving modes.
+
+Starts the pattern server in each mode, parks a number of mostly idle
+StreamPatterns streams on it, and then measures RecognizePattern throughput
+and latency while those streams stay open. In threaded mode every open
+stream pins one of the server's worker threads; in asyncio mode it only
+costs a coroutine.
+
+Usage (from services/python):
+    python benchmarks/serving_modes.py --idle-streams 200 --workers 10
+
+Pass --processes N to run each mode pre-forked behind SO_REUSEPORT; use
+--channels so client connections are spread across the worker processes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starweave_pb2
+import starweave_pb2_grpc
+from server.metrics import percentile
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(port: int, workers: int, use_aio: bool, processes: int = 1) -> subprocess.Popen:
+    """Start the pattern server in a subprocess and wait until it accepts calls."""
+    cmd = [sys.executable, "-m", "server.pattern_server", "--port", str(port), "--workers", str(workers),
+           "--processes", str(processes)]
+    if use_aio:
+        cmd.append("--aio")
+    process = subprocess.Popen(cmd, cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    with grpc.insecure_channel(f"localhost:{port}") as channel:
+        grpc.channel_ready_future(channel).result(timeout=30)
+    return process
+
+
+def make_request(index: int) -> starweave_pb2.PatternRequest:
+    return starweave_pb2.PatternRequest(
+        pattern=starweave_pb2.Pattern(id=f"bench-{index}", data=f"benchmark pattern {index}".encode())
+    )
+
+
+async def hold_stream(call, index: int, opened: list) -> None:
+    """Read responses from an open stream until it is cancelled."""
+    try:
+        async for _ in call:
+            opened.append(index)
+    except (grpc.aio.AioRpcError, asyncio.CancelledError):
+        pass
+
+
+async def run_mode(port: int, args) -> dict:
+    # A local subchannel pool gives each channel its own connection
+    channels = [grpc.aio.insecure_channel(f"localhost:{port}", options=[("grpc.use_local_subchannel_pool", 1)])
+                for _ in range(args.channels)]
+    stubs = [starweave_pb2_grpc.PatternServiceStub(channel) for channel in channels]
+    try:
+        # Park idle streams on the server
+        release = asyncio.Event()
+        opened = []
+
+        async def idle_requests(index: int):
+            yield make_request(index)
+            await release.wait()
+
+        calls = [stubs[i % len(stubs)].StreamPatterns(idle_requests(i)) for i in range(args.idle_streams)]
+        streams = [asyncio.ensure_future(hold_stream(call, i, opened)) for i, call in enumerate(calls)]
+        await asyncio.sleep(args.settle)
+
+        # Measure unary throughput while the streams are open
+        latencies = []
+        errors = 0
+        deadline = time.perf_counter() + args.duration
+
+        async def unary_worker(worker_id: int):
+            nonlocal errors
+            stub = stubs[worker_id % len(stubs)]
+            i = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    await stub.RecognizePattern(make_request(worker_id * 1_000_000 + i), timeout=args.timeout)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                except grpc.aio.AioRpcError:
+                    errors += 1
+                i += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(unary_worker(w) for w in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        for call in calls:
+            call.cancel()
+        release.set()
+        await asyncio.gather(*streams, return_exceptions=True)
+    finally:
+        for channel in channels:
+            await channel.close()
+
+    return {
+        "idle_streams_requested": args.idle_streams,
+        "idle_streams_served": len(opened),
+        "unary_requests": len(latencies),
+        "unary_errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark threaded vs asyncio PatternService serving")
+    parser.add_argument("--port", type=int, default=50152, help="Port to run the benchmark server on")
+    parser.add_argument("--workers", type=int, default=10, help="Server worker threads")
+    parser.add_argument("--idle-streams", type=int, default=200, help="Idle StreamPatterns streams to hold open")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent RecognizePattern callers")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to measure unary calls")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-call deadline in seconds")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to let streams open")
+    parser.add_argument("--modes", default="threaded,aio", help="Comma-separated modes to run")
+    parser.add_argument("--processes", type=int, default=1, help="Pre-forked server processes")
+    parser.add_argument("--channels", type=int, default=1, help="Client channels (connections) to spread calls over")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes.split(","):
+        process = start_server(args.port, args.workers, use_aio=(mode == "aio"), processes=args.processes)
+        try:
+            results[mode] = asyncio.run(run_mode(args.port, args))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Measure the transport profiles against plain gRPC defaults.
+
+Runs two in-process workloads over loopback:
+
+* stream: many small StreamPatterns messages through the real PatternService
+* image: GenerateImage returning a large, incompressible payload (a stand-in
+  for a PNG, so no model is needed)
+
+Each workload is run with gRPC defaults (message-size limits only) and with
+the service's TransportProfile, and the throughput and per-message sizes
+are printed as JSON.
+
+Usage (from services/python):
+    python benchmarks/transport_profiles.py --messages 20000 --images 50
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent import futures
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starweave_pb2
+import starweave_pb2_grpc
+from server.pattern_server import PatternService
+from server.transport import IMAGE_PROFILE, PATTERN_PROFILE, TransportProfile
+
+
+class PayloadImageService(starweave_pb2_grpc.ImageGenerationServiceServicer):
+    """Returns a fixed incompressible payload in place of a generated PNG."""
+
+    def __init__(self, payload_bytes: int):
+        self.payload = os.urandom(payload_bytes)
+
+    def GenerateImage(self, request, context):
+        return starweave_pb2.ImageResponse(request_id="bench", image_data=self.payload, format="image/png")
+
+
+def baseline(profile: TransportProfile) -> TransportProfile:
+    """Profile with only the message-size limits set."""
+    return TransportProfile(name=f"{profile.name}-default", service=profile.service,
+                            max_message_length=profile.max_message_length)
+
+
+def start_server(profile: TransportProfile, register) -> tuple:
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=4),
+        options=profile.server_options(),
+        compression=profile.default_compression(),
+        interceptors=profile.interceptors(),
+    )
+    register(server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, port
+
+
+def bench_stream(profile: TransportProfile, messages: int, payload_size: int) -> dict:
+    server, port = start_server(
+        profile, lambda s: starweave_pb2_grpc.add_PatternServiceServicer_to_server(PatternService(), s))
+    data = (b"pattern:token " * (payload_size // 14 + 1))[:payload_size]
+
+    def requests():
+        for i in range(messages):
+            yield starweave_pb2.PatternRequest(
+                pattern=starweave_pb2.Pattern(id=f"p-{i}", data=data, metadata={"source": "bench"}))
+
+    try:
+        with grpc.insecure_channel(f"localhost:{port}", options=profile.channel_options()) as channel:
+            stub = starweave_pb2_grpc.PatternServiceStub(channel)
+            start = time.perf_counter()
+            last = None
+            for last in stub.StreamPatterns(requests()):
+                pass
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop(0)
+
+    raw = last.SerializeToString()
+    compressed = profile.method_compression().get("/starweave.PatternService/StreamPatterns")
+    return {
+        "messages_per_sec": round(messages / elapsed, 1),
+        "response_bytes": len(raw),
+        "response_wire_bytes_estimate": len(gzip.compress(raw)) if compressed else len(raw),
+    }
+
+
+def bench_image(profile: TransportProfile, images: int, payload_bytes: int) -> dict:
+    server, port = start_server(
+        profile, lambda s: starweave_pb2_grpc.add_ImageGenerationServiceServicer_to_server(
+            PayloadImageService(payload_bytes), s))
+    try:
+        with grpc.insecure_channel(f"localhost:{port}", options=profile.channel_options()) as channel:
+            stub = starweave_pb2_grpc.ImageGenerationServiceStub(channel)
+            stub.GenerateImage(starweave_pb2.ImageRequest(prompt="warmup"))
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(images):
+                call_start = time.perf_counter()
+                stub.GenerateImage(starweave_pb2.ImageRequest(prompt="bench"))
+                latencies.append((time.perf_counter() - call_start) * 1000)
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop(0)
+
+    latencies.sort()
+    return {
+        "megabytes_per_sec": round(images * payload_bytes / elapsed / (1024 * 1024), 1),
+        "latency_ms_p50": round(latencies[len(latencies) // 2], 2),
+        "latency_ms_max": round(latencies[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure transport profiles against gRPC defaults")
+    parser.add_argument("--messages", type=int, default=20000, help="StreamPatterns messages per run")
+    parser.add_argument("--pattern-bytes", type=int, default=256, help="Pattern payload size")
+    parser.add_argument("--images", type=int, default=50, help="GenerateImage calls per run")
+    parser.add_argument("--image-bytes", type=int, default=1536 * 1024, help="Image payload size")
+    args = parser.parse_args()
+
+    results = {
+        "stream": {
+            "default": bench_stream(baseline(PATTERN_PROFILE), args.messages, args.pattern_bytes),
+            "profile": bench_stream(PATTERN_PROFILE, args.messages, args.pattern_bytes),
+        },
+        "image": {
+            "default": bench_image(baseline(IMAGE_PROFILE), args.images, args.image_bytes),
+            "profile": bench_image(IMAGE_PROFILE, args.images, args.image_bytes),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
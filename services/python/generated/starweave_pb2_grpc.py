@@ -40,6 +40,11 @@ class PatternServiceStub(object):
                 request_serializer=starweave__pb2.PatternRequest.SerializeToString,
                 response_deserializer=starweave__pb2.PatternResponse.FromString,
                 _registered_method=True)
+        self.RecognizePatterns = channel.unary_unary(
+                '/starweave.PatternService/RecognizePatterns',
+                request_serializer=starweave__pb2.PatternBatchRequest.SerializeToString,
+                response_deserializer=starweave__pb2.PatternBatchResponse.FromString,
+                _registered_method=True)
         self.StreamPatterns = channel.stream_stream(
                 '/starweave.PatternService/StreamPatterns',
                 request_serializer=starweave__pb2.PatternRequest.SerializeToString,
@@ -50,6 +55,16 @@ class PatternServiceStub(object):
                 request_serializer=starweave__pb2.StatusRequest.SerializeToString,
                 response_deserializer=starweave__pb2.StatusResponse.FromString,
                 _registered_method=True)
+        self.IngestPatterns = channel.stream_unary(
+                '/starweave.PatternService/IngestPatterns',
+                request_serializer=starweave__pb2.IngestRequest.SerializeToString,
+                response_deserializer=starweave__pb2.IngestResponse.FromString,
+                _registered_method=True)
+        self.GetTrends = channel.unary_unary(
+                '/starweave.PatternService/GetTrends',
+                request_serializer=starweave__pb2.TrendRequest.SerializeToString,
+                response_deserializer=starweave__pb2.TrendResponse.FromString,
+                _registered_method=True)
 
 
 class PatternServiceServicer(object):
@@ -63,6 +78,13 @@ class PatternServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RecognizePatterns(self, request, context):
+        """Process a batch of patterns in one call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def StreamPatterns(self, request_iterator, context):
         """Stream patterns for real-time processing
         """
@@ -77,6 +99,20 @@ class PatternServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def IngestPatterns(self, request_iterator, context):
+        """Load patterns into the recognition corpus in batches
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetTrends(self, request, context):
+        """Heavy hitters and label counts of recently streamed patterns
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_PatternServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -85,6 +121,11 @@ def add_PatternServiceServicer_to_server(servicer, server):
                     request_deserializer=starweave__pb2.PatternRequest.FromString,
                     response_serializer=starweave__pb2.PatternResponse.SerializeToString,
             ),
+            'RecognizePatterns': grpc.unary_unary_rpc_method_handler(
+                    servicer.RecognizePatterns,
+                    request_deserializer=starweave__pb2.PatternBatchRequest.FromString,
+                    response_serializer=starweave__pb2.PatternBatchResponse.SerializeToString,
+            ),
             'StreamPatterns': grpc.stream_stream_rpc_method_handler(
                     servicer.StreamPatterns,
                     request_deserializer=starweave__pb2.PatternRequest.FromString,
@@ -95,6 +136,16 @@ def add_PatternServiceServicer_to_server(servicer, server):
                     request_deserializer=starweave__pb2.StatusRequest.FromString,
                     response_serializer=starweave__pb2.StatusResponse.SerializeToString,
             ),
+            'IngestPatterns': grpc.stream_unary_rpc_method_handler(
+                    servicer.IngestPatterns,
+                    request_deserializer=starweave__pb2.IngestRequest.FromString,
+                    response_serializer=starweave__pb2.IngestResponse.SerializeToString,
+            ),
+            'GetTrends': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetTrends,
+                    request_deserializer=starweave__pb2.TrendRequest.FromString,
+                    response_serializer=starweave__pb2.TrendResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'starweave.PatternService', rpc_method_handlers)
@@ -134,6 +185,33 @@ class PatternService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def RecognizePatterns(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/starweave.PatternService/RecognizePatterns',
+            starweave__pb2.PatternBatchRequest.SerializeToString,
+            starweave__pb2.PatternBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def StreamPatterns(request_iterator,
             target,
@@ -188,6 +266,60 @@ class PatternService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def IngestPatterns(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/starweave.PatternService/IngestPatterns',
+            starweave__pb2.IngestRequest.SerializeToString,
+            starweave__pb2.IngestResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetTrends(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/starweave.PatternService/GetTrends',
+            starweave__pb2.TrendRequest.SerializeToString,
+            starweave__pb2.TrendResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
 
 class ImageGenerationServiceStub(object):
     """Image Generation Service
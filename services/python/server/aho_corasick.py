@@ -0,0 +1,196 @@
+"""
+Aho–Corasick scanning: find every stored pattern that occurs in an input.
+
+The reverse of search. Stored patterns are compiled into an automaton (a
+trie with failure and output links), so one linear pass over the input
+reports every occurrence of every pattern. Per-pattern substring checks
+would cost O(patterns x length).
+
+PatternScanner keeps the automaton current without blocking scans; see
+server.background_index. Patterns added since the last build are found
+with direct substring search until they are compiled in.
+
+An automaton can be exported as flat arrays (sorted transition keys, failure
+and output links, outputs in CSR form) and scanned from them as a
+FlatAutomaton, e.g. memory-mapped from a snapshot (see server.snapshot).
+"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from server.background_index import BackgroundIndex
+
+# (pattern number, start, end) with end exclusive
+Occurrence = Tuple[int, int, int]
+
+_CODE_BITS = 21  # Code points fit in 21 bits; transition keys are node << 21 | code point
+
+
+class Automaton:
+    """Immutable Aho–Corasick automaton over (text, pattern number) pairs."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, int]] = ()):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[Tuple[int, int]]] = [[]]
+        count = 0
+        for text, doc in patterns:
+            if not text:
+                continue
+            node = 0
+            for char in text:
+                nxt = goto[node].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][char] = nxt
+                    goto.append({})
+                    outputs.append([])
+                node = nxt
+            outputs[node].append((doc, len(text)))
+            count += 1
+
+        # Breadth-first: a node's failure target is always shallower, so already final
+        fail = [0] * len(goto)
+        output_link = [0] * len(goto)  # Nearest proper suffix node that ends a pattern
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target
+                output_link[child] = target if outputs[target] else output_link[target]
+                queue.append(child)
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = [tuple(out) for out in outputs]
+        self._output_link = output_link
+        self.patterns = count
+
+    @property
+    def nodes(self) -> int:
+        return len(self._goto)
+
+    def scan(self, text: str) -> Iterator[Occurrence]:
+        """Yield (pattern number, start, end) for every occurrence in text."""
+        goto, fail, outputs, output_link = self._goto, self._fail, self._outputs, self._output_link
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            match = node if outputs[node] else output_link[node]
+            while match:
+                for doc, length in outputs[match]:
+                    yield doc, position + 1 - length, position + 1
+                match = output_link[match]
+
+    def export(self) -> Dict[str, np.ndarray]:
+        """Flat arrays of the automaton, for FlatAutomaton."""
+        keys = np.fromiter((node << _CODE_BITS | ord(char) for node, edges in enumerate(self._goto)
+                            for char in edges), dtype=np.int64)
+        targets = np.fromiter((child for edges in self._goto for child in edges.values()),
+                              dtype=np.int64, count=len(keys))
+        order = np.argsort(keys, kind="stable")
+        sizes = np.fromiter((len(out) for out in self._outputs), dtype=np.int64, count=len(self._outputs))
+        flat = [item for out in self._outputs for item in out]
+        return {
+            "keys": keys[order],
+            "targets": targets[order],
+            "fail": np.array(self._fail, dtype=np.int64),
+            "output_link": np.array(self._output_link, dtype=np.int64),
+            "output_ptr": np.append(0, np.cumsum(sizes)),
+            "output_docs": np.array([doc for doc, _ in flat], dtype=np.int64),
+            "output_lengths": np.array([length for _, length in flat], dtype=np.int64),
+            "patterns": np.array(self.patterns, dtype=np.int64),
+        }
+
+
+class FlatAutomaton:
+    """Aho–Corasick automaton scanned from the arrays of Automaton.export().
+
+    Transitions are looked up by binary search over ``node << 21 | code
+    point`` keys, so nothing is unpacked into Python objects and the arrays
+    can stay memory-mapped. Scans are slower per character than Automaton.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._arrays = arrays
+        self._keys = arrays["keys"]
+        self._targets = arrays["targets"]
+        self._fail = arrays["fail"]
+        self._output_link = arrays["output_link"]
+        self._output_ptr = arrays["output_ptr"]
+        self._output_docs = arrays["output_docs"]
+        self._output_lengths = arrays["output_lengths"]
+        self.patterns = int(arrays["patterns"])
+
+    @property
+    def nodes(self) -> int:
+        return len(self._fail)
+
+    def _goto(self, node: int, code: int) -> int:
+        # Child of node for code point, or -1
+        key = node << _CODE_BITS | code
+        slot = int(self._keys.searchsorted(key))
+        if slot < len(self._keys) and self._keys[slot] == key:
+            return int(self._targets[slot])
+        return -1
+
+    def scan(self, text: str) -> Iterator[Occurrence]:
+        """Yield (pattern number, start, end) for every occurrence in text."""
+        ptr, fail, output_link = self._output_ptr, self._fail, self._output_link
+        node = 0
+        for position, char in enumerate(text):
+            code = ord(char)
+            child = self._goto(node, code)
+            while child < 0 and node:
+                node = int(fail[node])
+                child = self._goto(node, code)
+            node = max(child, 0)
+            match = node if ptr[node + 1] > ptr[node] else int(output_link[node])
+            while match:
+                start, end = int(ptr[match]), int(ptr[match + 1])
+                for doc, length in zip(self._output_docs[start:end].tolist(),
+                                       self._output_lengths[start:end].tolist()):
+                    yield doc, position + 1 - length, position + 1
+                match = int(output_link[match])
+
+    def export(self) -> Dict[str, np.ndarray]:
+        return self._arrays
+
+
+class PatternScanner(BackgroundIndex):
+    """Aho–Corasick scanner with background rebuilds and atomic swaps.
+
+    See BackgroundIndex for the arguments.
+    """
+
+    def build(self, patterns: List[Tuple[str, int]]) -> Automaton:
+        return Automaton(patterns)
+
+    def scan(self, text: str) -> Iterator[Occurrence]:
+        """Yield (pattern number, start, end) for every occurrence in text.
+
+        Removed patterns may still be reported until the next rebuild.
+        """
+        automaton, delta = self._state
+        yield from automaton.scan(text)
+        for pattern, doc in delta:
+            start = text.find(pattern)
+            while start != -1:
+                yield doc, start, start + len(pattern)
+                start = text.find(pattern, start + 1)
+
+    def stats(self) -> Dict[str, int]:
+        automaton, _ = self._state
+        stats = super().stats()
+        return {
+            "scanner_patterns": automaton.patterns,
+            "scanner_nodes": automaton.nodes,
+            "scanner_delta": stats["delta"],
+            "scanner_rebuilds": stats["rebuilds"],
+        }
@@ -0,0 +1,151 @@
+"""
+Base class for pattern indexes that are rebuilt in the background.
+
+The state is an immutable ``(built, delta)`` pair that readers take once and
+writers replace whole, so queries never wait for a rebuild:
+
+* Patterns added since the last build go to the delta, which subclasses
+  search directly until the next rebuild. Removed patterns stay in the
+  built index until then, and callers filter them out.
+* A background thread rebuilds from the full pattern set after changes
+  settle (or once the delta is large) and swaps the new state in.
+* Bulk loads can hold rebuilds with defer() and resume(), so a long
+  stream of additions causes one rebuild at the end, not one per
+  max_delta patterns.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REBUILD_DELAY = 0.5  # Seconds without changes before rebuilding
+DEFAULT_MAX_DELTA = 256  # Rebuild right away once this many patterns are pending
+
+
+class BackgroundIndex:
+    """Built index plus a delta of recent additions, rebuilt in the background.
+
+    Subclasses implement build().
+
+    Args:
+        source: Returns the current (text, pattern number) pairs and the next
+            unused pattern number; called for rebuilds. Pattern numbers must
+            only increase.
+        rebuild_delay: Seconds without changes before a background rebuild
+        max_delta: Pending additions that trigger a rebuild without waiting
+    """
+
+    def __init__(self, source: Callable[[], Tuple[List[Tuple[str, int]], int]],
+                 rebuild_delay: float = DEFAULT_REBUILD_DELAY, max_delta: int = DEFAULT_MAX_DELTA):
+        self._source = source
+        self.rebuild_delay = rebuild_delay
+        self.max_delta = max_delta
+        self._state: Tuple[Any, Tuple[Tuple[str, int], ...]] = (self.build([]), ())
+        self._lock = threading.Lock()  # Serializes writers; readers never take it
+        self._rebuild_lock = threading.Lock()
+        self._changed = threading.Event()
+        self._urgent = False
+        self._holds = 0
+        self._deferred = False
+        self._thread: Optional[threading.Thread] = None
+        self.rebuilds = 0
+
+    def build(self, patterns: List[Tuple[str, int]]) -> Any:
+        """Build the immutable index over (text, pattern number) pairs."""
+        raise NotImplementedError
+
+    def add(self, patterns: Iterable[Tuple[str, int]]) -> None:
+        """Make new (text, pattern number) pairs visible to queries and schedule a rebuild."""
+        added = tuple((text, doc) for text, doc in patterns if text)
+        if not added:
+            return
+        with self._lock:
+            built, delta = self._state
+            delta += added
+            self._state = (built, delta)
+        self._schedule(urgent=len(delta) >= self.max_delta)
+
+    def removed(self) -> None:
+        """Note that a pattern was removed so the index is eventually rebuilt."""
+        self._schedule(urgent=False)
+
+    def defer(self) -> None:
+        """Hold background rebuilds until a matching resume(); additions stay in the delta."""
+        with self._lock:
+            self._holds += 1
+
+    def resume(self) -> None:
+        """Release a defer() and rebuild right away if changes were held back."""
+        with self._lock:
+            self._holds -= 1
+            release = self._holds == 0 and self._deferred
+            if release:
+                self._deferred = False
+        if release:
+            self._schedule(urgent=True)
+
+    def rebuild(self, loader: Optional[Callable[[], Tuple[Any, int]]] = None) -> None:
+        """Rebuild from the source and swap the result in.
+
+        Args:
+            loader: Returns a ready index and its watermark, replacing build()
+                for this rebuild (e.g. to load a saved copy)
+        """
+        with self._rebuild_lock:
+            if loader is not None:
+                built, watermark = loader()
+            else:
+                patterns, watermark = self._source()
+                built = self.build(patterns)
+            self.swap(built, watermark)
+
+    def swap(self, built: Any, watermark: int) -> None:
+        """Install a built index covering all pattern numbers below watermark."""
+        with self._lock:
+            _, delta = self._state
+            # Additions made after the snapshot stay in the delta
+            self._state = (built, tuple(item for item in delta if item[1] >= watermark))
+        self.rebuilds += 1
+
+    @property
+    def state(self) -> Tuple[Any, Tuple[Tuple[str, int], ...]]:
+        """The current (built, delta) pair."""
+        return self._state
+
+    def restore(self, built: Any, delta: Iterable[Tuple[str, int]]) -> None:
+        """Install a built index with its delta, e.g. loaded from a snapshot."""
+        with self._lock:
+            self._state = (built, tuple(delta))
+
+    def stats(self) -> Dict[str, int]:
+        _, delta = self._state
+        return {"delta": len(delta), "rebuilds": self.rebuilds}
+
+    def _schedule(self, urgent: bool) -> None:
+        with self._lock:
+            if self._holds:
+                self._deferred = True
+                return
+        if urgent:
+            self._urgent = True
+        self._changed.set()
+        if self._thread is None or not self._thread.is_alive():
+            # Also restarts the worker in processes forked after it started
+            self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}-rebuild", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._changed.wait()
+            # Debounce: rebuild once changes stop arriving, unless the delta is large
+            while not self._urgent:
+                self._changed.clear()
+                if not self._changed.wait(self.rebuild_delay):
+                    break
+            self._changed.clear()
+            self._urgent = False
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"{type(self).__name__} rebuild failed: {e}")
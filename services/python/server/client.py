@@ -27,7 +27,24 @@ def run():
                 )
             )
             logger.info(f"Response: {response}")
-            
+
+            # Test batch recognition
+            logger.info("\nTesting batch recognition...")
+            batch = stub.RecognizePatterns(
+                starweave_pb2.PatternBatchRequest(requests=[
+                    starweave_pb2.PatternRequest(
+                        pattern=starweave_pb2.Pattern(
+                            id=f"batch-pattern-{i}",
+                            data=f"batch data {i}".encode(),
+                            metadata={"source": "test-client"}
+                        )
+                    )
+                    for i in range(3)
+                ])
+            )
+            for response in batch.responses:
+                logger.info(f"Batch response: {response}")
+
             # Test status check
             logger.info("\nTesting status check...")
             status = stub.GetStatus(starweave_pb2.StatusRequest(detailed=True))
@@ -47,7 +64,12 @@ def run():
             
             for response in stub.StreamPatterns(generate_requests()):
                 logger.info(f"Stream response: {response}")
-                
+
+            # Test trends of the streamed patterns
+            logger.info("\nTesting trends...")
+            trends = stub.GetTrends(starweave_pb2.TrendRequest(window_seconds=60, top_k=3))
+            logger.info(f"Trends: {trends}")
+
         except grpc.RpcError as e:
             logger.error(f"RPC failed: {e.code()}: {e.details()}")
             raise
@@ -3,6 +3,7 @@ Image Generation Service for STARWEAVE
 
 This module implements the gRPC service for generating images using HuggingFace Diffusers.
 """
+import asyncio
 import os
 import sys
 import time
@@ -23,14 +24,13 @@ from loguru import logger
 from PIL import Image, ImageFile
 import torch
 from diffusers import (
-    StableDiffusionPipeline,
-    DPMSolverSinglestepScheduler,
     StableDiffusionImg2ImgPipeline,
     StableDiffusionInpaintPipeline
 )
 from diffusers.pipelines.stable_diffusion.safety_checker import (
     StableDiffusionSafetyChecker
 )
+from diffusers.utils.torch_utils import randn_tensor
 
 # Health service imports
 from grpc_health.v1 import health
@@ -69,6 +69,7 @@ MIN_IMAGE_SIZE = 128   # Minimum width/height for generated images
 MAX_PROMPT_LENGTH = 1000
 MAX_STEPS = 100
 MAX_BATCH_SIZE = 4
+MAX_CONCURRENT_GENERATIONS = 2  # Generations allowed into the worker pool at once (asyncio mode)
 
 class ModelType(Enum):
     TEXT_TO_IMAGE = "text-to-image"
@@ -105,6 +106,10 @@ from starweave_pb2 import (
     GenerationMetadata,
 )
 from starweave_pb2_grpc import ImageGenerationServiceServicer, add_ImageGenerationServiceServicer_to_server
+from server.metrics import StageTimer, StageHistograms, NULL_STAGE_TIMER
+from server.rpc_metrics import AsyncMetricsInterceptor, MetricsInterceptor, RpcMetrics, start_exporter
+from server.transport import DEFAULT_PROFILES, IMAGE_PROFILE, TransportProfile, load_profiles
+from server.pipeline_backends import DiffusersBackend, PipelineBackend, get_backend
 
 @dataclass
 class ModelInfo:
@@ -118,12 +123,15 @@ class ModelInfo:
     memory_usage: int = 0  # In bytes
     load_count: int = 0
     error_count: int = 0
+    # Serializes pipeline calls; diffusers pipelines keep per-call scheduler state
+    generation_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
 class ImageGenerationServicer(ImageGenerationServiceServicer):
     """gRPC servicer for image generation requests."""
     
     def __init__(self, model_dir: str = "./models", max_models_in_memory: int = 2, 
-                 max_disk_cache_gb: float = 10.0, cleanup_interval: int = 300):
+                 max_disk_cache_gb: float = 10.0, cleanup_interval: int = 300,
+                 enable_metrics: bool = True, backend: Optional[PipelineBackend] = None):
         """Initialize the image generation service.
         
         Args:
@@ -131,6 +139,8 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
             max_models_in_memory: Maximum number of models to keep in GPU memory
             max_disk_cache_gb: Maximum disk space to use for model cache (in GB)
             cleanup_interval: How often to run cleanup (in seconds)
+            enable_metrics: Whether to record per-stage generation timings
+            backend: Loads pipelines for model ids (defaults to diffusers)
         """
         # Initialize device settings
         self.device = DEFAULT_DEVICE
@@ -144,8 +154,12 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
         self._models: Dict[str, ModelInfo] = {}
         self._cache_metadata_path = self.model_dir / "cache_metadata.json"
         self._stop_event = threading.Event()
+        self.enable_metrics = enable_metrics
+        self._stage_histograms = StageHistograms()
+        self.backend = backend or DiffusersBackend()
         
-        logger.info(f"Initialized with device: {self.device}, dtype: {self.torch_dtype}")
+        logger.info(f"Initialized with device: {self.device}, dtype: {self.torch_dtype}, "
+                    f"backend: {self.backend.name}")
         
         # Initialize models and load cache state
         self.model_dir.mkdir(parents=True, exist_ok=True)
@@ -462,7 +476,7 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
                 return False, "Missing required model components (UNet, TextEncoder, or VAE)"
                 
             # Check model type matches expected
-            if model_config.type == ModelType.TEXT_TO_IMAGE and not isinstance(pipe, StableDiffusionPipeline):
+            if model_config.type == ModelType.TEXT_TO_IMAGE and not isinstance(pipe, self.backend.pipeline_class):
                 return False, f"Expected text-to-image model but got {type(pipe).__name__}"
                 
             # Check model dimensions
@@ -528,36 +542,13 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
                 model_dir = self.model_dir / hashlib.md5(model_id.encode()).hexdigest()
                 model_dir.mkdir(parents=True, exist_ok=True)
                 
-                # Try different model loading strategies
                 try:
-                    # First try with fp16 if on CUDA/ROCm
-                    if DEFAULT_DEVICE != "cpu":
-                        try:
-                            pipe = StableDiffusionPipeline.from_pretrained(
-                                model_id,
-                                revision="fp16",
-                                torch_dtype=DEFAULT_TORCH_DTYPE,
-                                cache_dir=str(model_dir),
-                                safety_checker=None,
-                                use_safetensors=True
-                            )
-                        except Exception as e:
-                            logger.warning(f"FP16 load failed, trying without revision: {e}")
-                            pipe = StableDiffusionPipeline.from_pretrained(
-                                model_id,
-                                torch_dtype=DEFAULT_TORCH_DTYPE,
-                                cache_dir=str(model_dir),
-                                safety_checker=None,
-                                use_safetensors=True
-                            )
-                    else:
-                        pipe = StableDiffusionPipeline.from_pretrained(
-                            model_id,
-                            torch_dtype=DEFAULT_TORCH_DTYPE,
-                            cache_dir=str(model_dir),
-                            safety_checker=None,
-                            use_safetensors=True
-                        )
+                    pipe = self.backend.load(
+                        model_id,
+                        cache_dir=str(model_dir),
+                        device=DEFAULT_DEVICE,
+                        torch_dtype=DEFAULT_TORCH_DTYPE
+                    )
                     
                     # Move to device with error handling
                     try:
@@ -568,10 +559,6 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
                         self.torch_dtype = torch.float32
                         pipe = pipe.to(self.device)
                     
-                    # Configure scheduler if needed
-                    if hasattr(pipe, 'scheduler'):
-                        pipe.scheduler = DPMSolverSinglestepScheduler.from_config(pipe.scheduler.config)
-                    
                     # Validate the loaded model
                     is_valid, validation_error = self._validate_model(pipe, model_info.config)
                     if not is_valid:
@@ -593,6 +580,8 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
                         # Estimate memory usage
                         if DEFAULT_DEVICE.startswith("cuda") and torch.cuda.is_available():
                             model_info.memory_usage = torch.cuda.memory_allocated()
+                        else:
+                            model_info.memory_usage = self.backend.memory_usage(pipe)
                     
                     load_time = time.time() - start_time
                     logger.info(f"Successfully loaded and validated model {model_id} in {load_time:.2f}s")
@@ -696,12 +685,17 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
                 model_info.parameters["memory_usage"] = f"{info.memory_usage / (1024*1024):.2f} MB"
                 model_info.parameters["load_count"] = str(info.load_count)
                 model_info.parameters["error_count"] = str(info.error_count)
+                
+                # Add per-stage timing percentiles
+                for stage, stats in self._stage_histograms.snapshot(model_id).items():
+                    model_info.parameters[f"stage_{stage}_ms"] = (
+                        f"p50: {stats['p50']:.1f}, p95: {stats['p95']:.1f}, count: {stats['count']}"
+                    )
         
         return response
     
-    def _generate_image(self, pipe, prompt: str, settings: ImageSettings, **kwargs) -> Tuple[Image.Image, Dict[str, Any]]:
-        """Generate an image using the given pipeline and parameters."""
-        # Prepare generation parameters
+    def _prepare_generation_params(self, settings: ImageSettings) -> Dict[str, Any]:
+        """Clamp generation settings to supported ranges and resolve the seed."""
         width = min(max(settings.width or 512, MIN_IMAGE_SIZE), MAX_IMAGE_SIZE)
         height = min(max(settings.height or 512, MIN_IMAGE_SIZE), MAX_IMAGE_SIZE)
         num_inference_steps = min(max(settings.steps or 25, 1), MAX_STEPS)
@@ -712,6 +706,29 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
         if seed == -1:
             seed = torch.randint(0, 2**32 - 1, (1,)).item()
         
+        return {
+            "width": width,
+            "height": height,
+            "num_inference_steps": num_inference_steps,
+            "guidance_scale": guidance_scale,
+            "seed": seed,
+        }
+    
+    def _generate_image(self, pipe, prompt: str, settings: ImageSettings,
+                        timer: StageTimer = NULL_STAGE_TIMER, **kwargs) -> Tuple[Image.Image, Dict[str, Any]]:
+        """Generate an image using the given pipeline and parameters.
+        
+        If an enabled ``timer`` is given, text encoding, UNet steps and VAE decode
+        are timed through hooks on the pipeline for the duration of the call.
+        """
+        # Prepare generation parameters
+        params = self._prepare_generation_params(settings)
+        width = params["width"]
+        height = params["height"]
+        num_inference_steps = params["num_inference_steps"]
+        guidance_scale = params["guidance_scale"]
+        seed = params["seed"]
+        
         # Create generator with the specified seed
         device = "cuda" if torch.cuda.is_available() else "cpu"
         generator = torch.Generator(device=device).manual_seed(seed)
@@ -728,18 +745,22 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
         }
         
         # Generate the image
-        with torch.inference_mode():
-            result = pipe(**gen_kwargs)
-            
-            # Handle different pipeline outputs
-            if hasattr(result, 'images') and result.images:
-                image = result.images[0]
-            elif isinstance(result, list) and len(result) > 0 and isinstance(result[0], Image.Image):
-                image = result[0]
-            elif isinstance(result, Image.Image):
-                image = result
-            else:
-                raise ValueError(f"Unexpected pipeline output format: {type(result)}")
+        timer.attach(pipe)
+        try:
+            with torch.inference_mode():
+                result = pipe(**gen_kwargs)
+        finally:
+            timer.detach()
+        
+        # Handle different pipeline outputs
+        if hasattr(result, 'images') and result.images:
+            image = result.images[0]
+        elif isinstance(result, list) and len(result) > 0 and isinstance(result[0], Image.Image):
+            image = result[0]
+        elif isinstance(result, Image.Image):
+            image = result
+        else:
+            raise ValueError(f"Unexpected pipeline output format: {type(result)}")
         
         # Prepare metadata
         metadata = {
@@ -755,14 +776,128 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
         
         return image, metadata
     
+    def _fork_variations(self, pipe, prompt: str, settings: ImageSettings,
+                         variation_strength: float) -> Dict[str, Any]:
+        """Run the base denoising trajectory that variations branch off.
+        
+        The base trajectory is run once, up to the step that corresponds to
+        ``variation_strength``, and its latent is snapshotted. Each variation then
+        perturbs that latent with its own noise and only runs the remaining
+        ``variation_strength * steps`` denoising steps (see _generate_branch), so
+        a variation at strength 0.3 costs roughly 30% of a full generation.
+        
+        Returns:
+            The fork to pass to _generate_branch
+        """
+        params = self._prepare_generation_params(settings)
+        num_inference_steps = params["num_inference_steps"]
+        seed = params["seed"]
+        
+        branch_steps = max(1, round(num_inference_steps * variation_strength))
+        fork_step = num_inference_steps - branch_steps
+        
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        base_kwargs = {
+            "prompt": prompt,
+            "width": params["width"],
+            "height": params["height"],
+            "guidance_scale": params["guidance_scale"],
+        }
+        
+        # Run the shared part of the trajectory once and snapshot the latent
+        snapshot = {}
+        if fork_step > 0:
+            def _capture_fork(pipeline, step_index, timestep, callback_kwargs):
+                if step_index == fork_step - 1:
+                    snapshot["latents"] = callback_kwargs["latents"].clone()
+                    snapshot["timesteps"] = [int(t) for t in pipeline.scheduler.timesteps[fork_step:]]
+                    # Skip the rest of the base loop; only the branches finish it
+                    pipeline._interrupt = True
+                return callback_kwargs
+            
+            base_start = time.time()
+            with torch.inference_mode():
+                pipe(
+                    **base_kwargs,
+                    num_inference_steps=num_inference_steps,
+                    generator=torch.Generator(device=device).manual_seed(seed),
+                    output_type="latent",
+                    callback_on_step_end=_capture_fork,
+                )
+            base_time_ms = int((time.time() - base_start) * 1000)
+            
+            if "latents" not in snapshot:
+                raise ValueError(f"Base trajectory ended before fork step {fork_step}")
+        else:
+            base_time_ms = 0
+        
+        return {
+            "params": params,
+            "base_kwargs": base_kwargs,
+            "snapshot": snapshot,
+            "branch_steps": branch_steps,
+            "fork_step": fork_step,
+            "variation_strength": variation_strength,
+            "device": device,
+            "base_time_ms": base_time_ms,
+        }
+    
+    def _generate_branch(self, pipe, fork: Dict[str, Any], i: int) -> Tuple[Image.Image, Dict[str, Any]]:
+        """Finish variation i of a fork (see _fork_variations) with its own noise.
+        
+        Returns:
+            Tuple of (image, metadata)
+        """
+        params = fork["params"]
+        snapshot = fork["snapshot"]
+        variation_strength = fork["variation_strength"]
+        seed = params["seed"]
+        
+        branch_start = time.time()
+        branch_seed = (seed + i + 1) % (2**32)
+        generator = torch.Generator(device=fork["device"]).manual_seed(branch_seed)
+        
+        if snapshot:
+            # Blend fresh noise into the shared latent, preserving its variance
+            base_latents = snapshot["latents"]
+            noise = randn_tensor(base_latents.shape, generator=generator,
+                                 device=base_latents.device, dtype=base_latents.dtype)
+            latents = ((1.0 - variation_strength ** 2) ** 0.5) * base_latents + variation_strength * noise
+            branch_kwargs = {"latents": latents, "timesteps": snapshot["timesteps"]}
+        else:
+            # Strength 1.0: nothing is shared, each branch is a full generation
+            branch_kwargs = {"num_inference_steps": params["num_inference_steps"]}
+        
+        with torch.inference_mode():
+            result = pipe(**fork["base_kwargs"], generator=generator, **branch_kwargs)
+        
+        metadata = {
+            "width": params["width"],
+            "height": params["height"],
+            "steps": params["num_inference_steps"],
+            "branch_steps": fork["branch_steps"],
+            "fork_step": fork["fork_step"],
+            "guidance_scale": params["guidance_scale"],
+            "seed": seed,
+            "branch_seed": branch_seed,
+            "model": pipe.name_or_path if hasattr(pipe, 'name_or_path') else "unknown",
+            "device": fork["device"],
+            "base_time_ms": fork["base_time_ms"],
+            "generation_time_ms": int((time.time() - branch_start) * 1000),
+        }
+        
+        return result.images[0], metadata
+    
     def GenerateImage(self, request: ImageRequest, context) -> ImageResponse:
         """Generate a single image from a text prompt."""
         start_time = time.time()
         request_id = str(uuid.uuid4())
+        timer = StageTimer() if self.enable_metrics else NULL_STAGE_TIMER
         
         try:
             # Validate the request
-            is_valid, error_msg = self._validate_image_request(request)
+            with timer.stage("validate"):
+                is_valid, error_msg = self._validate_image_request(request)
             if not is_valid:
                 return ImageResponse(
                     request_id=request_id,
@@ -771,7 +906,8 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
             
             # Get model ID or use default
             model_id = request.model or DEFAULT_MODEL
-            model_info = self._get_model_info(model_id)
+            with timer.stage("model_wait"):
+                model_info = self._get_model_info(model_id)
             
             if not model_info or not model_info.loaded or not model_info.pipeline:
                 return ImageResponse(
@@ -782,38 +918,54 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
             # Get the pipeline
             pipe = model_info.pipeline
             
-            # Update last used timestamp
-            model_info.last_used = time.time()
-            
-            # Generate the image
-            image, gen_metadata = self._generate_image(
-                pipe=pipe,
-                prompt=request.prompt,
-                settings=request.settings or ImageSettings(),
-                num_images_per_prompt=1
-            )
+            # Wait for our turn on the pipeline
+            with timer.stage("queue_wait"):
+                model_info.generation_lock.acquire()
+            try:
+                # Update last used timestamp
+                model_info.last_used = time.time()
+                
+                # Generate the image
+                image, gen_metadata = self._generate_image(
+                    pipe=pipe,
+                    prompt=request.prompt,
+                    settings=request.settings or ImageSettings(),
+                    timer=timer,
+                    num_images_per_prompt=1
+                )
+            finally:
+                model_info.generation_lock.release()
             
             # Convert to bytes
             img_byte_arr = BytesIO()
             image_format = "PNG"
-            image.save(img_byte_arr, format=image_format)
+            with timer.stage("encode"):
+                image.save(img_byte_arr, format=image_format)
             
             # Calculate generation time
             generation_time_ms = int((time.time() - start_time) * 1000)
             gen_metadata["generation_time_ms"] = generation_time_ms
             
-            # Create response
-            return ImageResponse(
-                request_id=request_id,
-                image_data=img_byte_arr.getvalue(),
-                format=f"image/{image_format.lower()}",
-                metadata=GenerationMetadata(
-                    model=model_id,
-                    generation_time_ms=generation_time_ms,
-                    seed=gen_metadata["seed"],
-                    debug_info={k: str(v) for k, v in gen_metadata.items()}
+            # Create response; gRPC serializes it for the wire after this returns, outside the breakdown
+            with timer.stage("build_response"):
+                response = ImageResponse(
+                    request_id=request_id,
+                    image_data=img_byte_arr.getvalue(),
+                    format=f"image/{image_format.lower()}",
+                    metadata=GenerationMetadata(
+                        model=model_id,
+                        generation_time_ms=generation_time_ms,
+                        seed=gen_metadata["seed"],
+                        debug_info={k: str(v) for k, v in gen_metadata.items()}
+                    )
                 )
-            )
+            
+            if timer.enabled:
+                stage_timings = timer.summary()
+                response.metadata.debug_info.update({k: str(v) for k, v in stage_timings.items()})
+                self._stage_histograms.observe(model_id, stage_timings)
+            
+            return response
             
         except Exception as e:
             error_msg = f"Image generation failed: {str(e)}"
@@ -871,24 +1023,22 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
             num_variations = max(1, min(request.num_variations or 1, MAX_BATCH_SIZE))
             variation_strength = max(0.0, min(1.0, request.variation_strength or 0.5))
             
-            # Generate each variation
+            # Run the shared base trajectory once; if it fails, no variation can be made
+            settings = request.base_request.settings or ImageSettings()
+            with model_info.generation_lock:
+                fork = self._fork_variations(
+                    pipe=pipe,
+                    prompt=request.base_request.prompt,
+                    settings=settings,
+                    variation_strength=variation_strength
+                )
+            
+            # Generate each variation from the fork; a failed one does not stop the rest
             for i in range(num_variations):
                 try:
-                    # Add variation strength to the prompt
-                    variation_prompt = f"{request.base_request.prompt} (variation {i+1}, strength: {variation_strength:.2f})"
-                    
-                    # Generate the image with a slightly modified seed
-                    settings = request.base_request.settings or ImageSettings()
-                    if settings.seed is not None:
-                        settings.seed += i  # Vary the seed for each variation
-                    
-                    image, gen_metadata = self._generate_image(
-                        pipe=pipe,
-                        prompt=variation_prompt,
-                        settings=settings,
-                        num_images_per_prompt=1,
-                        strength=variation_strength
-                    )
+                    # Hold the pipeline only while a branch is being denoised
+                    with model_info.generation_lock:
+                        image, gen_metadata = self._generate_branch(pipe, fork, i)
                     
                     # Convert to bytes
                     img_byte_arr = BytesIO()
@@ -914,6 +1064,7 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
                     
                 except Exception as e:
                     logger.error(f"Error generating variation {i}: {str(e)}")
+                    model_info.error_count += 1
                     yield ImageResponse(
                         request_id=f"{request_id}-{i}",
                         error=f"Failed to generate variation {i+1}: {str(e)}"
@@ -932,8 +1083,101 @@ class ImageGenerationServicer(ImageGenerationServiceServicer):
                 error=error_msg
             )
 
+class AsyncImageGenerationServicer(ImageGenerationServiceServicer):
+    """asyncio (grpc.aio) front end for ImageGenerationServicer.
+    
+    Generation runs on a small worker pool. Requests waiting for a free
+    generation slot are parked as coroutines instead of pinning a thread.
+    A variations stream holds a slot only while its next variation is
+    being generated, not while the client reads it.
+    """
+    
+    def __init__(self, servicer: ImageGenerationServicer,
+                 max_concurrent_generations: int = MAX_CONCURRENT_GENERATIONS,
+                 executor: Optional[futures.Executor] = None):
+        """Initialize the asyncio servicer.
+        
+        Args:
+            servicer: Synchronous servicer that does the actual generation
+            max_concurrent_generations: Generations allowed to run at once
+            executor: Worker pool for generation (created if not given)
+        """
+        self.servicer = servicer
+        self._generation_slots = asyncio.Semaphore(max_concurrent_generations)
+        self._executor = executor or futures.ThreadPoolExecutor(
+            max_workers=max_concurrent_generations,
+            thread_name_prefix='image_worker'
+        )
+    
+    async def GenerateImage(self, request: ImageRequest, context) -> ImageResponse:
+        """Generate a single image from a text prompt."""
+        loop = asyncio.get_running_loop()
+        async with self._generation_slots:
+            return await loop.run_in_executor(
+                self._executor, self.servicer.GenerateImage, request, None)
+    
+    async def GenerateImageVariations(self, request: ImageVariationsRequest, context):
+        """Generate multiple variations of an image."""
+        loop = asyncio.get_running_loop()
+        responses = self.servicer.GenerateImageVariations(request, None)
+        while True:
+            # Take a slot per variation, not for the stream, so a slow reader does not hold one
+            async with self._generation_slots:
+                response = await loop.run_in_executor(self._executor, next, responses, None)
+            if response is None:
+                break
+            yield response
+    
+    async def GetImageModels(self, request: ModelRequest, context) -> ModelResponse:
+        """Get list of available image generation models."""
+        return self.servicer.GetImageModels(request, context)
+    
+    def shutdown(self):
+        """Shut down the worker pool."""
+        self._executor.shutdown(wait=False)
+
+
+async def _serve_aio(servicer: ImageGenerationServicer, port: int,
+                     max_concurrent_generations: int = MAX_CONCURRENT_GENERATIONS,
+                     transport_profile: TransportProfile = IMAGE_PROFILE,
+                     metrics_port: int = 0):
+    """Run the image generation service on an asyncio (grpc.aio) server."""
+    # Saturation is relative to the generation slots, the limit calls queue for
+    rpc_metrics = RpcMetrics(workers=max_concurrent_generations)
+    server = grpc.aio.server(
+        options=transport_profile.server_options(),
+        compression=transport_profile.default_compression(),
+        interceptors=[AsyncMetricsInterceptor(rpc_metrics)] + transport_profile.aio_interceptors()
+    )
+    async_servicer = AsyncImageGenerationServicer(
+        servicer, max_concurrent_generations=max_concurrent_generations)
+    add_ImageGenerationServiceServicer_to_server(async_servicer, server)
+    
+    # Add health checking service
+    health_servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    await health_servicer.set("", health_pb2.HealthCheckResponse.SERVING)
+    await health_servicer.set("starweave.ImageGeneration", health_pb2.HealthCheckResponse.SERVING)
+    
+    server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+    logger.info(f"Image generation asyncio server started on port {port}")
+    metrics_exporter = start_exporter(rpc_metrics, metrics_port)
+    
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(0)
+        async_servicer.shutdown()
+        if metrics_exporter:
+            metrics_exporter.stop()
+
+
 def serve(port: int = 50051, model_dir: str = "./models", max_models_in_memory: int = 2, 
-          max_disk_cache_gb: float = 10.0, cleanup_interval: int = 300):
+          max_disk_cache_gb: float = 10.0, cleanup_interval: int = 300, enable_metrics: bool = True,
+          use_aio: bool = False, transport_config: Optional[str] = None,
+          backend: str = "diffusers", backend_options: Optional[Dict[str, Any]] = None,
+          metrics_port: int = 0):
     """Start the gRPC server for image generation.
     
     Args:
@@ -942,9 +1186,18 @@ def serve(port: int = 50051, model_dir: str = "./models", max_models_in_memory:
         max_models_in_memory: Maximum number of models to keep in GPU memory
         max_disk_cache_gb: Maximum disk space to use for model cache (in GB)
         cleanup_interval: How often to run cleanup (in seconds)
+        enable_metrics: Whether to record per-stage generation timings
+        use_aio: Serve with the asyncio (grpc.aio) server instead of a thread pool
+        transport_config: JSON file with transport profile overrides
+        backend: Pipeline backend name ("diffusers" or "synthetic")
+        backend_options: Keyword arguments for the backend constructor
+        metrics_port: Serve per-RPC and process metrics in the Prometheus text
+            format on http://127.0.0.1:<metrics_port>/metrics (0 disables)
     """
+    transport_profile = load_profiles(transport_config, DEFAULT_PROFILES)["image"]
     server = None
     servicer = None
+    metrics_exporter = None
     
     def handle_sigterm(*_):
         logger.info("Received SIGTERM, shutting down gracefully...")
@@ -976,24 +1229,41 @@ def serve(port: int = 50051, model_dir: str = "./models", max_models_in_memory:
     signal.signal(signal.SIGINT, handle_sigterm)
     
     try:
+        if use_aio:
+            servicer = ImageGenerationServicer(
+                model_dir=model_dir,
+                max_models_in_memory=max_models_in_memory,
+                max_disk_cache_gb=max_disk_cache_gb,
+                cleanup_interval=cleanup_interval,
+                enable_metrics=enable_metrics,
+                backend=get_backend(backend, **(backend_options or {}))
+            )
+            asyncio.run(_serve_aio(servicer, port, transport_profile=transport_profile,
+                                   metrics_port=metrics_port))
+            return
+        
         # Initialize server and servicer
+        max_workers = 10
+        rpc_metrics = RpcMetrics(workers=max_workers)
         server = grpc.server(
             futures.ThreadPoolExecutor(
-                max_workers=10,
+                max_workers=max_workers,
                 thread_name_prefix='grpc_worker'
             ),
-            options=[
-                ('grpc.max_send_message_length', 100 * 1024 * 1024),  # 100MB
-                ('grpc.max_receive_message_length', 100 * 1024 * 1024),  # 100MB
-                ('grpc.max_concurrent_rpcs', 10),
-            ]
+            options=transport_profile.server_options() + [
+                ('grpc.max_concurrent_rpcs', max_workers),
+            ],
+            compression=transport_profile.default_compression(),
+            interceptors=[MetricsInterceptor(rpc_metrics)] + transport_profile.interceptors()
         )
         
         servicer = ImageGenerationServicer(
             model_dir=model_dir,
             max_models_in_memory=max_models_in_memory,
             max_disk_cache_gb=max_disk_cache_gb,
-            cleanup_interval=cleanup_interval
+            cleanup_interval=cleanup_interval,
+            enable_metrics=enable_metrics,
+            backend=get_backend(backend, **(backend_options or {}))
         )
         
         # Add services
@@ -1010,6 +1280,7 @@ def serve(port: int = 50051, model_dir: str = "./models", max_models_in_memory:
         # Start the server
         server.add_insecure_port(f'[::]:{port}')
         server.start()
+        metrics_exporter = start_exporter(rpc_metrics, metrics_port)
         
         # Log server info
         logger.info(f"Image generation server started on port {port}")
@@ -1035,113 +1306,10 @@ def serve(port: int = 50051, model_dir: str = "./models", max_models_in_memory:
             servicer.stop()
         if server:
             server.stop(0)
+        if metrics_exporter:
+            metrics_exporter.stop()
         logger.info("Server has been shut down")
 
-def GenerateImageVariations(self, request: ImageVariationsRequest, context):
-    """Generate multiple variations of an image."""
-    request_id = str(uuid.uuid4())
-    
-    try:
-        # Validate the base request
-        if not request.base_request:
-            yield ImageResponse(
-                request_id=request_id,
-                error="Base request is required"
-            )
-            return
-            
-        # Validate the base image request
-        is_valid, error_msg = self._validate_image_request(request.base_request)
-        if not is_valid:
-            yield ImageResponse(
-                request_id=request_id,
-                error=f"Invalid base request: {error_msg}"
-            )
-            return
-        
-        # Get model ID or use default
-        model_id = request.base_request.model or DEFAULT_MODEL
-        model_info = self._get_model_info(model_id)
-        
-        if not model_info or not model_info.loaded or not model_info.pipeline:
-            yield ImageResponse(
-                request_id=request_id,
-                error=f"Model {model_id} is not available or failed to load"
-            )
-            return
-        
-        # Get the pipeline
-        pipe = model_info.pipeline
-        
-        # Update last used timestamp
-        model_info.last_used = time.time()
-        
-        # Generate variations
-        num_variations = max(1, min(request.num_variations or 1, MAX_BATCH_SIZE))
-        variation_strength = max(0.0, min(1.0, request.variation_strength or 0.5))
-        
-        # Generate each variation
-        for i in range(num_variations):
-            try:
-                # Add variation strength to the prompt
-                variation_prompt = f"{request.base_request.prompt} (variation {i+1}, strength: {variation_strength:.2f})"
-                
-                # Generate the image with a slightly modified seed
-                settings = request.base_request.settings or ImageSettings()
-                if settings.seed is not None:
-                    settings.seed += i  # Vary the seed for each variation
-                
-                image, gen_metadata = self._generate_image(
-                    pipe=pipe,
-                    prompt=variation_prompt,
-                    settings=settings,
-                    num_images_per_prompt=1,
-                    strength=variation_strength
-                )
-                
-                # Convert to bytes
-                img_byte_arr = BytesIO()
-                image_format = "PNG"
-                image.save(img_byte_arr, format=image_format)
-                
-                # Create response
-                yield ImageResponse(
-                    request_id=f"{request_id}-{i}",
-                    image_data=img_byte_arr.getvalue(),
-                    format=f"image/{image_format.lower()}",
-                    metadata=GenerationMetadata(
-                        model=model_id,
-                        generation_time_ms=gen_metadata.get("generation_time_ms", 0),
-                        seed=gen_metadata.get("seed", 0),
-                        debug_info={
-                            "variation_index": str(i),
-                            "variation_strength": f"{variation_strength:.2f}",
-                            **{k: str(v) for k, v in gen_metadata.items()}
-                        }
-                    )
-                )
-                
-            except Exception as e:
-                logger.error(f"Error generating variation {i}: {str(e)}")
-                yield ImageResponse(
-                    request_id=f"{request_id}-{i}",
-                    error=f"Failed to generate variation {i+1}: {str(e)}"
-                )
-    
-    except Exception as e:
-        error_msg = f"Image variation generation failed: {str(e)}"
-        logger.exception("Error in GenerateImageVariations")
-        
-        # Update error count for the model
-        if 'model_info' in locals() and model_info:
-            model_info.error_count += 1
-        
-        yield ImageResponse(
-            request_id=request_id,
-            error=error_msg
-        )
-
-
 if __name__ == '__main__':
     import argparse
     
@@ -1149,10 +1317,28 @@ if __name__ == '__main__':
     parser.add_argument('--port', type=int, default=50051, help='Port to listen on')
     parser.add_argument('--model-dir', type=str, default='./models', 
                        help='Directory to store downloaded models')
+    parser.add_argument('--disable-metrics', action='store_true',
+                       help='Disable per-stage generation timing')
+    parser.add_argument('--aio', action='store_true',
+                       help='Serve with the asyncio (grpc.aio) server')
+    parser.add_argument('--transport-config', type=str, default=None,
+                       help='JSON file with transport profile overrides')
+    parser.add_argument('--backend', choices=['diffusers', 'synthetic'], default='diffusers',
+                       help='Pipeline backend; synthetic needs no weights or GPU')
+    parser.add_argument('--synthetic-step-ms', type=float, default=50.0,
+                       help='Synthetic backend: UNet step cost at 512x512 (ms)')
+    parser.add_argument('--synthetic-memory-mb', type=float, default=64.0,
+                       help='Synthetic backend: memory held per loaded model (MB)')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                       help='Serve Prometheus-style metrics on localhost at this port (0 disables)')
     
     args = parser.parse_args()
     
     # Configure logging
     logger.add("image_generation_{time:YYYY-MM-DD}.log", rotation="10 MB")
     
-    serve(port=args.port, model_dir=args.model_dir)
+    serve(port=args.port, model_dir=args.model_dir, enable_metrics=not args.disable_metrics,
+          use_aio=args.aio, transport_config=args.transport_config, backend=args.backend,
+          metrics_port=args.metrics_port,
+          backend_options=({"step_ms": args.synthetic_step_ms, "memory_mb": args.synthetic_memory_mb}
+                           if args.backend == "synthetic" else None))
@@ -0,0 +1,263 @@
+"""
+Lightweight metrics primitives for the STARWEAVE gRPC services.
+
+Provides fixed-bucket histograms and per-request stage timers that can be
+aggregated per model without pulling in an external metrics library.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Latency bucket upper bounds in milliseconds
+DEFAULT_BUCKETS_MS = (
+    0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000, 120000,
+)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of values using nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def bucket_quantile(buckets: Tuple[float, ...], counts: List[int], q: float) -> float:
+    """Estimate the q-th quantile (0.0-1.0) of bucketed counts by interpolating within buckets.
+
+    counts has one entry per bucket upper bound in buckets, plus a last
+    (+Inf) entry.
+    """
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+
+    target = q * total
+    cumulative = 0
+    for index, bucket_count in enumerate(counts):
+        if cumulative + bucket_count >= target and bucket_count > 0:
+            lower = buckets[index - 1] if index > 0 else 0.0
+            if index >= len(buckets):
+                return float(lower)  # Overflow bucket has no upper bound
+            upper = buckets[index]
+            return lower + (upper - lower) * (target - cumulative) / bucket_count
+        cumulative += bucket_count
+    return float(buckets[-1])
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram of millisecond observations."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record a single observation."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-th quantile (0.0-1.0) by interpolating within buckets."""
+        with self._lock:
+            counts = list(self.counts)
+        return bucket_quantile(self.buckets, counts, q)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return summary statistics for the histogram."""
+        with self._lock:
+            count = self.count
+            total = self.sum
+        return {
+            "count": count,
+            "mean": total / count if count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class StageTimer:
+    """Collects wall-clock timings for the stages of a single request.
+
+    Pipeline-internal stages (text encoding, UNet steps, VAE decode) are
+    captured with forward hooks while the timer is attached to a pipeline.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.unet_steps: List[float] = []
+        self._hooks = []
+        self._sync_cuda = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as the named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def record(self, name: str, elapsed_ms: float) -> None:
+        """Add elapsed time to the named stage."""
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def attach(self, pipe) -> None:
+        """Register timing hooks on the pipeline's text encoder, UNet and VAE decoder."""
+        try:
+            import torch
+            self._sync_cuda = torch.cuda.is_available()
+        except ImportError:
+            self._sync_cuda = False
+
+        self._hook_module(getattr(pipe, "text_encoder", None), "text_encode")
+        self._hook_module(getattr(pipe, "unet", None), None)
+        vae = getattr(pipe, "vae", None)
+        self._hook_module(getattr(vae, "decoder", None), "vae_decode")
+
+    def detach(self) -> None:
+        """Remove all hooks registered by attach()."""
+        for handle in self._hooks:
+            handle.remove()
+        self._hooks = []
+
+    def _hook_module(self, module, stage_name: Optional[str]) -> None:
+        if module is None or not hasattr(module, "register_forward_pre_hook"):
+            return
+
+        started = []
+
+        def _pre_hook(_module, _inputs):
+            started.append(time.perf_counter())
+
+        def _post_hook(_module, _inputs, _output):
+            if self._sync_cuda:
+                import torch
+                torch.cuda.synchronize()
+            elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+            if stage_name is None:
+                self.unet_steps.append(elapsed_ms)
+            else:
+                self.record(stage_name, elapsed_ms)
+
+        self._hooks.append(module.register_forward_pre_hook(_pre_hook))
+        self._hooks.append(module.register_forward_hook(_post_hook))
+
+    def summary(self) -> Dict[str, float]:
+        """Return stage timings in milliseconds, keyed as ``<stage>_ms``."""
+        result = {f"{name}_ms": round(value, 3) for name, value in self.stages.items()}
+        if self.unet_steps:
+            result["unet_steps"] = len(self.unet_steps)
+            result["unet_total_ms"] = round(sum(self.unet_steps), 3)
+            result["unet_step_mean_ms"] = round(sum(self.unet_steps) / len(self.unet_steps), 3)
+            result["unet_step_p95_ms"] = round(percentile(self.unet_steps, 95), 3)
+        return result
+
+
+class NullStageTimer(StageTimer):
+    """No-op stage timer used when metrics are disabled."""
+
+    enabled = False
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def record(self, name: str, elapsed_ms: float) -> None:
+        pass
+
+    def attach(self, pipe) -> None:
+        pass
+
+    def summary(self) -> Dict[str, float]:
+        return {}
+
+
+NULL_STAGE_TIMER = NullStageTimer()
+
+
+class StageHistograms:
+    """Per-model histograms of stage timings."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS_MS):
+        self._buckets = tuple(buckets)
+        self._histograms: Dict[str, Dict[str, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model_id: str, timings: Dict[str, float]) -> None:
+        """Record one request's stage timings (as returned by StageTimer.summary())."""
+        for name, value in timings.items():
+            if not name.endswith("_ms"):
+                continue
+            self._get(model_id, name[:-3]).observe(value)
+
+    def _get(self, model_id: str, stage: str) -> Histogram:
+        with self._lock:
+            model_histograms = self._histograms.setdefault(model_id, {})
+            histogram = model_histograms.get(stage)
+            if histogram is None:
+                histogram = model_histograms[stage] = Histogram(self._buckets)
+            return histogram
+
+    def snapshot(self, model_id: str) -> Dict[str, Dict[str, float]]:
+        """Return summary statistics for every stage recorded for a model."""
+        with self._lock:
+            model_histograms = dict(self._histograms.get(model_id, {}))
+        return {stage: histogram.snapshot() for stage, histogram in model_histograms.items()}
+
+
+class SharedCounters:
+    """Integer counters in shared memory, aggregated across forked worker processes.
+
+    Each worker process owns one slot and is the only process writing to it,
+    so increments only need a process-local lock. Totals are computed by
+    summing every slot. Create before forking so children inherit the mapping.
+    """
+
+    def __init__(self, num_slots: int, fields: Iterable[str] = ("requests_processed",)):
+        import ctypes
+        from multiprocessing.sharedctypes import RawArray
+
+        self.num_slots = num_slots
+        self.fields = tuple(fields)
+        self._index = {name: i for i, name in enumerate(self.fields)}
+        self._values = RawArray(ctypes.c_int64, num_slots * len(self.fields))
+        self._slot = 0
+        self._lock = threading.Lock()
+
+    def bind(self, slot: int) -> None:
+        """Select the slot this process writes to (call in the worker after fork)."""
+        if not 0 <= slot < self.num_slots:
+            raise ValueError(f"Slot {slot} out of range (0-{self.num_slots - 1})")
+        self._slot = slot
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Add amount to this process's counter."""
+        index = self._slot * len(self.fields) + self._index[name]
+        with self._lock:
+            self._values[index] += amount
+
+    def value(self, name: str, slot: Optional[int] = None) -> int:
+        """Return the counter for one slot (this process's by default)."""
+        slot = self._slot if slot is None else slot
+        return self._values[slot * len(self.fields) + self._index[name]]
+
+    def total(self, name: str) -> int:
+        """Return the counter summed across all slots."""
+        offset = self._index[name]
+        stride = len(self.fields)
+        return sum(self._values[slot * stride + offset] for slot in range(self.num_slots))
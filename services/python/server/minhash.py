@@ -0,0 +1,242 @@
+"""
+MinHash signatures with LSH banding for approximate Jaccard search.
+
+Each token set gets ``bands * rows`` MinHash values, computed in NumPy over
+batches of patterns. Every band of ``rows`` values is folded into one 64-bit
+key. Two sets with Jaccard similarity s share at least one band key with
+probability ``1 - (1 - s**rows)**bands``. More bands raise recall; more rows
+raise precision. The similarity where that curve is steepest is about
+``(1 / bands) ** (1 / rows)``.
+
+Only band keys are kept, not full signatures. Keys are salted per band
+and kept in one sorted array with a parallel array of pattern numbers, so
+a query is two vectorized ``np.searchsorted`` calls. New patterns go to a
+small pending buffer that is scanned directly and merged into the sorted
+arrays once it grows past ``merge_threshold``. Candidates are approximate and must be re-scored by
+the caller.
+
+Writers must be serialized by the caller. Each write publishes an
+immutable state (sorted arrays, pending buffers, removed patterns) that
+queries take once, so they never lock. Merges build new arrays rather than
+changing the published ones.
+"""
+import hashlib
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+DEFAULT_BANDS = 32
+DEFAULT_ROWS = 4
+DEFAULT_BATCH_TOKENS = 16384  # Bounds the (tokens x permutations) hash matrix per batch
+DEFAULT_MERGE_THRESHOLD = 65536
+
+_FOLD = np.uint64(0x9E3779B97F4A7C15)
+_SHIFT = np.uint64(32)
+
+
+def token_hash(token: str) -> int:
+    """Stable 64-bit token hash (unlike hash(), identical across processes)."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHashLSH:
+    """Band-key index over MinHash signatures of token sets.
+
+    Args:
+        bands: Number of bands; more bands raise recall
+        rows: MinHash values per band; more rows raise precision
+        seed: Seed for the hash permutations; indexes must share it to be comparable
+        batch_tokens: Tokens hashed per NumPy batch when computing signatures
+        merge_threshold: Pending entries allowed before merging into the sorted arrays
+    """
+
+    def __init__(self, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS, seed: int = 1,
+                 batch_tokens: int = DEFAULT_BATCH_TOKENS, merge_threshold: int = DEFAULT_MERGE_THRESHOLD):
+        if bands < 1 or rows < 1:
+            raise ValueError("bands and rows must be positive")
+        self.bands = bands
+        self.rows = rows
+        self.seed = seed
+        self.batch_tokens = batch_tokens
+        self.merge_threshold = merge_threshold
+
+        # Multiply-add-shift hashing: h(x) = ((a * x + b) mod 2**64) >> 32, a odd
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2 ** 63, size=self.num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=self.num_perm, dtype=np.uint64)
+        self._salt = rng.integers(0, 2 ** 63, size=bands, dtype=np.uint64)
+
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._docs = np.empty(0, dtype=np.uint32)
+        self._pending_keys: List[np.ndarray] = []
+        self._pending_docs: List[np.ndarray] = []
+        self._pending = 0
+        self._removed: Set[int] = set()
+        self._count = 0
+        self._publish()
+
+    @property
+    def num_perm(self) -> int:
+        return self.bands * self.rows
+
+    @property
+    def threshold(self) -> float:
+        """Approximate similarity at which a pair becomes likely to collide."""
+        return (1.0 / self.bands) ** (1.0 / self.rows)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _publish(self) -> None:
+        # (keys, docs, pending keys, pending docs, removed, count); replaced whole, never changed
+        self._state = (self._keys, self._docs, tuple(self._pending_keys), tuple(self._pending_docs),
+                       frozenset(self._removed), self._count)
+
+    @property
+    def state(self) -> Tuple:
+        """The published state, for candidates() and export()."""
+        return self._state
+
+    def signatures(self, token_sets: Sequence[FrozenSet[str]]) -> np.ndarray:
+        """Return a (len(token_sets), num_perm) uint32 array of MinHash values.
+
+        Token sets must be non-empty.
+        """
+        signatures = np.empty((len(token_sets), self.num_perm), dtype=np.uint32)
+        for start, end in self._batches(token_sets):
+            signatures[start:end] = self._signature_batch(token_sets[start:end])
+        return signatures
+
+    def _batches(self, token_sets: Sequence[FrozenSet[str]]):
+        start = 0
+        while start < len(token_sets):
+            # Take patterns until the batch holds batch_tokens tokens (at least one pattern)
+            end, tokens = start, 0
+            while end < len(token_sets) and (end == start or tokens + len(token_sets[end]) <= self.batch_tokens):
+                tokens += len(token_sets[end])
+                end += 1
+            yield start, end
+            start = end
+
+    def _signature_batch(self, batch: Sequence[FrozenSet[str]]) -> np.ndarray:
+        lengths = np.fromiter((len(tokens) for tokens in batch), dtype=np.int64, count=len(batch))
+        hashes = np.fromiter((token_hash(token) for tokens in batch for token in tokens),
+                             dtype=np.uint64, count=int(lengths.sum()))
+        offsets = np.zeros(len(batch), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        permuted = (hashes[:, None] * self._a + self._b) >> _SHIFT
+        return np.minimum.reduceat(permuted, offsets, axis=0).astype(np.uint32)
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Fold each band of signatures into one salted key: an (n, bands) uint64 array."""
+        banded = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        keys = np.broadcast_to(self._salt, (len(signatures), self.bands)).copy()
+        for row in range(self.rows):
+            keys = keys * _FOLD + banded[:, :, row]
+        return keys
+
+    def add(self, docs: Sequence[int], token_sets: Sequence[FrozenSet[str]]) -> None:
+        """Index token sets under the given pattern numbers; empty sets are skipped."""
+        keep = [i for i, tokens in enumerate(token_sets) if tokens]
+        kept_sets = [token_sets[i] for i in keep]
+        for start, end in self._batches(kept_sets):
+            # Signatures are dropped per batch; only the band keys are retained
+            self._pending_keys.append(self.band_keys(self._signature_batch(kept_sets[start:end])))
+            self._pending_docs.append(np.fromiter(
+                (docs[i] for i in keep[start:end]), dtype=np.uint32, count=end - start))
+            self._pending += end - start
+            self._count += end - start
+            if self._pending >= self.merge_threshold:
+                self.merge()
+        self._publish()
+
+    def remove(self, doc: int) -> None:
+        """Drop a pattern number (added with a non-empty token set) from future candidates."""
+        self.remove_many([doc])
+
+    def remove_many(self, docs: Iterable[int]) -> None:
+        """Like remove() for each pattern number, published once."""
+        for doc in docs:
+            if doc not in self._removed:
+                self._removed.add(doc)
+                self._count -= 1
+        if len(self._removed) >= self.merge_threshold:
+            self.merge()
+        self._publish()
+
+    def merge(self) -> None:
+        """Merge pending entries into the sorted band arrays and purge removed patterns."""
+        if not self._pending and not self._removed:
+            return
+        self._keys, self._docs = self._merged(self._keys, self._docs, self._pending_keys, self._pending_docs,
+                                              self._removed)
+        self._pending_keys, self._pending_docs, self._pending = [], [], 0
+        self._removed.clear()
+        self._publish()
+
+    def _merged(self, keys: np.ndarray, docs: np.ndarray, pending_keys: Sequence[np.ndarray],
+                pending_docs: Sequence[np.ndarray], removed: Set[int]) -> Tuple[np.ndarray, np.ndarray]:
+        # New sorted band arrays; the given ones are left as they are
+        keys = np.concatenate([keys] + [batch.ravel() for batch in pending_keys])
+        docs = np.concatenate([docs] + [np.repeat(batch, self.bands) for batch in pending_docs])
+        if removed:
+            alive = ~np.isin(docs, np.fromiter(removed, dtype=np.uint32, count=len(removed)))
+            keys, docs = keys[alive], docs[alive]
+        order = np.argsort(keys, kind="stable")
+        return keys[order], docs[order]
+
+    def candidates(self, tokens: FrozenSet[str], state: Optional[Tuple] = None) -> np.ndarray:
+        """Return pattern numbers sharing at least one band key with tokens.
+
+        Searches state (see the state property), or the current one.
+        """
+        if not tokens:
+            return np.empty(0, dtype=np.uint32)
+        sorted_keys, sorted_docs, pending_keys, pending_docs, removed, _ = state or self._state
+        query = self.band_keys(self._signature_batch([tokens]))[0]
+        lo = np.searchsorted(sorted_keys, query, side="left")
+        hi = np.searchsorted(sorted_keys, query, side="right")
+        found = [sorted_docs[start:end] for start, end in zip(lo.tolist(), hi.tolist()) if end > start]
+        for keys, docs in zip(pending_keys, pending_docs):
+            found.append(docs[(keys == query).any(axis=1)])
+        if not found:
+            return np.empty(0, dtype=np.uint32)
+        result = np.unique(np.concatenate(found))
+        if removed:
+            result = result[~np.isin(result, np.fromiter(removed, dtype=np.uint32, count=len(removed)))]
+        return result
+
+    def export(self, state: Optional[Tuple] = None) -> Dict[str, np.ndarray]:
+        """Band arrays of state (or the current one), merged, and parameters, for restore() (see server.snapshot).
+
+        The index itself is not changed, so a caller can export the state its
+        other components were captured with.
+        """
+        keys, docs, pending_keys, pending_docs, removed, count = state or self._state
+        if pending_keys or removed:
+            keys, docs = self._merged(keys, docs, pending_keys, pending_docs, removed)
+        return {
+            "keys": keys,
+            "docs": docs,
+            "params": np.array([self.bands, self.rows, self.seed, count], dtype=np.int64),
+        }
+
+    def restore(self, arrays: Dict[str, np.ndarray]) -> bool:
+        """Adopt arrays from export(); False if they were built with other bands, rows or seed."""
+        bands, rows, seed, count = (int(value) for value in arrays["params"])
+        if (bands, rows, seed) != (self.bands, self.rows, self.seed):
+            return False
+        self._keys, self._docs, self._count = arrays["keys"], arrays["docs"], count
+        self._pending_keys, self._pending_docs, self._pending = [], [], 0
+        self._removed.clear()
+        self._publish()
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "minhash_patterns": self._count,
+            "minhash_bands": self.bands,
+            "minhash_rows": self.rows,
+            "minhash_threshold": round(self.threshold, 3),
+            "minhash_pending": self._pending,
+        }
@@ -6,14 +6,24 @@ This server implements the PatternService defined in protos/starweave.proto.
 It handles pattern recognition requests and streams responses back to clients.
 """
 
+import asyncio
+import atexit
+import collections
+import contextlib
+import functools
+import gc
+import hashlib
 import logging
+import platform
+import queue
+import re
 import time
 import sys
 import os
 import signal
 import threading
 from concurrent import futures
-from typing import Dict, Any, Optional
+from typing import Callable, Deque, Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
 
 import grpc
 from grpc_health.v1 import health_pb2
@@ -21,6 +31,17 @@ from grpc_health.v1 import health_pb2_grpc
 
 import starweave_pb2
 import starweave_pb2_grpc
+from server.metrics import SharedCounters
+from server.minhash import MinHashLSH
+from server.recognition import PatternIndex, PatternRecognizer, StoredPattern, STRATEGIES, decode_pattern_data
+from server.rerank import ContextSession, ContextSessions
+from server.result_cache import ResultCache, result_key
+from server.rpc_metrics import AsyncMetricsInterceptor, MetricsInterceptor, RpcMetrics, process_stats, start_exporter
+from server.sharding import SHARD_KEY, SHARD_TIMEOUT, ShardedIndex, ShardTimeout, ShardUnavailable
+from server.trends import TrendWindow
+from server.vectors import (DEFAULT_ANN_THRESHOLD, DEFAULT_EF_SEARCH, METRICS, VECTOR_KEY, VectorIndex,
+                            decode_vector, is_vector)
+from server.transport import DEFAULT_PROFILES, PATTERN_PROFILE, TransportProfile, load_profiles
 # Use standard logging throughout (avoid loguru-specific methods in mixed setup)
 
 # Configure logging
@@ -49,73 +70,930 @@ class HealthServicer(health_pb2_grpc.HealthServicer):
             return self._server_status
 
 
+class AsyncHealthServicer(HealthServicer):
+    """gRPC health check servicer for the asyncio server."""
+    
+    async def Check(self, request, context):
+        return super().Check(request, context)
+
+
+# A "key=value" context entry is an option; any other entry is conversation context
+_OPTION = re.compile(r"\s*([^\s=]+)\s*=(.*)", re.DOTALL)
+
+
+def request_options(request) -> Dict[str, str]:
+    """Collect recognition options from a PatternRequest's context and metadata."""
+    options = {}
+    for item in request.context:
+        option = _OPTION.fullmatch(item)
+        if option:
+            options[option.group(1)] = option.group(2).strip()
+    options.update(request.pattern.metadata)
+    return options
+
+
+def context_entries(request) -> List[str]:
+    """The conversation context of a PatternRequest: its context entries that are not options."""
+    return [item for item in request.context if item.strip() and not _OPTION.fullmatch(item)]
+
+
+def invocation_value(context, key: str) -> Optional[str]:
+    """Value of a call metadata key; None if absent or without a call context."""
+    for item_key, value in (context.invocation_metadata() or ()) if context is not None else ():
+        if item_key == key:
+            return value
+    return None
+
+
+STREAM_ORDERS = ("ordered", "completed")
+
+
+def _number_option(options: Dict[str, str], key: str, kind: type):
+    value = options.get(key)
+    if not value:
+        return None
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"Option {key} must be {'an integer' if kind is int else 'a number'}, "
+                         f"got {value!r}") from None
+
+
+def recognition_options(request) -> Tuple[Optional[str], Optional[int], Optional[float], Optional[float],
+                                          Optional[str]]:
+    """Parse (strategy, top_k, min_score, context_weight, shard_key) from a PatternRequest;
+    None means the default.
+    
+    Options are "strategy" (exact, contains, jaccard, minhash, scan, tfidf,
+    cosine or dot), "top_k", "min_score", "context_weight" (share of the
+    context similarity in re-ranked scores, 0 to 1) and "shard_key" (search
+    only that key's shard of a sharded index), given as "key=value" entries
+    in the request context or as keys of the pattern's metadata (which take
+    precedence). A pattern whose metadata has "vector" (its encoding, e.g.
+    float32) is a vector query, searched with cosine unless dot is asked for.
+    
+    Raises:
+        ValueError: An option is invalid, or the pattern does not suit the strategy
+    """
+    options = request_options(request)
+    strategy = options.get("strategy") or None
+    if strategy is not None and strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    if is_vector(request.pattern.metadata):
+        decode_vector(request.pattern.data, request.pattern.metadata[VECTOR_KEY])
+        strategy = strategy or METRICS[0]
+        if strategy not in METRICS:
+            raise ValueError(f"Vector patterns are searched with {' or '.join(METRICS)}, not {strategy}")
+    elif strategy in METRICS:
+        raise ValueError(f"The {strategy} strategy needs a vector pattern (metadata {VECTOR_KEY}=float32)")
+    top_k = _number_option(options, "top_k", int)
+    min_score = _number_option(options, "min_score", float)
+    context_weight = _number_option(options, "context_weight", float)
+    if context_weight is not None and not 0.0 <= context_weight <= 1.0:
+        raise ValueError(f"context_weight must be between 0 and 1, got {context_weight}")
+    return strategy, top_k, min_score, context_weight, options.get(SHARD_KEY) or None
+
+
+def stream_order(context, default: str) -> str:
+    """Response order requested for a stream via the "stream-order" call metadata."""
+    value = invocation_value(context, "stream-order")
+    if value is None:
+        return default
+    if value not in STREAM_ORDERS:
+        raise ValueError(f"Unknown stream-order: {value} (expected one of {', '.join(STREAM_ORDERS)})")
+    return value
+
+
+class StreamWindow:
+    """Requests of one stream that were read but whose responses are not yet written.
+    
+    The reader pauses once high requests are in flight and resumes when the
+    writer has drained them to low. While it is paused, unread requests fill
+    gRPC's receive buffer and then the stream's HTTP/2 flow-control window,
+    so a client that sends faster than it is answered blocks in its own send.
+    """
+    
+    def __init__(self, high: int, low: int):
+        if not 0 <= low < high:
+            raise ValueError("stream watermarks need 0 <= low < high")
+        self.high = high
+        self.low = low
+        self.in_flight = 0
+        self.peak = 0
+        self.pauses = 0
+        self.paused = False
+        self.closed = False
+        self._condition = threading.Condition()
+    
+    def wait(self) -> bool:
+        """Block while the stream is paused; False once the window is closed."""
+        with self._condition:
+            while self.paused and not self.closed:
+                self._condition.wait()
+            return not self.closed
+    
+    def add(self) -> None:
+        """Count a request the reader has taken off the stream."""
+        with self._condition:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            if self.in_flight >= self.high and not self.paused:
+                self.paused = True
+                self.pauses += 1
+    
+    def release(self, count: int = 1) -> None:
+        """Count responses the writer has handed to gRPC."""
+        with self._condition:
+            self.in_flight -= count
+            if self.paused and self.in_flight <= self.low:
+                self.paused = False
+                self._condition.notify_all()
+    
+    def close(self) -> None:
+        """Release a reader waiting on a stream whose writer is gone."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class AsyncStreamWindow(StreamWindow):
+    """StreamWindow for a reader task; only wait() differs."""
+    
+    def __init__(self, high: int, low: int):
+        super().__init__(high, low)
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+    
+    async def wait(self) -> bool:
+        while self.paused and not self.closed:
+            self._resumed.clear()
+            await self._resumed.wait()
+        return not self.closed
+    
+    def release(self, count: int = 1) -> None:
+        super().release(count)
+        if not self.paused:
+            self._resumed.set()
+    
+    def close(self) -> None:
+        super().close()
+        self._resumed.set()
+
+
+# Events on a stream pipeline's queue
+_REQUEST, _END, _SCORED, _DONE, _FAILED = range(5)
+
+
+class StreamPipeline:
+    """Runs one StreamPatterns call as reader -> work queue -> workers -> writer.
+    
+    - Reader: a thread taking requests off the stream, paused and resumed
+      by the stream's StreamWindow.
+    - Work queue: micro-batches of at most max_batch requests, closed
+      max_wait seconds after their first request, waiting for a worker.
+      The window bounds it along with everything else in flight.
+    - Workers: score_batch (PatternService.score_stream_batch) runs on a
+      shared executor, at most `workers` batches of this stream at a time,
+      so a slow batch does not hold up the ones behind it.
+    - Writer: the handler's thread, iterating the pipeline. It emits
+      responses in request order, or as groups finish with order
+      "completed", and releases the window as gRPC accepts each one.
+    
+    Stages talk to the writer through one event queue, so the writer also
+    closes batches and dispatches them to workers.
+    """
+    
+    def __init__(self, request_iterator, score_batch: Callable[[List], Iterator[List[Tuple[int, Any]]]],
+                 executor: futures.Executor, window: StreamWindow, order: str,
+                 max_batch: int, max_wait: float, workers: int):
+        self.window = window
+        self.order = order
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.workers = workers
+        self.running = 0  # Batches being scored
+        self._request_iterator = request_iterator
+        self._score_batch = score_batch
+        self._executor = executor
+        self._events = self._event_queue()
+        self._batch: List = []
+        self._deadline = 0.0
+        self._queued: Deque[Tuple[int, List]] = collections.deque()
+        self._read = 0  # Requests read, i.e. the stream position of the next one
+        self._ended = False
+        self._error: Optional[BaseException] = None
+        self._next = 0  # Next stream position to write in request order
+        self._held: Dict[int, Any] = {}
+    
+    @property
+    def queued(self) -> int:
+        """Batches in the work queue, including the one being filled."""
+        return len(self._queued) + bool(self._batch)
+    
+    def _event_queue(self):
+        return queue.SimpleQueue()
+    
+    def __iter__(self) -> Iterator[Any]:
+        reader = threading.Thread(target=self._read_requests, name="stream-reader", daemon=True)
+        reader.start()
+        try:
+            while True:
+                self._dispatch()
+                if self._finished:
+                    break
+                timeout = max(self._deadline - time.monotonic(), 0) if self._batch else None
+                try:
+                    kind, item = self._events.get(timeout=timeout)
+                except queue.Empty:
+                    self._close_batch()
+                    continue
+                for response in self._handle(kind, item):
+                    yield response
+                    self.window.release()
+            if self._error is not None:
+                raise self._error
+        finally:
+            self.window.close()
+    
+    def _read_requests(self) -> None:
+        error = None
+        try:
+            requests = iter(self._request_iterator)
+            while self.window.wait():
+                request = next(requests, None)
+                if request is None:
+                    break
+                self.window.add()
+                self._events.put((_REQUEST, request))
+        except Exception as e:  # Cancelled or broken stream; raised by the writer
+            error = e
+        finally:
+            self._events.put((_END, error))
+    
+    def _dispatch(self) -> None:
+        # Close an expired batch and hand queued batches to free workers
+        if self._batch and time.monotonic() >= self._deadline:
+            self._close_batch()
+        while self._queued and self.running < self.workers:
+            start, batch = self._queued.popleft()
+            self.running += 1
+            self._submit(start, batch)
+    
+    def _submit(self, start: int, batch: List) -> None:
+        self._executor.submit(self._score, start, batch)
+    
+    def _score(self, start: int, batch: List) -> None:
+        try:
+            for group in self._score_batch(batch):
+                self._events.put((_SCORED, [(start + position, response) for position, response in group]))
+            self._events.put((_DONE, None))
+        except Exception as e:
+            self._events.put((_FAILED, e))
+    
+    @property
+    def _finished(self) -> bool:
+        return self._ended and not self._batch and not self._queued and not self.running
+    
+    def _close_batch(self) -> None:
+        if self._batch:
+            self._queued.append((self._read - len(self._batch), self._batch))
+            self._batch = []
+    
+    def _handle(self, kind: int, item) -> List[Any]:
+        """Apply one event; return the responses that are now ready to write."""
+        if kind == _REQUEST:
+            if not self._batch:
+                self._deadline = time.monotonic() + self.max_wait
+            self._batch.append(item)
+            self._read += 1
+            if len(self._batch) >= self.max_batch:
+                self._close_batch()
+        elif kind == _END:
+            self._ended = True
+            self._error = item
+            self._close_batch()
+        elif kind == _DONE:
+            self.running -= 1
+        elif kind == _FAILED:
+            raise item
+        else:
+            return self._ready(item)
+        return []
+    
+    def _ready(self, group: List[Tuple[int, Any]]) -> List[Any]:
+        if self.order == "completed":
+            return [response for _, response in group]
+        self._held.update(group)
+        ready = []
+        while self._next in self._held:
+            ready.append(self._held.pop(self._next))
+            self._next += 1
+        return ready
+
+
+class AsyncStreamPipeline(StreamPipeline):
+    """asyncio counterpart of StreamPipeline: the reader and the batches being
+    scored are tasks, and each group of a batch is one executor call."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tasks: Set[asyncio.Task] = set()
+    
+    def _event_queue(self):
+        return asyncio.Queue()
+    
+    async def __aiter__(self):
+        self._spawn(self._read_requests())
+        try:
+            while True:
+                self._dispatch()
+                if self._finished:
+                    break
+                try:
+                    if self._batch:
+                        kind, item = await asyncio.wait_for(
+                            self._events.get(), max(self._deadline - time.monotonic(), 0))
+                    else:
+                        kind, item = await self._events.get()
+                except asyncio.TimeoutError:
+                    self._close_batch()
+                    continue
+                for response in self._handle(kind, item):
+                    yield response
+                    self.window.release()
+            if self._error is not None:
+                raise self._error
+        finally:
+            self.window.close()
+            for task in self._tasks:
+                task.cancel()
+    
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _read_requests(self) -> None:
+        error = None
+        try:
+            requests = self._request_iterator.__aiter__()
+            while await self.window.wait():
+                try:
+                    request = await requests.__anext__()
+                except StopAsyncIteration:
+                    break
+                self.window.add()
+                self._events.put_nowait((_REQUEST, request))
+        except Exception as e:
+            error = e
+        finally:
+            self._events.put_nowait((_END, error))
+    
+    def _submit(self, start: int, batch: List) -> None:
+        self._spawn(self._score_async(start, batch))
+    
+    async def _score_async(self, start: int, batch: List) -> None:
+        loop = asyncio.get_running_loop()
+        groups = self._score_batch(batch)
+        try:
+            while True:
+                group = await loop.run_in_executor(self._executor, next, groups, None)
+                if group is None:
+                    break
+                self._events.put_nowait(
+                    (_SCORED, [(start + position, response) for position, response in group]))
+            self._events.put_nowait((_DONE, None))
+        except Exception as e:
+            self._events.put_nowait((_FAILED, e))
+
+
+# Characters of a streamed pattern's text kept as its key in the trend sketches
+TREND_KEY_CHARS = 256
+
+
+def trend_key(pattern) -> str:
+    """Key of a streamed pattern in the trend sketches: its text, or a digest of a vector payload."""
+    if is_vector(pattern.metadata):
+        return "vector:" + hashlib.blake2b(pattern.data, digest_size=8).hexdigest()
+    return decode_pattern_data(pattern.data)[:TREND_KEY_CHARS]
+
+
+def stored_pattern(pattern) -> StoredPattern:
+    """Convert a Pattern message for the corpus, reading labels from its metadata.
+    
+    Raises:
+        ValueError: The pattern declares a vector payload that is malformed
+    """
+    metadata = dict(pattern.metadata)
+    if metadata.get("labels"):
+        labels = [label.strip() for label in metadata["labels"].split(",") if label.strip()]
+    else:
+        labels = [metadata["label"]] if metadata.get("label") else []
+    if is_vector(metadata):
+        # Copied: the vector outlives the request bytes it would otherwise view
+        vector = decode_vector(pattern.data, metadata[VECTOR_KEY]).copy()
+        return StoredPattern(id=pattern.id, data="", labels=labels, metadata=metadata, vector=vector)
+    return StoredPattern(id=pattern.id, data=decode_pattern_data(pattern.data), labels=labels, metadata=metadata)
+
+
+class PatternIngest:
+    """State of one IngestPatterns stream.
+    
+    Patterns are collected from the stream's messages and applied to the
+    index batch_size at a time. Each batch becomes visible to queries as a
+    whole. Scanner and suffix array rebuilds are held until close(), so
+    the stream costs one rebuild rather than one per few hundred patterns.
+    
+    Applied patterns are moved out of the garbage collector's view
+    (gc.freeze). Otherwise full collections traverse the whole index and
+    stall queries for longer as it grows.
+    
+    If the index has a snapshot directory, it is saved there in the
+    background once the stream has added patterns.
+    """
+    
+    def __init__(self, index: PatternIndex, batch_size: int):
+        self.index = index
+        self.batch_size = batch_size
+        self.received = 0
+        self.applied = 0
+        self.replaced = 0
+        self.rejected = 0
+        self._pending = []
+        self._start = time.time()
+        self._closed = False
+        index.defer_rebuilds()
+    
+    def add(self, patterns: Iterable) -> None:
+        """Queue Pattern messages and apply a batch once enough are queued."""
+        for pattern in patterns:
+            self.received += 1
+            if not pattern.id:
+                self.rejected += 1
+                continue
+            try:
+                self._pending.append(stored_pattern(pattern))
+            except ValueError as e:
+                logger.warning(f"Rejected pattern {pattern.id}: {e}")
+                self.rejected += 1
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Apply the queued patterns."""
+        if self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                self.replaced += self.index.add_many(batch)
+                self.applied += len(batch)
+            except ValueError:
+                # A vector of the wrong length rejects the whole batch; apply the rest one by one
+                for pattern in batch:
+                    try:
+                        self.replaced += self.index.add_many([pattern])
+                        self.applied += 1
+                    except ValueError as e:
+                        logger.warning(f"Rejected pattern {pattern.id}: {e}")
+                        self.rejected += 1
+            gc.freeze()
+    
+    def close(self) -> None:
+        """Release the held rebuilds; safe to call more than once."""
+        if not self._closed:
+            self._closed = True
+            self.index.resume_rebuilds()
+            if self.applied and self.index.snapshot_dir:
+                threading.Thread(target=self._save_snapshot, name="snapshot-save", daemon=True).start()
+    
+    def _save_snapshot(self) -> None:
+        try:
+            self.index.save(self.index.snapshot_dir)
+        except Exception as e:
+            logger.error(f"Saving snapshot to {self.index.snapshot_dir} failed: {e}")
+    
+    def response(self):
+        """Summarize the stream as an IngestResponse."""
+        seconds = time.time() - self._start
+        return starweave_pb2.IngestResponse(
+            received=self.received,
+            added=self.applied - self.replaced,
+            replaced=self.replaced,
+            rejected=self.rejected,
+            total=len(self.index),
+            seconds=seconds,
+            patterns_per_second=self.applied / seconds if seconds > 0 else 0.0,
+        )
+
+
 class PatternService(starweave_pb2_grpc.PatternServiceServicer):
     """Implementation of the PatternService."""
     
-    def __init__(self, health_servicer: Optional[HealthServicer] = None):
+    # Patterns applied to the index per step while ingesting; queries wait for one step at most
+    INGEST_BATCH = 5000
+    # Pre-forked workers each have their own copy of the index, so none of them may change it
+    PREFORK_INGEST_ERROR = ("IngestPatterns is not available with pre-forked server processes: each worker "
+                            "has its own index; ingest into a single-process or sharded server")
+    # StreamPatterns micro-batches: at most this many requests, closed this many seconds after the first
+    STREAM_BATCH = 64
+    STREAM_BATCH_WAIT = 0.001
+    # Response order of streams that do not send "stream-order" metadata (see STREAM_ORDERS)
+    STREAM_ORDER = "ordered"
+    # Per stream: stop reading at this many requests in flight, resume at the low mark (see StreamWindow)
+    STREAM_HIGH_WATERMARK = 256
+    STREAM_LOW_WATERMARK = 128
+    # Batches of one stream scored at once, and threads scoring streams' batches (sync server)
+    STREAM_CONCURRENCY = 2
+    STREAM_WORKERS = 4
+    # Recognition results kept for repeated requests (0 disables the cache), and for how many seconds
+    RESULT_CACHE_SIZE = 10000
+    RESULT_CACHE_TTL = 300.0
+    # Seconds of streamed patterns summarized for GetTrends, in this many slices; heavy hitters by default
+    TREND_WINDOW = 300.0
+    TREND_SLICES = 10
+    TREND_TOP_K = 10
+    
+    def __init__(self, health_servicer: Optional[HealthServicer] = None,
+                 shared_counters: Optional[SharedCounters] = None,
+                 pattern_index: Optional[PatternIndex] = None,
+                 rpc_metrics: Optional[RpcMetrics] = None):
         self.start_time = time.time()
         self.request_count = 0
+        self._request_count_lock = threading.Lock()
         self.health_servicer = health_servicer or HealthServicer()
-        logger.info("PatternService initialized")
+        # Counters shared with sibling worker processes in pre-fork mode
+        self.shared_counters = shared_counters
+        # Per-RPC counts recorded by the server's MetricsInterceptor, for GetStatus
+        self.rpc_metrics = rpc_metrics
+        self.recognizer = PatternRecognizer(pattern_index)
+        self.stream_executor = futures.ThreadPoolExecutor(
+            max_workers=self.STREAM_WORKERS, thread_name_prefix='stream_worker')
+        self._streams: Set[StreamPipeline] = set()
+        self._streams_lock = threading.Lock()
+        self._stream_pauses = 0  # Of finished streams
+        self.context_sessions = ContextSessions()
+        self.result_cache = ResultCache(self.RESULT_CACHE_SIZE, self.RESULT_CACHE_TTL)
+        self.trends = TrendWindow(self.TREND_WINDOW, self.TREND_SLICES)
+        logger.info(f"PatternService initialized with {len(self.recognizer.index)} patterns")
+    
+    def _count_request(self, count: int = 1) -> int:
+        """Count processed requests and return this process's number for the last one."""
+        with self._request_count_lock:
+            self.request_count += count
+            last = self.request_count
+        if self.shared_counters is not None:
+            self.shared_counters.increment("requests_processed", count)
+        return last
+    
+    def context_session(self, context) -> ContextSession:
+        """Context feature cache for a call: shared by calls with the same "session-id"
+        metadata, otherwise private to the call (one stream, say)."""
+        session_id = invocation_value(context, "session-id")
+        return self.context_sessions.get(session_id) if session_id else self.context_sessions.new()
+    
+    def _recognize(self, request, options: Tuple, request_id: str, metadata: Dict[str, str],
+                   session: ContextSession):
+        """Match the request's pattern against the corpus and build the response.
+        
+        options are the request's, parsed by recognition_options(); its
+        other context entries re-rank the matches (see server.rerank).
+        Results are cached under the index version they were computed
+        from (see server.result_cache), which the response reports as
+        "index_version".
+        """
+        try:
+            strategy, top_k, min_score, context_weight, shard_key = options
+            entries = context_entries(request)
+            key = result_key(request.pattern.data, options, entries)
+            version = self.recognizer.index.version
+            result = self.result_cache.get(key, version)
+            if result is None:
+                result = self.recognizer.recognize(
+                    request.pattern.data, strategy=strategy, top_k=top_k, min_score=min_score,
+                    context=session.features(entries), context_weight=context_weight, shard_key=shard_key)
+                self.result_cache.put(key, result, result.version)
+            else:
+                metadata["cached"] = "true"
+        except ValueError as e:
+            return starweave_pb2.PatternResponse(request_id=request_id, error=str(e), metadata=metadata)
+        return self._response(result, request_id, metadata)
+    
+    def _response(self, result, request_id: str, metadata: Dict[str, str]):
+        """Build the PatternResponse for a RecognitionResult."""
+        metadata.update({
+            "strategy": result.strategy,
+            "matches": str(len(result.matches)),
+            "matched_ids": ",".join(match.pattern.id for match in result.matches),
+            "index_version": str(result.version),
+        })
+        if result.strategy == "contains":
+            metadata["counts"] = ",".join(f"{match.pattern.id}:{match.count}" for match in result.matches)
+        if result.strategy == "scan":
+            metadata["positions"] = ",".join(
+                f"{match.pattern.id}@{start}-{end}" for match in result.matches for start, end in match.positions)
+        if any(match.context_score is not None for match in result.matches):
+            metadata["context_scores"] = ",".join(
+                f"{match.pattern.id}:{match.context_score:.4f}" for match in result.matches)
+        return starweave_pb2.PatternResponse(
+            request_id=request_id,
+            labels=result.labels,
+            confidences=result.confidences,
+            metadata=metadata
+        )
     
     def RecognizePattern(self, request, context):
-        """Handle a single pattern recognition request."""
-        self.request_count += 1
+        """Handle a single pattern recognition request.
+        
+        Invalid options fail the call with INVALID_ARGUMENT.
+        """
+        request_number = self._count_request()
         pattern_id = request.pattern.id
         logger.info(f"Processing pattern: {pattern_id}")
+        try:
+            options = recognition_options(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         
-        # TODO: Implement actual pattern recognition logic
-        # For now, return a mock response
-        return starweave_pb2.PatternResponse(
-            request_id=str(self.request_count),
-            labels=["mock_label_1", "mock_label_2"],
-            confidences={"mock_label_1": 0.95, "mock_label_2": 0.75},
-            metadata={"processed_by": "python-server"}
-        )
+        return self._recognize(request, options, str(request_number), {"processed_by": "python-server"},
+                               self.context_session(context))
+    
+    def RecognizePatterns(self, request, context):
+        """Handle a batch of pattern recognition requests in one call.
+        
+        The batch is scored like a stream's micro-batch (see
+        score_stream_batch), so requests with the same options share one
+        recognize_many call. Responses follow request order and carry their
+        pattern id in their "pattern_id" metadata; an invalid request gets an
+        error response without failing the others.
+        """
+        requests = list(request.requests)
+        logger.info(f"Processing batch of {len(requests)} patterns")
+        responses: List[Any] = [None] * len(requests)
+        for group in self.score_stream_batch(requests, self.context_session(context), source="batch"):
+            for position, response in group:
+                responses[position] = response
+        return starweave_pb2.PatternBatchResponse(responses=responses)
     
     def StreamPatterns(self, request_iterator, context):
-        """Handle a stream of pattern recognition requests."""
+        """Handle a stream of pattern recognition requests.
+        
+        Requests go through a StreamPipeline: read ahead up to the stream's
+        high watermark, scored in micro-batches (see score_stream_batch) by
+        the stream workers, and written back by this thread. Every response
+        carries its request's pattern id in its "pattern_id" metadata.
+        Recognized requests are counted in the trend sketches (see GetTrends).
+        Responses follow request order unless the call sends
+        "stream-order: completed" metadata. Context features are cached for
+        the stream, or for its "session-id" metadata if it sends one.
+        """
         logger.info("Starting pattern stream processing")
+        try:
+            order = stream_order(context, self.STREAM_ORDER)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         
-        for request in request_iterator:
-            self.request_count += 1
-            pattern_id = request.pattern.id
-            pattern_data = request.pattern.data
-            logger.debug(f"Processing streamed pattern: {pattern_id}")
-            
-            # Process the pattern (mock implementation)
-            # Return response matching the expected PatternResponse proto
-            yield starweave_pb2.PatternResponse(
-                request_id=f"stream-{self.request_count}",
-                labels=["stream_label_1", "stream_label_2"],
-                confidences={
-                    "stream_label_1": 0.9,
-                    "stream_label_2": 0.7
-                },
-                metadata={
-                    "processed_by": "python-stream-server",
-                    "pattern_id": pattern_id,
-                    "original_data": pattern_data.decode("utf-8", errors="ignore") if isinstance(pattern_data, (bytes, bytearray)) else str(pattern_data)
-                }
-            )
+        pipeline = self.stream_pipeline(
+            StreamPipeline, request_iterator, self.stream_executor, order, self.context_session(context))
+        with self.track_stream(pipeline):
+            yield from pipeline
+    
+    def stream_pipeline(self, pipeline_class, request_iterator, executor: futures.Executor, order: str,
+                        session: ContextSession):
+        """Create a StreamPipeline (or AsyncStreamPipeline) with this service's stream settings."""
+        window_class = AsyncStreamWindow if issubclass(pipeline_class, AsyncStreamPipeline) else StreamWindow
+        return pipeline_class(
+            request_iterator, functools.partial(self.score_observed_batch, session=session), executor,
+            window_class(self.STREAM_HIGH_WATERMARK, self.STREAM_LOW_WATERMARK), order,
+            max_batch=self.STREAM_BATCH, max_wait=self.STREAM_BATCH_WAIT, workers=self.STREAM_CONCURRENCY)
+    
+    @contextlib.contextmanager
+    def track_stream(self, pipeline: StreamPipeline):
+        """Count a stream's pipeline in the stream metrics of GetStatus while it runs."""
+        with self._streams_lock:
+            self._streams.add(pipeline)
+        try:
+            yield pipeline
+        finally:
+            with self._streams_lock:
+                self._streams.discard(pipeline)
+                self._stream_pauses += pipeline.window.pauses
+            logger.info(f"Stream finished: peak {pipeline.window.peak} requests in flight, "
+                        f"paused {pipeline.window.pauses} times")
+    
+    def stream_metrics(self) -> Dict[str, str]:
+        """Queue depths of the running streams, summed over streams."""
+        with self._streams_lock:
+            streams = list(self._streams)
+            pauses = self._stream_pauses + sum(pipeline.window.pauses for pipeline in streams)
+        return {
+            "streams_active": str(len(streams)),
+            "streams_paused": str(sum(pipeline.window.paused for pipeline in streams)),
+            "stream_requests_in_flight": str(sum(pipeline.window.in_flight for pipeline in streams)),
+            "stream_batches_queued": str(sum(pipeline.queued for pipeline in streams)),
+            "stream_batches_running": str(sum(pipeline.running for pipeline in streams)),
+            "stream_pauses": str(pauses),
+            "stream_high_watermark": str(self.STREAM_HIGH_WATERMARK),
+            "stream_low_watermark": str(self.STREAM_LOW_WATERMARK),
+        }
+    
+    def score_observed_batch(self, requests: List,
+                             session: Optional[ContextSession] = None) -> Iterator[List[Tuple[int, Any]]]:
+        """score_stream_batch for a stream, counting each group's patterns and labels in the trend sketches.
+        
+        Only recognized patterns are counted: a malformed request retried
+        over and over must not become a heavy hitter.
+        """
+        for group in self.score_stream_batch(requests, session):
+            self.trends.observe_many((trend_key(requests[position].pattern), requests[position].pattern.timestamp,
+                                      response.labels) for position, response in group if not response.error)
+            yield group
+    
+    def process_stream_request(self, request):
+        """Recognize a single pattern received on a stream."""
+        (_, response), = next(self.score_stream_batch([request]))
+        return response
+    
+    def score_stream_batch(self, requests: List, session: Optional[ContextSession] = None,
+                           source: str = "stream") -> Iterator[List[Tuple[int, Any]]]:
+        """Recognize a micro-batch of streamed requests (or a RecognizePatterns batch), one group at a time.
+        
+        Cached results (see server.result_cache) come first, as one group.
+        Requests with the same options are scored together with one
+        PatternRecognizer.recognize_many call (one sparse matrix product for
+        tfidf), each re-ranked by its own context with features from session;
+        repeats of a request within the group are scored once. Groups are
+        scored in order of their first request; each yields its (position in
+        the batch, response) pairs as soon as it is done. Responses are
+        numbered and tagged with source ("stream" or "batch").
+        """
+        session = session or self.context_sessions.new()
+        last = self._count_request(len(requests))
+        request_ids = [f"{source}-{number}" for number in range(last - len(requests) + 1, last + 1)]
+        version = self.recognizer.index.version
+        entries = [context_entries(request) for request in requests]
+        keys: List[Optional[bytes]] = [None] * len(requests)
+        groups: Dict[Tuple, List[int]] = {}
+        errors, cached = [], []
+        for position, request in enumerate(requests):
+            try:
+                options = recognition_options(request)
+            except ValueError as e:
+                errors.append((position, e))
+                continue
+            keys[position] = result_key(request.pattern.data, options, entries[position])
+            result = self.result_cache.get(keys[position], version)
+            if result is not None:
+                cached.append((position, result))
+            else:
+                groups.setdefault(options, []).append(position)
+        
+        if errors:
+            yield [(position, starweave_pb2.PatternResponse(
+                request_id=request_ids[position], error=str(e),
+                metadata=self._stream_metadata(requests[position], source))) for position, e in errors]
+        if cached:
+            yield [(position, self._response(result, request_ids[position],
+                                             dict(self._stream_metadata(requests[position], source), cached="true")))
+                   for position, result in cached]
+        for (strategy, top_k, min_score, context_weight, shard_key), positions in groups.items():
+            first: Dict[bytes, int] = {}
+            for position in positions:
+                first.setdefault(keys[position], position)
+            unique = list(first.values())
+
+            def recognize(positions: List[int]):
+                return self.recognizer.recognize_many(
+                    [requests[position].pattern.data for position in positions],
+                    strategy=strategy, top_k=top_k, min_score=min_score,
+                    contexts=[session.features(entries[position]) for position in positions],
+                    context_weight=context_weight, shard_key=shard_key)
+
+            scored: Dict[bytes, Any] = {}
+            try:
+                scored.update(zip((keys[position] for position in unique), recognize(unique)))
+            except ValueError as e:
+                if len(unique) == 1:
+                    scored[keys[unique[0]]] = e
+                else:
+                    # One request (a vector of the wrong length, say) fails the group; find it
+                    for position in unique:
+                        try:
+                            scored[keys[position]] = recognize([position])[0]
+                        except ValueError as e:
+                            scored[keys[position]] = e
+            for key, result in scored.items():
+                if not isinstance(result, ValueError):
+                    self.result_cache.put(key, result, result.version)
+            responses = []
+            for position in positions:
+                result = scored[keys[position]]
+                metadata = self._stream_metadata(requests[position], source)
+                if isinstance(result, ValueError):
+                    responses.append((position, starweave_pb2.PatternResponse(
+                        request_id=request_ids[position], error=str(result), metadata=metadata)))
+                else:
+                    responses.append((position, self._response(result, request_ids[position], metadata)))
+            yield responses
+    
+    @staticmethod
+    def _stream_metadata(request, source: str = "stream") -> Dict[str, str]:
+        return {
+            "processed_by": f"python-{source}-server",
+            "pattern_id": request.pattern.id,
+            "original_data": ("" if is_vector(request.pattern.metadata)
+                              else decode_pattern_data(request.pattern.data)),
+        }
+    
+    def IngestPatterns(self, request_iterator, context):
+        """Add a stream of pattern batches to the corpus.
+        
+        Fails with FAILED_PRECONDITION in pre-fork mode, where the patterns
+        would only reach the worker serving this stream.
+        """
+        if self.shared_counters is not None:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, self.PREFORK_INGEST_ERROR)
+        ingest = PatternIngest(self.recognizer.index, self.INGEST_BATCH)
+        try:
+            for request in request_iterator:
+                ingest.add(request.patterns)
+            ingest.flush()
+        finally:
+            ingest.close()
+        response = ingest.response()
+        logger.info(f"Ingested {response.received} patterns in {response.seconds:.1f}s "
+                    f"({response.patterns_per_second:.0f}/s), {response.total} indexed")
+        return response
+    
+    def GetTrends(self, request, context):
+        """Return the heavy hitters and label counts of recently streamed patterns.
+        
+        Counts come from the sliding-window sketches (see server.trends):
+        hitters by Space-Saving tightened by Count-Min, distinct patterns per
+        label by HyperLogLog, and Count-Min estimates for the requested keys.
+        In pre-fork mode each worker summarizes only the streams it served.
+        """
+        if request.window_seconds < 0 or request.top_k < 0:
+            return starweave_pb2.TrendResponse(error="window_seconds and top_k cannot be negative")
+        trends = self.trends.query(request.window_seconds, request.top_k or self.TREND_TOP_K, list(request.keys))
+        return starweave_pb2.TrendResponse(
+            window_seconds=trends.window_seconds,
+            total=trends.total,
+            hitters=[starweave_pb2.HeavyHitter(key=hitter.key, count=hitter.count, error=hitter.error)
+                     for hitter in trends.hitters],
+            labels=[starweave_pb2.LabelTrend(label=label.label, count=label.count, distinct=label.distinct)
+                    for label in trends.labels],
+            estimates=trends.estimates,
+            late=trends.late,
+        )
     
     def GetStatus(self, request, context):
         """Return the current status of the service."""
         current_time = time.time()
         uptime = int(current_time - self.start_time)
+        with self._request_count_lock:
+            request_count = self.request_count
         
         metrics = {
-            "requests_processed": str(self.request_count),
+            "requests_processed": str(request_count),
             "uptime_seconds": str(uptime),
-            "status": "SERVING"
+            "status": "SERVING",
+            "index_version": str(self.recognizer.index.version),
         }
+        if isinstance(self.recognizer.index, ShardedIndex):
+            # One round trip to the shards, which may each take up to the shard timeout
+            shard_stats = self.recognizer.index.shard_stats()
+            metrics.update({key: str(value) for key, value in shard_stats.items()})
+            if all(shard_stats[f"shard_{number}_up"] for number in range(shard_stats["shards"])):
+                metrics["patterns_indexed"] = str(sum(
+                    shard_stats[f"shard_{number}_patterns"] for number in range(shard_stats["shards"])))
+            else:
+                metrics["patterns_indexed"] = "unavailable"  # See the shard_<n>_up entries
+        else:
+            metrics["patterns_indexed"] = str(len(self.recognizer.index))
+        metrics.update(self.stream_metrics())
+        metrics.update({key: str(value) for key, value in self.context_sessions.stats().items()})
+        metrics.update({key: str(value) for key, value in self.result_cache.stats().items()})
+        metrics.update({key: str(value) for key, value in self.trends.stats().items()})
+        
+        if self.shared_counters is not None:
+            metrics.update({
+                "requests_processed": str(self.shared_counters.total("requests_processed")),
+                "worker_requests_processed": str(request_count),
+                "worker_pid": str(os.getpid()),
+                "workers": str(self.shared_counters.num_slots),
+            })
         
         if request.detailed:
+            process = process_stats()
             metrics.update({
-                "python_version": "3.13",  # This should be dynamic in production
+                "python_version": platform.python_version(),
                 "grpc_version": grpc.__version__,
-                "memory_usage_mb": "0"  # Add actual memory usage in production
+                "memory_usage_mb": f"{process['rss_bytes'] / 2 ** 20:.1f}",
+                "cpu_user_seconds": f"{process['cpu_user_seconds']:.2f}",
+                "cpu_system_seconds": f"{process['cpu_system_seconds']:.2f}",
+                "threads": str(process["threads"]),
             })
+            if self.rpc_metrics is not None:
+                metrics.update({key: str(value) for key, value in self.rpc_metrics.summary().items()})
         
         return starweave_pb2.StatusResponse(
             status="SERVING",
@@ -123,33 +1001,210 @@ class PatternService(starweave_pb2_grpc.PatternServiceServicer):
             uptime=uptime,
             metrics=metrics
         )
+    
+    def shutdown(self) -> None:
+        """Shut down the stream workers."""
+        self.stream_executor.shutdown(wait=False)
+
+class AsyncPatternService(starweave_pb2_grpc.PatternServiceServicer):
+    """asyncio (grpc.aio) front end for PatternService.
+    
+    Recognition work runs on a bounded thread pool, so idle streams and
+    queued requests cost a coroutine each rather than an OS thread.
+    """
+    
+    def __init__(self, pattern_service: Optional[PatternService] = None,
+                 executor: Optional[futures.Executor] = None, max_workers: int = 10):
+        self.pattern_service = pattern_service or PatternService()
+        self._executor = executor or futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='pattern_worker')
+    
+    async def RecognizePattern(self, request, context):
+        """Handle a single pattern recognition request."""
+        try:
+            recognition_options(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.pattern_service.RecognizePattern, request, context)
+    
+    async def RecognizePatterns(self, request, context):
+        """Handle a batch of pattern recognition requests in one call."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.pattern_service.RecognizePatterns, request, context)
+    
+    async def StreamPatterns(self, request_iterator, context):
+        """Handle a stream of pattern recognition requests (see PatternService.StreamPatterns).
+        
+        Each group of a micro-batch is scored with one executor call.
+        """
+        logger.info("Starting pattern stream processing")
+        service = self.pattern_service
+        try:
+            order = stream_order(context, service.STREAM_ORDER)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        
+        pipeline = service.stream_pipeline(
+            AsyncStreamPipeline, request_iterator, self._executor, order, service.context_session(context))
+        with service.track_stream(pipeline):
+            async for response in pipeline:
+                yield response
+    
+    async def IngestPatterns(self, request_iterator, context):
+        """Add a stream of pattern batches to the corpus."""
+        if self.pattern_service.shared_counters is not None:
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION, self.pattern_service.PREFORK_INGEST_ERROR)
+        loop = asyncio.get_running_loop()
+        ingest = PatternIngest(self.pattern_service.recognizer.index, self.pattern_service.INGEST_BATCH)
+        try:
+            async for request in request_iterator:
+                await loop.run_in_executor(self._executor, ingest.add, request.patterns)
+            await loop.run_in_executor(self._executor, ingest.flush)
+        finally:
+            ingest.close()
+        response = ingest.response()
+        logger.info(f"Ingested {response.received} patterns in {response.seconds:.1f}s "
+                    f"({response.patterns_per_second:.0f}/s), {response.total} indexed")
+        return response
+    
+    async def GetTrends(self, request, context):
+        """Return the heavy hitters and label counts of recently streamed patterns."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.pattern_service.GetTrends, request, context)
+    
+    async def GetStatus(self, request, context):
+        """Return the current status of the service.
+        
+        Runs in the worker pool: with a sharded index it waits on every shard.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.pattern_service.GetStatus, request, context)
+    
+    def shutdown(self) -> None:
+        """Shut down the worker pool."""
+        self._executor.shutdown(wait=False)
+        self.pattern_service.shutdown()
+
+# Status of an RPC that failed because a shard was down or too slow
+SHARD_ERROR_CODES = ((ShardTimeout, grpc.StatusCode.DEADLINE_EXCEEDED),
+                     (ShardUnavailable, grpc.StatusCode.UNAVAILABLE))
+
+
+def _shard_error_code(error: Exception) -> Optional[grpc.StatusCode]:
+    for error_class, code in SHARD_ERROR_CODES:
+        if isinstance(error, error_class):
+            return code
+    return None
+
+
+class ShardErrorInterceptor(grpc.ServerInterceptor):
+    """Fails RPCs of the threaded server with UNAVAILABLE or DEADLINE_EXCEEDED when a shard is down or slow."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return handler
+
+        def _wrap(behavior):
+            def _unary(request, context):
+                try:
+                    return behavior(request, context)
+                except (ShardUnavailable, ShardTimeout) as e:
+                    context.abort(_shard_error_code(e), str(e))
+
+            def _stream(request, context):
+                try:
+                    yield from behavior(request, context)
+                except (ShardUnavailable, ShardTimeout) as e:
+                    context.abort(_shard_error_code(e), str(e))
+            return _stream if handler.response_streaming else _unary
+
+        for kind in ('unary_unary', 'unary_stream', 'stream_unary', 'stream_stream'):
+            behavior = getattr(handler, kind)
+            if behavior is not None:
+                return handler._replace(**{kind: _wrap(behavior)})
+        return handler
+
+
+class AsyncShardErrorInterceptor(grpc.aio.ServerInterceptor):
+    """Fails RPCs of the asyncio server with UNAVAILABLE or DEADLINE_EXCEEDED when a shard is down or slow."""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return handler
+
+        if not handler.response_streaming:
+            kind = 'unary_unary' if handler.unary_unary is not None else 'stream_unary'
+            behavior = getattr(handler, kind)
+
+            async def _unary(request, context):
+                try:
+                    return await behavior(request, context)
+                except (ShardUnavailable, ShardTimeout) as e:
+                    await context.abort(_shard_error_code(e), str(e))
+            return handler._replace(**{kind: _unary})
+
+        kind = 'unary_stream' if handler.unary_stream is not None else 'stream_stream'
+        behavior = getattr(handler, kind)
+
+        async def _stream(request, context):
+            try:
+                async for response in behavior(request, context):
+                    yield response
+            except (ShardUnavailable, ShardTimeout) as e:
+                await context.abort(_shard_error_code(e), str(e))
+        return handler._replace(**{kind: _stream})
+
 
 class ServerManager:
     """Manages the gRPC server lifecycle."""
     
-    def __init__(self, port: int = 50052, max_workers: int = 10):
+    def __init__(self, port: int = 50052, max_workers: int = 10,
+                 shared_counters: Optional[SharedCounters] = None,
+                 transport_profile: TransportProfile = PATTERN_PROFILE,
+                 pattern_index: Optional[PatternIndex] = None,
+                 metrics_port: int = 0):
         self.port = port
         self.max_workers = max_workers
+        self.shared_counters = shared_counters
+        self.transport_profile = transport_profile
+        self.pattern_index = pattern_index
+        self.metrics_port = metrics_port
         self.server = None
         self.health_servicer = None
         self.pattern_service = None
+        self.rpc_metrics = None
+        self.metrics_exporter = None
         self._stop_event = threading.Event()
     
+    def shard_interceptors(self) -> List[grpc.ServerInterceptor]:
+        """Map shard failures to gRPC statuses when the index is sharded."""
+        return [ShardErrorInterceptor()] if isinstance(self.pattern_index, ShardedIndex) else []
+
     def start(self) -> None:
         """Start the gRPC server."""
-        # Create server with thread pool
+        # Create server with thread pool; metrics come first so they time the other interceptors too
+        self.rpc_metrics = RpcMetrics(workers=self.max_workers)
         self.server = grpc.server(
             futures.ThreadPoolExecutor(max_workers=self.max_workers),
-            options=[
-                ('grpc.max_send_message_length', 100 * 1024 * 1024),  # 100MB
-                ('grpc.max_receive_message_length', 100 * 1024 * 1024),  # 100MB
-                ('grpc.so_reuseport', 1),
-            ]
+            options=self.transport_profile.server_options(),
+            compression=self.transport_profile.default_compression(),
+            interceptors=[MetricsInterceptor(self.rpc_metrics)] + self.shard_interceptors()
+            + self.transport_profile.interceptors()
         )
         
         # Create and register services
         self.health_servicer = HealthServicer()
-        self.pattern_service = PatternService(health_servicer=self.health_servicer)
+        self.pattern_service = PatternService(
+            health_servicer=self.health_servicer,
+            shared_counters=self.shared_counters,
+            pattern_index=self.pattern_index,
+            rpc_metrics=self.rpc_metrics
+        )
         
         # Add services to the server
         starweave_pb2_grpc.add_PatternServiceServicer_to_server(
@@ -170,6 +1225,7 @@ class ServerManager:
         endpoint = f'[::]:{self.port}'
         self.server.add_insecure_port(endpoint)
         self.server.start()
+        self.metrics_exporter = start_exporter(self.rpc_metrics, self.metrics_port)
         
         # Update health status
         self.health_servicer.set_status(health_pb2.HealthCheckResponse.SERVING)
@@ -190,6 +1246,12 @@ class ServerManager:
             self.server.stop(grace)
             logger.info("gRPC server stopped")
         
+        if self.pattern_service:
+            self.pattern_service.shutdown()
+        
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        
         self._stop_event.set()
     
     def wait_for_termination(self) -> None:
@@ -206,8 +1268,326 @@ class ServerManager:
         self.stop()
 
 
-def serve(port: int = 50052, max_workers: int = 10) -> None:
-    """Start the gRPC server."""
+class AsyncServerManager:
+    """Manages the lifecycle of the asyncio (grpc.aio) server."""
+    
+    def __init__(self, port: int = 50052, max_workers: int = 10,
+                 shared_counters: Optional[SharedCounters] = None,
+                 transport_profile: TransportProfile = PATTERN_PROFILE,
+                 pattern_index: Optional[PatternIndex] = None,
+                 metrics_port: int = 0):
+        self.port = port
+        self.max_workers = max_workers
+        self.shared_counters = shared_counters
+        self.transport_profile = transport_profile
+        self.pattern_index = pattern_index
+        self.metrics_port = metrics_port
+        self.server = None
+        self.health_servicer = None
+        self.pattern_service = None
+        self.rpc_metrics = None
+        self.metrics_exporter = None
+    
+    def shard_interceptors(self) -> List["grpc.aio.ServerInterceptor"]:
+        """Map shard failures to gRPC statuses when the index is sharded."""
+        return [AsyncShardErrorInterceptor()] if isinstance(self.pattern_index, ShardedIndex) else []
+
+    async def start(self) -> None:
+        """Start the gRPC server."""
+        # Saturation is relative to the recognition workers, the limit calls queue for
+        self.rpc_metrics = RpcMetrics(workers=self.max_workers)
+        self.server = grpc.aio.server(
+            options=self.transport_profile.server_options(),
+            compression=self.transport_profile.default_compression(),
+            interceptors=[AsyncMetricsInterceptor(self.rpc_metrics)] + self.shard_interceptors()
+            + self.transport_profile.aio_interceptors()
+        )
+        
+        # Create and register services
+        self.health_servicer = AsyncHealthServicer()
+        self.pattern_service = AsyncPatternService(
+            PatternService(health_servicer=self.health_servicer,
+                           shared_counters=self.shared_counters,
+                           pattern_index=self.pattern_index,
+                           rpc_metrics=self.rpc_metrics),
+            max_workers=self.max_workers
+        )
+        
+        starweave_pb2_grpc.add_PatternServiceServicer_to_server(
+            self.pattern_service, self.server)
+        health_pb2_grpc.add_HealthServicer_to_server(
+            self.health_servicer, self.server)
+        
+        # Add reflection service for debugging
+        from grpc_reflection.v1alpha import reflection
+        SERVICE_NAMES = (
+            starweave_pb2.DESCRIPTOR.services_by_name['PatternService'].full_name,
+            health_pb2.DESCRIPTOR.services_by_name['Health'].full_name,
+            reflection.SERVICE_NAME,
+        )
+        reflection.enable_server_reflection(SERVICE_NAMES, self.server)
+        
+        # Start the server
+        self.server.add_insecure_port(f'[::]:{self.port}')
+        await self.server.start()
+        self.metrics_exporter = start_exporter(self.rpc_metrics, self.metrics_port)
+        
+        self.health_servicer.set_status(health_pb2.HealthCheckResponse.SERVING)
+        logger.info(f"gRPC asyncio server started on port {self.port}")
+        
+        # Register signal handlers for graceful shutdown
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(
+                signum, lambda signum=signum: asyncio.ensure_future(self._handle_signal(signum)))
+    
+    async def stop(self, grace: float = 5.0) -> None:
+        """Stop the gRPC server."""
+        if self.health_servicer:
+            self.health_servicer.set_status(health_pb2.HealthCheckResponse.NOT_SERVING)
+        
+        if self.server:
+            logger.info("Shutting down gRPC server...")
+            await self.server.stop(grace)
+            logger.info("gRPC server stopped")
+        
+        if self.pattern_service:
+            self.pattern_service.shutdown()
+        
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+    
+    async def wait_for_termination(self) -> None:
+        """Wait until the server is terminated."""
+        await self.server.wait_for_termination()
+    
+    async def _handle_signal(self, signum):
+        """Handle OS signals for graceful shutdown."""
+        logger.info(f"Received signal {signal.Signals(signum).name}, shutting down...")
+        await self.stop()
+
+
+class PreforkSupervisor:
+    """Runs several pattern server processes on one port behind SO_REUSEPORT.
+    
+    Worker processes are forked before any gRPC state exists in the
+    supervisor, each binds the same port (the kernel spreads incoming
+    connections across them), and workers that exit are reaped and
+    restarted in the same slot. Request counters live in shared memory so
+    GetStatus on any worker reports totals for the whole group.
+    
+    Load is balanced per connection, not per call: a client needs several
+    channels to use more than one worker. Per-RPC metrics are per worker:
+    worker N serves them on metrics_port + N.
+    """
+    
+    # Minimum seconds between restarts of the same slot, to avoid crash loops
+    RESTART_BACKOFF = 1.0
+    
+    def __init__(self, port: int = 50052, num_processes: int = 2, max_workers: int = 10,
+                 use_aio: bool = False, transport_profile: TransportProfile = PATTERN_PROFILE,
+                 pattern_index: Optional[PatternIndex] = None, metrics_port: int = 0):
+        self.port = port
+        self.num_processes = num_processes
+        self.max_workers = max_workers
+        self.use_aio = use_aio
+        self.transport_profile = transport_profile
+        # Built before forking so workers share the pages copy-on-write
+        self.pattern_index = pattern_index
+        self.metrics_port = metrics_port
+        self.shared_counters = None
+        self._workers: Dict[int, int] = {}  # pid -> slot
+        self._last_spawn: Dict[int, float] = {}  # slot -> spawn time
+        self._stopping = False
+    
+    def run(self) -> None:
+        """Start the workers and supervise them until asked to stop."""
+        self.shared_counters = SharedCounters(self.num_processes)
+        
+        for slot in range(self.num_processes):
+            self._spawn(slot)
+        
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        logger.info(f"Supervisor started {self.num_processes} workers on port {self.port}")
+        
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            
+            slot = self._workers.pop(pid, None)
+            if slot is None:
+                continue
+            
+            if self._stopping:
+                logger.info(f"Worker {slot} (pid {pid}) exited")
+                continue
+            
+            logger.warning(f"Worker {slot} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            delay = self._last_spawn.get(slot, 0.0) + self.RESTART_BACKOFF - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            if not self._stopping:
+                self._spawn(slot)
+        
+        logger.info("All workers stopped")
+    
+    def stop(self) -> None:
+        """Ask every worker to shut down gracefully."""
+        self._stopping = True
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    def _spawn(self, slot: int) -> None:
+        self._last_spawn[slot] = time.time()
+        pid = os.fork()
+        if pid:
+            self._workers[pid] = slot
+            return
+        
+        # Child process: never return into the supervisor loop
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self.shared_counters.bind(slot)
+            _configure_worker_logging(slot)
+            _run_worker(self.port, self.max_workers, self.use_aio, self.shared_counters,
+                        self.transport_profile, self.pattern_index,
+                        self.metrics_port + slot if self.metrics_port else 0)
+        except Exception:
+            logger.exception(f"Worker {slot} failed")
+            exit_code = 1
+        finally:
+            logging.shutdown()
+            os._exit(exit_code)
+    
+    def _handle_signal(self, signum, frame):
+        """Handle OS signals by stopping all workers."""
+        logger.info(f"Supervisor received signal {signal.Signals(signum).name}, stopping workers...")
+        self.stop()
+
+
+def _configure_worker_logging(slot: int) -> None:
+    """Replace inherited log handlers with ones that identify the worker."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker-{slot}[%(process)d] - %(name)s - %(levelname)s - %(message)s',
+        force=True
+    )
+
+
+def _run_worker(port: int, max_workers: int, use_aio: bool,
+                shared_counters: Optional[SharedCounters] = None,
+                transport_profile: TransportProfile = PATTERN_PROFILE,
+                pattern_index: Optional[PatternIndex] = None, metrics_port: int = 0) -> None:
+    """Serve until terminated in a single (possibly pre-forked) process."""
+    if use_aio:
+        asyncio.run(_serve_aio(port, max_workers, shared_counters, transport_profile, pattern_index, metrics_port))
+        return
+    
+    server = ServerManager(port=port, max_workers=max_workers, shared_counters=shared_counters,
+                           transport_profile=transport_profile, pattern_index=pattern_index,
+                           metrics_port=metrics_port)
+    server.start()
+    server.wait_for_termination()
+
+
+async def _serve_aio(port: int, max_workers: int,
+                     shared_counters: Optional[SharedCounters] = None,
+                     transport_profile: TransportProfile = PATTERN_PROFILE,
+                     pattern_index: Optional[PatternIndex] = None, metrics_port: int = 0) -> None:
+    """Run the asyncio server until it is terminated."""
+    server = AsyncServerManager(port=port, max_workers=max_workers, shared_counters=shared_counters,
+                                transport_profile=transport_profile, pattern_index=pattern_index,
+                                metrics_port=metrics_port)
+    await server.start()
+    await server.wait_for_termination()
+
+
+def serve(port: int = 50052, max_workers: int = 10, use_aio: bool = False,
+          processes: int = 1, transport_config: Optional[str] = None,
+          corpus: Optional[str] = None, minhash_bands: int = 0, minhash_rows: int = 4,
+          scan: bool = True, suffix_array_dir: Optional[str] = None, tfidf: bool = True,
+          snapshot_dir: Optional[str] = None, shards: int = 1, shard_timeout: float = SHARD_TIMEOUT,
+          vector_ann_threshold: int = DEFAULT_ANN_THRESHOLD, vector_ef: int = DEFAULT_EF_SEARCH,
+          metrics_port: int = 0) -> None:
+    """Start the gRPC server.
+    
+    Args:
+        port: Port to listen on
+        max_workers: Maximum number of worker threads (per process)
+        use_aio: Serve with grpc.aio; max_workers then only bounds recognition work
+        processes: Number of pre-forked server processes sharing the port; each
+            has its own copy of the index, so IngestPatterns is refused and
+            snapshot_dir cannot be used
+        transport_config: JSON file with transport profile overrides
+        corpus: JSON or JSON-lines file of labeled patterns to recognize against
+        minhash_bands: LSH bands for the minhash strategy (0 disables it)
+        minhash_rows: MinHash values per LSH band
+        scan: Compile patterns into an Aho–Corasick scanner for the scan strategy
+        suffix_array_dir: Answer contains queries from a suffix array memory-mapped
+            from this directory (built there on first use) instead of trigram postings
+        tfidf: Keep hashed TF-IDF vectors for the tfidf strategy
+        snapshot_dir: Memory-map the index from a snapshot in this directory
+            instead of reading the corpus; without one, the index is built and
+            saved there. Ingested patterns are saved back.
+        shards: Partition the index across this many worker processes
+            (see server.sharding); cannot be combined with processes
+        shard_timeout: Seconds a recognition waits for the shards before
+            failing with DEADLINE_EXCEEDED (a shard that is restarting fails
+            it with UNAVAILABLE right away)
+        vector_ann_threshold: Vector patterns from which cosine and dot queries
+            walk an HNSW graph instead of scoring every vector
+        vector_ef: Candidates kept while walking the graph (recall vs latency)
+        metrics_port: Serve per-RPC and process metrics in the Prometheus text
+            format on http://127.0.0.1:<metrics_port>/metrics (0 disables);
+            pre-forked workers use consecutive ports from it
+    """
+    if shards > 1 and processes > 1:
+        raise ValueError("Sharding cannot be combined with pre-forked server processes")
+    if snapshot_dir and processes > 1:
+        raise ValueError("Snapshots cannot be combined with pre-forked server processes, "
+                         "whose indexes would diverge; use shards instead")
+    transport_profile = load_profiles(transport_config, DEFAULT_PROFILES)["pattern"]
+    corpus = corpus or os.environ.get("STARWEAVE_PATTERN_CORPUS")
+    minhash = MinHashLSH(bands=minhash_bands, rows=minhash_rows) if minhash_bands > 0 else None
+    vectors = VectorIndex(ann_threshold=vector_ann_threshold, ef_search=vector_ef)
+    pattern_index = None
+    if shards > 1:
+        index_kwargs = dict(minhash=minhash, scan=scan, suffix_array_dir=suffix_array_dir, tfidf=tfidf,
+                            vectors=vectors)
+        if snapshot_dir:
+            pattern_index = ShardedIndex.load(snapshot_dir, shards, timeout=shard_timeout, **index_kwargs)
+        if pattern_index is None and corpus:
+            pattern_index = ShardedIndex.from_file(corpus, shards, timeout=shard_timeout, **index_kwargs)
+            logger.info(f"Loaded {len(pattern_index)} patterns from {corpus} into {shards} shards")
+            if snapshot_dir:
+                pattern_index.save(snapshot_dir)
+        elif pattern_index is None:
+            pattern_index = ShardedIndex(shards, timeout=shard_timeout, **index_kwargs)
+        atexit.register(pattern_index.close)
+    elif snapshot_dir:
+        pattern_index = PatternIndex.load(snapshot_dir, minhash=minhash, scan=scan,
+                                          suffix_array=suffix_array_dir is not None, tfidf=tfidf, vectors=vectors)
+    if pattern_index is None and corpus:
+        pattern_index = PatternIndex.from_file(corpus, minhash=minhash, scan=scan,
+                                               suffix_array_dir=suffix_array_dir, tfidf=tfidf, vectors=vectors)
+        gc.freeze()  # The corpus lives as long as the server; keep full collections off it
+        logger.info(f"Loaded {len(pattern_index)} patterns from {corpus}")
+        if snapshot_dir:
+            pattern_index.save(snapshot_dir)
+    elif pattern_index is None:
+        pattern_index = PatternIndex(minhash=minhash, scan=scan, suffix_array=suffix_array_dir is not None,
+                                     tfidf=tfidf, vectors=vectors)
+    if snapshot_dir:
+        pattern_index.snapshot_dir = snapshot_dir
+    
     # Logging already configured via logging.basicConfig; no special setup needed
     
     # Set up process title
@@ -217,8 +1597,26 @@ def serve(port: int = 50052, max_workers: int = 10) -> None:
     except ImportError:
         pass  # setproctitle not available
     
+    if processes > 1:
+        PreforkSupervisor(
+            port=port,
+            num_processes=processes,
+            max_workers=max_workers,
+            use_aio=use_aio,
+            transport_profile=transport_profile,
+            pattern_index=pattern_index,
+            metrics_port=metrics_port
+        ).run()
+        return
+    
+    if use_aio:
+        asyncio.run(_serve_aio(port, max_workers, transport_profile=transport_profile,
+                               pattern_index=pattern_index, metrics_port=metrics_port))
+        return
+    
     # Create and start server
-    server = ServerManager(port=port, max_workers=max_workers)
+    server = ServerManager(port=port, max_workers=max_workers, transport_profile=transport_profile,
+                           pattern_index=pattern_index, metrics_port=metrics_port)
     server.start()
     
     try:
@@ -233,4 +1631,50 @@ def serve(port: int = 50052, max_workers: int = 10) -> None:
         sys.exit(0)
 
 if __name__ == '__main__':
-    serve()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='STARWEAVE Pattern Recognition Server')
+    parser.add_argument('--port', type=int, default=50052, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=10,
+                       help='Maximum number of worker threads')
+    parser.add_argument('--aio', action='store_true',
+                       help='Serve with the asyncio (grpc.aio) server')
+    parser.add_argument('--processes', type=int, default=1,
+                       help='Number of pre-forked server processes sharing the port')
+    parser.add_argument('--transport-config', type=str, default=None,
+                       help='JSON file with transport profile overrides')
+    parser.add_argument('--corpus', type=str, default=None,
+                       help='JSON or JSON-lines file of labeled patterns (or set STARWEAVE_PATTERN_CORPUS)')
+    parser.add_argument('--minhash-bands', type=int, default=0,
+                       help='LSH bands for the minhash strategy; more bands raise recall (0 disables)')
+    parser.add_argument('--minhash-rows', type=int, default=4,
+                       help='MinHash values per LSH band; more rows raise precision')
+    parser.add_argument('--no-scan', dest='scan', action='store_false',
+                       help='Do not compile patterns for the scan strategy (saves memory)')
+    parser.add_argument('--suffix-array', type=str, default=None, metavar='DIR',
+                       help='Serve contains queries from a suffix array memory-mapped from DIR')
+    parser.add_argument('--no-tfidf', dest='tfidf', action='store_false',
+                       help='Do not keep TF-IDF vectors for the tfidf strategy (saves memory)')
+    parser.add_argument('--snapshot', type=str, default=None, metavar='DIR',
+                       help='Memory-map the index from a snapshot in DIR (built from --corpus and saved '
+                            'there when missing); ingested patterns are saved back')
+    parser.add_argument('--shards', type=int, default=1,
+                       help='Partition the pattern index across this many worker processes')
+    parser.add_argument('--shard-timeout', type=float, default=SHARD_TIMEOUT, metavar='SECONDS',
+                       help='Fail recognitions with DEADLINE_EXCEEDED when a shard takes longer than this')
+    parser.add_argument('--vector-ann-threshold', type=int, default=DEFAULT_ANN_THRESHOLD,
+                       help='Vector patterns from which cosine and dot queries use an HNSW graph')
+    parser.add_argument('--vector-ef', type=int, default=DEFAULT_EF_SEARCH,
+                       help='Candidates kept per HNSW query (higher: better recall, slower)')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                       help='Serve Prometheus-style metrics on localhost at this port (0 disables)')
+    
+    args = parser.parse_args()
+    
+    serve(port=args.port, max_workers=args.workers, use_aio=args.aio, processes=args.processes,
+          transport_config=args.transport_config, corpus=args.corpus,
+          minhash_bands=args.minhash_bands, minhash_rows=args.minhash_rows, scan=args.scan,
+          suffix_array_dir=args.suffix_array, tfidf=args.tfidf, snapshot_dir=args.snapshot,
+          shards=args.shards, shard_timeout=args.shard_timeout,
+          vector_ann_threshold=args.vector_ann_threshold, vector_ef=args.vector_ef,
+          metrics_port=args.metrics_port)
@@ -0,0 +1,399 @@
+"""
+Pipeline backends for the image generation service.
+
+A backend turns a model id into a callable pipeline for
+ImageGenerationServicer. The default DiffusersBackend loads Stable Diffusion
+weights with diffusers. SyntheticBackend builds a stand-in pipeline that has
+the same call signature, components, step callbacks and a configurable
+memory footprint and per-step cost. It produces deterministic images without
+any downloads or a GPU, so model loading, eviction, scheduling and load
+behavior can be exercised on CI machines and laptops.
+"""
+import hashlib
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type, Union
+
+import numpy as np
+import torch
+from loguru import logger
+from PIL import Image
+
+
+def _module_bytes(module) -> int:
+    """Return the size of a module's parameters and buffers in bytes."""
+    if not isinstance(module, torch.nn.Module):
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class PipelineBackend:
+    """Loads pipelines for model ids.
+
+    Subclasses implement load(). The returned pipeline must accept the
+    StableDiffusionPipeline call arguments used by the servicer and expose
+    ``unet``, ``text_encoder``, ``vae`` and ``scheduler`` components.
+    """
+
+    name = "base"
+    pipeline_class: Type = object
+
+    def load(self, model_id: str, cache_dir: str, device: str, torch_dtype: torch.dtype):
+        """Load the pipeline for model_id (not yet moved to device)."""
+        raise NotImplementedError
+
+    def memory_usage(self, pipe) -> int:
+        """Estimate the pipeline's memory footprint in bytes."""
+        return sum(
+            _module_bytes(getattr(pipe, component, None))
+            for component in ("unet", "text_encoder", "vae")
+        )
+
+
+class DiffusersBackend(PipelineBackend):
+    """Loads Stable Diffusion checkpoints with diffusers."""
+
+    name = "diffusers"
+
+    def __init__(self):
+        from diffusers import StableDiffusionPipeline
+        self.pipeline_class = StableDiffusionPipeline
+
+    def load(self, model_id: str, cache_dir: str, device: str, torch_dtype: torch.dtype):
+        from diffusers import DPMSolverSinglestepScheduler
+
+        load_kwargs = {
+            "torch_dtype": torch_dtype,
+            "cache_dir": cache_dir,
+            "safety_checker": None,
+            "use_safetensors": True,
+        }
+
+        # First try with fp16 if on CUDA/ROCm
+        if device != "cpu":
+            try:
+                pipe = self.pipeline_class.from_pretrained(model_id, revision="fp16", **load_kwargs)
+            except Exception as e:
+                logger.warning(f"FP16 load failed, trying without revision: {e}")
+                pipe = self.pipeline_class.from_pretrained(model_id, **load_kwargs)
+        else:
+            pipe = self.pipeline_class.from_pretrained(model_id, **load_kwargs)
+
+        # Configure scheduler if needed
+        if hasattr(pipe, 'scheduler'):
+            pipe.scheduler = DPMSolverSinglestepScheduler.from_config(pipe.scheduler.config)
+
+        return pipe
+
+
+@dataclass
+class SyntheticPipelineOutput:
+    """Mirrors StableDiffusionPipelineOutput."""
+    images: Union[List[Image.Image], torch.Tensor]
+    nsfw_content_detected: Optional[List[bool]] = None
+
+
+def _spend(cost_ms: float, busy: bool) -> None:
+    """Consume cost_ms of wall time, either sleeping (GPU-like) or spinning (CPU-bound)."""
+    if cost_ms <= 0:
+        return
+    if not busy:
+        time.sleep(cost_ms / 1000)
+        return
+    deadline = time.perf_counter() + cost_ms / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+class SyntheticTextEncoder(torch.nn.Module):
+    """Maps hashed prompt tokens to fixed embeddings."""
+
+    def __init__(self, vocab_size: int, hidden_size: int, cost_ms: float, busy: bool):
+        super().__init__()
+        generator = torch.Generator().manual_seed(0)
+        self.embedding = torch.nn.Embedding(vocab_size, hidden_size)
+        with torch.no_grad():
+            self.embedding.weight.copy_(torch.randn(vocab_size, hidden_size, generator=generator))
+        self.config = SimpleNamespace(vocab_size=vocab_size, hidden_size=hidden_size)
+        self.cost_ms = cost_ms
+        self.busy = busy
+
+    def forward(self, input_ids: torch.Tensor) -> torch.Tensor:
+        _spend(self.cost_ms, self.busy)
+        return self.embedding(input_ids)
+
+
+class SyntheticUNet(torch.nn.Module):
+    """Predicts the offset from a prompt-dependent target latent.
+
+    ``footprint`` is a buffer of ``memory_mb`` bytes so the pipeline occupies
+    roughly as much memory as the model it stands in for.
+    """
+
+    def __init__(self, hidden_size: int, latent_channels: int, sample_size: int,
+                 step_ms: float, memory_mb: float, busy: bool):
+        super().__init__()
+        generator = torch.Generator().manual_seed(1)
+        self.level = torch.nn.Linear(hidden_size, latent_channels, bias=False)
+        self.frequency = torch.nn.Linear(hidden_size, 2, bias=False)
+        with torch.no_grad():
+            self.level.weight.copy_(torch.randn(latent_channels, hidden_size, generator=generator))
+            self.frequency.weight.copy_(torch.randn(2, hidden_size, generator=generator))
+        self.register_buffer("footprint", torch.ones(int(memory_mb * 1024 * 1024), dtype=torch.uint8))
+        self.config = SimpleNamespace(sample_size=sample_size, in_channels=latent_channels)
+        self.step_ms = step_ms
+        self.busy = busy
+
+    def target(self, encoder_hidden_states: torch.Tensor, height: int, width: int) -> torch.Tensor:
+        """Return the clean latent the denoiser converges to for these embeddings."""
+        pooled = encoder_hidden_states.mean(dim=1)
+        level = torch.tanh(self.level(pooled))[:, :, None, None]
+        frequency = self.frequency(pooled)
+        ys = torch.linspace(0, 1, height, device=pooled.device, dtype=pooled.dtype)[None, :, None]
+        xs = torch.linspace(0, 1, width, device=pooled.device, dtype=pooled.dtype)[None, None, :]
+        pattern = torch.sin(6.0 * (frequency[:, 0, None, None] * xs + frequency[:, 1, None, None] * ys))
+        return level + 0.5 * pattern[:, None, :, :]
+
+    def forward(self, sample: torch.Tensor, timestep, encoder_hidden_states: torch.Tensor) -> torch.Tensor:
+        # Cost is quoted for a 64x64 latent (512x512 image) and scales with area
+        area = sample.shape[-2] * sample.shape[-1] / float(self.config.sample_size ** 2)
+        _spend(self.step_ms * area, self.busy)
+        return sample - self.target(encoder_hidden_states, sample.shape[-2], sample.shape[-1])
+
+
+class SyntheticDecoder(torch.nn.Module):
+    """Upsamples latents to RGB in [0, 1]."""
+
+    def __init__(self, scale_factor: int, cost_ms: float, busy: bool):
+        super().__init__()
+        self.scale_factor = scale_factor
+        self.cost_ms = cost_ms
+        self.busy = busy
+
+    def forward(self, latents: torch.Tensor) -> torch.Tensor:
+        area = latents.shape[-2] * latents.shape[-1] / 4096.0
+        _spend(self.cost_ms * area, self.busy)
+        rgb = latents[:, :3] + 0.25 * latents[:, 3:4]
+        rgb = torch.nn.functional.interpolate(rgb.float(), scale_factor=self.scale_factor, mode="nearest")
+        return (torch.tanh(rgb) + 1.0) / 2.0
+
+
+class SyntheticVAE(torch.nn.Module):
+
+    def __init__(self, decoder: SyntheticDecoder):
+        super().__init__()
+        self.decoder = decoder
+        self.config = SimpleNamespace(scaling_factor=1.0)
+
+
+class SyntheticScheduler:
+    """Deterministic scheduler that moves latents toward the predicted target.
+
+    Each step shrinks the distance to the target by sigma(next) / sigma(t),
+    so the result keeps ``sigma_min`` of the initial noise and still depends
+    on the seed.
+    """
+
+    order = 1
+
+    def __init__(self, num_train_timesteps: int = 1000, sigma_min: float = 0.05):
+        self.config = {"num_train_timesteps": num_train_timesteps, "sigma_min": sigma_min}
+        self.num_train_timesteps = num_train_timesteps
+        self.sigma_min = sigma_min
+        self.timesteps = torch.tensor([], dtype=torch.long)
+
+    def set_timesteps(self, num_inference_steps: Optional[int] = None, device=None,
+                      timesteps: Optional[Sequence[int]] = None) -> None:
+        if timesteps is None:
+            timesteps = np.linspace(self.num_train_timesteps - 1, 0, num_inference_steps).round()
+        self.timesteps = torch.tensor([int(t) for t in timesteps], dtype=torch.long, device=device)
+
+    def sigma(self, timestep) -> float:
+        if timestep is None:
+            return self.sigma_min
+        return max(float(timestep) / self.num_train_timesteps, self.sigma_min)
+
+    def step(self, model_output: torch.Tensor, timestep, sample: torch.Tensor, next_timestep=None) -> torch.Tensor:
+        ratio = self.sigma(next_timestep) / self.sigma(timestep)
+        return sample - (1.0 - ratio) * model_output
+
+
+class SyntheticPipeline:
+    """Stand-in for StableDiffusionPipeline with deterministic output.
+
+    Supports the arguments the servicer passes (prompt, size, steps or custom
+    timesteps, guidance_scale, generator, latents, output_type and
+    callback_on_step_end). Classifier-free guidance doubles the UNet batch,
+    as in the real pipeline.
+    """
+
+    vae_scale_factor = 8
+
+    def __init__(self, model_id: str, step_ms: float = 50.0, text_encode_ms: float = 10.0,
+                 decode_ms: float = 40.0, memory_mb: float = 64.0, busy: bool = False,
+                 hidden_size: int = 32, vocab_size: int = 4096, max_length: int = 77,
+                 latent_channels: int = 4, sample_size: int = 64):
+        self.name_or_path = model_id
+        self.max_length = max_length
+        self.text_encoder = SyntheticTextEncoder(vocab_size, hidden_size, text_encode_ms, busy)
+        self.unet = SyntheticUNet(hidden_size, latent_channels, sample_size, step_ms, memory_mb, busy)
+        self.vae = SyntheticVAE(SyntheticDecoder(self.vae_scale_factor, decode_ms, busy))
+        self.scheduler = SyntheticScheduler()
+        self._device = torch.device("cpu")
+        self._dtype = torch.float32
+        self._interrupt = False
+
+    @property
+    def device(self) -> torch.device:
+        return self._device
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return self._dtype
+
+    @property
+    def interrupt(self) -> bool:
+        return self._interrupt
+
+    def to(self, device=None, dtype: Optional[torch.dtype] = None) -> "SyntheticPipeline":
+        if isinstance(device, torch.dtype):
+            device, dtype = None, device
+        for module in (self.text_encoder, self.unet, self.vae):
+            module.to(device=device, dtype=dtype)
+        if device is not None:
+            self._device = torch.device(device)
+        if dtype is not None:
+            self._dtype = dtype
+        return self
+
+    def _tokenize(self, prompts: List[str]) -> torch.Tensor:
+        vocab_size = self.text_encoder.config.vocab_size
+        ids = torch.zeros((len(prompts), self.max_length), dtype=torch.long)
+        for row, prompt in enumerate(prompts):
+            tokens = prompt.lower().split()[:self.max_length - 1]
+            for col, token in enumerate(tokens):
+                digest = hashlib.sha1(token.encode()).digest()
+                ids[row, col + 1] = 1 + int.from_bytes(digest[:4], "little") % (vocab_size - 1)
+        return ids.to(self._device)
+
+    def encode_prompt(self, prompts: List[str], num_images_per_prompt: int,
+                      do_classifier_free_guidance: bool) -> torch.Tensor:
+        embeds = self.text_encoder(self._tokenize(prompts)).to(self._dtype)
+        embeds = embeds.repeat_interleave(num_images_per_prompt, dim=0)
+        if do_classifier_free_guidance:
+            uncond = self.text_encoder(self._tokenize([""])).to(self._dtype)
+            embeds = torch.cat([uncond.expand_as(embeds), embeds])
+        return embeds
+
+    def _prepare_latents(self, shape, generator: Optional[torch.Generator]) -> torch.Tensor:
+        device = generator.device if generator is not None else self._device
+        latents = torch.randn(shape, generator=generator, device=device, dtype=torch.float32)
+        return latents.to(self._device, self._dtype)
+
+    def _to_images(self, samples: torch.Tensor) -> List[Image.Image]:
+        array = (samples.clamp(0, 1) * 255).round().to(torch.uint8).permute(0, 2, 3, 1).cpu().numpy()
+        return [Image.fromarray(image) for image in array]
+
+    def __call__(self, prompt: Union[str, List[str]] = None, height: Optional[int] = None,
+                 width: Optional[int] = None, num_inference_steps: int = 50,
+                 timesteps: Optional[List[int]] = None, guidance_scale: float = 7.5,
+                 num_images_per_prompt: int = 1, generator: Optional[torch.Generator] = None,
+                 latents: Optional[torch.Tensor] = None, output_type: str = "pil",
+                 callback_on_step_end: Optional[Callable] = None,
+                 callback_on_step_end_tensor_inputs: Sequence[str] = ("latents",),
+                 **kwargs: Any) -> SyntheticPipelineOutput:
+        height = height or self.unet.config.sample_size * self.vae_scale_factor
+        width = width or self.unet.config.sample_size * self.vae_scale_factor
+        prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+        batch_size = len(prompts) * num_images_per_prompt
+        do_classifier_free_guidance = guidance_scale > 1.0
+        self._interrupt = False
+
+        embeds = self.encode_prompt(prompts, num_images_per_prompt, do_classifier_free_guidance)
+
+        self.scheduler.set_timesteps(num_inference_steps, device=self._device, timesteps=timesteps)
+        step_timesteps = self.scheduler.timesteps
+
+        shape = (batch_size, self.unet.config.in_channels,
+                 height // self.vae_scale_factor, width // self.vae_scale_factor)
+        if latents is None:
+            latents = self._prepare_latents(shape, generator)
+        else:
+            latents = latents.to(self._device, self._dtype)
+
+        for i, t in enumerate(step_timesteps):
+            if self._interrupt:
+                continue
+
+            model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
+            noise_pred = self.unet(model_input, t, encoder_hidden_states=embeds)
+            if do_classifier_free_guidance:
+                noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+                noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+
+            next_t = step_timesteps[i + 1] if i + 1 < len(step_timesteps) else None
+            latents = self.scheduler.step(noise_pred, t, latents, next_t)
+
+            if callback_on_step_end is not None:
+                step_tensors = {"latents": latents, "prompt_embeds": embeds}
+                callback_kwargs = {name: step_tensors[name] for name in callback_on_step_end_tensor_inputs}
+                callback_outputs = callback_on_step_end(self, i, t, callback_kwargs)
+                latents = callback_outputs.pop("latents", latents)
+
+        if output_type == "latent":
+            return SyntheticPipelineOutput(images=latents)
+
+        samples = self.vae.decoder(latents / self.vae.config.scaling_factor)
+        return SyntheticPipelineOutput(images=self._to_images(samples), nsfw_content_detected=[False] * batch_size)
+
+
+class SyntheticBackend(PipelineBackend):
+    """Builds SyntheticPipelines; every model id loads instantly.
+
+    Args:
+        step_ms: Wall time per UNet call for a 512x512 image (scales with area)
+        text_encode_ms: Wall time per text encoder call
+        decode_ms: Wall time per VAE decode for a 512x512 image
+        memory_mb: Memory held by each loaded pipeline
+        load_ms: Simulated load time
+        busy: Spin instead of sleeping, holding the GIL like CPU-bound inference
+    """
+
+    name = "synthetic"
+    pipeline_class = SyntheticPipeline
+
+    def __init__(self, step_ms: float = 50.0, text_encode_ms: float = 10.0, decode_ms: float = 40.0,
+                 memory_mb: float = 64.0, load_ms: float = 0.0, busy: bool = False):
+        self.step_ms = step_ms
+        self.text_encode_ms = text_encode_ms
+        self.decode_ms = decode_ms
+        self.memory_mb = memory_mb
+        self.load_ms = load_ms
+        self.busy = busy
+
+    def load(self, model_id: str, cache_dir: str, device: str, torch_dtype: torch.dtype):
+        _spend(self.load_ms, busy=False)
+        pipe = SyntheticPipeline(
+            model_id,
+            step_ms=self.step_ms,
+            text_encode_ms=self.text_encode_ms,
+            decode_ms=self.decode_ms,
+            memory_mb=self.memory_mb,
+            busy=self.busy,
+        )
+        return pipe.to(dtype=torch_dtype)
+
+
+BACKENDS: Dict[str, Type[PipelineBackend]] = {
+    DiffusersBackend.name: DiffusersBackend,
+    SyntheticBackend.name: SyntheticBackend,
+}
+
+
+def get_backend(name: str, **options: Any) -> PipelineBackend:
+    """Create a backend by name, passing options to its constructor."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown pipeline backend: {name} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
@@ -0,0 +1,1104 @@
+"""
+Pattern recognition over a labeled corpus held in inverted indexes.
+
+Supports the same strategies as StarweaveCore.PatternMatcher on the Elixir
+side, without scanning every stored pattern per query:
+
+* exact: hash lookup of the full pattern text.
+* contains: the query must be a substring of a stored pattern. Candidates
+  are the intersection of the posting lists of the query's character
+  trigrams, then verified with a substring check. With a suffix array
+  (see server.suffix_array) the trigram postings are not kept; matches
+  come from one binary search instead. Either way each match carries the
+  number of occurrences of the query.
+* jaccard: token-set similarity. Tokenization matches PatternMatcher
+  (lowercase, punctuation stripped, whitespace split). Candidates come from
+  the posting lists of the query's rarest tokens (prefix filtering): a
+  pattern with similarity >= min_score must share at least one of the first
+  ``|q| - ceil(min_score * |q|) + 1`` of them. Token postings are split by
+  pattern size, so only sizes that can still reach min_score are read: a
+  pattern first reached through the j-th rarest token shares at most
+  ``|q| - j`` tokens with the query, which bounds its size. Common tokens
+  late in the prefix therefore only contribute short patterns.
+* minhash: approximate jaccard. Candidates are the patterns that share an
+  LSH band key with the query (see server.minhash), then re-scored exactly.
+  Only available when the index was built with a MinHashLSH. Cost depends
+  on bucket sizes rather than on the postings of common tokens. Patterns
+  below the LSH threshold may be missed.
+* scan: the reverse question, which stored patterns occur in the query.
+  One Aho–Corasick pass over the query (see server.aho_corasick) reports
+  every occurrence; matches carry their positions.
+* tfidf: cosine similarity of hashed TF-IDF vectors over the jaccard
+  tokens (see server.tfidf). Rare tokens weigh more than common ones, and
+  every pattern is scored with one sparse matrix product, so the cost does
+  not depend on posting list lengths. search_many scores a whole batch of
+  queries with one matrix product.
+* cosine and dot: top-k by cosine similarity or inner product of dense
+  float32 vectors, for patterns whose metadata declares a vector payload
+  (see server.vectors). Small corpora are searched by brute force, large
+  ones through an HNSW graph. Vector patterns are kept out of the text
+  indexes above, and text patterns out of this one.
+
+Labels of the best matches are aggregated into per-label confidences
+(the best score of any matching pattern that carries the label). Given a
+conversation context, PatternRecognizer first re-ranks a wider set of
+matches by their similarity to it (see server.rerank).
+
+An index can be saved as a snapshot of memory-mapped arrays and loaded back
+without rebuilding anything (see server.snapshot). The loaded snapshot
+serves as a read-only base. Patterns added later go to the in-memory
+indexes above it, and removals of snapshot patterns are recorded as
+tombstones.
+
+Queries take no lock. Every write publishes a new immutable IndexView
+(numbered by a new version) built beside the current one, so a query
+sees one version throughout and never waits for a writer. Results carry
+the version they were searched in, for caches and clients to judge
+staleness.
+"""
+import bisect
+import heapq
+import itertools
+import json
+import logging
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from server.aho_corasick import FlatAutomaton, PatternScanner
+from server.minhash import MinHashLSH
+from server.snapshot import Snapshot, hash_keys, write_snapshot
+from server.suffix_array import SuffixArray, SuffixArrayIndex, count_occurrences
+from server.tfidf import HashedTfidf
+from server.vectors import METRICS, VectorIndex, decode_vector
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("exact", "contains", "jaccard", "minhash", "scan", "tfidf") + METRICS
+DEFAULT_STRATEGY = "contains"  # Same default as StarweaveCore.PatternMatcher.match/3
+DEFAULT_TOP_K = 10
+DEFAULT_MIN_SCORE = 0.2  # Jaccard and cosine cutoff; lower values widen the candidate set
+NGRAM = 3
+_EPSILON = 1e-9  # Keeps size bounds inclusive despite float rounding
+
+_NON_WORD = re.compile(r"[^\w\s]|_", re.UNICODE)
+_VERSIONS = itertools.count(1)
+_NO_DOCS: FrozenSet[int] = frozenset()
+_NO_SIZES: Dict[int, Set[int]] = {}
+
+
+def next_version() -> int:
+    """A new index version. Versions are shared by all indexes, so one also identifies its index."""
+    return next(_VERSIONS)
+
+
+def words(text: str) -> List[str]:
+    """Split text into lowercase word tokens, in order and with repeats."""
+    return _NON_WORD.sub(" ", text.lower()).split()
+
+
+def tokenize(text: str) -> FrozenSet[str]:
+    """Split text into a set of lowercase word tokens."""
+    return frozenset(words(text))
+
+
+def ngrams(text: str, n: int = NGRAM) -> Set[str]:
+    """Return the set of character n-grams of text."""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def decode_pattern_data(data) -> str:
+    """Decode Pattern.data bytes to text."""
+    if isinstance(data, (bytes, bytearray)):
+        return data.decode("utf-8", errors="ignore")
+    return str(data)
+
+
+@dataclass
+class StoredPattern:
+    """A labeled pattern in the corpus."""
+    id: str
+    data: str
+    labels: List[str] = field(default_factory=list)
+    metadata: Dict[str, str] = field(default_factory=dict)
+    vector: Optional[np.ndarray] = None  # Payload of a vector pattern, whose data is then empty
+
+
+@dataclass
+class Match:
+    """A stored pattern that matched a query."""
+    pattern: StoredPattern
+    score: float
+    positions: List[Tuple[int, int]] = field(default_factory=list)  # (start, end) for scan matches
+    count: int = 0  # Occurrences of the query in the pattern for contains matches
+    context_score: Optional[float] = None  # Similarity to the request's context, once re-ranked
+
+
+@dataclass
+class RecognitionResult:
+    """Matches for one query and the labels derived from them."""
+    strategy: str
+    matches: List[Match]
+    labels: List[str]
+    confidences: Dict[str, float]
+    candidates: int = 0
+    version: int = 0  # Index version the query was searched in (see PatternIndex.view)
+
+
+_Entry = Tuple[StoredPattern, FrozenSet[str], Iterable[str]]  # Pattern, its tokens and n-grams
+
+
+class _Segment:
+    """Postings of text patterns numbered from start, added in one or more runs.
+
+    Never changed once published. Removing a pattern publishes a copy whose
+    slot holds None; the pattern's postings keep its number (queries check
+    the slot) until merge() rewrites the segment without it.
+    """
+    __slots__ = ("start", "docs", "doc_tokens", "ids", "exact", "ngrams", "tokens", "live", "removed")
+
+    def __init__(self, start: int, docs: List[Optional[StoredPattern]], doc_tokens: List[Optional[FrozenSet[str]]],
+                 ids: Dict[str, int], exact: Dict[str, Set[int]], grams: Dict[str, Set[int]],
+                 tokens: Dict[str, Dict[int, Set[int]]], live: int, removed: Tuple[_Entry, ...] = ()):
+        self.start = start
+        self.docs = docs
+        self.doc_tokens = doc_tokens
+        self.ids = ids
+        self.exact = exact
+        self.ngrams = grams
+        self.tokens = tokens  # token -> pattern token count -> docs
+        self.live = live
+        self.removed = removed  # (doc, pattern, tokens) of removed patterns still in the postings
+
+    def __len__(self) -> int:
+        # Patterns in the postings, removed or not
+        return self.live + len(self.removed)
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.docs)
+
+    @classmethod
+    def build(cls, start: int, entries: Sequence[_Entry]) -> "_Segment":
+        """A segment of entries numbered from start."""
+        ids: Dict[str, int] = {}
+        exact: Dict[str, Set[int]] = {}
+        grams: Dict[str, Set[int]] = {}
+        tokens: Dict[str, Dict[int, Set[int]]] = {}
+        for doc, (pattern, pattern_tokens, pattern_grams) in enumerate(entries, start):
+            ids[pattern.id] = doc
+            exact.setdefault(pattern.data, set()).add(doc)
+            for gram in pattern_grams:
+                grams.setdefault(gram, set()).add(doc)
+            for token in pattern_tokens:
+                tokens.setdefault(token, {}).setdefault(len(pattern_tokens), set()).add(doc)
+        return cls(start, [pattern for pattern, _, _ in entries], [found for _, found, _ in entries],
+                   ids, exact, grams, tokens, len(entries))
+
+    def without(self, docs: Sequence[int]) -> "_Segment":
+        """A copy with the patterns numbered docs removed."""
+        patterns, doc_tokens, removed = list(self.docs), list(self.doc_tokens), list(self.removed)
+        for doc in docs:
+            slot = doc - self.start
+            removed.append((doc, patterns[slot], doc_tokens[slot]))
+            patterns[slot] = doc_tokens[slot] = None
+        return _Segment(self.start, patterns, doc_tokens, self.ids, self.exact, self.ngrams, self.tokens,
+                        self.live - len(docs), tuple(removed))
+
+    @staticmethod
+    def merge(segments: Sequence["_Segment"], keep_ngrams: bool) -> "_Segment":
+        """One segment holding the live patterns of segments (in order), with removed ones purged."""
+        first = segments[0]
+        docs: List[Optional[StoredPattern]] = []
+        doc_tokens: List[Optional[FrozenSet[str]]] = []
+        for segment in segments:
+            # Segments dropped once empty leave a gap in the numbers
+            gap = [None] * (segment.start - first.start - len(docs))
+            docs += gap + segment.docs
+            doc_tokens += gap + segment.doc_tokens
+        ids, exact, grams, tokens = dict(first.ids), dict(first.exact), dict(first.ngrams), dict(first.tokens)
+        for segment in segments[1:]:
+            ids.update(segment.ids)
+            _union(exact, segment.exact)
+            _union(grams, segment.ngrams)
+            for token, by_size in segment.tokens.items():
+                current = tokens.get(token)
+                tokens[token] = by_size if current is None else _union(dict(current), by_size)
+
+        dead_exact: Dict[str, Set[int]] = {}
+        dead_grams: Dict[str, Set[int]] = {}
+        dead_tokens: Dict[str, Dict[int, Set[int]]] = {}
+        for segment in segments:
+            for doc, pattern, pattern_tokens in segment.removed:
+                if ids.get(pattern.id) == doc:
+                    del ids[pattern.id]
+                dead_exact.setdefault(pattern.data, set()).add(doc)
+                if keep_ngrams:
+                    for gram in ngrams(pattern.data):
+                        dead_grams.setdefault(gram, set()).add(doc)
+                for token in pattern_tokens:
+                    dead_tokens.setdefault(token, {}).setdefault(len(pattern_tokens), set()).add(doc)
+        _subtract(exact, dead_exact)
+        _subtract(grams, dead_grams)
+        for token, by_size in dead_tokens.items():
+            remaining = _subtract(dict(tokens.get(token, {})), by_size)
+            if remaining:
+                tokens[token] = remaining
+            else:
+                tokens.pop(token, None)
+        return _Segment(first.start, docs, doc_tokens, ids, exact, grams, tokens,
+                        sum(segment.live for segment in segments))
+
+
+def _union(postings: Dict, other: Dict) -> Dict:
+    # Adds other's postings to postings (a copy owned by the caller) without changing any set
+    for key, docs in other.items():
+        current = postings.get(key)
+        postings[key] = docs if current is None else current | docs
+    return postings
+
+
+def _subtract(postings: Dict, removed: Dict) -> Dict:
+    # Takes removed's docs out of postings (a copy owned by the caller) without changing any set
+    for key, docs in removed.items():
+        remaining = postings.get(key, _NO_DOCS) - docs
+        if remaining:
+            postings[key] = remaining
+        else:
+            postings.pop(key, None)
+    return postings
+
+
+@dataclass(frozen=True, eq=False)
+class IndexView:
+    """One version of a PatternIndex, searched without taking any lock.
+
+    Writers never change a published view. They build the next version's
+    segments and component states aside (sharing whatever did not change)
+    and publish it as a new view in one assignment; see PatternIndex.view().
+    A reader searches the view it took, so it sees all of a write or none
+    of it. Python frees an old version once its last reader drops it.
+
+    The scanner and suffix array are rebuilt in the background rather than
+    versioned. Their matches are checked against the view, so a pattern
+    added after it is never returned, but one removed after it can be
+    missed once they rebuild.
+    """
+    version: int
+    segments: Tuple[_Segment, ...]
+    next_doc: int  # Pattern numbers below it are taken
+    live: int  # Text patterns, in the segments and the base snapshot
+    base: Optional[Snapshot]  # Patterns numbered below base_docs, read-only
+    base_docs: int
+    base_removed: FrozenSet[int]  # Tombstones of snapshot patterns
+    minhash: Optional[MinHashLSH]
+    minhash_state: Optional[Tuple]
+    tfidf: Optional[HashedTfidf]
+    tfidf_state: Optional[Tuple]
+    vectors: VectorIndex
+    vector_state: Tuple
+    scanner: Optional[PatternScanner]
+    suffix_array: Optional[SuffixArrayIndex]
+    starts: Tuple[int, ...] = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "starts", tuple(segment.start for segment in self.segments))
+
+    def __len__(self) -> int:
+        return self.live + self.vector_state[4]
+
+    def _segment(self, doc: int) -> Optional[_Segment]:
+        position = bisect.bisect_right(self.starts, doc) - 1
+        if position >= 0:
+            segment = self.segments[position]
+            if doc < segment.end:
+                return segment
+        return None
+
+    def _in_base(self, doc: int) -> bool:
+        return doc < self.base_docs and doc not in self.base_removed and self.base.alive(doc)
+
+    def alive(self, doc: int) -> bool:
+        """Whether pattern number doc holds a text pattern in this version."""
+        if doc < self.base_docs:
+            return self._in_base(doc)
+        segment = self._segment(doc)
+        return segment is not None and segment.docs[doc - segment.start] is not None
+
+    def pattern(self, doc: int) -> Optional[StoredPattern]:
+        if doc < self.base_docs:
+            return StoredPattern(*self.base.pattern(doc)) if self._in_base(doc) else None
+        segment = self._segment(doc)
+        return segment.docs[doc - segment.start] if segment is not None else None
+
+    def tokens(self, doc: int) -> FrozenSet[str]:
+        """Tokens of a live pattern."""
+        if doc < self.base_docs:
+            return tokenize(self.base.data(doc))
+        segment = self._segment(doc)
+        return segment.doc_tokens[doc - segment.start]
+
+    def length(self, doc: int) -> int:
+        if doc < self.base_docs:
+            return self.base.length(doc)
+        return len(self.pattern(doc).data)
+
+    def doc_of(self, pattern_id: str) -> Optional[int]:
+        """Number of the live text pattern with this id, or None."""
+        for segment in reversed(self.segments):
+            doc = segment.ids.get(pattern_id)
+            if doc is not None:
+                # Newest first: an id found removed was not added again later
+                return doc if segment.docs[doc - segment.start] is not None else None
+        if self.base is not None:
+            doc = self.base.find_id(pattern_id)
+            if doc is not None and doc not in self.base_removed:
+                return doc
+        return None
+
+    def get(self, pattern_id: str) -> Optional[StoredPattern]:
+        doc = self.doc_of(pattern_id)
+        if doc is not None:
+            return self.pattern(doc)
+        stored = self.vectors.get(pattern_id, self.vector_state)
+        return replace(stored[0], vector=stored[1]) if stored is not None else None
+
+    def live_patterns(self) -> Tuple[List[Tuple[str, int]], int]:
+        """Live (data, pattern number) pairs and the next pattern number."""
+        live = [(pattern.data, doc) for segment in self.segments
+                for doc, pattern in enumerate(segment.docs, segment.start) if pattern is not None]
+        if self.base is not None:
+            base = [(self.base.data(doc), doc) for doc in self.base.live_docs().tolist()
+                    if doc not in self.base_removed]
+            live = base + live
+        return live, self.next_doc
+
+    def search(self, query: str, strategy: str = DEFAULT_STRATEGY, top_k: int = DEFAULT_TOP_K,
+               min_score: float = DEFAULT_MIN_SCORE) -> Tuple[List[Match], int]:
+        """Return the top_k matches for query and the number of candidates examined.
+
+        Queries of the cosine and dot strategies are vectors, or their float32 bytes.
+        """
+        _check_strategy(strategy)
+        if strategy in METRICS:
+            return self._search_vectors([query], strategy, top_k, min_score)[0]
+        if strategy == "scan":
+            return self._search_scan(query, top_k)
+        if strategy == "tfidf":
+            return self._search_tfidf([query], top_k, min_score)[0]
+
+        counts: Dict[int, int] = {}
+        if strategy == "exact":
+            scored = [(1.0, doc) for segment in self.segments for doc in segment.exact.get(query, ())
+                      if segment.docs[doc - segment.start] is not None]
+            if self.base is not None:
+                scored += [(1.0, doc) for doc in self.base.exact(query) if doc not in self.base_removed]
+            candidates = len(scored)
+        elif strategy == "contains":
+            scored, candidates, counts = self._search_contains(query, top_k)
+        elif strategy == "minhash":
+            scored, candidates = self._search_minhash(query, min_score)
+        else:
+            scored, candidates = self._search_jaccard(query, min_score)
+
+        best = heapq.nlargest(top_k, scored, key=lambda item: (item[0], -item[1]))
+        return [Match(self.pattern(doc), score, count=counts.get(doc, 0)) for score, doc in best], candidates
+
+    def search_many(self, queries: List[str], strategy: str = DEFAULT_STRATEGY, top_k: int = DEFAULT_TOP_K,
+                    min_score: float = DEFAULT_MIN_SCORE,
+                    shard_key: Optional[str] = None) -> List[Tuple[List[Match], int]]:
+        """Like search() for each query; tfidf scores the whole batch with one matrix product.
+
+        shard_key only narrows the search of a server.sharding.ShardedIndex; one index is one shard.
+        """
+        _check_strategy(strategy)
+        if strategy == "tfidf":
+            return self._search_tfidf(queries, top_k, min_score)
+        if strategy in METRICS:
+            return self._search_vectors(queries, strategy, top_k, min_score)
+        return [self.search(query, strategy, top_k, min_score) for query in queries]
+
+    def _search_tfidf(self, queries: List[str], top_k: int, min_score: float) -> List[Tuple[List[Match], int]]:
+        if self.tfidf is None:
+            raise ValueError("The tfidf strategy is not enabled on this server")
+        return [([Match(self.pattern(doc), score) for score, doc in scored], candidates)
+                for scored, candidates in self.tfidf.search(queries, top_k, min_score, self.tfidf_state)]
+
+    def _search_vectors(self, queries: List, metric: str, top_k: int,
+                        min_score: float) -> List[Tuple[List[Match], int]]:
+        vectors = [decode_vector(query) for query in queries]
+        return [([Match(pattern, score) for score, pattern in scored], candidates)
+                for scored, candidates in self.vectors.search(vectors, metric, top_k, min_score, self.vector_state)]
+
+    def _search_contains(self, query: str, top_k: int) -> Tuple[List[Tuple[float, int]], int, Dict[int, int]]:
+        if not query:
+            return [], 0, {}
+
+        if self.suffix_array is not None:
+            docs, occurrences, lengths = self.suffix_array.find(query)
+            # Shortest patterns score highest; take the top_k live ones in order
+            scored, counts = [], {}
+            for i in np.lexsort((docs, lengths)).tolist():
+                doc = int(docs[i])
+                if not self.alive(doc):
+                    continue
+                scored.append((len(query) / int(lengths[i]), doc))
+                counts[doc] = int(occurrences[i])
+                if len(scored) == top_k:
+                    break
+            return scored, len(docs), counts
+
+        scored, counts, examined = [], {}, 0
+        if self.base is not None:
+            docs, occurrences, lengths, examined = self.base.contains(query)
+            for doc, count, length in zip(docs, occurrences, lengths):
+                if doc not in self.base_removed:
+                    scored.append((len(query) / length, doc))
+                    counts[doc] = count
+
+        grams = ngrams(query)
+        for segment in self.segments:
+            if grams:
+                postings = sorted((segment.ngrams.get(gram, _NO_DOCS) for gram in grams), key=len)
+                candidates = set(postings[0])
+                for posting in postings[1:]:
+                    if not candidates:
+                        break
+                    candidates &= posting
+            else:
+                # Queries shorter than an n-gram match almost everything; scan
+                candidates = [doc for doc, pattern in enumerate(segment.docs, segment.start) if pattern is not None]
+            examined += len(candidates)
+            for doc in candidates:
+                pattern = segment.docs[doc - segment.start]
+                if pattern is not None and query in pattern.data:
+                    # Rank by how much of the stored pattern the query covers
+                    scored.append((len(query) / len(pattern.data), doc))
+                    counts[doc] = count_occurrences(pattern.data, query)
+        return scored, examined, counts
+
+    def _search_jaccard(self, query: str, min_score: float) -> Tuple[List[Tuple[float, int]], int]:
+        query_tokens = tokenize(query)
+        size = len(query_tokens)
+        if size == 0:
+            return [], 0
+
+        postings = [{token: segment.tokens.get(token, _NO_SIZES) for token in query_tokens}
+                    for segment in self.segments]
+        frequencies = {token: sum(len(docs) for by_token in postings for docs in by_token[token].values())
+                       for token in query_tokens}
+        if self.base is not None:
+            keys = dict(zip(query_tokens, hash_keys(query_tokens).tolist()))
+            for token in query_tokens:
+                frequencies[token] += self.base.token_count(keys[token])
+
+        # Rarest tokens first; only the prefix can produce matches above min_score
+        ordered = sorted(query_tokens, key=frequencies.get)
+        required_overlap = max(1, math.ceil(min_score * size))
+        prefix = ordered[:size - required_overlap + 1]
+
+        min_size = min_score * size - _EPSILON
+        candidates: List[Set[int]] = [set() for _ in self.segments]
+        base_candidates = []
+        for position, token in enumerate(prefix):
+            if min_score > 0:
+                # overlap <= size - position and overlap >= min_score * (size + n) / (1 + min_score)
+                max_size = (size - position) * (1 + min_score) / min_score - size + _EPSILON
+            else:
+                max_size = float("inf")
+            for found, by_token in zip(candidates, postings):
+                for doc_size, docs in by_token[token].items():
+                    if min_size <= doc_size <= max_size:
+                        found.update(docs)
+            if self.base is not None:
+                base_candidates.append(self.base.token_docs(keys[token], min_size, max_size))
+
+        base_docs = np.unique(np.concatenate(base_candidates)).tolist() if base_candidates else []
+        scored = self._score_jaccard(query_tokens, zip(self.segments, candidates), base_docs, min_score)
+        return scored, sum(len(found) for found in candidates) + len(base_docs)
+
+    def _search_minhash(self, query: str, min_score: float) -> Tuple[List[Tuple[float, int]], int]:
+        if self.minhash is None:
+            raise ValueError("The minhash strategy is not enabled on this server")
+        query_tokens = tokenize(query)
+        candidates = self.minhash.candidates(query_tokens, self.minhash_state)  # Sorted
+        bounds = np.searchsorted(candidates, [self.base_docs] + [bound for segment in self.segments
+                                                                 for bound in (segment.start, segment.end)])
+        per_segment = [(segment, candidates[bounds[2 * i + 1]:bounds[2 * i + 2]].tolist())
+                       for i, segment in enumerate(self.segments)]
+        scored = self._score_jaccard(query_tokens, per_segment, candidates[:bounds[0]].tolist(), min_score)
+        return scored, len(candidates)
+
+    def _search_scan(self, query: str, top_k: int) -> Tuple[List[Match], int]:
+        if self.scanner is None:
+            raise ValueError("The scan strategy is not enabled on this server")
+
+        positions: Dict[int, List[Tuple[int, int]]] = {}
+        for doc, start, end in self.scanner.scan(query):
+            positions.setdefault(doc, []).append((start, end))
+
+        scored = [(self.length(doc) / len(query), doc) for doc in positions if self.alive(doc)]
+        best = heapq.nlargest(top_k, scored, key=lambda item: (item[0], -item[1]))
+        return [Match(self.pattern(doc), score, sorted(positions[doc])) for score, doc in best], len(positions)
+
+    def _score_jaccard(self, query_tokens: FrozenSet[str], candidates: Iterable[Tuple[_Segment, Iterable[int]]],
+                       base_docs: List[int], min_score: float) -> List[Tuple[float, int]]:
+        size = len(query_tokens)
+        scored = []
+        for segment, docs in candidates:
+            doc_tokens, start = segment.doc_tokens, segment.start
+            for doc in docs:
+                tokens = doc_tokens[doc - start]
+                if tokens is None:
+                    continue  # Removed, but not yet purged from the postings
+                overlap = len(query_tokens & tokens)
+                score = overlap / (size + len(tokens) - overlap)
+                if score > 0 and score >= min_score:
+                    scored.append((score, doc))
+
+        base_docs = [doc for doc in base_docs if self._in_base(doc)]
+        if base_docs:
+            # Snapshot patterns are scored together from their token hashes
+            base_docs = np.array(base_docs, dtype=np.int64)
+            overlaps, sizes = self.base.overlaps(np.sort(hash_keys(query_tokens)), base_docs)
+            scores = overlaps / (size + sizes - overlaps)
+            keep = (scores > 0) & (scores >= min_score)
+            scored += zip(scores[keep].tolist(), base_docs[keep].tolist())
+        return scored
+
+
+class PatternIndex:
+    """Labeled pattern corpus with exact, substring and token inverted indexes.
+
+    Text patterns are numbered internally, and numbers are never reused.
+    After load(), numbers below the snapshot's count live in the snapshot.
+    Later ones live in segments: each write adds one, and a segment merges
+    with its predecessor while that one is at most twice its size (like
+    the TF-IDF blocks), so postings are rewritten O(log n) times each.
+
+    Queries never lock. They search the current IndexView; writers take
+    the index lock, build the next version beside it and publish it whole.
+
+    Args:
+        minhash: Optional MinHashLSH enabling the "minhash" strategy
+        scan: Compile patterns into an Aho–Corasick scanner for the "scan" strategy
+        suffix_array: Answer "contains" from a suffix array instead of trigram postings
+        suffix_array_dir: Directory to memory-map the suffix array from (and save
+            it to when missing or stale); implies suffix_array
+        tfidf: Keep hashed TF-IDF vectors for the "tfidf" strategy
+        vectors: VectorIndex holding vector patterns for the "cosine" and "dot"
+            strategies (one with default settings if None)
+    """
+
+    def __init__(self, minhash: Optional[MinHashLSH] = None, scan: bool = True, suffix_array: bool = False,
+                 suffix_array_dir: Optional[str] = None, tfidf: bool = True, vectors: Optional[VectorIndex] = None):
+        self._minhash = minhash
+        self._lock = threading.Lock()  # Serializes writers; readers never take it
+        self._scanner = PatternScanner(self._live_patterns) if scan else None
+        self._suffix_array_dir = suffix_array_dir
+        use_suffix_array = suffix_array or suffix_array_dir is not None
+        self._suffix_array = SuffixArrayIndex(self._live_patterns) if use_suffix_array else None
+        self._tfidf = HashedTfidf(words) if tfidf else None
+        self._vectors = vectors if vectors is not None else VectorIndex()
+        self._save_lock = threading.Lock()
+        self.snapshot_dir: Optional[str] = None  # Last saved to or loaded from
+        self._view = IndexView(
+            version=next_version(), segments=(), next_doc=0, live=0, base=None, base_docs=0,
+            base_removed=frozenset(), minhash=minhash, minhash_state=minhash.state if minhash is not None else None,
+            tfidf=self._tfidf, tfidf_state=self._tfidf.state if self._tfidf is not None else None,
+            vectors=self._vectors, vector_state=self._vectors.state, scanner=self._scanner,
+            suffix_array=self._suffix_array)
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def view(self) -> IndexView:
+        """The current version; search it to see one consistent version throughout."""
+        return self._view
+
+    @property
+    def version(self) -> int:
+        """Changes whenever patterns are added or removed."""
+        return self._view.version
+
+    def _publish(self, **changes) -> None:
+        # With the lock held: install the next view, with the components' current states
+        version = changes.pop("version", None) or next_version()
+        self._view = replace(
+            self._view, version=version,
+            minhash_state=self._minhash.state if self._minhash is not None else None,
+            tfidf_state=self._tfidf.state if self._tfidf is not None else None,
+            vector_state=self._vectors.state, **changes)
+
+    def add(self, pattern_id: str, data: str, labels: Optional[Iterable[str]] = None,
+            metadata: Optional[Dict[str, str]] = None) -> None:
+        """Add a pattern, replacing any existing pattern with the same id."""
+        self.add_many([StoredPattern(
+            id=pattern_id,
+            data=data,
+            labels=list(labels or []),
+            metadata=dict(metadata or {}),
+        )])
+
+    def add_many(self, patterns: Iterable[StoredPattern], rebuild: bool = False) -> int:
+        """Add patterns in bulk and return how many replaced an existing pattern.
+
+        Tokens, n-grams and TF-IDF rows are computed before taking the index
+        lock, and MinHash signatures in one batch. The batch becomes one new
+        version: queries see all of it or none of it, and never wait for it.
+        Vector patterns go to the VectorIndex, before the text patterns of
+        the batch. Of several patterns with one id, the last one is kept.
+
+        Args:
+            patterns: Patterns to add
+            rebuild: Rebuild the scanner and suffix array (and merge the MinHash
+                band arrays) right away instead of queueing the patterns in their
+                deltas (for bulk loads)
+
+        Raises:
+            ValueError: A vector's length differs from the others' (nothing is added)
+        """
+        patterns = list(patterns)
+        vector_patterns = [pattern for pattern in patterns if pattern.vector is not None]
+        if vector_patterns:
+            patterns = [pattern for pattern in patterns if pattern.vector is None]
+        last = {pattern.id: position for position, pattern in enumerate(patterns)}
+        if len(last) < len(patterns):
+            patterns = [pattern for position, pattern in enumerate(patterns) if last[pattern.id] == position]
+        keep_ngrams = self._suffix_array is None
+        prepared = [(pattern, tokenize(pattern.data), ngrams(pattern.data) if keep_ngrams else ())
+                    for pattern in patterns]
+        vectors = (self._tfidf.vectors([pattern.data for pattern in patterns])
+                   if self._tfidf is not None and patterns else None)
+
+        replaced = 0
+        with self._lock:
+            view = self._view
+            removed: Set[int] = set()
+            if vector_patterns:
+                replaced += self._vectors.add([replace(pattern, vector=None) for pattern in vector_patterns],
+                                              [pattern.vector for pattern in vector_patterns])
+                for pattern in vector_patterns:
+                    doc = view.doc_of(pattern.id)
+                    if doc is not None and doc not in removed:
+                        removed.add(doc)
+                        replaced += 1
+            vector_ids = []
+            for pattern, _, _ in prepared:
+                doc = view.doc_of(pattern.id)
+                if doc is not None and doc not in removed:
+                    removed.add(doc)
+                    replaced += 1
+                elif pattern.id in self._vectors:
+                    vector_ids.append(pattern.id)
+            replaced += self._vectors.remove_many(vector_ids)
+            segments, base_removed = self._remove_docs(view, removed)
+
+            docs = list(range(view.next_doc, view.next_doc + len(prepared)))
+            if docs:
+                segments = self._append_segment(segments, _Segment.build(view.next_doc, prepared))
+                if self._minhash is not None:
+                    self._minhash.add(docs, [tokens for _, tokens, _ in prepared])
+                if self._tfidf is not None:
+                    self._tfidf.add_vectors(docs, vectors)
+            if self._tfidf is not None:
+                self._tfidf.publish()
+            self._publish(segments=segments, next_doc=view.next_doc + len(docs),
+                          live=view.live - len(removed) + len(docs), base_removed=base_removed)
+            if not rebuild:
+                for background in (self._scanner, self._suffix_array):
+                    if background is not None:
+                        background.add((pattern.data, doc) for doc, (pattern, _, _) in zip(docs, prepared))
+        if rebuild:
+            self.rebuild()
+            if self._minhash is not None:
+                with self._lock:
+                    self._minhash.merge()
+                    self._publish(version=self._view.version)  # Same patterns, so the same version
+        return replaced
+
+    def _remove_docs(self, view: IndexView, docs: Set[int]) -> Tuple[Tuple[_Segment, ...], FrozenSet[int]]:
+        # With the lock held: take live patterns out of the components; return the segments
+        # and snapshot tombstones for the next view
+        if not docs:
+            return view.segments, view.base_removed
+        texts, with_tokens, base_docs = [], [], []
+        by_segment: Dict[int, List[int]] = {}
+        for doc in sorted(docs):
+            if doc < view.base_docs:
+                # Snapshot pattern: its postings are read-only, so queries skip tombstones
+                base_docs.append(doc)
+                texts.append(view.base.data(doc))
+                has_tokens = view.base.token_size(doc) > 0
+            else:
+                position = bisect.bisect_right(view.starts, doc) - 1
+                segment = view.segments[position]
+                by_segment.setdefault(position, []).append(doc)
+                texts.append(segment.docs[doc - segment.start].data)
+                has_tokens = bool(segment.doc_tokens[doc - segment.start])
+            if has_tokens:
+                with_tokens.append(doc)
+        if self._minhash is not None:
+            self._minhash.remove_many(with_tokens)
+        if self._tfidf is not None:
+            self._tfidf.remove_many(sorted(docs), texts)
+        for background in (self._scanner, self._suffix_array):
+            if background is not None:
+                background.removed()
+
+        segments = list(view.segments)
+        keep_ngrams = self._suffix_array is None
+        for position, removed in by_segment.items():
+            segment = segments[position].without(removed)
+            if 4 * len(segment.removed) > len(segment):
+                segment = _Segment.merge([segment], keep_ngrams)
+            segments[position] = segment
+        return (tuple(segment for segment in segments if len(segment)),
+                view.base_removed | frozenset(base_docs) if base_docs else view.base_removed)
+
+    def _append_segment(self, segments: Tuple[_Segment, ...], segment: _Segment) -> Tuple[_Segment, ...]:
+        segments = list(segments) + [segment]
+        keep_ngrams = self._suffix_array is None
+        while len(segments) > 1 and len(segments[-2]) <= 2 * len(segments[-1]):
+            newer = segments.pop()
+            segments[-1] = _Segment.merge([segments[-1], newer], keep_ngrams)
+        return tuple(segments)
+
+    def defer_rebuilds(self) -> None:
+        """Hold background rebuilds of the scanner and suffix array (e.g. during ingestion).
+
+        Patterns added meanwhile are searched directly from the deltas. Every
+        call must be matched by resume_rebuilds(), which rebuilds once.
+        """
+        for background in (self._scanner, self._suffix_array):
+            if background is not None:
+                background.defer()
+
+    def resume_rebuilds(self) -> None:
+        """Release defer_rebuilds() and rebuild in the background if patterns changed."""
+        for background in (self._scanner, self._suffix_array):
+            if background is not None:
+                background.resume()
+
+    def rebuild(self) -> None:
+        """Rebuild the scanner and suffix array synchronously.
+
+        With suffix_array_dir, the saved suffix array is memory-mapped if it
+        matches the current patterns, and rebuilt and saved otherwise. Later
+        background rebuilds stay in memory.
+        """
+        if self._scanner is not None:
+            self._scanner.rebuild()
+        if self._suffix_array is not None:
+            self._suffix_array.rebuild(self._load_suffix_array if self._suffix_array_dir else None)
+
+    def _load_suffix_array(self) -> Tuple[SuffixArray, int]:
+        view = self._view
+        array, ids = SuffixArray.load(self._suffix_array_dir)
+        docs = [view.doc_of(pattern_id) for pattern_id in ids]
+        if array is not None and len(docs) == view.live and None not in docs:
+            expected = [view.length(doc) for doc in docs]
+            if np.array_equal(array.lengths, expected):
+                array.docs = np.array(docs, dtype=np.int64)
+                logger.info(f"Memory-mapped suffix array from {self._suffix_array_dir}")
+                return array, view.next_doc
+
+        patterns, watermark = view.live_patterns()
+        built = SuffixArray.build(patterns)
+        built.save(self._suffix_array_dir, [view.pattern(doc).id for _, doc in patterns])
+        array, _ = SuffixArray.load(self._suffix_array_dir)
+        array.docs = built.docs
+        logger.info(f"Built suffix array over {len(patterns)} patterns in {self._suffix_array_dir}")
+        return array, watermark
+
+    def remove(self, pattern_id: str) -> bool:
+        """Remove a pattern; return False if it was not present."""
+        return self.remove_many([pattern_id]) > 0
+
+    def remove_many(self, pattern_ids: Iterable[str]) -> int:
+        """Remove patterns, as one new version; return how many were present."""
+        with self._lock:
+            view = self._view
+            docs: Set[int] = set()
+            vector_ids = []
+            for pattern_id in pattern_ids:
+                doc = view.doc_of(pattern_id)
+                if doc is not None:
+                    docs.add(doc)
+                else:
+                    vector_ids.append(pattern_id)
+            removed = len(docs) + self._vectors.remove_many(vector_ids)
+            if removed:
+                segments, base_removed = self._remove_docs(view, docs)
+                if self._tfidf is not None:
+                    self._tfidf.publish()
+                self._publish(segments=segments, base_removed=base_removed, live=view.live - len(docs))
+            return removed
+
+    def get(self, pattern_id: str) -> Optional[StoredPattern]:
+        return self._view.get(pattern_id)
+
+    def search(self, query: str, strategy: str = DEFAULT_STRATEGY, top_k: int = DEFAULT_TOP_K,
+               min_score: float = DEFAULT_MIN_SCORE) -> Tuple[List[Match], int]:
+        """Search the current version (see IndexView.search)."""
+        return self._view.search(query, strategy, top_k, min_score)
+
+    def search_many(self, queries: List[str], strategy: str = DEFAULT_STRATEGY, top_k: int = DEFAULT_TOP_K,
+                    min_score: float = DEFAULT_MIN_SCORE,
+                    shard_key: Optional[str] = None) -> List[Tuple[List[Match], int]]:
+        """Search the current version (see IndexView.search_many)."""
+        return self._view.search_many(queries, strategy, top_k, min_score, shard_key)
+
+    def _live_patterns(self) -> Tuple[List[Tuple[str, int]], int]:
+        # Source for the background indexes
+        return self._view.live_patterns()
+
+    def stats(self) -> Dict[str, int]:
+        view = self._view
+        stats = {
+            "patterns": len(view),
+            "tokens": len(set().union(*(segment.tokens for segment in view.segments))),
+            "ngrams": len(set().union(*(segment.ngrams for segment in view.segments))),
+            "segments": len(view.segments),
+        }
+        if self._minhash is not None:
+            stats.update(self._minhash.stats())
+        if self._tfidf is not None:
+            stats.update(self._tfidf.stats())
+        stats.update(self._vectors.stats())
+        if view.base is not None:
+            stats["snapshot_patterns"] = len(view.base) - len(view.base_removed)
+        for background in (self._scanner, self._suffix_array):
+            if background is not None:
+                stats.update(background.stats())
+        return stats
+
+    def save(self, directory: str) -> None:
+        """Write a snapshot of the current version to directory, replacing any snapshot there.
+
+        The index lock is held only while the version and the background
+        indexes' states are captured, so queries and writes continue while
+        the arrays are computed and written.
+        """
+        with self._save_lock:
+            started = time.perf_counter()
+            with self._lock:
+                view = self._view
+                states = {name: background.state for name, background in
+                          (("scanner", self._scanner), ("suffix_array", self._suffix_array)) if background is not None}
+
+            components = {}
+            if self._minhash is not None:
+                components["minhash"] = self._minhash.export(view.minhash_state)
+            if self._tfidf is not None:
+                components["tfidf"] = self._tfidf.export(view.tfidf_state)
+            if view.vector_state[0]:
+                components["vectors"] = self._vectors.export(view.vector_state)
+            for name, (built, delta) in states.items():
+                components[name] = dict(built.export(), delta_docs=np.array([doc for _, doc in delta], dtype=np.int64))
+            patterns, token_sets = [], []
+            for doc in range(view.next_doc):
+                pattern = view.pattern(doc)
+                patterns.append((pattern.id, pattern.data, pattern.labels, pattern.metadata) if pattern else None)
+                token_sets.append(view.tokens(doc) if pattern else None)
+            write_snapshot(directory, patterns, token_sets, components)
+            self.snapshot_dir = directory
+            logger.info(f"Saved {len(view)} patterns to {directory} "
+                        f"in {time.perf_counter() - started:.1f}s")
+
+    @classmethod
+    def load(cls, directory: str, minhash: Optional[MinHashLSH] = None, scan: bool = True,
+             suffix_array: bool = False, tfidf: bool = True,
+             vectors: Optional[VectorIndex] = None) -> Optional["PatternIndex"]:
+        """Open a snapshot written by save(); None if directory holds none.
+
+        Arrays are memory-mapped, not read. Components enabled here but missing
+        from the snapshot (or saved with other parameters) are built from the
+        snapshot's patterns. The remaining arguments are as for PatternIndex.
+
+        Raises:
+            ValueError: The snapshot has an unsupported format version
+        """
+        started = time.perf_counter()
+        snapshot = Snapshot.load(directory)
+        if snapshot is None:
+            return None
+        index = cls(minhash=minhash, scan=scan, suffix_array=suffix_array, tfidf=tfidf, vectors=vectors)
+        index._restore(snapshot)
+        index.snapshot_dir = directory
+        logger.info(f"Loaded {len(index)} patterns from {directory} in {time.perf_counter() - started:.3f}s")
+        return index
+
+    def _restore(self, snapshot: Snapshot) -> None:
+        live = snapshot.live_docs()
+
+        if self._minhash is not None:
+            arrays = snapshot.component("minhash")
+            if arrays is None or not self._minhash.restore(arrays):
+                logger.info("Snapshot has no matching MinHash index; building it")
+                self._minhash.add(live.tolist(), [tokenize(snapshot.data(doc)) for doc in live.tolist()])
+                self._minhash.merge()
+        if self._tfidf is not None:
+            arrays = snapshot.component("tfidf")
+            if arrays is None or not self._tfidf.restore(arrays):
+                logger.info("Snapshot has no matching TF-IDF index; building it")
+                self._tfidf.add(live.tolist(), [snapshot.data(doc) for doc in live.tolist()])
+                self._tfidf.publish()
+        arrays = snapshot.component("vectors")
+        if arrays is not None:
+            self._vectors.restore(arrays, lambda pattern_id, labels, metadata: StoredPattern(
+                pattern_id, "", labels, metadata))
+        with self._lock:
+            self._publish(segments=(), next_doc=snapshot.docs, live=len(snapshot), base=snapshot,
+                          base_docs=snapshot.docs, base_removed=frozenset())
+
+        for name, background, restore in (("scanner", self._scanner, FlatAutomaton),
+                                          ("suffix_array", self._suffix_array, _restore_suffix_array)):
+            if background is None:
+                continue
+            arrays = snapshot.component(name)
+            if arrays is None:
+                logger.info(f"Snapshot has no {name}; building it")
+                background.rebuild()
+                continue
+            delta = [(snapshot.data(doc), doc) for doc in arrays.pop("delta_docs").tolist() if snapshot.alive(doc)]
+            background.restore(restore(arrays), delta)
+
+    @classmethod
+    def from_file(cls, path: str, minhash: Optional[MinHashLSH] = None, scan: bool = True,
+                  suffix_array: bool = False, suffix_array_dir: Optional[str] = None,
+                  tfidf: bool = True, vectors: Optional[VectorIndex] = None) -> "PatternIndex":
+        """Build an index from a JSON array or JSON-lines file of patterns (see read_patterns).
+
+        The remaining arguments are as for PatternIndex.
+        """
+        index = cls(minhash=minhash, scan=scan, suffix_array=suffix_array, suffix_array_dir=suffix_array_dir,
+                    tfidf=tfidf, vectors=vectors)
+        index.add_many(read_patterns(path), rebuild=True)
+        return index
+
+    def close(self) -> None:
+        """Release resources held outside the process; nothing for an in-process index."""
+
+
+def read_patterns(path: str) -> List[StoredPattern]:
+    """Read a JSON array or JSON-lines file of patterns.
+
+    Each entry has "id" and "data", plus optional "labels" (or a single
+    "label") and "metadata". A vector pattern has a "vector" list of
+    numbers instead of "data".
+    """
+    with open(path, "r") as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        entries = json.loads(stripped)
+    else:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    patterns = []
+    for entry in entries:
+        labels = entry.get("labels")
+        if labels is None and "label" in entry:
+            labels = [entry["label"]]
+        vector = entry.get("vector")
+        patterns.append(StoredPattern(
+            id=str(entry["id"]),
+            data=str(entry.get("data", "")),
+            labels=list(labels or []),
+            metadata=dict(entry.get("metadata") or {}),
+            vector=np.asarray(vector, dtype=np.float32) if vector is not None else None,
+        ))
+    return patterns
+
+
+def _check_strategy(strategy: str) -> None:
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy} (expected one of {', '.join(STRATEGIES)})")
+
+
+def _restore_suffix_array(arrays: Dict[str, np.ndarray]) -> SuffixArray:
+    return SuffixArray(**arrays)
+
+
+class PatternRecognizer:
+    """Turns index matches into labels and confidences.
+
+    With a context, matches are re-ranked by their similarity to it (see
+    server.rerank) before labels are derived.
+    """
+
+    def __init__(self, index: Optional[PatternIndex] = None, default_strategy: str = DEFAULT_STRATEGY,
+                 top_k: int = DEFAULT_TOP_K, min_score: float = DEFAULT_MIN_SCORE, reranker=None):
+        if reranker is None:
+            from server.rerank import ContextReranker  # server.rerank imports this module
+            reranker = ContextReranker()
+        self.index = index if index is not None else PatternIndex()
+        self.default_strategy = default_strategy
+        self.top_k = top_k
+        self.min_score = min_score
+        self.reranker = reranker
+
+    def recognize(self, data, strategy: Optional[str] = None, top_k: Optional[int] = None,
+                  min_score: Optional[float] = None, context: Optional[Dict[str, float]] = None,
+                  context_weight: Optional[float] = None, shard_key: Optional[str] = None) -> RecognitionResult:
+        """Match pattern data against the corpus.
+
+        Args:
+            data: Pattern data (bytes are decoded as UTF-8, except as vectors for cosine and dot)
+            strategy: "exact", "contains", "jaccard", "minhash", "scan", "tfidf", "cosine" or "dot"
+            top_k: Maximum number of matching patterns to consider
+            min_score: Minimum Jaccard or cosine similarity (jaccard, minhash and tfidf strategies)
+            context: Context feature vector to re-rank by (see server.rerank.ContextSession)
+            context_weight: Share of the context similarity in the score (reranker default if None)
+            shard_key: Only search the shard of this key (see server.sharding)
+        """
+        return self.recognize_many([data], strategy, top_k, min_score,
+                                   None if context is None else [context], context_weight, shard_key)[0]
+
+    def recognize_many(self, data: List, strategy: Optional[str] = None, top_k: Optional[int] = None,
+                       min_score: Optional[float] = None, contexts: Optional[List[Dict[str, float]]] = None,
+                       context_weight: Optional[float] = None,
+                       shard_key: Optional[str] = None) -> List[RecognitionResult]:
+        """Like recognize() for each item of data (and its context), searched with one
+        search_many call on one version of the index (only in the shard of shard_key, if given)."""
+        strategy = strategy or self.default_strategy
+        top_k = top_k or self.top_k
+        vectors = strategy in METRICS
+        # Context features are textual, so vector matches keep their order
+        rerank = contexts is not None and any(contexts) and context_weight != 0.0 and not vectors
+        view = self.index.view()  # One version for the whole batch
+        searched = view.search_many(
+            list(data) if vectors else [decode_pattern_data(item) for item in data],
+            strategy=strategy,
+            top_k=self.reranker.candidates(top_k) if rerank else top_k,
+            min_score=self.min_score if min_score is None else min_score,
+            shard_key=shard_key,
+        )
+        if rerank:
+            searched = [(self.reranker.rerank(matches, context, top_k, context_weight), candidates)
+                        for (matches, candidates), context in zip(searched, contexts)]
+        return [self._result(strategy, matches, candidates, view.version) for matches, candidates in searched]
+
+    @staticmethod
+    def _result(strategy: str, matches: List[Match], candidates: int, version: int) -> RecognitionResult:
+        confidences: Dict[str, float] = {}
+        for match in matches:
+            for label in match.pattern.labels or [match.pattern.id]:
+                if match.score > confidences.get(label, 0.0):
+                    confidences[label] = match.score
+        labels = sorted(confidences, key=lambda label: (-confidences[label], label))
+
+        return RecognitionResult(
+            strategy=strategy,
+            matches=matches,
+            labels=labels,
+            confidences={label: round(confidences[label], 6) for label in labels},
+            candidates=candidates,
+            version=version,
+        )
@@ -0,0 +1,176 @@
+"""
+Re-ranking of recognition candidates against conversation context.
+
+PatternRequest.context carries the caller's conversation, one entry per
+turn (entries of the form ``key=value`` are request options instead).
+Recognition becomes two-phase: the pattern index retrieves ``depth`` times
+top_k candidates with the requested strategy, and ContextReranker blends
+each candidate's retrieval score with its cosine similarity to the context:
+
+    score = (1 - weight) * retrieval score + weight * context similarity
+
+Both parts lie in [0, 1], so the blend does too, and labels and
+confidences follow the blended scores.
+
+Context features are sparse bags of the jaccard tokens with sublinear term
+frequencies (1 + log tf), one L2-normalized vector per entry. The context
+vector is the sum of its entry vectors, each scaled by ``decay`` per turn
+it lies behind the latest one, normalized again. A ContextSession caches
+entry vectors, and the combined vector of the last context it saw, so a
+stream whose messages repeat or extend the same conversation computes
+features only for new entries.
+"""
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from server.recognition import Match, words
+
+DEFAULT_WEIGHT = 0.3
+DEFAULT_DEPTH = 4  # Candidates retrieved per top_k match when re-ranking
+DEFAULT_DECAY = 0.8
+DEFAULT_SESSION_ENTRIES = 256
+DEFAULT_SESSIONS = 1024
+
+Features = Dict[str, float]
+
+
+def text_features(text: str) -> Features:
+    """L2-normalized sublinear term frequencies of the jaccard tokens of text."""
+    weights = {token: 1.0 + math.log(count) for token, count in Counter(words(text)).items()}
+    return _normalized(weights)
+
+
+def _normalized(weights: Features) -> Features:
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    return {token: weight / norm for token, weight in weights.items()} if norm > 0 else {}
+
+
+def similarity(features: Features, other: Features) -> float:
+    """Cosine similarity of two normalized feature vectors."""
+    if len(features) > len(other):
+        features, other = other, features
+    return sum(weight * other.get(token, 0.0) for token, weight in features.items())
+
+
+class ContextSession:
+    """Context feature cache for one stream or client session.
+
+    Args:
+        decay: Weight of an entry relative to the entry after it
+        max_entries: Entry vectors kept, least recently used dropped first
+    """
+
+    def __init__(self, decay: float = DEFAULT_DECAY, max_entries: int = DEFAULT_SESSION_ENTRIES):
+        self.decay = decay
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Features]" = OrderedDict()
+        self._last: Tuple[Tuple[str, ...], Features] = ((), {})
+        self._lock = threading.Lock()  # A stream's batches may be scored concurrently
+
+    def features(self, entries: Sequence[str]) -> Features:
+        """Context vector of entries, oldest first; empty without entries."""
+        entries = tuple(entries)
+        if not entries:
+            return {}
+        with self._lock:
+            if entries == self._last[0]:
+                self.hits += 1
+                return self._last[1]
+            combined: Features = {}
+            scale = 1.0
+            for entry in reversed(entries):
+                for token, weight in self._entry(entry).items():
+                    combined[token] = combined.get(token, 0.0) + scale * weight
+                scale *= self.decay
+            features = _normalized(combined)
+            self._last = (entries, features)
+            return features
+
+    def _entry(self, entry: str) -> Features:
+        features = self._entries.get(entry)
+        if features is not None:
+            self.hits += 1
+            self._entries.move_to_end(entry)
+            return features
+        self.misses += 1
+        features = self._entries[entry] = text_features(entry)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return features
+
+
+class ContextSessions:
+    """ContextSessions by session id, least recently used dropped first."""
+
+    def __init__(self, max_sessions: int = DEFAULT_SESSIONS, decay: float = DEFAULT_DECAY,
+                 max_entries: int = DEFAULT_SESSION_ENTRIES):
+        self.max_sessions = max_sessions
+        self.decay = decay
+        self.max_entries = max_entries
+        self._sessions: "OrderedDict[str, ContextSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def new(self) -> ContextSession:
+        """A session that is not shared, e.g. for one stream."""
+        return ContextSession(self.decay, self.max_entries)
+
+    def get(self, session_id: str) -> ContextSession:
+        """The session for session_id, created on first use."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = self.new()
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "context_sessions": len(sessions),
+            "context_cache_hits": sum(session.hits for session in sessions),
+            "context_cache_misses": sum(session.misses for session in sessions),
+        }
+
+
+class ContextReranker:
+    """Re-orders retrieved matches by their similarity to a context vector.
+
+    Args:
+        weight: Default share of the context similarity in the blended score
+        depth: Candidates to retrieve per match kept, see candidates()
+    """
+
+    def __init__(self, weight: float = DEFAULT_WEIGHT, depth: int = DEFAULT_DEPTH):
+        if not 0.0 <= weight <= 1.0:
+            raise ValueError("context weight must be between 0 and 1")
+        self.weight = weight
+        self.depth = depth
+
+    def candidates(self, top_k: int) -> int:
+        """Number of matches to retrieve so that top_k survive re-ranking."""
+        return top_k * self.depth
+
+    def rerank(self, matches: List[Match], context: Features, top_k: int,
+               weight: Optional[float] = None) -> List[Match]:
+        """Blend each match's score with its context similarity and keep the best top_k.
+
+        Matches keep their retrieval order among equal blended scores.
+        """
+        weight = self.weight if weight is None else weight
+        if not context or weight == 0.0:
+            return matches[:top_k]
+        for match in matches:
+            match.context_score = similarity(text_features(match.pattern.data), context)
+            match.score = (1.0 - weight) * match.score + weight * match.context_score
+        return sorted(matches, key=lambda match: -match.score)[:top_k]
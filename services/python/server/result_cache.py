@@ -0,0 +1,113 @@
+"""
+Bounded LRU/TTL cache of recognition results.
+
+Callers re-send identical payloads (retries, periodic re-evaluation,
+duplicate events). Results are cached under a 16-byte BLAKE2b digest of
+the pattern data, the parsed recognition options and the context entries,
+so the cache does not hold on to payloads.
+
+Every entry belongs to the index version it was computed against (see
+PatternIndex.version). The first lookup or store with a newer version
+drops the whole cache. A result computed while the index changed is not
+stored, because its version is no longer current. Entries also expire ttl
+seconds after they were stored. Beyond max_entries, the least recently
+used entry is evicted.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 300.0
+
+
+def result_key(data: bytes, options: Tuple, context: Sequence[str]) -> bytes:
+    """Cache key for pattern data recognized with options under context entries."""
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(repr(options).encode("utf-8"))
+    for entry in context:
+        digest.update(b"\0")
+        digest.update(entry.strip().encode("utf-8"))
+    return digest.digest()
+
+
+class ResultCache:
+    """Thread-safe LRU/TTL cache of results for one index version at a time.
+
+    Args:
+        max_entries: Results kept; 0 disables the cache
+        ttl: Seconds a result stays valid after it is stored
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, Any]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self, version: int) -> bool:
+        # Called with the lock held; False for a version older than the cache's
+        if self._version is None or version > self._version:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self._version = version
+        return version == self._version
+
+    def get(self, key: bytes, version: int) -> Optional[Any]:
+        """The result stored under key for this index version, or None."""
+        if not self.max_entries:
+            return None
+        with self._lock:
+            entry = self._entries.get(key) if self._check_version(version) else None
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: bytes, result: Any, version: int) -> None:
+        """Store a result computed against this index version (dropped if it is outdated)."""
+        if not self.max_entries:
+            return
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "result_cache_entries": len(self._entries),
+                "result_cache_hits": self.hits,
+                "result_cache_misses": self.misses,
+                "result_cache_hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "result_cache_evictions": self.evictions,
+                "result_cache_expirations": self.expirations,
+                "result_cache_invalidations": self.invalidations,
+            }
@@ -0,0 +1,464 @@
+"""
+Per-RPC metrics for the STARWEAVE gRPC services, with a local Prometheus-style exporter.
+
+MetricsInterceptor (AsyncMetricsInterceptor on grpc.aio servers) records
+every call of every method: calls started and finished (their difference
+is the in-flight gauge), a latency histogram, request and response
+messages and bytes, and the status codes returned. Each thread counts
+into its own table that no other thread writes, so recording takes no
+lock; readers sum the tables. The table of a thread that exits (such as
+a stream's request reader) is folded into a shared total, so short-lived
+threads do not pile up tables. Counts are never reset, so a scraper can
+take rates. The threaded server only learns of a cancellation through
+the handler, so a client that cancels as its handler finishes is counted
+with the handler's code.
+
+process_stats() reports resident memory, CPU time and threads, and the
+saturation of the server's worker threads is its in-flight calls over
+the workers (above 1, calls wait for a thread or a recognition worker).
+MetricsExporter serves all of it in the Prometheus text format on
+http://127.0.0.1:<port>/metrics; GetStatus(detailed=True) summarizes it.
+"""
+import asyncio
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import grpc
+
+from server.metrics import DEFAULT_BUCKETS_MS, bucket_quantile
+
+logger = logging.getLogger(__name__)
+
+_KINDS = ('unary_unary', 'unary_stream', 'stream_unary', 'stream_stream')
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _MethodCounts:
+    """Counts for one method, written by one thread (or summed for a reader)."""
+
+    __slots__ = ("started", "finished", "buckets", "latency_ms", "request_messages", "request_bytes",
+                 "response_messages", "response_bytes", "codes")
+
+    def __init__(self, buckets: int):
+        self.started = 0
+        self.finished = 0
+        self.buckets = [0] * buckets
+        self.latency_ms = 0.0
+        self.request_messages = 0
+        self.request_bytes = 0
+        self.response_messages = 0
+        self.response_bytes = 0
+        self.codes: Dict[str, int] = {}
+
+    def add(self, other: "_MethodCounts") -> None:
+        # Another thread may be writing other; every field read is still a whole value
+        self.started += other.started
+        self.finished += other.finished
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+        self.latency_ms += other.latency_ms
+        self.request_messages += other.request_messages
+        self.request_bytes += other.request_bytes
+        self.response_messages += other.response_messages
+        self.response_bytes += other.response_bytes
+        for code, count in dict(other.codes).items():
+            self.codes[code] = self.codes.get(code, 0) + count
+
+    @property
+    def in_flight(self) -> int:
+        # started is read before finished, so a call that starts and ends in between can count -1
+        return max(0, self.started - self.finished)
+
+
+class _TableOwner:
+    """Held only by a thread's threading.local, so it is collected when the thread exits."""
+
+    __slots__ = ("table", "__weakref__")
+
+    def __init__(self):
+        self.table: Dict[str, _MethodCounts] = {}
+
+
+class RpcMetrics:
+    """Per-method RPC counts kept in per-thread tables.
+
+    Args:
+        workers: Threads (or recognition workers, on grpc.aio) serving calls,
+            for the saturation gauge; 0 leaves it out
+        buckets: Latency histogram bucket upper bounds in milliseconds
+    """
+
+    def __init__(self, workers: int = 0, buckets=DEFAULT_BUCKETS_MS):
+        self.workers = workers
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        # Tables of live threads by id; exited threads' counts are summed in _retired
+        self._tables: Dict[int, Dict[str, _MethodCounts]] = {}
+        self._retired: Dict[str, _MethodCounts] = {}
+        # Registers, retires and sums tables; recording never takes it. Reentrant: a thread's table may
+        # be retired by whatever thread drops its last reference, even one holding the lock.
+        self._lock = threading.RLock()
+
+    def _counts(self, method: str) -> _MethodCounts:
+        owner = getattr(self._local, "owner", None)
+        if owner is None:
+            owner = self._local.owner = _TableOwner()
+            with self._lock:
+                self._tables[id(owner.table)] = owner.table
+            weakref.finalize(owner, self._retire, owner.table)
+        table = owner.table
+        counts = table.get(method)
+        if counts is None:
+            counts = table[method] = _MethodCounts(len(self.buckets) + 1)
+        return counts
+
+    def start(self, method: str) -> float:
+        """Count a call of method as started; return its start time for finish()."""
+        self._counts(method).started += 1
+        return time.perf_counter()
+
+    def finish(self, method: str, started: float, code: grpc.StatusCode) -> None:
+        """Count a call of method as finished with code and record its latency."""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        counts = self._counts(method)
+        counts.buckets[bisect.bisect_left(self.buckets, elapsed_ms)] += 1
+        counts.latency_ms += elapsed_ms
+        counts.codes[code.name] = counts.codes.get(code.name, 0) + 1
+        counts.finished += 1
+
+    def received(self, method: str, size: int) -> None:
+        """Count a request message of size bytes."""
+        counts = self._counts(method)
+        counts.request_messages += 1
+        counts.request_bytes += size
+
+    def sent(self, method: str, size: int) -> None:
+        """Count a response message of size bytes."""
+        counts = self._counts(method)
+        counts.response_messages += 1
+        counts.response_bytes += size
+
+    def _retire(self, table: Dict[str, _MethodCounts]) -> None:
+        # The thread that owned table exited: nothing writes it any more
+        with self._lock:
+            self._add(self._retired, table)
+            del self._tables[id(table)]
+
+    def _add(self, totals: Dict[str, _MethodCounts], table: Dict[str, _MethodCounts]) -> None:
+        for method, counts in dict(table).items():
+            total = totals.get(method)
+            if total is None:
+                total = totals[method] = _MethodCounts(len(self.buckets) + 1)
+            total.add(counts)
+
+    def snapshot(self) -> Dict[str, _MethodCounts]:
+        """Counts per full method name ("/package.Service/Method"), summed over threads."""
+        totals: Dict[str, _MethodCounts] = {}
+        # Under the lock, so a table retired meanwhile is not counted twice
+        with self._lock:
+            self._add(totals, self._retired)
+            for table in list(self._tables.values()):
+                self._add(totals, table)
+        return totals
+
+    def summary(self) -> Dict[str, float]:
+        """Calls, errors, in-flight calls, latency and bytes per method, keyed rpc_<Method>_..., plus totals."""
+        stats: Dict[str, float] = {}
+        in_flight = 0
+        for method, counts in sorted(self.snapshot().items()):
+            prefix = f"rpc_{method.rsplit('/', 1)[-1]}"
+            stats[f"{prefix}_calls"] = counts.finished
+            stats[f"{prefix}_errors"] = counts.finished - counts.codes.get("OK", 0)
+            stats[f"{prefix}_in_flight"] = counts.in_flight
+            if counts.finished:
+                stats[f"{prefix}_latency_ms_mean"] = round(counts.latency_ms / counts.finished, 3)
+                for name, q in (("p50", 0.5), ("p99", 0.99)):
+                    stats[f"{prefix}_latency_ms_{name}"] = round(bucket_quantile(self.buckets, counts.buckets, q), 3)
+            stats[f"{prefix}_request_bytes"] = counts.request_bytes
+            stats[f"{prefix}_response_bytes"] = counts.response_bytes
+            in_flight += counts.in_flight
+        stats["rpc_in_flight"] = in_flight
+        if self.workers:
+            stats["rpc_worker_saturation"] = round(in_flight / self.workers, 3)
+        return stats
+
+    def exposition(self) -> str:
+        """These counts and process_stats() in the Prometheus text format."""
+        out: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        snapshot = sorted(self.snapshot().items())
+        labelled = [(_method_labels(method), counts) for method, counts in snapshot]
+
+        family("starweave_rpc_started_total", "counter", "RPCs started.")
+        out.extend(f"starweave_rpc_started_total{{{labels}}} {counts.started}" for labels, counts in labelled)
+        family("starweave_rpc_handled_total", "counter", "RPCs finished, by status code.")
+        for labels, counts in labelled:
+            out.extend(f'starweave_rpc_handled_total{{{labels},code="{code}"}} {count}'
+                       for code, count in sorted(counts.codes.items()))
+        family("starweave_rpc_in_flight", "gauge", "RPCs started and not yet finished.")
+        out.extend(f"starweave_rpc_in_flight{{{labels}}} {counts.in_flight}" for labels, counts in labelled)
+
+        family("starweave_rpc_duration_seconds", "histogram", "Time from the start to the end of an RPC.")
+        for labels, counts in labelled:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (None,), counts.buckets):
+                cumulative += count
+                le = "+Inf" if bound is None else _number(bound / 1000)
+                out.append(f'starweave_rpc_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            out.append(f"starweave_rpc_duration_seconds_sum{{{labels}}} {_number(counts.latency_ms / 1000)}")
+            out.append(f"starweave_rpc_duration_seconds_count{{{labels}}} {cumulative}")
+
+        for direction in ("request", "response"):
+            family(f"starweave_rpc_{direction}_messages_total", "counter", f"{direction.title()} messages.")
+            out.extend(f"starweave_rpc_{direction}_messages_total{{{labels}}} "
+                       f"{getattr(counts, direction + '_messages')}" for labels, counts in labelled)
+            family(f"starweave_rpc_{direction}_bytes_total", "counter",
+                   f"Serialized size of {direction} messages.")
+            out.extend(f"starweave_rpc_{direction}_bytes_total{{{labels}}} "
+                       f"{getattr(counts, direction + '_bytes')}" for labels, counts in labelled)
+
+        if self.workers:
+            in_flight = sum(counts.in_flight for _, counts in labelled)
+            family("starweave_rpc_workers", "gauge", "Workers serving RPCs.")
+            out.append(f"starweave_rpc_workers {self.workers}")
+            family("starweave_rpc_worker_saturation", "gauge", "RPCs in flight per worker.")
+            out.append(f"starweave_rpc_worker_saturation {_number(in_flight / self.workers)}")
+
+        process = process_stats()
+        family("process_resident_memory_bytes", "gauge", "Resident memory size in bytes.")
+        out.append(f"process_resident_memory_bytes {process['rss_bytes']}")
+        family("process_cpu_seconds_total", "counter", "User and system CPU time spent in seconds.")
+        out.append(f"process_cpu_seconds_total {_number(process['cpu_user_seconds'] + process['cpu_system_seconds'])}")
+        family("process_threads", "gauge", "Threads of the process.")
+        out.append(f"process_threads {process['threads']}")
+        return "\n".join(out) + "\n"
+
+
+def _method_labels(method: str) -> str:
+    service, _, name = method.lstrip("/").rpartition("/")
+    return f'service="{_escape(service)}",method="{_escape(name)}"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(round(value, 6))
+
+
+def process_stats() -> Dict[str, float]:
+    """Resident memory (bytes), user and system CPU seconds and OS threads of this process."""
+    times = os.times()
+    stats: Dict[str, float] = {"cpu_user_seconds": times.user, "cpu_system_seconds": times.system}
+    try:
+        with open("/proc/self/statm") as f:
+            stats["rss_bytes"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        stats["threads"] = len(os.listdir("/proc/self/task"))
+    except OSError:
+        # Not Linux: peak rather than current memory, and Python threads only
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats["rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+        stats["threads"] = threading.active_count()
+    return stats
+
+
+def _code(context, default: grpc.StatusCode) -> grpc.StatusCode:
+    # The code the handler set (with set_code or abort), if any
+    code = context.code()
+    return default if code is None else code
+
+
+def _threaded_code(context, default: grpc.StatusCode) -> grpc.StatusCode:
+    # A threaded handler whose client cancelled may still return, or fail reading requests
+    return _code(context, default if context.is_active() else grpc.StatusCode.CANCELLED)
+
+
+def _handler_behavior(handler) -> Tuple[str, object]:
+    for kind in _KINDS:
+        behavior = getattr(handler, kind)
+        if behavior is not None:
+            return kind, behavior
+    raise ValueError("RPC method handler without a behavior")
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records every RPC of the threaded server in an RpcMetrics."""
+
+    def __init__(self, metrics: RpcMetrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return handler
+        metrics = self.metrics
+        method = handler_call_details.method
+        kind, behavior = _handler_behavior(handler)
+
+        def _requests(request_iterator):
+            for request in request_iterator:
+                metrics.received(method, request.ByteSize())
+                yield request
+
+        def _request(request):
+            if handler.request_streaming:
+                return _requests(request)
+            metrics.received(method, request.ByteSize())
+            return request
+
+        if not handler.response_streaming:
+            def _unary(request, context):
+                started = metrics.start(method)
+                code = grpc.StatusCode.UNKNOWN
+                try:
+                    response = behavior(_request(request), context)
+                    if response is not None:
+                        metrics.sent(method, response.ByteSize())
+                    code = _threaded_code(context, grpc.StatusCode.OK)
+                    return response
+                except Exception:
+                    code = _threaded_code(context, grpc.StatusCode.UNKNOWN)
+                    raise
+                finally:
+                    metrics.finish(method, started, code)
+            return handler._replace(**{kind: _unary})
+
+        def _stream(request, context):
+            started = metrics.start(method)
+            code = grpc.StatusCode.UNKNOWN
+            try:
+                for response in behavior(_request(request), context):
+                    metrics.sent(method, response.ByteSize())
+                    yield response
+                code = _threaded_code(context, grpc.StatusCode.OK)
+            except GeneratorExit:
+                code = grpc.StatusCode.CANCELLED  # The client went away mid-stream
+                raise
+            except Exception:
+                code = _threaded_code(context, grpc.StatusCode.UNKNOWN)
+                raise
+            finally:
+                metrics.finish(method, started, code)
+        return handler._replace(**{kind: _stream})
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Records every RPC of the asyncio server in an RpcMetrics."""
+
+    def __init__(self, metrics: RpcMetrics):
+        self.metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return handler
+        metrics = self.metrics
+        method = handler_call_details.method
+        kind, behavior = _handler_behavior(handler)
+
+        async def _requests(request_iterator):
+            async for request in request_iterator:
+                metrics.received(method, request.ByteSize())
+                yield request
+
+        def _request(request):
+            if handler.request_streaming:
+                return _requests(request)
+            metrics.received(method, request.ByteSize())
+            return request
+
+        if not handler.response_streaming:
+            async def _unary(request, context):
+                started = metrics.start(method)
+                code = grpc.StatusCode.UNKNOWN
+                try:
+                    response = await behavior(_request(request), context)
+                    if response is not None:
+                        metrics.sent(method, response.ByteSize())
+                    code = _code(context, grpc.StatusCode.OK)
+                    return response
+                except asyncio.CancelledError:
+                    code = grpc.StatusCode.CANCELLED
+                    raise
+                except Exception:
+                    code = _code(context, grpc.StatusCode.UNKNOWN)
+                    raise
+                finally:
+                    metrics.finish(method, started, code)
+            return handler._replace(**{kind: _unary})
+
+        async def _stream(request, context):
+            started = metrics.start(method)
+            code = grpc.StatusCode.UNKNOWN
+            try:
+                async for response in behavior(_request(request), context):
+                    metrics.sent(method, response.ByteSize())
+                    yield response
+                code = _code(context, grpc.StatusCode.OK)
+            except (asyncio.CancelledError, GeneratorExit):
+                code = grpc.StatusCode.CANCELLED
+                raise
+            except Exception:
+                code = _code(context, grpc.StatusCode.UNKNOWN)
+                raise
+            finally:
+                metrics.finish(method, started, code)
+        return handler._replace(**{kind: _stream})
+
+
+class MetricsExporter:
+    """Serves RpcMetrics.exposition() at http://host:port/metrics from a daemon thread.
+
+    Args:
+        metrics: Counts to serve
+        port: Port to listen on (0 picks a free one; see port)
+        host: Address to listen on; the loopback interface by default
+    """
+
+    def __init__(self, metrics: RpcMetrics, port: int, host: str = "127.0.0.1"):
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.exposition().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", _CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Metrics request from {self.address_string()}: {format % args}")
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics_exporter", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{host}:{self.port}/metrics")
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start_exporter(metrics: RpcMetrics, port: Optional[int]) -> Optional[MetricsExporter]:
+    """Start a MetricsExporter on port; None (and no exporter) when port is 0 or None."""
+    return MetricsExporter(metrics, port) if port else None
@@ -0,0 +1,598 @@
+"""
+Pattern index partitioned across worker processes.
+
+ShardedIndex offers the PatternIndex methods the server uses, over N
+shards. Each shard is a PatternIndex in its own process, started with the
+"spawn" method so no gRPC or thread state is inherited. A corpus can then
+outgrow one process's memory, and queries use one core per shard.
+
+Routing: a pattern lives in the shard given by a stable hash of its
+``shard_key`` metadata, or of its id when it has none. Patterns sharing a
+shard_key (a tenant, a source) are kept together. Writes go to the owning
+shard only. Queries fan out to every shard in parallel, unless they name a
+shard_key, in which case only that key's shard is searched. Each shard
+returns its own top_k; the merged list keeps the best top_k by score,
+and candidate counts are summed.
+
+Each shard searches one published version of its own index, but shards
+change independently. A ShardedView therefore carries the version read
+before its searches start: a write that lands during them can show up in
+the results, but results are never labelled with a version newer than
+the data they come from.
+
+Scores do not depend on the rest of the corpus, except for tfidf, whose
+document frequencies are per shard. Its scores therefore differ slightly
+from those of a single index.
+
+Requests are pickled once, even when broadcast, and sent over one pipe
+per shard behind an 8-byte request id. A reader thread per shard resolves
+the replies, so concurrent callers pipeline their requests rather than
+taking turns, and a shard process serves a few requests at once. Each
+shard keeps the latencies of its recent searches; shard_stats() reports
+their percentiles.
+
+Failures: a shard process that exits is restarted, like the workers of
+PreforkSupervisor. It loads the snapshot the index was last saved to (or
+loaded from), and the writes sent to it since are replayed before it
+serves again. Until then, calls that need it raise ShardUnavailable.
+Those writes are kept pickled in the server process, so an index that is
+never saved holds its whole corpus a second time there. Reads wait at most
+timeout seconds for a shard and then raise ShardTimeout, so one stuck
+shard cannot hold every server thread. Writes wait until the shard
+answers or exits, because a large batch can legitimately take minutes.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from server.recognition import (
+    DEFAULT_MIN_SCORE, DEFAULT_STRATEGY, DEFAULT_TOP_K, Match, PatternIndex, StoredPattern, next_version,
+    read_patterns,
+)
+
+logger = logging.getLogger(__name__)
+
+SHARD_KEY = "shard_key"  # Pattern metadata (and request option) that picks the shard
+MANIFEST = "shards.json"
+LATENCY_SAMPLES = 1024  # Recent searches per shard kept for the latency percentiles
+SHARD_THREADS = 4  # Requests a shard process serves at once
+SHARD_TIMEOUT = 10.0  # Seconds a read waits for a shard
+RESTART_BACKOFF = 1.0  # Minimum seconds between restarts of the same shard, to avoid crash loops
+
+_ID_BYTES = 8
+_STOP = (-1).to_bytes(_ID_BYTES, "little", signed=True)
+
+
+class ShardUnavailable(ConnectionError):
+    """A shard process is down or restarting."""
+
+
+class ShardTimeout(TimeoutError):
+    """A shard did not answer within the shard timeout."""
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Shard number of a shard key or pattern id (stable across processes)."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") % shards
+
+
+def _shard_directory(directory: str, number: int) -> str:
+    return os.path.join(directory, f"shard-{number:03d}")
+
+
+def _serve_shard(connection, number: int, index_kwargs: Dict[str, Any], snapshot_dir: Optional[str]) -> None:
+    """Main function of a shard process: apply the PatternIndex calls received on connection."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The server stops shards through the pipe
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - shard-{number}[%(process)d] - %(name)s - %(levelname)s - %(message)s',
+        force=True
+    )
+    if index_kwargs.get("suffix_array_dir"):
+        index_kwargs = dict(index_kwargs, suffix_array_dir=_shard_directory(index_kwargs["suffix_array_dir"], number))
+    index = None
+    if snapshot_dir:
+        load_kwargs = dict(index_kwargs)
+        load_kwargs["suffix_array"] = bool(load_kwargs.pop("suffix_array_dir", None) or load_kwargs.get("suffix_array"))
+        index = PatternIndex.load(_shard_directory(snapshot_dir, number), **load_kwargs)
+    if index is None:
+        index = PatternIndex(**index_kwargs)
+
+    send_lock = threading.Lock()
+
+    def serve(request_id: bytes, body: bytes) -> None:
+        method, args, kwargs = pickle.loads(body)
+        try:
+            reply = (True, getattr(index, method)(*args, **kwargs))
+        except Exception as e:
+            reply = (False, e)
+        payload = request_id + pickle.dumps(reply, protocol=pickle.HIGHEST_PROTOCOL)
+        with send_lock:
+            connection.send_bytes(payload)
+
+    executor = futures.ThreadPoolExecutor(max_workers=SHARD_THREADS, thread_name_prefix=f"shard-{number}")
+    try:
+        while True:
+            try:
+                message = connection.recv_bytes()
+            except (EOFError, OSError):
+                break
+            if message == _STOP:
+                break
+            executor.submit(serve, message[:_ID_BYTES], message[_ID_BYTES:])
+    finally:
+        executor.shutdown(wait=True)
+        index.close()
+
+
+class _Shard:
+    """Parent-side handle of one shard process; start() (re)starts the process."""
+
+    def __init__(self, number: int, context, index_kwargs: Dict[str, Any], on_exit: Callable[["_Shard"], None]):
+        self.number = number
+        self.latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self.available = False  # Serving calls: started and, after a restart, caught up
+        self.restarts = 0
+        self.started = 0.0
+        self.process = None
+        self._context = context
+        self._index_kwargs = index_kwargs
+        self._on_exit = on_exit
+        self._connection = None
+        self._ids = itertools.count()
+        self._pending: Dict[int, Tuple[futures.Future, float, bool]] = {}
+        self._lock = threading.Lock()
+        self._closing = False
+
+    def start(self, snapshot_dir: Optional[str]) -> None:
+        """Start the shard process, loading its part of the snapshot in snapshot_dir if given."""
+        self.started = time.time()
+        parent, child = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_serve_shard, args=(child, self.number, self._index_kwargs, snapshot_dir),
+            name=f"pattern-shard-{self.number}", daemon=True)
+        self.process.start()
+        child.close()
+        with self._lock:
+            self._connection = parent
+        threading.Thread(target=self._read, args=(parent,), name=f"shard-{self.number}-reader",
+                         daemon=True).start()
+
+    def send(self, body: bytes, timed: bool = False) -> futures.Future:
+        """Send a pickled (method, args, kwargs); the future resolves to the call's result."""
+        future = futures.Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = (future, time.perf_counter(), timed)
+            try:
+                self._connection.send_bytes(request_id.to_bytes(_ID_BYTES, "little", signed=True) + body)
+            except (OSError, ValueError) as e:
+                del self._pending[request_id]
+                future.set_exception(ShardUnavailable(f"Shard {self.number} is not running: {e}"))
+        return future
+
+    def _read(self, connection) -> None:
+        while True:
+            try:
+                message = connection.recv_bytes()
+            except (EOFError, OSError):
+                break
+            ok, result = pickle.loads(message[_ID_BYTES:])
+            with self._lock:
+                future, started, timed = self._pending.pop(int.from_bytes(message[:_ID_BYTES], "little", signed=True))
+            if timed:
+                self.latencies.append(time.perf_counter() - started)
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+        with self._lock:
+            self.available = False
+            pending, self._pending = self._pending, {}
+            connection.close()
+        for future, _, _ in pending.values():
+            future.set_exception(ShardUnavailable(f"Shard {self.number} exited"))
+        if not self._closing:
+            self._on_exit(self)
+
+    def close(self, timeout: float = 10.0) -> None:
+        self._closing = True
+        self.available = False
+        try:
+            with self._lock:
+                self._connection.send_bytes(_STOP)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._connection.close()
+
+
+class ShardedView:
+    """Searches of a ShardedIndex labelled with the version current when the view was taken."""
+
+    def __init__(self, index: "ShardedIndex"):
+        self.version = index.version
+        self._index = index
+
+    def search_many(self, queries: List[str], strategy: str = DEFAULT_STRATEGY, top_k: int = DEFAULT_TOP_K,
+                    min_score: float = DEFAULT_MIN_SCORE,
+                    shard_key: Optional[str] = None) -> List[Tuple[List[Match], int]]:
+        return self._index.search_many(queries, strategy, top_k, min_score, shard_key)
+
+
+class ShardedIndex:
+    """PatternIndex interface over shards served by worker processes.
+
+    Args:
+        shards: Number of shard processes
+        snapshot_dir: Load each shard from its subdirectory of a snapshot
+            written by save(); prefer load(), which checks the shard count
+        timeout: Seconds a read waits for the shards before raising ShardTimeout
+        **index_kwargs: PatternIndex arguments for every shard (minhash,
+            scan, suffix_array, suffix_array_dir, tfidf); a suffix_array_dir
+            gets one subdirectory per shard
+    """
+
+    def __init__(self, shards: int, snapshot_dir: Optional[str] = None, timeout: float = SHARD_TIMEOUT,
+                 **index_kwargs):
+        if shards < 1:
+            raise ValueError("shards must be positive")
+        context = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self._exited: queue.SimpleQueue = queue.SimpleQueue()
+        self._shards = [_Shard(number, context, index_kwargs, self._exited.put) for number in range(shards)]
+        # Patterns whose shard_key put them in another shard than their id's
+        self._placed: Dict[str, int] = {}
+        # Writes (pickled calls) each shard received since the snapshot it restarts from
+        self._journal: List[List[bytes]] = [[] for _ in range(shards)]
+        self._deferred = 0  # defer_rebuilds() calls not yet resumed, replayed into restarted shards
+        self._lock = threading.Lock()  # Serializes writes and restarts
+        self._closing = False
+        self.version = next_version()
+        self.snapshot_dir = snapshot_dir
+        for shard in self._shards:
+            shard.start(snapshot_dir)
+            shard.available = True
+        threading.Thread(target=self._supervise, name="shard-supervisor", daemon=True).start()
+        try:  # Wait until every shard serves, or fail here
+            self._results(self._send_all(self._encode("__len__", (), {})))
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def shards(self) -> int:
+        return len(self._shards)
+
+    @staticmethod
+    def _encode(method: str, args: Tuple, kwargs: Dict[str, Any]) -> bytes:
+        return pickle.dumps((method, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _send_all(self, body: bytes, timed: bool = False) -> Dict[int, futures.Future]:
+        return {shard.number: shard.send(body, timed) for shard in self._shards}
+
+    def _check_available(self, numbers: Iterable[int]) -> None:
+        down = [number for number in numbers if not self._shards[number].available]
+        if down:
+            raise ShardUnavailable(f"Shard {', '.join(map(str, down))} is restarting")
+
+    def _results(self, sent: Dict[int, futures.Future], timeout: Optional[float] = None) -> Dict[int, Any]:
+        """Wait for the calls sent, at most timeout seconds in all; results by shard number.
+
+        Raises:
+            ShardTimeout: A shard did not answer in time
+            ShardUnavailable: A shard exited before answering
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = {}
+        for number, future in sent.items():
+            try:
+                results[number] = future.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except futures.TimeoutError:
+                raise ShardTimeout(f"Shard {number} did not answer within {timeout:g}s") from None
+        return results
+
+    def _call(self, calls: Dict[int, Tuple[str, Tuple, Dict[str, Any]]], timed: bool = False) -> Dict[int, Any]:
+        """Make PatternIndex reads, one per shard number, in parallel and return their results."""
+        self._check_available(calls)
+        sent = {number: self._shards[number].send(self._encode(*call), timed) for number, call in calls.items()}
+        return self._results(sent, self.timeout)
+
+    def _broadcast(self, method: str, *args, timed: bool = False, **kwargs) -> List[Any]:
+        """Make the same read on every shard in parallel; results in shard order."""
+        self._check_available(range(len(self._shards)))
+        return list(self._results(self._send_all(self._encode(method, args, kwargs), timed), self.timeout).values())
+
+    def _write(self, calls: Dict[int, List[Tuple[str, Tuple, Dict[str, Any]]]]) -> Dict[int, List[Any]]:
+        """Make PatternIndex writes, in order per shard, and journal them; call with the lock held.
+
+        Writes wait without a timeout: a shard either answers or exits, and
+        a shard that exits replays the journal when it restarts.
+        """
+        self._check_available(calls)
+        sent: Dict[int, List[futures.Future]] = {}
+        for number, shard_calls in calls.items():
+            for call in shard_calls:
+                body = self._encode(*call)
+                self._journal[number].append(body)
+                sent.setdefault(number, []).append(self._shards[number].send(body))
+        return {number: [future.result() for future in shard_sent] for number, shard_sent in sent.items()}
+
+    def _supervise(self) -> None:
+        """Restart shard processes that exit, until close()."""
+        while True:
+            shard = self._exited.get()
+            if shard is None or self._closing:
+                return
+            shard.process.join()
+            logger.warning(f"Shard {shard.number} (pid {shard.process.pid}) exited with status "
+                           f"{shard.process.exitcode}, restarting")
+            delay = shard.started + RESTART_BACKOFF - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self._restart(shard)
+            except ShardUnavailable:
+                pass  # It exited again; its reader queued it once more
+            except Exception:
+                logger.exception(f"Could not restart shard {shard.number}")
+                self._exited.put(shard)
+
+    def _restart(self, shard: _Shard) -> None:
+        """Start shard from the last snapshot and replay the writes it missed."""
+        started = time.perf_counter()
+        with self._lock:
+            if self._closing:
+                return
+            shard.start(self.snapshot_dir)
+            # Hold rebuilds while replaying so the shard rebuilds once, then as many times as the server holds them
+            for _ in range(self._deferred + 1):
+                shard.send(self._encode("defer_rebuilds", (), {})).result()
+            # One at a time: a shard serves several requests at once, in no particular order
+            for body in self._journal[shard.number]:
+                error = shard.send(body).exception()
+                if isinstance(error, ShardUnavailable):
+                    raise error
+                # Other errors rejected the write the first time too (e.g. a vector of the wrong length)
+            shard.send(self._encode("resume_rebuilds", (), {})).result()
+            patterns = shard.send(self._encode("__len__", (), {})).result()
+            if self._closing:
+                shard.close()
+                return
+            shard.restarts += 1
+            shard.available = True
+            self.version = next_version()
+        logger.info(f"Restarted shard {shard.number} with {patterns} patterns "
+                    f"({len(self._journal[shard.number])} writes replayed) in {time.perf_counter() - started:.1f}s")
+
+    def shard_of_pattern(self, pattern: StoredPattern) -> int:
+        """Shard a pattern belongs in: by its shard_key metadata, else by its id."""
+        return shard_of(pattern.metadata.get(SHARD_KEY) or pattern.id, len(self._shards))
+
+    def _shard_of_id(self, pattern_id: str) -> int:
+        placed = self._placed.get(pattern_id)
+        return placed if placed is not None else shard_of(pattern_id, len(self._shards))
+
+    def __len__(self) -> int:
+        return sum(self._broadcast("__len__"))
+
+    def view(self) -> ShardedView:
+        """Take the version before searching (see PatternIndex.view)."""
+        return ShardedView(self)
+
+    def add(self, pattern_id: str, data: str, labels: Optional[Iterable[str]] = None,
+            metadata: Optional[Dict[str, str]] = None) -> None:
+        """Add a pattern, replacing any existing pattern with the same id."""
+        self.add_many([StoredPattern(pattern_id, data, list(labels or []), dict(metadata or {}))])
+
+    def add_many(self, patterns: Iterable[StoredPattern], rebuild: bool = False) -> int:
+        """Add patterns to their shards (see PatternIndex.add_many); return how many replaced one.
+
+        A pattern whose shard_key moves it to another shard is removed from
+        the shard it was in before.
+        """
+        by_shard: Dict[int, List[StoredPattern]] = {}
+        moved: Dict[int, List[str]] = {}
+        with self._lock:
+            placed = {}
+            for pattern in patterns:
+                number = self.shard_of_pattern(pattern)
+                previous = placed.get(pattern.id, self._shard_of_id(pattern.id))
+                if previous != number:
+                    moved.setdefault(previous, []).append(pattern.id)
+                placed[pattern.id] = number
+                by_shard.setdefault(number, []).append(pattern)
+            self._check_available(set(by_shard) | set(moved))
+            for pattern_id, number in placed.items():
+                if number != shard_of(pattern_id, len(self._shards)):
+                    self._placed[pattern_id] = number
+                else:
+                    self._placed.pop(pattern_id, None)
+            calls: Dict[int, List[Tuple[str, Tuple, Dict[str, Any]]]] = {}
+            for number, ids in moved.items():
+                calls.setdefault(number, []).append(("remove_many", (ids,), {}))
+            for number, batch in by_shard.items():
+                calls.setdefault(number, []).append(("add_many", (batch,), {"rebuild": rebuild}))
+            replaced = sum(sum(results) for results in self._write(calls).values())
+            self.version = next_version()
+        return replaced
+
+    def remove(self, pattern_id: str) -> bool:
+        """Remove a pattern; return False if it was not present."""
+        with self._lock:
+            number = self._shard_of_id(pattern_id)
+            self._check_available([number])
+            self._placed.pop(pattern_id, None)
+            removed = self._write({number: [("remove", (pattern_id,), {})]})[number][0]
+            self.version = next_version()
+        return removed
+
+    def remove_many(self, pattern_ids: Iterable[str]) -> int:
+        """Remove patterns; return how many were present."""
+        by_shard: Dict[int, List[str]] = {}
+        with self._lock:
+            for pattern_id in pattern_ids:
+                by_shard.setdefault(self._shard_of_id(pattern_id), []).append(pattern_id)
+            self._check_available(by_shard)
+            for ids in by_shard.values():
+                for pattern_id in ids:
+                    self._placed.pop(pattern_id, None)
+            results = self._write({number: [("remove_many", (ids,), {})] for number, ids in by_shard.items()})
+            removed = sum(shard_results[0] for shard_results in results.values())
+            self.version = next_version()
+        return removed
+
+    def get(self, pattern_id: str) -> Optional[StoredPattern]:
+        number = self._shard_of_id(pattern_id)
+        return self._call({number: ("get", (pattern_id,), {})})[number]
+
+    def search(self, query: str, strategy: str = DEFAULT_STRATEGY, top_k: int = DEFAULT_TOP_K,
+               min_score: float = DEFAULT_MIN_SCORE, shard_key: Optional[str] = None) -> Tuple[List[Match], int]:
+        """Return the top_k matches for query and the number of candidates examined."""
+        return self.search_many([query], strategy, top_k, min_score, shard_key)[0]
+
+    def search_many(self, queries: List[str], strategy: str = DEFAULT_STRATEGY, top_k: int = DEFAULT_TOP_K,
+                    min_score: float = DEFAULT_MIN_SCORE,
+                    shard_key: Optional[str] = None) -> List[Tuple[List[Match], int]]:
+        """Search every shard (or only shard_key's) in parallel and merge each query's matches."""
+        args = (queries, strategy, top_k, min_score)
+        if shard_key:
+            number = shard_of(shard_key, len(self._shards))
+            return self._call({number: ("search_many", args, {})}, timed=True)[number]
+        merged = []
+        for per_shard in zip(*self._broadcast("search_many", *args, timed=True)):
+            # Best score first; ties keep shard order, then each shard's own order
+            matches = sorted(itertools.chain.from_iterable(matches for matches, _ in per_shard),
+                             key=lambda match: -match.score)[:top_k]
+            merged.append((matches, sum(candidates for _, candidates in per_shard)))
+        return merged
+
+    def _tell_running(self, method: str) -> None:
+        """Make a call on every running shard; one restarting gets it replayed, or rebuilds anyway."""
+        sent = {shard.number: shard.send(self._encode(method, (), {})) for shard in self._shards if shard.available}
+        for future in sent.values():
+            try:
+                future.result()
+            except ShardUnavailable:
+                pass
+
+    def defer_rebuilds(self) -> None:
+        with self._lock:
+            self._deferred += 1
+            self._tell_running("defer_rebuilds")
+
+    def resume_rebuilds(self) -> None:
+        with self._lock:
+            self._deferred -= 1
+            self._tell_running("resume_rebuilds")
+
+    def rebuild(self) -> None:
+        with self._lock:
+            self._tell_running("rebuild")
+
+    def stats(self) -> Dict[str, int]:
+        """Index statistics summed over shards."""
+        stats: Dict[str, int] = {}
+        for shard_stats in self._broadcast("stats"):
+            for key, value in shard_stats.items():
+                stats[key] = stats.get(key, 0) + value
+        return stats
+
+    def shard_stats(self) -> Dict[str, float]:
+        """Whether each shard is up, its restarts, pattern count and recent search latency percentiles (ms).
+
+        Shards that are restarting or do not answer within the timeout are
+        reported down, without a pattern count.
+        """
+        stats: Dict[str, float] = {"shards": len(self._shards)}
+        sent = {shard.number: shard.send(self._encode("__len__", (), {})) for shard in self._shards if shard.available}
+        deadline = time.monotonic() + self.timeout
+        for shard in self._shards:
+            prefix = f"shard_{shard.number}"
+            try:
+                stats[f"{prefix}_patterns"] = sent[shard.number].result(max(0.0, deadline - time.monotonic()))
+                stats[f"{prefix}_up"] = 1
+            except (KeyError, ShardUnavailable, futures.TimeoutError):
+                stats[f"{prefix}_up"] = 0
+            stats[f"{prefix}_restarts"] = shard.restarts
+            latencies = np.array(shard.latencies) * 1000
+            stats[f"{prefix}_searches"] = len(latencies)
+            if len(latencies):
+                for name, value in zip(("p50", "p90", "p99"), np.percentile(latencies, (50, 90, 99))):
+                    stats[f"{prefix}_search_ms_{name}"] = round(float(value), 3)
+                stats[f"{prefix}_search_ms_max"] = round(float(latencies.max()), 3)
+        return stats
+
+    def save(self, directory: str) -> None:
+        """Save every shard to its subdirectory of directory, plus a manifest of the layout.
+
+        Shards restart from this snapshot from now on, so the writes it
+        holds are dropped from the journal.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._check_available(range(len(self._shards)))
+            # Writes journaled by now are in the snapshot; later ones may be too, and replaying them is harmless
+            saved = [len(journal) for journal in self._journal]
+        self._results({shard.number: shard.send(self._encode("save", (_shard_directory(directory, shard.number),), {}))
+                       for shard in self._shards})
+        manifest = {"shards": len(self._shards), "placed": dict(self._placed)}
+        path = os.path.join(directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            for journal, count in zip(self._journal, saved):
+                del journal[:count]
+            self.snapshot_dir = directory
+
+    @classmethod
+    def load(cls, directory: str, shards: int, **index_kwargs) -> Optional["ShardedIndex"]:
+        """Start shards from a snapshot written by save(); None if directory holds none.
+
+        Raises:
+            ValueError: The snapshot was saved with another number of shards
+        """
+        path = os.path.join(directory, MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest["shards"] != shards:
+            raise ValueError(f"The snapshot in {directory} has {manifest['shards']} shards, not {shards}; "
+                             f"start with that many or rebuild it from the corpus")
+        started = time.perf_counter()
+        index = cls(shards, snapshot_dir=directory, **index_kwargs)
+        index._placed = {pattern_id: int(number) for pattern_id, number in manifest["placed"].items()}
+        logger.info(f"Loaded {len(index)} patterns in {shards} shards from {directory} "
+                    f"in {time.perf_counter() - started:.1f}s")
+        return index
+
+    @classmethod
+    def from_file(cls, path: str, shards: int, **index_kwargs) -> "ShardedIndex":
+        """Build a sharded index from a corpus file (see read_patterns)."""
+        index = cls(shards, **index_kwargs)
+        index.add_many(read_patterns(path), rebuild=True)
+        return index
+
+    def close(self) -> None:
+        """Stop the shard processes."""
+        self._closing = True
+        self._exited.put(None)
+        for shard in self._shards:
+            shard.close()
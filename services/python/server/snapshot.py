@@ -0,0 +1,354 @@
+"""
+Versioned on-disk snapshots of a pattern index as flat, memory-mappable arrays.
+
+A snapshot is a directory holding ``manifest.json`` and one ``.npy`` file
+per array. Loading maps every array with ``numpy.load(mmap_mode="r")``
+and builds no Python structures per pattern. Startup cost therefore does
+not depend on corpus size, and pre-forked workers share the pages
+through the page cache. Layout (version 1):
+
+* Pattern table: ids, UTF-8 data and JSON-encoded [labels, metadata],
+  each as one byte blob with start offsets and byte lengths, plus the
+  character length of each pattern. Pattern numbers are kept, and
+  removed patterns leave empty slots with ``alive`` false.
+* Id and exact-data lookup: sorted 64-bit hashes with the pattern
+  number of each, verified against the table on lookup.
+* Contains postings: character trigrams packed into int64 keys (three
+  21-bit code points), with CSR offsets into sorted pattern numbers.
+* Token postings: token hashes with CSR offsets into pattern numbers
+  sorted by (pattern token count, pattern number). That is the
+  size-bucketed layout the jaccard strategy filters on. Each pattern's
+  sorted token hashes are kept for scoring.
+* Components: subdirectories of arrays exported by MinHashLSH,
+  HashedTfidf, the Aho–Corasick scanner, the suffix array and the
+  VectorIndex (which keeps vector patterns out of the tables above).
+
+Snapshots are written to a temporary directory and renamed into place,
+so a reader never sees a partial snapshot. Processes that still map the
+previous files keep their inodes.
+"""
+import json
+import mmap
+import os
+import shutil
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from server.minhash import token_hash
+from server.suffix_array import count_occurrences
+
+FORMAT = "starweave-pattern-index"
+VERSION = 1
+
+_CODE_BITS = 21  # Unicode code points fit in 21 bits, so a trigram fits in 63
+
+
+def hash_keys(values: Iterable[str]) -> np.ndarray:
+    """Stable 64-bit hashes of strings as a uint64 array."""
+    values = list(values)
+    return np.fromiter((token_hash(value) for value in values), dtype=np.uint64, count=len(values))
+
+
+def gram_keys(text: str) -> np.ndarray:
+    """Sorted unique int64 keys of the character trigrams of text."""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    if len(codes) < 3:
+        return np.empty(0, dtype=np.int64)
+    return np.unique((codes[:-2] << 2 * _CODE_BITS) | (codes[1:-1] << _CODE_BITS) | codes[2:])
+
+
+def save_arrays(directory: str, arrays: Dict[str, np.ndarray]) -> None:
+    """Write arrays as .npy files in directory."""
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array))
+
+
+def load_arrays(directory: str) -> Dict[str, np.ndarray]:
+    """Memory-map every .npy file in directory."""
+    return {name[:-4]: np.load(os.path.join(directory, name), mmap_mode="r")
+            for name in sorted(os.listdir(directory)) if name.endswith(".npy")}
+
+
+def _blob(values: Sequence[bytes]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Values joined by NUL bytes, so a byte search never matches across two values
+    sizes = np.fromiter((len(value) for value in values), dtype=np.int64, count=len(values))
+    starts = np.zeros(len(values), dtype=np.int64)
+    np.cumsum(sizes[:-1] + 1, out=starts[1:])
+    blob = np.frombuffer(b"\x00".join(values) + b"\x00", dtype=np.uint8)
+    return blob, starts, sizes
+
+
+def _gather(ptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Positions of the CSR rows' entries, and which of rows each belongs to
+    starts, ends = ptr[rows], ptr[rows + 1]
+    sizes = ends - starts
+    owners = np.repeat(np.arange(len(rows)), sizes)
+    offsets = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return np.repeat(starts, sizes) + offsets, owners
+
+
+def _postings(keys: np.ndarray, docs: np.ndarray, order_by: Sequence[np.ndarray] = ()) -> Dict[str, np.ndarray]:
+    # CSR postings: unique keys, offsets, and docs grouped by key (deduplicated)
+    order = np.lexsort((docs, *order_by, keys))
+    keys, docs = keys[order], docs[order]
+    fresh = np.ones(len(keys), dtype=bool)
+    fresh[1:] = (keys[1:] != keys[:-1]) | (docs[1:] != docs[:-1])
+    keys, docs = keys[fresh], docs[fresh]
+    firsts = np.flatnonzero(np.diff(keys, prepend=keys[:1] - 1) != 0) if len(keys) else np.empty(0, np.int64)
+    return {"keys": keys[firsts], "ptr": np.append(firsts, len(keys)), "docs": docs}
+
+
+def write_snapshot(directory: str, patterns: Sequence[Optional[Tuple[str, str, List[str], Dict[str, str]]]],
+                   token_sets: Sequence[Optional[Iterable[str]]],
+                   components: Dict[str, Dict[str, np.ndarray]]) -> None:
+    """Write a snapshot, replacing any snapshot in directory.
+
+    Args:
+        directory: Snapshot directory
+        patterns: (id, data, labels, metadata) per pattern number; None for removed patterns
+        token_sets: Distinct tokens of each pattern (None for removed patterns)
+        components: Arrays to store per component name
+    """
+    n = len(patterns)
+    alive = np.fromiter((pattern is not None for pattern in patterns), dtype=bool, count=n)
+    live = np.flatnonzero(alive)
+    empty = ("", "", [], {})
+    rows = [pattern or empty for pattern in patterns]
+
+    arrays: Dict[str, np.ndarray] = {"alive": alive}
+    ids = [pattern_id.encode("utf-8") for pattern_id, _, _, _ in rows]
+    data = [text.encode("utf-8") for _, text, _, _ in rows]
+    info = [json.dumps([labels, metadata]).encode("utf-8") if labels or metadata else b""
+            for _, _, labels, metadata in rows]
+    for name, values in (("id", ids), ("data", data), ("info", info)):
+        arrays[f"{name}_blob"], arrays[f"{name}_starts"], arrays[f"{name}_sizes"] = _blob(values)
+    arrays["lengths"] = np.fromiter((len(text) for _, text, _, _ in rows), dtype=np.int64, count=n)
+
+    for name, column in (("id", 0), ("exact", 1)):
+        keys = hash_keys(rows[doc][column] for doc in live)
+        order = np.argsort(keys, kind="stable")
+        arrays[f"{name}_keys"], arrays[f"{name}_docs"] = keys[order], live[order]
+
+    # Trigram postings over all pattern text at once
+    text = "".join(rows[doc][1] for doc in live)
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    lengths = arrays["lengths"][live]
+    owners = np.repeat(live, lengths)
+    position = np.arange(len(codes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    valid = np.flatnonzero(position + 2 < np.repeat(lengths, lengths))
+    keys = (codes[valid] << 2 * _CODE_BITS) | (codes[valid + 1] << _CODE_BITS) | codes[valid + 2]
+    del codes, position
+    grams = _postings(keys, owners[valid])
+    del keys, owners, valid
+    arrays.update(gram_keys=grams["keys"], gram_ptr=grams["ptr"], gram_docs=grams["docs"])
+
+    # Token postings sorted by (pattern size, doc) within each token, and per-pattern token keys
+    vocabulary: Dict[str, int] = {}
+    doc_keys = [np.sort(np.fromiter(
+        (vocabulary[token] if token in vocabulary else vocabulary.setdefault(token, token_hash(token))
+         for token in (token_sets[doc] or ())), dtype=np.uint64)) for doc in range(n)]
+    counts = np.fromiter((len(keys) for keys in doc_keys), dtype=np.int64, count=n)
+    flat = np.concatenate(doc_keys) if doc_keys else np.empty(0, dtype=np.uint64)
+    owners = np.repeat(np.arange(n), counts)
+    tokens = _postings(flat, owners, order_by=(counts[owners],))
+    arrays.update(token_keys=tokens["keys"], token_ptr=tokens["ptr"], token_docs=tokens["docs"],
+                  token_sizes=counts[tokens["docs"]], doc_token_keys=flat, doc_token_counts=counts,
+                  doc_token_ptr=np.append(0, np.cumsum(counts)))
+
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "created": time.time(),
+        "docs": n,
+        "patterns": int(alive.sum()),
+        "components": sorted(components),
+    }
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = os.path.join(parent, f".{os.path.basename(directory)}.tmp-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    save_arrays(staging, arrays)
+    for name, component in components.items():
+        save_arrays(os.path.join(staging, name), component)
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    # Swap directories; mappings of the old files stay valid until unmapped
+    retired = None
+    if os.path.exists(directory):
+        retired = f"{staging}.old"
+        os.rename(directory, retired)
+    os.rename(staging, directory)
+    if retired:
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+class Snapshot:
+    """Read-only pattern index mapped from a snapshot directory.
+
+    Pattern numbers are those of the index that wrote it. Callers keep
+    their own record of patterns removed since; methods here only skip
+    patterns that were already removed when the snapshot was written.
+    """
+
+    def __init__(self, directory: str, manifest: Dict, arrays: Dict[str, np.ndarray]):
+        self.directory = directory
+        self.manifest = manifest
+        self._arrays = arrays
+        for name, array in arrays.items():
+            setattr(self, f"_{name}", array)
+        # Byte searches (short contains queries) read the data blob through mmap, without copying
+        with open(os.path.join(directory, "data_blob.npy"), "rb") as f:
+            self._data_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data_offset = arrays["data_blob"].offset
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["Snapshot"]:
+        """Map the snapshot in directory; None if there is none.
+
+        Raises:
+            ValueError: The snapshot has another format or version
+        """
+        path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT or manifest.get("version") != VERSION:
+            raise ValueError(f"Unsupported snapshot in {directory}: "
+                             f"{manifest.get('format')} version {manifest.get('version')}")
+        return cls(directory, manifest, load_arrays(directory))
+
+    @property
+    def docs(self) -> int:
+        """Number of pattern numbers covered (one past the largest)."""
+        return self.manifest["docs"]
+
+    def __len__(self) -> int:
+        return self.manifest["patterns"]
+
+    def component(self, name: str) -> Optional[Dict[str, np.ndarray]]:
+        """Memory-mapped arrays stored for a component, or None."""
+        if name not in self.manifest["components"]:
+            return None
+        return load_arrays(os.path.join(self.directory, name))
+
+    def alive(self, doc: int) -> bool:
+        return bool(self._alive[doc])
+
+    def live_docs(self) -> np.ndarray:
+        return np.flatnonzero(self._alive)
+
+    def _field(self, name: str, doc: int) -> bytes:
+        start = int(self._arrays[f"{name}_starts"][doc])
+        return self._arrays[f"{name}_blob"][start:start + int(self._arrays[f"{name}_sizes"][doc])].tobytes()
+
+    def pattern_id(self, doc: int) -> str:
+        return self._field("id", doc).decode("utf-8")
+
+    def data(self, doc: int) -> str:
+        return self._field("data", doc).decode("utf-8")
+
+    def length(self, doc: int) -> int:
+        """Length of the pattern's data in characters."""
+        return int(self._lengths[doc])
+
+    def pattern(self, doc: int) -> Tuple[str, str, List[str], Dict[str, str]]:
+        """(id, data, labels, metadata) of a pattern."""
+        info = self._field("info", doc)
+        labels, metadata = json.loads(info) if info else ([], {})
+        return self.pattern_id(doc), self.data(doc), labels, metadata
+
+    def _lookup(self, name: str, value: str, field: str) -> List[int]:
+        keys, docs = self._arrays[f"{name}_keys"], self._arrays[f"{name}_docs"]
+        key = np.uint64(token_hash(value))
+        lo, hi = np.searchsorted(keys, key, side="left"), np.searchsorted(keys, key, side="right")
+        encoded = value.encode("utf-8")
+        return [int(doc) for doc in docs[lo:hi] if self._field(field, int(doc)) == encoded]
+
+    def find_id(self, pattern_id: str) -> Optional[int]:
+        """Pattern number stored under pattern_id, if any."""
+        found = self._lookup("id", pattern_id, "id")
+        return found[0] if found else None
+
+    def exact(self, data: str) -> List[int]:
+        """Pattern numbers whose data equals data."""
+        return self._lookup("exact", data, "data")
+
+    def contains(self, query: str) -> Tuple[List[int], List[int], List[int], int]:
+        """Return (pattern numbers, occurrences, pattern lengths, candidates examined) for patterns containing query."""
+        encoded = query.encode("utf-8")
+        if not encoded or b"\x00" in encoded:
+            return [], [], [], 0
+        keys = gram_keys(query)
+        if not len(keys):
+            return self._search_blob(encoded)
+
+        slots = np.searchsorted(self._gram_keys, keys)
+        slots = np.minimum(slots, len(self._gram_keys) - 1) if len(self._gram_keys) else slots
+        if not len(self._gram_keys) or not np.array_equal(self._gram_keys[slots], keys):
+            return [], [], [], 0
+        ptr = self._gram_ptr
+        postings = sorted((self._gram_docs[ptr[slot]:ptr[slot + 1]] for slot in slots.tolist()), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                return [], [], [], 0
+
+        # Verify against slices of the mapped blob (cheaper per candidate than array slicing)
+        blob, offset = self._data_map, self._data_offset
+        starts, sizes = self._data_starts[candidates] + offset, self._data_sizes[candidates]
+        docs, counts = [], []
+        for doc, start, size in zip(candidates.tolist(), starts.tolist(), sizes.tolist()):
+            count = count_occurrences(blob[start:start + size], encoded)
+            if count:
+                docs.append(doc)
+                counts.append(count)
+        return docs, counts, self._lengths[docs].tolist(), len(candidates)
+
+    def _search_blob(self, encoded: bytes) -> Tuple[List[int], List[int], List[int], int]:
+        # Queries shorter than a trigram: find every occurrence in the data blob
+        positions = []
+        blob, offset, end = self._data_map, self._data_offset, self._data_offset + len(self._data_blob)
+        position = blob.find(encoded, offset, end)
+        while position != -1:
+            positions.append(position - offset)
+            position = blob.find(encoded, position + 1, end)
+        if not positions:
+            return [], [], [], len(self)
+        owners = np.searchsorted(self._data_starts, np.array(positions), side="right") - 1
+        docs, counts = np.unique(owners, return_counts=True)
+        return docs.tolist(), counts.tolist(), self._lengths[docs].tolist(), len(self)
+
+    def token_size(self, doc: int) -> int:
+        """Number of distinct tokens of a pattern."""
+        return int(self._doc_token_counts[doc])
+
+    def token_count(self, key: int) -> int:
+        """Number of patterns with a token, by token hash."""
+        slot = np.searchsorted(self._token_keys, np.uint64(key))
+        if slot == len(self._token_keys) or self._token_keys[slot] != np.uint64(key):
+            return 0
+        return int(self._token_ptr[slot + 1] - self._token_ptr[slot])
+
+    def token_docs(self, key: int, min_size: float, max_size: float) -> np.ndarray:
+        """Patterns with a token (by hash) whose token count is within [min_size, max_size]."""
+        slot = np.searchsorted(self._token_keys, np.uint64(key))
+        if slot == len(self._token_keys) or self._token_keys[slot] != np.uint64(key):
+            return np.empty(0, dtype=np.int64)
+        start, end = int(self._token_ptr[slot]), int(self._token_ptr[slot + 1])
+        sizes = self._token_sizes[start:end]
+        lo = start + int(np.searchsorted(sizes, min_size, side="left"))
+        hi = start + int(np.searchsorted(sizes, max_size, side="right"))
+        return self._token_docs[lo:hi]
+
+    def overlaps(self, query_keys: np.ndarray, docs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (shared token counts, token counts) of docs against sorted query token hashes."""
+        positions, owners = _gather(self._doc_token_ptr, docs)
+        shared = np.isin(self._doc_token_keys[positions], query_keys)
+        return np.bincount(owners, weights=shared, minlength=len(docs)), self._doc_token_counts[docs]
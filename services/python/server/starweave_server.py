@@ -5,6 +5,7 @@ STARWEAVE gRPC Server
 This is the main gRPC server that combines all STARWEAVE services.
 """
 
+import asyncio
 import os
 import signal
 import threading
@@ -16,8 +17,16 @@ import grpc
 from grpc_health.v1 import health_pb2, health_pb2_grpc
 
 # Import service implementations
-from server.pattern_server import PatternService, HealthServicer as PatternHealthServicer
-from server.image_generation_servicer import ImageGenerationServicer
+from server.pattern_server import (
+    PatternService,
+    AsyncPatternService,
+    HealthServicer as PatternHealthServicer,
+    AsyncHealthServicer as AsyncPatternHealthServicer,
+)
+from server.image_generation_servicer import ImageGenerationServicer, AsyncImageGenerationServicer
+from server.pipeline_backends import get_backend
+from server.recognition import PatternIndex
+from server.transport import DEFAULT_PROFILES, TransportProfile, load_profiles, merge_profiles
 
 # Import generated protobuf code
 import starweave_pb2_grpc
@@ -25,17 +34,29 @@ import starweave_pb2_grpc
 class ServerManager:
     """Manages the gRPC server lifecycle."""
     
-    def __init__(self, port: int = 50051, max_workers: int = 10, model_dir: str = "./models"):
+    def __init__(self, port: int = 50051, max_workers: int = 10, model_dir: str = "./models",
+                 use_aio: bool = False, transport_profile: Optional[TransportProfile] = None,
+                 backend: str = "diffusers", pattern_corpus: Optional[str] = None):
         """Initialize the server manager.
         
         Args:
             port: Port to listen on
             max_workers: Maximum number of worker threads
             model_dir: Directory to store downloaded models
+            use_aio: Serve with the asyncio (grpc.aio) server instead of a thread pool
+            transport_profile: Transport settings; defaults to the pattern and
+                image profiles merged
+            backend: Image pipeline backend ("diffusers" or "synthetic")
+            pattern_corpus: JSON or JSON-lines file of labeled patterns
         """
         self.port = port
         self.max_workers = max_workers
         self.model_dir = model_dir
+        self.use_aio = use_aio
+        self.backend = backend
+        self.pattern_index = PatternIndex.from_file(pattern_corpus) if pattern_corpus else PatternIndex()
+        self.transport_profile = transport_profile or merge_profiles(
+            "starweave", *DEFAULT_PROFILES.values())
         self.server = None
         self.health_servicer = None
         self._stop_event = threading.Event()
@@ -53,13 +74,16 @@ class ServerManager:
     
     def start(self):
         """Start the gRPC server with all services."""
+        if self.use_aio:
+            asyncio.run(self._serve_aio())
+            return
+        
         # Create server with thread pool
         self.server = grpc.server(
             futures.ThreadPoolExecutor(max_workers=self.max_workers),
-            options=[
-                ('grpc.max_send_message_length', 50 * 1024 * 1024),  # 50MB
-                ('grpc.max_receive_message_length', 50 * 1024 * 1024),  # 50MB
-            ]
+            options=self.transport_profile.server_options(),
+            compression=self.transport_profile.default_compression(),
+            interceptors=self.transport_profile.interceptors()
         )
         
         # Initialize health service
@@ -67,11 +91,11 @@ class ServerManager:
         health_pb2_grpc.add_HealthServicer_to_server(self.health_servicer, self.server)
         
         # Add Pattern Service
-        pattern_service = PatternService()
+        pattern_service = PatternService(pattern_index=self.pattern_index)
         starweave_pb2_grpc.add_PatternServiceServicer_to_server(pattern_service, self.server)
         
         # Add Image Generation Service
-        image_service = ImageGenerationServicer(model_dir=self.model_dir)
+        image_service = ImageGenerationServicer(model_dir=self.model_dir, backend=get_backend(self.backend))
         starweave_pb2_grpc.add_ImageGenerationServiceServicer_to_server(image_service, self.server)
         
         # Start the server
@@ -79,7 +103,7 @@ class ServerManager:
         self.server.start()
         
         # Set health status to serving
-        self.health_servicer.set("", health_pb2.HealthCheckResponse.SERVING)
+        self.health_servicer.set_status(health_pb2.HealthCheckResponse.SERVING)
         
         print(f"STARWEAVE server started on port {self.port}")
         print("Services:")
@@ -94,6 +118,49 @@ class ServerManager:
         except KeyboardInterrupt:
             self.stop()
     
+    async def _serve_aio(self):
+        """Run all services on an asyncio (grpc.aio) server until stopped."""
+        server = grpc.aio.server(
+            options=self.transport_profile.server_options(),
+            compression=self.transport_profile.default_compression(),
+            interceptors=self.transport_profile.aio_interceptors()
+        )
+        
+        # Initialize health service
+        self.health_servicer = AsyncPatternHealthServicer()
+        health_pb2_grpc.add_HealthServicer_to_server(self.health_servicer, server)
+        
+        # Add Pattern Service
+        pattern_service = AsyncPatternService(PatternService(pattern_index=self.pattern_index),
+                                              max_workers=self.max_workers)
+        starweave_pb2_grpc.add_PatternServiceServicer_to_server(pattern_service, server)
+        
+        # Add Image Generation Service
+        image_service = AsyncImageGenerationServicer(
+            ImageGenerationServicer(model_dir=self.model_dir, backend=get_backend(self.backend)))
+        starweave_pb2_grpc.add_ImageGenerationServiceServicer_to_server(image_service, server)
+        
+        # Start the server
+        server.add_insecure_port(f'[::]:{self.port}')
+        await server.start()
+        self.health_servicer.set_status(health_pb2.HealthCheckResponse.SERVING)
+        
+        print(f"STARWEAVE asyncio server started on port {self.port}")
+        print("Services:")
+        print("  - PatternService")
+        print("  - ImageGenerationService")
+        print("  - Health Service")
+        
+        # Wait for stop() to be called from the signal handler
+        while not self._stop_event.is_set():
+            await asyncio.sleep(1)
+        
+        self.health_servicer.set_status(health_pb2.HealthCheckResponse.NOT_SERVING)
+        await server.stop(5.0)
+        pattern_service.shutdown()
+        image_service.shutdown()
+        print("Server stopped gracefully")
+    
     def stop(self, grace: float = 5.0):
         """Stop the gRPC server.
         
@@ -102,7 +169,7 @@ class ServerManager:
         """
         if self.server:
             if self.health_servicer:
-                self.health_servicer.set("", health_pb2.HealthCheckResponse.NOT_SERVING)
+                self.health_servicer.set_status(health_pb2.HealthCheckResponse.NOT_SERVING)
             
             # Give existing RPCs time to complete
             stopped = self.server.stop(grace).wait()
@@ -116,13 +183,19 @@ class ServerManager:
             self.server.wait_for_termination()
 
 
-def serve(port: int = 50051, max_workers: int = 10, model_dir: str = "./models"):
+def serve(port: int = 50051, max_workers: int = 10, model_dir: str = "./models",
+          use_aio: bool = False, transport_config: Optional[str] = None, backend: str = "diffusers",
+          pattern_corpus: Optional[str] = None):
     """Start the STARWEAVE gRPC server.
     
     Args:
         port: Port to listen on
         max_workers: Maximum number of worker threads
         model_dir: Directory to store downloaded models
+        use_aio: Serve with the asyncio (grpc.aio) server instead of a thread pool
+        transport_config: JSON file with transport profile overrides
+        backend: Image pipeline backend ("diffusers" or "synthetic")
+        pattern_corpus: JSON or JSON-lines file of labeled patterns
     """
     # Create models directory if it doesn't exist
     os.makedirs(model_dir, exist_ok=True)
@@ -139,7 +212,10 @@ def serve(port: int = 50051, max_workers: int = 10, model_dir: str = "./models")
     )
     
     # Start the server
-    server = ServerManager(port=port, max_workers=max_workers, model_dir=model_dir)
+    profiles = load_profiles(transport_config, DEFAULT_PROFILES)
+    server = ServerManager(port=port, max_workers=max_workers, model_dir=model_dir, use_aio=use_aio,
+                           transport_profile=merge_profiles("starweave", *profiles.values()),
+                           backend=backend, pattern_corpus=pattern_corpus)
     server.start()
 
 
@@ -152,7 +228,17 @@ if __name__ == '__main__':
                        help='Maximum number of worker threads')
     parser.add_argument('--model-dir', type=str, default='./models',
                        help='Directory to store downloaded models')
+    parser.add_argument('--aio', action='store_true',
+                       help='Serve with the asyncio (grpc.aio) server')
+    parser.add_argument('--transport-config', type=str, default=None,
+                       help='JSON file with transport profile overrides')
+    parser.add_argument('--backend', choices=['diffusers', 'synthetic'], default='diffusers',
+                       help='Image pipeline backend; synthetic needs no weights or GPU')
+    parser.add_argument('--pattern-corpus', type=str, default=None,
+                       help='JSON or JSON-lines file of labeled patterns')
     
     args = parser.parse_args()
     
-    serve(port=args.port, max_workers=args.workers, model_dir=args.model_dir)
+    serve(port=args.port, max_workers=args.workers, model_dir=args.model_dir, use_aio=args.aio,
+          transport_config=args.transport_config, backend=args.backend,
+          pattern_corpus=args.pattern_corpus)
@@ -0,0 +1,263 @@
+"""
+Suffix-array substring index over the pattern corpus.
+
+Patterns are UTF-8 encoded and concatenated, each followed by a separator.
+The suffix array is built by prefix doubling in NumPy. Ranks start from
+the bytes, and every separator gets its own rank below all bytes, so no
+suffix comparison runs across a pattern boundary and the number of
+doubling rounds is bounded by the longest pattern.
+
+The LCP array (common prefix length of each suffix and its predecessor)
+is computed for all adjacent pairs at once, comparing eight bytes per
+round. A contains query binary-searches the first suffix starting with
+the query, O(|q| log n). The matching suffixes run on from there while
+the LCP stays >= |q|. Mapping them back to patterns gives the matching
+pattern numbers and how often each contains the query.
+
+Arrays can be saved as .npy files and memory-mapped back, so a large
+index loads instantly and is shared between pre-forked workers through
+the page cache. Additions go to SuffixArrayIndex's delta and are merged
+by background rebuilds (see server.background_index).
+"""
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from server.background_index import BackgroundIndex
+
+SEPARATOR = b"\x00"  # Queries containing it never match
+
+_FILES = ("text", "sa", "lcp", "starts", "lengths")
+
+
+def count_occurrences(text: str, query: str) -> int:
+    """Count occurrences of query in text, including overlapping ones."""
+    count, start = 0, text.find(query)
+    while start != -1 and query:
+        count += 1
+        start = text.find(query, start + 1)
+    return count
+
+
+def _index_type(n: int):
+    return np.int32 if n < 2 ** 31 - 1 else np.int64
+
+
+def build_suffix_array(ranks: np.ndarray) -> np.ndarray:
+    """Sort suffixes of a sequence of positive integer ranks by prefix doubling."""
+    n = len(ranks)
+    index_type = _index_type(max(n, int(ranks.max(initial=0))))
+    rank = ranks.astype(index_type)
+    sa = np.arange(n, dtype=index_type)
+    k = 1
+    while n and k < n:
+        # Sort by (rank of the first k, rank of the next k); 0 sorts suffixes that end first
+        key = rank.astype(np.int64) * (int(rank.max()) + 1)
+        key[:n - k] += rank[k:]
+        sa = np.argsort(key).astype(index_type)
+        sorted_key = key[sa]
+        del key
+        sorted_rank = np.empty(n, dtype=index_type)
+        sorted_rank[0] = 1
+        np.cumsum(sorted_key[1:] != sorted_key[:-1], out=sorted_rank[1:])
+        del sorted_key
+        sorted_rank[1:] += 1
+        rank[sa] = sorted_rank
+        if sorted_rank[-1] == n:
+            break
+        k *= 2
+    return sa
+
+
+def _leading_zero_bytes(x: np.ndarray) -> np.ndarray:
+    count = np.zeros(len(x), dtype=np.int64)
+    done = np.zeros(len(x), dtype=bool)
+    for shift in range(56, -8, -8):
+        nonzero = ((x >> np.uint64(shift)) & np.uint64(0xFF)) != 0
+        count += ~(done | nonzero)
+        done |= nonzero
+    return count
+
+
+def build_lcp(text: np.ndarray, sa: np.ndarray, limit: np.ndarray) -> np.ndarray:
+    """LCP of each suffix with its predecessor in sa, capped by limit (bytes left before the separator)."""
+    n = len(text)
+    lcp = np.zeros(n, dtype=np.int32)
+    if n < 2:
+        return lcp
+
+    # Big-endian 8-byte word starting at every position
+    padded = np.concatenate([text, np.zeros(8, dtype=np.uint8)])
+    words = np.zeros(n, dtype=np.uint64)
+    for j in range(8):
+        words <<= np.uint64(8)
+        words |= padded[j:j + n]
+
+    first, second = sa[:-1], sa[1:]
+    cap = np.minimum(limit[first], limit[second])
+    length = np.zeros(n - 1, dtype=cap.dtype)
+    active = np.flatnonzero(cap > 0)
+    while active.size:
+        diff = words[first[active] + length[active]] ^ words[second[active] + length[active]]
+        equal = diff == 0
+        done = active[~equal]
+        length[done] += _leading_zero_bytes(diff[~equal])
+        active = active[equal]
+        length[active] += 8
+        active = active[length[active] < cap[active]]
+    lcp[1:] = np.minimum(length, cap)
+    return lcp
+
+
+class SuffixArray:
+    """Immutable suffix array with LCP over concatenated patterns.
+
+    Args:
+        text: Concatenated UTF-8 patterns, each followed by SEPARATOR
+        sa: Suffix start offsets in sorted order
+        lcp: lcp[i] is the common prefix length of suffixes sa[i - 1] and sa[i]
+        starts: Byte offset of each pattern in text
+        lengths: Length of each pattern in characters (for scoring)
+        docs: Pattern number of each pattern
+    """
+
+    def __init__(self, text: np.ndarray, sa: np.ndarray, lcp: np.ndarray, starts: np.ndarray,
+                 lengths: np.ndarray, docs: np.ndarray):
+        self.text = text
+        self.sa = sa
+        self.lcp = lcp
+        self.starts = starts
+        self.lengths = lengths
+        self.docs = docs
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @classmethod
+    def build(cls, patterns: List[Tuple[str, int]]) -> "SuffixArray":
+        """Build from (text, pattern number) pairs."""
+        encoded = [text.encode("utf-8") for text, _ in patterns]
+        sizes = np.fromiter((len(data) + 1 for data in encoded), dtype=np.int64, count=len(encoded))
+        text = np.frombuffer(SEPARATOR.join(encoded) + SEPARATOR, dtype=np.uint8) if encoded else \
+            np.empty(0, dtype=np.uint8)
+        del encoded
+        index_type = _index_type(len(text) + len(sizes) + 256)
+        starts = np.zeros(len(sizes), dtype=index_type)
+        np.cumsum(sizes[:-1], out=starts[1:])
+        ends = starts + (sizes - 1).astype(index_type)  # Separator positions
+
+        # Separator of pattern j ranks j + 1, below every byte
+        ranks = text.astype(index_type) + (len(sizes) + 1)
+        ranks[ends] = np.arange(1, len(sizes) + 1, dtype=index_type)
+        sa = build_suffix_array(ranks)
+        del ranks
+
+        # Bytes left before the owning pattern's separator, for every position
+        limit = np.repeat(ends, sizes) - np.arange(len(text), dtype=index_type)
+        lcp = build_lcp(text, sa, limit)
+
+        lengths = np.fromiter((len(data) for data, _ in patterns), dtype=np.int64, count=len(patterns))
+        docs = np.fromiter((doc for _, doc in patterns), dtype=np.int64, count=len(patterns))
+        return cls(text, sa, lcp, starts, lengths, docs)
+
+    def find(self, query: bytes) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (pattern slots, occurrences) for patterns containing query.
+
+        Slots index docs and lengths.
+        """
+        m = len(query)
+        none = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        if m == 0 or SEPARATOR in query or not len(self.sa):
+            return none
+        text, sa = self.text, self.sa
+
+        # First suffix >= query
+        lo, hi = 0, len(sa)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = int(sa[mid])
+            if text[start:start + m].tobytes() < query:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(sa) or text[int(sa[lo]):int(sa[lo]) + m].tobytes() != query:
+            return none
+
+        # The run of suffixes with the query as prefix ends where the LCP drops below |q|
+        end, step = lo + 1, 64
+        while end < len(sa):
+            window = self.lcp[end:end + step]
+            below = np.flatnonzero(window < m)
+            if below.size:
+                end += int(below[0])
+                break
+            end += len(window)
+            step *= 2
+
+        # Sorted positions make the owner lookup cache-friendly and the owners sorted
+        owners = np.searchsorted(self.starts, np.sort(sa[lo:end]), side="right") - 1
+        firsts = np.flatnonzero(np.diff(owners, prepend=-1))
+        return owners[firsts], np.diff(firsts, append=len(owners))
+
+    def export(self) -> Dict[str, np.ndarray]:
+        """The arrays by constructor argument, for SuffixArray(**arrays) (see server.snapshot)."""
+        return {name: getattr(self, name) for name in _FILES + ("docs",)}
+
+    def save(self, directory: str, ids: List[str]) -> None:
+        """Write the arrays and the pattern ids (in pattern order) to directory."""
+        os.makedirs(directory, exist_ok=True)
+        for name in _FILES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "ids.json"), "w") as f:
+            json.dump(ids, f)
+
+    @classmethod
+    def load(cls, directory: str) -> Tuple[Optional["SuffixArray"], List[str]]:
+        """Memory-map a saved suffix array; returns (None, []) if directory has none.
+
+        The returned array has no pattern numbers yet (docs is empty); callers
+        map the returned ids to their own numbering.
+        """
+        if not os.path.exists(os.path.join(directory, "ids.json")):
+            return None, []
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in _FILES}
+        with open(os.path.join(directory, "ids.json")) as f:
+            ids = json.load(f)
+        return cls(docs=np.empty(0, dtype=np.int64), **arrays), ids
+
+
+class SuffixArrayIndex(BackgroundIndex):
+    """Suffix array over the corpus with a delta of recent additions.
+
+    See BackgroundIndex for the arguments.
+    """
+
+    def build(self, patterns: List[Tuple[str, int]]) -> SuffixArray:
+        return SuffixArray.build(patterns)
+
+    def find(self, query: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (pattern numbers, occurrences, pattern lengths) for patterns containing query.
+
+        Removed patterns may still be reported until the next rebuild.
+        """
+        array, delta = self._state
+        slots, counts = array.find(query.encode("utf-8"))
+        docs, lengths = array.docs[slots], array.lengths[slots]
+        extra = [(doc, count, len(pattern)) for pattern, doc in delta
+                 for count in (count_occurrences(pattern, query),) if count]
+        if extra:
+            docs, counts, lengths = (np.concatenate([column, np.array(values, dtype=np.int64)])
+                                     for column, values in zip((docs, counts, lengths), zip(*extra)))
+        return docs, counts, lengths
+
+    def stats(self) -> Dict[str, int]:
+        array, _ = self._state
+        stats = super().stats()
+        return {
+            "suffix_array_patterns": len(array),
+            "suffix_array_bytes": len(array.text),
+            "suffix_array_delta": stats["delta"],
+            "suffix_array_rebuilds": stats["rebuilds"],
+        }
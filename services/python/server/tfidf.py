@@ -0,0 +1,311 @@
+"""
+Hashed TF-IDF vectors with cosine scoring by sparse matrix products.
+
+Patterns are tokenized like the jaccard strategy, hashed into
+``n_features`` buckets (scikit-learn's HashingVectorizer, stable across
+processes) and stored as sublinear term frequencies (1 + log tf) in CSR
+blocks. Blocks are feature-major (features x patterns), so each feature's
+row is its posting list and a product only reads the postings of the
+query's features, not the whole matrix.
+
+IDF is not baked in. Document frequencies are kept per feature and
+updated on every add and remove. The smoothed IDF splits into a global
+part and a per-feature part, ``idf_f = log(1 + N) + 1 - log(1 + df_f)``,
+so each pattern's squared norm is ``c^2 A + 2 c B + C`` with c the global
+part. Per pattern, A, B and C are sums of tf^2, tf^2 g and tf^2 g^2 over
+its features, with ``g_f = -log(1 + df_f)``. A new pattern only moves c
+for everyone. B and C change only for features whose document frequency
+changed, and are patched from those features' postings before the next
+query.
+
+A batch of queries becomes one (queries x features) matrix, and each
+block is scored with a single sparse matrix product (one query is the
+matrix-vector case). Per query, top_k is taken from the nonzero scores
+with argpartition.
+
+Blocks merge like an LSM tree. A new block merges with its predecessor
+while that one is at most twice its size, so appends are cheap, queries
+touch O(log n) blocks, and removed patterns are dropped as blocks merge.
+
+Writers must be serialized by the caller, and their changes reach queries
+at the next publish(). Published blocks are never changed: masking a
+pattern or patching norm terms makes a new block that shares the
+postings. Queries take the published (blocks, document frequencies,
+count) state once and need no lock.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+DEFAULT_FEATURES = 2 ** 20
+
+
+def _feature_weight(df: np.ndarray) -> np.ndarray:
+    # Per-feature part of the smoothed IDF
+    return -np.log1p(df.astype(np.float64))
+
+
+class _Block:
+    """Transposed TF matrix (features x patterns) for ascending pattern numbers.
+
+    Norm terms are consistent with the document frequencies last applied by
+    HashedTfidf. Once published a block is not changed; see patched() and
+    without().
+    """
+
+    def __init__(self, postings: sparse.csr_matrix, docs: np.ndarray, weights: np.ndarray):
+        self.postings = postings
+        self.docs = docs
+        self.alive = np.ones(len(docs), dtype=bool)
+        squared = postings.T.copy()  # Patterns x features
+        squared.data **= 2
+        self.a = np.asarray(squared.sum(axis=1), dtype=np.float64).ravel()
+        self.b = squared @ weights
+        self.c = squared @ weights ** 2
+        self.norms: Optional[Tuple[float, np.ndarray]] = None  # (scale, norms), set in one assignment
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _copy(self) -> "_Block":
+        copy = _Block.__new__(_Block)
+        copy.__dict__.update(self.__dict__)
+        return copy
+
+    def patched(self, features: np.ndarray, old: np.ndarray, new: np.ndarray) -> "_Block":
+        """A copy with the norm terms patched for the weights of features changing from old to new."""
+        squared = self.postings[features]
+        squared.data **= 2
+        block = self._copy()
+        block.b = self.b + squared.T @ (new - old)
+        block.c = self.c + squared.T @ (new ** 2 - old ** 2)
+        block.norms = None
+        return block
+
+    def without(self, slots: np.ndarray) -> "_Block":
+        """A copy with the patterns in slots masked."""
+        block = self._copy()
+        block.alive = self.alive.copy()
+        block.alive[slots] = False
+        return block
+
+    def pattern_norms(self, scale: float) -> np.ndarray:
+        """Norms of the patterns' TF-IDF vectors for the global IDF part scale."""
+        cached = self.norms
+        if cached is not None and cached[0] == scale:
+            return cached[1]
+        norms = np.sqrt(np.maximum(scale ** 2 * self.a + 2 * scale * self.b + self.c, 0))
+        # Concurrent queries may both compute it; either result is the same
+        self.norms = (scale, norms)
+        return norms
+
+
+class HashedTfidf:
+    """Hashed TF-IDF index over pattern texts.
+
+    Args:
+        analyzer: Splits a text into tokens
+        n_features: Number of hash buckets
+    """
+
+    def __init__(self, analyzer: Callable[[str], List[str]], n_features: int = DEFAULT_FEATURES):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.n_features = n_features
+        self._vectorizer = HashingVectorizer(
+            analyzer=analyzer, n_features=n_features, alternate_sign=False, norm=None, dtype=np.float32)
+        self._blocks: List[_Block] = []
+        self._df = np.zeros(n_features, dtype=np.int64)
+        self._applied_df = self._df.copy()  # What the blocks' norm terms reflect
+        self._weights = _feature_weight(self._applied_df)
+        self._dirty = False
+        self._count = 0
+        self.publish()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _tf(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        matrix = self._vectorizer.transform(texts)
+        np.log(matrix.data, out=matrix.data)
+        matrix.data += 1
+        return matrix
+
+    def vectors(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        """Term frequency rows for texts, to add later with add_vectors()."""
+        return self._tf(texts)
+
+    def add(self, docs: Sequence[int], texts: Sequence[str]) -> None:
+        """Add patterns; pattern numbers must be larger than any added before. Searched after publish()."""
+        self.add_vectors(docs, self._tf(texts))
+
+    def add_vectors(self, docs: Sequence[int], matrix: sparse.csr_matrix) -> None:
+        """Add patterns from rows computed by vectors(). Searched after publish()."""
+        if not len(docs):
+            return
+        self._df += np.bincount(matrix.indices, minlength=self.n_features)
+        self._dirty = True
+        self._count += len(docs)
+        block = _Block(matrix.T.tocsr(), np.asarray(docs, dtype=np.int64), self._weights)
+        self._blocks.append(block)
+        while len(self._blocks) > 1 and len(self._blocks[-2]) <= 2 * len(self._blocks[-1]):
+            newer = self._blocks.pop()
+            self._blocks[-1] = self._merge(self._blocks[-1], newer)
+
+    def remove(self, doc: int, text: str) -> None:
+        """Mask a pattern (added with text) and take it out of the document frequencies."""
+        self.remove_many([doc], [text])
+
+    def remove_many(self, docs: Iterable[int], texts: Iterable[str]) -> None:
+        """Like remove() for each pattern number and its text. Searched after publish()."""
+        docs = np.fromiter(docs, dtype=np.int64)
+        texts = list(texts)
+        removed = np.zeros(len(docs), dtype=bool)
+        for position, block in enumerate(self._blocks):
+            if not len(block):
+                continue
+            slots = np.searchsorted(block.docs, docs).clip(max=len(block) - 1)
+            found = (block.docs[slots] == docs) & block.alive[slots]
+            if found.any():
+                self._blocks[position] = block.without(slots[found])
+                removed |= found
+        if removed.any():
+            self._df -= np.bincount(self._tf([text for text, hit in zip(texts, removed) if hit]).indices,
+                                    minlength=self.n_features)
+            self._dirty = True
+            self._count -= int(removed.sum())
+
+    @staticmethod
+    def _merge(*blocks: _Block) -> _Block:
+        merged = _Block.__new__(_Block)
+        merged.postings = sparse.hstack([block.postings for block in blocks], format="csr")
+        merged.docs = np.concatenate([block.docs for block in blocks])
+        merged.a, merged.b, merged.c = (np.concatenate([getattr(block, term) for block in blocks])
+                                        for term in ("a", "b", "c"))
+        alive = np.concatenate([block.alive for block in blocks])
+        if not alive.all():
+            merged.postings = merged.postings[:, alive]
+            merged.docs, merged.a, merged.b, merged.c = (
+                column[alive] for column in (merged.docs, merged.a, merged.b, merged.c))
+        merged.alive = np.ones(len(merged.docs), dtype=bool)
+        merged.norms = None
+        return merged
+
+    def _apply_document_frequencies(self) -> None:
+        if not self._dirty:
+            return
+        self._dirty = False
+        changed = np.flatnonzero(self._df != self._applied_df)
+        if not changed.size:
+            return
+        old, new = _feature_weight(self._applied_df[changed]), _feature_weight(self._df[changed])
+        self._blocks = [block.patched(changed, old, new) for block in self._blocks]
+        self._applied_df[changed] = self._df[changed]
+        self._weights[changed] = new
+
+    def publish(self) -> None:
+        """Make the writes so far visible to search()."""
+        self._apply_document_frequencies()
+        # (blocks, document frequencies, count); replaced whole, never changed
+        self._state = (tuple(self._blocks), self._df.copy(), self._count)
+
+    @property
+    def state(self) -> Tuple:
+        """The published state, for search() and export()."""
+        return self._state
+
+    def search(self, texts: Sequence[str], top_k: int, min_score: float = 0.0,
+               state: Optional[Tuple] = None) -> List[Tuple[List[Tuple[float, int]], int]]:
+        """Score every text against the corpus of state (see the state property), or the current one.
+
+        Returns, per text, the top_k (cosine score, pattern number) pairs best
+        first, and the number of patterns that scored above min_score.
+        """
+        blocks, df, count = state or self._state
+        results: List[Tuple[List[Tuple[float, int]], int]] = [([], 0) for _ in texts]
+        if not texts or not count:
+            return results
+
+        scale = np.log1p(count) + 1
+        queries = self._tf(texts)
+        idf = scale + _feature_weight(df[queries.indices])
+        queries.data *= idf
+        query_norms = np.sqrt(np.bincount(
+            np.repeat(np.arange(len(texts)), np.diff(queries.indptr)), queries.data ** 2, minlength=len(texts)))
+        # Patterns hold tf only, so the pattern-side IDF is folded into the queries
+        queries.data *= idf
+
+        rows, docs, scores = [], [], []
+        for block in blocks:
+            products = (queries @ block.postings).tocoo()
+            cols = products.col
+            denominator = query_norms[products.row] * block.pattern_norms(scale)[cols]
+            score = products.data / np.where(denominator > 0, denominator, 1)
+            keep = block.alive[cols] & (score > 0) & (score >= min_score)
+            rows.append(products.row[keep])
+            docs.append(block.docs[cols[keep]])
+            scores.append(score[keep])
+        if not rows:
+            return results
+
+        rows, docs, scores = np.concatenate(rows), np.concatenate(docs), np.concatenate(scores)
+        order = np.argsort(rows, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(texts)))])
+        for query in range(len(texts)):
+            selected = order[bounds[query]:bounds[query + 1]]
+            candidates = len(selected)
+            if len(selected) > top_k:
+                selected = selected[np.argpartition(-scores[selected], top_k - 1)[:top_k]]
+            # Best score first, then lowest pattern number
+            selected = selected[np.lexsort((docs[selected], -scores[selected]))]
+            results[query] = ([(float(scores[i]), int(docs[i])) for i in selected], candidates)
+        return results
+
+    def export(self, state: Optional[Tuple] = None) -> Dict[str, np.ndarray]:
+        """Arrays of state (or the current one) with its blocks merged into one, for restore() (see server.snapshot).
+
+        The index itself is not changed.
+        """
+        blocks, df, _ = state or self._state
+        arrays = {"df": df}
+        if blocks:
+            # Merging drops masked patterns, which restore() would otherwise take as live
+            block = blocks[0] if len(blocks) == 1 and blocks[0].alive.all() else self._merge(*blocks)
+            arrays.update(data=block.postings.data, indices=block.postings.indices, indptr=block.postings.indptr,
+                          docs=block.docs, a=block.a, b=block.b.copy(), c=block.c.copy())
+        return arrays
+
+    def restore(self, arrays: Dict[str, np.ndarray]) -> bool:
+        """Adopt arrays from export(); False if they were built with another n_features.
+
+        The postings stay memory-mapped; the terms patched by later writes are copied.
+        """
+        if len(arrays["df"]) != self.n_features:
+            return False
+        self._df = np.array(arrays["df"])
+        self._applied_df = self._df.copy()
+        self._weights = _feature_weight(self._applied_df)
+        self._dirty = False
+        self._blocks = []
+        self._count = 0
+        if "docs" in arrays:
+            block = _Block.__new__(_Block)
+            block.docs = arrays["docs"]
+            block.postings = sparse.csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]), shape=(self.n_features, len(block.docs)),
+                copy=False)
+            block.alive = np.ones(len(block.docs), dtype=bool)
+            block.a, block.b, block.c = arrays["a"], arrays["b"], arrays["c"]
+            block.norms = None
+            self._blocks.append(block)
+            self._count = len(block.docs)
+        self.publish()
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tfidf_patterns": self._count,
+            "tfidf_blocks": len(self._blocks),
+            "tfidf_nonzeros": sum(block.postings.nnz for block in self._blocks),
+        }
@@ -0,0 +1,398 @@
+"""
+Sliding-window frequency sketches over streamed patterns.
+
+TrendWindow answers "what is trending in the last few minutes" in constant
+memory. Each pattern seen on a stream is an event with a key, a
+timestamp and the labels it was recognized with. An event costs O(1):
+
+* Count-Min sketch: depth rows of width counters. An event adds one to a
+  counter per row, and a key's estimate is the smallest of its counters.
+  Estimates never fall below the true count and exceed it by at most
+  e/width of the events, except with probability e^-depth.
+* Space-Saving: the capacity most frequent keys, in a stream summary
+  (counters grouped in buckets of equal count, buckets in a linked list
+  ordered by count). A new key, once the summary is full, takes over the
+  counter of a least frequent key and inherits its count as error. Any
+  key seen more than events/capacity times is kept.
+* HyperLogLog per label: 2^precision registers holding the largest
+  leading-zero run seen among the hashes of the label's keys. It estimates
+  the number of distinct keys with a relative error of about
+  1.04/sqrt(2^precision).
+
+The window is a ring of slices, each covering slice_seconds of event time
+with sketches of its own. An event goes to the slice of its timestamp.
+The slice is reset when the ring comes back to it for a later period. A
+query merges the slices of the requested window: Count-Min and label
+counts by adding, HyperLogLog registers by taking their maximum, and
+Space-Saving summaries by adding counts (a key missing from a full
+summary counts as that summary's minimum, in its count and its error).
+Events older than the window are dropped and counted as late.
+"""
+import hashlib
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_WINDOW = 300.0
+DEFAULT_SLICES = 10
+DEFAULT_WIDTH = 2048
+DEFAULT_DEPTH = 4
+DEFAULT_CAPACITY = 1000
+DEFAULT_PRECISION = 10
+DEFAULT_MAX_LABELS = 1024
+
+
+def key_hash(key: str) -> Tuple[int, int]:
+    """Two independent 64-bit hashes of a key."""
+    digest = hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+class CountMinSketch:
+    """Count-Min sketch of depth rows by width counters.
+
+    Rows are indexed by double hashing (h1 + row * h2) of key_hash(), so
+    one hash per key serves every row.
+    """
+
+    def __init__(self, width: int = DEFAULT_WIDTH, depth: int = DEFAULT_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self._rows = np.arange(depth, dtype=np.uint64)
+
+    def columns(self, hashes: Sequence[Tuple[int, int]]) -> np.ndarray:
+        """Counter of each key (row) in each sketch row (column)."""
+        pairs = np.array(hashes, dtype=np.uint64).reshape(-1, 2)
+        columns = (pairs[:, :1] + self._rows * (pairs[:, 1:] | np.uint64(1))) % np.uint64(self.width)
+        return columns.astype(np.intp)
+
+    def add(self, columns: np.ndarray) -> None:
+        """Count keys given by their columns()."""
+        np.add.at(self.table, (np.broadcast_to(np.arange(self.depth), columns.shape), columns), 1)
+
+    def estimate(self, hashes: Sequence[Tuple[int, int]], table: Optional[np.ndarray] = None) -> np.ndarray:
+        """Upper bounds of keys' counts, from this sketch or a merged table of the same shape."""
+        table = self.table if table is None else table
+        if not len(hashes):
+            return np.zeros(0, dtype=np.int64)
+        return table[np.arange(self.depth), self.columns(hashes)].min(axis=1)
+
+    def clear(self) -> None:
+        self.table.fill(0)
+
+
+class _Bucket:
+    """Keys of a Space-Saving summary that share one count."""
+
+    __slots__ = ("count", "keys", "prev", "next")
+
+    def __init__(self, count: int):
+        self.count = count
+        self.keys: Dict[str, None] = {}  # Insertion-ordered set
+        self.prev: Optional["_Bucket"] = None
+        self.next: Optional["_Bucket"] = None
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters in a stream summary of capacity counters.
+
+    add() is O(1): a key moves from its bucket to the next count's.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._bucket: Dict[str, _Bucket] = {}
+        self._error: Dict[str, int] = {}
+        self._head: Optional[_Bucket] = None  # Lowest count
+
+    def __len__(self) -> int:
+        return len(self._bucket)
+
+    @property
+    def minimum(self) -> int:
+        """Count a key not in the summary may have: the lowest count once full, else 0."""
+        return self._head.count if self._head is not None and len(self._bucket) >= self.capacity else 0
+
+    def add(self, key: str) -> None:
+        bucket = self._bucket.get(key)
+        if bucket is None:
+            if len(self._bucket) < self.capacity:
+                if self._head is None or self._head.count != 1:
+                    new = _Bucket(1)
+                    self._link_after(None, new)
+                self._head.keys[key] = None
+                self._bucket[key] = self._head
+                self._error[key] = 0
+                return
+            # Full: the new key takes over a least frequent key's counter
+            bucket = self._head
+            victim = next(iter(bucket.keys))
+            del bucket.keys[victim], self._bucket[victim], self._error[victim]
+            bucket.keys[key] = None
+            self._bucket[key] = bucket
+            self._error[key] = bucket.count
+        self._increment(key, bucket)
+
+    def _increment(self, key: str, bucket: _Bucket) -> None:
+        target = bucket.next
+        if target is None or target.count != bucket.count + 1:
+            target = _Bucket(bucket.count + 1)
+            self._link_after(bucket, target)
+        del bucket.keys[key]
+        target.keys[key] = None
+        self._bucket[key] = target
+        if not bucket.keys:
+            self._unlink(bucket)
+
+    def _link_after(self, bucket: Optional[_Bucket], new: _Bucket) -> None:
+        """Insert new after bucket, or at the head if bucket is None."""
+        following = bucket.next if bucket is not None else self._head
+        new.prev, new.next = bucket, following
+        if following is not None:
+            following.prev = new
+        if bucket is not None:
+            bucket.next = new
+        else:
+            self._head = new
+
+    def _unlink(self, bucket: _Bucket) -> None:
+        if bucket.prev is not None:
+            bucket.prev.next = bucket.next
+        else:
+            self._head = bucket.next
+        if bucket.next is not None:
+            bucket.next.prev = bucket.prev
+
+    def counters(self) -> Dict[str, Tuple[int, int]]:
+        """(count, error) per key in the summary."""
+        return {key: (bucket.count, self._error[key]) for key, bucket in self._bucket.items()}
+
+    def clear(self) -> None:
+        self._bucket.clear()
+        self._error.clear()
+        self._head = None
+
+
+class HyperLogLog:
+    """HyperLogLog distinct count over 2^precision byte registers."""
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)  # Cheaper than NumPy to update one at a time
+
+    def add(self, hashes: Tuple[int, int]) -> None:
+        value = hashes[0]
+        register = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def array(self) -> np.ndarray:
+        return np.frombuffer(self.registers, dtype=np.uint8)
+
+    @staticmethod
+    def estimate(registers: np.ndarray) -> int:
+        """Distinct count estimated from (possibly merged) registers."""
+        size = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        raw = alpha * size * size / float(np.sum(np.ldexp(1.0, -registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(registers == 0))
+        if raw <= 2.5 * size and zeros:
+            return int(round(size * math.log(size / zeros)))  # Linear counting for small sets
+        return int(round(raw))
+
+
+class _Slice:
+    """Sketches of the events of one slice_seconds period."""
+
+    def __init__(self, width: int, depth: int, capacity: int):
+        self.period = -1
+        self.events = 0
+        self.counts = CountMinSketch(width, depth)
+        self.hitters = SpaceSaving(capacity)
+        self.labels: Dict[str, int] = {}
+        self.distinct: Dict[str, HyperLogLog] = {}
+
+    def reset(self, period: int) -> None:
+        self.period = period
+        self.events = 0
+        self.counts.clear()
+        self.hitters.clear()
+        self.labels.clear()
+        self.distinct.clear()
+
+
+@dataclass
+class HeavyHitter:
+    """A frequent key: its count is an upper bound, count - error a lower bound."""
+
+    key: str
+    count: int
+    error: int
+
+
+@dataclass
+class LabelTrend:
+    label: str
+    count: int
+    distinct: int
+
+
+@dataclass
+class Trends:
+    """What a window of a TrendWindow saw."""
+
+    window_seconds: float
+    total: int
+    hitters: List[HeavyHitter] = field(default_factory=list)
+    labels: List[LabelTrend] = field(default_factory=list)
+    estimates: Dict[str, int] = field(default_factory=dict)
+    late: int = 0
+
+
+class TrendWindow:
+    """Count-Min, Space-Saving and per-label HyperLogLog sketches over a sliding window.
+
+    Args:
+        window: Seconds of event time kept
+        slices: Periods the window is divided into; a query covers whole periods
+        width: Count-Min counters per row (estimates are off by at most e/width of the events)
+        depth: Count-Min rows (and the error bound fails with probability e^-depth)
+        capacity: Space-Saving counters per slice
+        precision: HyperLogLog registers per label and slice, as a power of two
+        max_labels: Labels tracked per slice; events' further labels are counted as dropped
+    """
+
+    def __init__(self, window: float = DEFAULT_WINDOW, slices: int = DEFAULT_SLICES, width: int = DEFAULT_WIDTH,
+                 depth: int = DEFAULT_DEPTH, capacity: int = DEFAULT_CAPACITY, precision: int = DEFAULT_PRECISION,
+                 max_labels: int = DEFAULT_MAX_LABELS):
+        if window <= 0 or slices < 1:
+            raise ValueError("A trend window needs a positive length and at least one slice")
+        self.window = window
+        self.slice_seconds = window / slices
+        self.precision = precision
+        self.max_labels = max_labels
+        self._slices = [_Slice(width, depth, capacity) for _ in range(slices)]
+        self._lock = threading.Lock()
+        self.events = 0
+        self.late = 0
+        self.dropped_labels = 0
+
+    def observe(self, key: str, timestamp: float = 0.0, labels: Sequence[str] = ()) -> None:
+        """Count one event (see observe_many)."""
+        self.observe_many([(key, timestamp, labels)])
+
+    def observe_many(self, events: Iterable[Tuple[str, float, Sequence[str]]], now: Optional[float] = None) -> None:
+        """Count (key, timestamp, labels) events.
+
+        A timestamp is seconds since the epoch; 0 (unset) or one in the
+        future means now. Events older than the window are dropped.
+        """
+        now = time.time() if now is None else now
+        current = int(now // self.slice_seconds)
+        prepared = []
+        for key, timestamp, labels in events:
+            period = int(timestamp // self.slice_seconds) if 0 < timestamp < now else current
+            prepared.append((key_hash(key), key, period, labels))
+        if not prepared:
+            return
+        columns = self._slices[0].counts.columns([hashes for hashes, _, _, _ in prepared])
+        with self._lock:
+            counted: Dict[int, List[int]] = {}  # Ring slot: events whose Count-Min columns it gets
+            for number, (hashes, key, period, labels) in enumerate(prepared):
+                self.events += 1
+                if period <= current - len(self._slices):
+                    self.late += 1
+                    continue
+                slot = period % len(self._slices)
+                ring = self._slices[slot]
+                if ring.period != period:
+                    if ring.period > period:  # Reused for a later period already
+                        self.late += 1
+                        continue
+                    ring.reset(period)
+                    counted.pop(slot, None)
+                counted.setdefault(slot, []).append(number)
+                ring.events += 1
+                ring.hitters.add(key)
+                for label in labels:
+                    distinct = ring.distinct.get(label)
+                    if distinct is None:
+                        if len(ring.distinct) >= self.max_labels:
+                            self.dropped_labels += 1
+                            continue
+                        distinct = ring.distinct[label] = HyperLogLog(self.precision)
+                    ring.labels[label] = ring.labels.get(label, 0) + 1
+                    distinct.add(hashes)
+            for slot, numbers in counted.items():
+                self._slices[slot].counts.add(columns[numbers])
+
+    def query(self, window: float = 0.0, top_k: int = 10, keys: Sequence[str] = (),
+              now: Optional[float] = None) -> Trends:
+        """Heavy hitters, label counts and Count-Min estimates for keys over the last window seconds.
+
+        The window is rounded up to whole slices, the current one included;
+        0 or more than the kept window means all of it.
+        """
+        now = time.time() if now is None else now
+        current = int(now // self.slice_seconds)
+        count = len(self._slices)
+        if 0 < window < self.window:
+            count = min(count, max(1, math.ceil(window / self.slice_seconds)))
+        with self._lock:
+            live = [ring for ring in self._slices if current - count < ring.period <= current]
+            total = sum(ring.events for ring in live)
+            table = sum((ring.counts.table for ring in live), np.zeros_like(self._slices[0].counts.table))
+            summaries = [(ring.hitters.counters(), ring.hitters.minimum) for ring in live]
+            labels: Dict[str, int] = {}
+            registers: Dict[str, np.ndarray] = {}
+            for ring in live:
+                for label, label_count in ring.labels.items():
+                    labels[label] = labels.get(label, 0) + label_count
+                    merged = registers.get(label)
+                    registers[label] = (ring.distinct[label].array().copy() if merged is None
+                                        else np.maximum(merged, ring.distinct[label].array()))
+            late = self.late
+
+        sketch = self._slices[0].counts
+        merged_counts: Dict[str, List[int]] = {}
+        for counters, _ in summaries:
+            for key in counters:
+                merged_counts.setdefault(key, [0, 0])
+        for counters, minimum in summaries:
+            for key, totals in merged_counts.items():
+                key_count, key_error = counters.get(key, (minimum, minimum))
+                totals[0] += key_count
+                totals[1] += key_error
+        hitters = []
+        estimates = sketch.estimate([key_hash(key) for key in merged_counts], table)
+        for (key, (key_count, key_error)), estimate in zip(merged_counts.items(), estimates.tolist()):
+            # Both counts are upper bounds; the lower bound is the summary's count less its error
+            upper = min(key_count, estimate)
+            hitters.append(HeavyHitter(key, upper, upper - (key_count - key_error)))
+        hitters.sort(key=lambda hitter: (-hitter.count, hitter.error, hitter.key))
+        label_trends = sorted((LabelTrend(label, label_count, HyperLogLog.estimate(registers[label]))
+                               for label, label_count in labels.items()),
+                              key=lambda trend: (-trend.count, trend.label))
+        return Trends(
+            window_seconds=count * self.slice_seconds,
+            total=total,
+            hitters=hitters[:top_k],
+            labels=label_trends,
+            estimates=dict(zip(keys, sketch.estimate([key_hash(key) for key in keys], table).tolist())),
+            late=late,
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "trend_events": self.events,
+                "trend_late_events": self.late,
+                "trend_dropped_labels": self.dropped_labels,
+            }
@@ -0,0 +1,571 @@
+"""
+Dense-vector patterns served by cosine or inner-product top-k.
+
+A pattern whose metadata has ``vector=float32`` carries little-endian
+float32 values in Pattern.data instead of text. Queries declared the same
+way are viewed with numpy.frombuffer, without copying the request bytes,
+and searched with the "cosine" or "dot" strategy. Vector patterns never
+reach the text indexes.
+
+Stored vectors live in one contiguous float32 matrix of unit rows, plus
+their norms, so cosine and inner-product scores both come from one product
+with the query (times the norms for "dot"). The matrix doubles when full.
+Removed rows are masked, not reused.
+
+Below ``ann_threshold`` rows every query is brute force: one matrix
+product per batch of queries and block of rows. Above it, a background
+thread links the rows into an HNSW graph (hierarchical navigable small
+world) held in NumPy arrays: a fixed-width neighbor table for layer 0 and
+neighbor arrays per node on the sparse upper layers. A query descends the
+upper layers greedily, then beam-searches layer 0 keeping ``ef``
+candidates. Raising ef raises recall and latency. Rows the graph does not
+cover yet are scored by brute force and merged in, so recent additions
+are never missed. The graph links rows by cosine similarity; "dot"
+queries walk it by inner product, which finds large-norm rows less
+reliably.
+
+Writers hold the PatternIndex lock. Each write publishes a (rows, matrix,
+norms, mask, patterns) state; masking a row copies the mask first, so a
+state never changes and readers need no lock. The graph builder does not
+lock either: it reads only rows that are already written and publishes
+each insertion as one (entry node, top layer, nodes inserted) tuple.
+Readers ignore nodes at or above the inserted count they saw, and rows
+beyond their state, and score the uncovered rows by brute force.
+"""
+import heapq
+import json
+import logging
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_KEY = "vector"  # Pattern metadata naming the encoding of a vector payload
+VECTOR_ENCODINGS = {"float32": np.dtype("<f4")}
+METRICS = ("cosine", "dot")
+DEFAULT_ANN_THRESHOLD = 50000
+DEFAULT_EF_SEARCH = 64
+DEFAULT_M = 16  # Links per node on the upper layers; layer 0 keeps twice as many
+DEFAULT_EF_CONSTRUCTION = 64
+BLOCK_ROWS = 65536  # Rows per matrix product in brute-force search
+_MIN_CAPACITY = 1024
+
+Scored = List[Tuple[float, int]]
+_NO_LINKS = np.empty(0, dtype=np.int32)
+
+
+def is_vector(metadata) -> bool:
+    """Whether pattern metadata declares a vector payload."""
+    return bool(metadata.get(VECTOR_KEY))
+
+
+def decode_vector(data, encoding: str = "float32") -> np.ndarray:
+    """View Pattern.data bytes as a vector, without copying them.
+
+    Raises:
+        ValueError: Unknown encoding, no values, a size that is not a whole
+            number of values, or values that are not finite
+    """
+    if isinstance(data, np.ndarray):
+        vector = data.astype(np.float32, copy=False).ravel()
+    elif isinstance(data, str):
+        raise ValueError("A vector is given as bytes, not text")
+    else:
+        dtype = VECTOR_ENCODINGS.get(encoding)
+        if dtype is None:
+            raise ValueError(f"Unknown vector encoding: {encoding} (expected one of {', '.join(VECTOR_ENCODINGS)})")
+        if not len(data) or len(data) % dtype.itemsize:
+            raise ValueError(f"A {encoding} vector needs a positive multiple of {dtype.itemsize} bytes, "
+                             f"got {len(data)}")
+        vector = np.frombuffer(data, dtype=dtype)
+    if not np.isfinite(vector).all():
+        raise ValueError("Vector values must be finite")
+    return vector
+
+
+class HnswGraph:
+    """HNSW graph over the unit rows of a VectorIndex, inserted in row order.
+
+    Args:
+        m: Links kept per node on the upper layers (2m on layer 0)
+        ef_construction: Candidates considered when linking a node
+        seed: Seed of the random layer assignment
+    """
+
+    def __init__(self, m: int = DEFAULT_M, ef_construction: int = DEFAULT_EF_CONSTRUCTION, seed: int = 1):
+        self.m = m
+        self.ef_construction = ef_construction
+        self._level_scale = 1.0 / math.log(m)
+        self._random = np.random.default_rng(seed)
+        self._layer0 = np.full((0, 2 * m), -1, dtype=np.int32)
+        self._upper: List[Dict[int, np.ndarray]] = []  # Layer l at position l - 1
+        self._lock = threading.Lock()  # Held per insertion and by export()
+        self.state = (-1, -1, 0)  # Entry node, top layer, nodes inserted
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _neighbors(self, node: int, layer: int) -> np.ndarray:
+        if layer == 0:
+            links = self._layer0[node]
+            return links[links >= 0]
+        return self._upper[layer - 1].get(node, _NO_LINKS)
+
+    def _set_neighbors(self, node: int, layer: int, links: np.ndarray) -> None:
+        if layer == 0:
+            row = np.full(2 * self.m, -1, dtype=np.int32)
+            row[:len(links)] = links
+            self._layer0[node] = row
+        else:
+            self._upper[layer - 1][node] = links.astype(np.int32)
+
+    def search_layer(self, score: Callable[[np.ndarray], np.ndarray], entries: Scored, ef: int, layer: int,
+                     limit: int) -> Tuple[Scored, int]:
+        """Beam search of one layer from entries ((score, node) pairs), over nodes below limit.
+
+        Returns the best ef (score, node) pairs, unordered, and the number of nodes scored.
+        """
+        visited = {node for _, node in entries}
+        candidates = [(-value, node) for value, node in entries]
+        heapq.heapify(candidates)
+        results = list(entries)
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+        while candidates:
+            value, node = heapq.heappop(candidates)
+            if len(results) >= ef and -value < results[0][0]:
+                break
+            links = self._neighbors(node, layer)
+            fresh = [link for link in links[links < limit].tolist() if link not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for link, value in zip(fresh, score(np.array(fresh)).tolist()):
+                if len(results) < ef or value > results[0][0]:
+                    heapq.heappush(candidates, (-value, link))
+                    heapq.heappush(results, (value, link))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return results, len(visited)
+
+    def search(self, score: Callable[[np.ndarray], np.ndarray], ef: int,
+               state: Optional[Tuple[int, int, int]] = None) -> Tuple[Scored, int, int]:
+        """Best ef (score, node) pairs for a query scored by score, best first.
+
+        Searches the graph as of state (the current one if None). Also returns
+        the number of nodes scored and the number of nodes the graph covered
+        (rows from there on are not searched).
+        """
+        entry, top, inserted = state or self.state
+        if not inserted:
+            return [], 0, 0
+        nearest = [(float(score(np.array([entry]))[0]), entry)]
+        examined = 1
+        for layer in range(top, 0, -1):
+            nearest, visited = self.search_layer(score, nearest, 1, layer, inserted)
+            examined += visited
+        nearest, visited = self.search_layer(score, nearest, ef, 0, inserted)
+        return sorted(nearest, reverse=True), examined + visited, inserted
+
+    def insert(self, node: int, vectors: np.ndarray) -> None:
+        """Link row node of vectors (unit rows) into the graph; it must be the next row."""
+        with self._lock:
+            entry, top, inserted = self.state
+            if node != inserted:
+                raise ValueError(f"Rows are linked in order: expected row {inserted}, got {node}")
+            if node >= len(self._layer0):
+                grown = np.full((max(_MIN_CAPACITY, 2 * len(self._layer0)), 2 * self.m), -1, dtype=np.int32)
+                grown[:len(self._layer0)] = self._layer0
+                self._layer0 = grown
+            level = int(-math.log(1.0 - self._random.random()) * self._level_scale)
+            while len(self._upper) < level:
+                self._upper.append({})
+            if entry < 0:
+                self.state = (node, level, node + 1)
+                return
+
+            query = vectors[node]
+
+            def score(nodes: np.ndarray) -> np.ndarray:
+                return vectors[nodes] @ query
+
+            nearest = [(float(score(np.array([entry]))[0]), entry)]
+            for layer in range(top, level, -1):
+                nearest, _ = self.search_layer(score, nearest, 1, layer, node)
+            for layer in range(min(top, level), -1, -1):
+                nearest, _ = self.search_layer(score, nearest, self.ef_construction, layer, node)
+                links = self._select(vectors, nearest, self.m)
+                self._set_neighbors(node, layer, links)
+                capacity = 2 * self.m if layer == 0 else self.m
+                for other in links.tolist():
+                    linked = self._neighbors(other, layer)
+                    if len(linked) < capacity:
+                        self._set_neighbors(other, layer, np.append(linked, node))
+                        continue
+                    candidates = np.append(linked, node)
+                    scores = vectors[candidates] @ vectors[other]
+                    self._set_neighbors(other, layer, self._select(
+                        vectors, list(zip(scores.tolist(), candidates.tolist())), capacity))
+            if level > top:
+                entry, top = node, level
+            self.state = (entry, top, node + 1)
+
+    @staticmethod
+    def _select(vectors: np.ndarray, candidates: Scored, limit: int) -> np.ndarray:
+        # HNSW neighbor heuristic: keep a candidate only if it is closer to the
+        # base than to every candidate kept before it, so links spread out
+        ordered = sorted(candidates, reverse=True)
+        nodes = np.array([node for _, node in ordered], dtype=np.int32)
+        if len(nodes) <= limit:
+            return nodes
+        scores = np.array([value for value, _ in ordered])
+        rows = vectors[nodes]
+        between = rows @ rows.T
+        kept = [0]
+        for i in range(1, len(nodes)):
+            if between[i, kept].max() < scores[i]:
+                kept.append(i)
+                if len(kept) == limit:
+                    break
+        return nodes[kept]
+
+    def export(self, limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Arrays for restore(), covering the nodes inserted so far (only those below limit, if given)."""
+        with self._lock:
+            entry, top, inserted = self.state
+            layer0 = self._layer0[:inserted].copy()
+            upper = [dict(links) for links in self._upper]
+        if limit is not None and inserted > limit:
+            # Drop the later nodes and the links to them; the entry moves to the highest node left
+            inserted = limit
+            layer0 = layer0[:limit]
+            layer0[layer0 >= limit] = -1
+            upper = [{node: links[links < limit] for node, links in neighbors.items() if node < limit}
+                     for neighbors in upper]
+            if entry >= limit:
+                while upper and not upper[-1]:
+                    upper.pop()
+                top = len(upper)
+                entry = min(upper[-1]) if upper else 0
+        layers, nodes, links = [], [], []
+        for layer, neighbors in enumerate(upper, 1):
+            for node in sorted(neighbors):
+                layers.append(layer)
+                nodes.append(node)
+                links.append(neighbors[node])
+        sizes = np.fromiter((len(row) for row in links), dtype=np.int64, count=len(links))
+        return {
+            "graph_state": np.array([entry, top, inserted, self.m], dtype=np.int64),
+            "graph_layer0": layer0,
+            "graph_upper_layers": np.array(layers, dtype=np.int32),
+            "graph_upper_nodes": np.array(nodes, dtype=np.int32),
+            "graph_upper_ptr": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+            "graph_upper_links": np.concatenate(links).astype(np.int32) if links else np.empty(0, np.int32),
+        }
+
+    def restore(self, arrays: Dict[str, np.ndarray]) -> bool:
+        """Adopt arrays from export(); False if they were built with another m."""
+        entry, top, inserted, m = (int(value) for value in arrays["graph_state"])
+        if m != self.m:
+            return False
+        with self._lock:
+            self._layer0 = np.array(arrays["graph_layer0"])  # Writable: later insertions relink old nodes
+            self._upper = [{} for _ in range(max(top, 0))]
+            ptr, links = arrays["graph_upper_ptr"], arrays["graph_upper_links"]
+            for i, (layer, node) in enumerate(zip(arrays["graph_upper_layers"].tolist(),
+                                                  arrays["graph_upper_nodes"].tolist())):
+                self._upper[layer - 1][node] = np.array(links[ptr[i]:ptr[i + 1]])
+            self.state = (entry, top, inserted)
+        return True
+
+
+
+class VectorIndex:
+    """Dense vectors of patterns in a float32 matrix, with an HNSW graph once large.
+
+    Writes are serialized by the caller (PatternIndex holds its lock).
+
+    Args:
+        ann_threshold: Rows from which queries go through the graph instead of brute force
+        ef_search: Candidates kept while searching the graph; more raises recall
+        m: Graph links per node (see HnswGraph)
+        ef_construction: Candidates considered when linking a row into the graph
+    """
+
+    def __init__(self, ann_threshold: int = DEFAULT_ANN_THRESHOLD, ef_search: int = DEFAULT_EF_SEARCH,
+                 m: int = DEFAULT_M, ef_construction: int = DEFAULT_EF_CONSTRUCTION):
+        self.ann_threshold = ann_threshold
+        self.ef_search = ef_search
+        self._graph = HnswGraph(m, ef_construction)
+        self._unit = np.empty((0, 0), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._count = 0  # Rows written, live or not; rows below it never change
+        self._patterns: List[Any] = []  # Per row; removed patterns stay for readers of older states
+        self._rows: Dict[str, int] = {}
+        self._build_lock = threading.Lock()
+        self._changed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.graph_seconds = 0.0
+        self._publish()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("_build_lock", "_changed", "_thread"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_lock = threading.Lock()
+        self._changed = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _publish(self) -> None:
+        # (rows, unit rows, norms, alive mask, live patterns); replaced whole, never changed
+        self._state = (self._count, self._unit, self._norms, self._alive, len(self._rows))
+
+    @property
+    def state(self) -> Tuple:
+        """The published state, for search(), get() and export()."""
+        return self._state
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        """Length of the stored vectors; None until the first one."""
+        return self._unit.shape[1] if self._count else None
+
+    def __contains__(self, pattern_id: str) -> bool:
+        return pattern_id in self._rows
+
+    def add(self, patterns: Sequence[Any], vectors: Sequence[np.ndarray]) -> int:
+        """Store patterns (objects with an id) with their vectors; return how many replaced one.
+
+        Raises:
+            ValueError: The vectors differ in length from each other or from the stored ones
+        """
+        if not len(patterns):
+            return 0
+        try:
+            matrix = np.vstack([np.asarray(vector, dtype=np.float32).ravel() for vector in vectors])
+        except ValueError:
+            raise ValueError("Vectors added together must have the same length") from None
+        dimensions = self.dimensions
+        if dimensions is not None and matrix.shape[1] != dimensions:
+            raise ValueError(f"Vectors have {dimensions} values in this index, got {matrix.shape[1]}")
+        norms = np.linalg.norm(matrix, axis=1)
+        matrix /= np.where(norms > 0, norms, 1)[:, None]
+
+        start, stop = self._count, self._count + len(matrix)
+        grown = stop > len(self._unit) or not self._unit.flags.writeable or self._unit.shape[1] != matrix.shape[1]
+        if grown:
+            capacity = max(_MIN_CAPACITY, 2 * stop)
+            unit = np.empty((capacity, matrix.shape[1]), dtype=np.float32)
+            norms_grown = np.empty(capacity, dtype=np.float32)
+            alive = np.zeros(capacity, dtype=bool)
+            if start:
+                unit[:start], norms_grown[:start], alive[:start] = self._unit[:start], self._norms[:start], \
+                    self._alive[:start]
+            # Readers hold on to the old arrays; rows below the count are the same in both
+            self._unit, self._norms, self._alive = unit, norms_grown, alive
+        elif any(self._rows.get(pattern.id, stop) < start for pattern in patterns):
+            # Published states share the mask; rows they see are only masked in a copy
+            self._alive = self._alive.copy()
+        self._unit[start:stop] = matrix
+        self._norms[start:stop] = norms
+        self._alive[start:stop] = True
+
+        replaced = 0
+        for row, pattern in enumerate(patterns, start):
+            previous = self._rows.get(pattern.id)
+            if previous is not None:
+                self._alive[previous] = False
+                replaced += previous < start  # Not a repeat within this batch
+            self._rows[pattern.id] = row
+            self._patterns.append(pattern)
+        self._count = stop  # Publishes the rows to the graph builder
+        self._publish()
+        self._schedule()
+        return replaced
+
+    def remove(self, pattern_id: str) -> bool:
+        """Mask a pattern's row; return False if it was not present."""
+        return self.remove_many([pattern_id]) > 0
+
+    def remove_many(self, pattern_ids: Iterable[str]) -> int:
+        """Mask the rows of patterns, in one copy of the mask; return how many were present."""
+        rows = [row for row in (self._rows.pop(pattern_id, None) for pattern_id in pattern_ids) if row is not None]
+        if rows:
+            alive = self._alive.copy()
+            alive[rows] = False
+            self._alive = alive
+            self._publish()
+        return len(rows)
+
+    def get(self, pattern_id: str, state: Optional[Tuple] = None) -> Optional[Tuple[Any, np.ndarray]]:
+        """A stored pattern and its vector in state (or the current one), or None."""
+        count, unit, norms, alive, _ = state or self._state
+        row = self._rows.get(pattern_id)
+        if row is None or row >= count or not alive[row]:
+            return None
+        return self._patterns[row], unit[row] * norms[row]
+
+    def search(self, queries: Sequence[np.ndarray], metric: str, top_k: int, min_score: float,
+               state: Optional[Tuple] = None) -> List[Tuple[List[Tuple[float, Any]], int]]:
+        """Top_k (score, pattern) pairs per query, best first, and the number of rows scored.
+
+        Searches the rows of state (see the state property), or the current ones.
+
+        Raises:
+            ValueError: A query's length differs from the stored vectors'
+        """
+        results: List[Tuple[List[Tuple[float, Any]], int]] = [([], 0) for _ in queries]
+        count, unit, norms, alive, _ = state or self._state
+        if not queries or not count:
+            return results
+        dimensions = unit.shape[1]
+        for query in queries:
+            if len(query) != dimensions:
+                raise ValueError(f"Vectors have {dimensions} values in this index, got {len(query)}")
+        matrix = np.vstack(queries).astype(np.float32)
+        if metric == "cosine":
+            lengths = np.linalg.norm(matrix, axis=1)
+            matrix /= np.where(lengths > 0, lengths, 1)[:, None]
+        scale = norms if metric == "dot" else None
+
+        self._schedule()
+        searched = 0
+        graphed: List[Scored] = [[] for _ in queries]
+        examined = [0] * len(queries)
+        graph_state = self._graph.state
+        if graph_state[2] >= self.ann_threshold:
+            # The graph may cover rows written after state; the current matrix, read after the
+            # graph state, holds them all, and they are filtered out below
+            graph_unit, graph_norms = self._unit, self._norms
+            ef = max(self.ef_search, top_k)
+            for i, query in enumerate(matrix):
+                def score(nodes: np.ndarray, query=query) -> np.ndarray:
+                    values = graph_unit[nodes] @ query
+                    return values * graph_norms[nodes] if scale is not None else values
+
+                graphed[i], examined[i], searched = self._graph.search(score, ef, graph_state)
+
+        exhaustive = self._brute_force(matrix, unit, scale, alive, min(searched, count), count, top_k, min_score)
+        for i, (graph_scored, (scored, matched)) in enumerate(zip(graphed, exhaustive)):
+            kept = [(value, row) for value, row in graph_scored if row < count and alive[row] and value >= min_score]
+            best = heapq.nlargest(top_k, kept + scored, key=lambda item: (item[0], -item[1]))
+            results[i] = ([(value, self._patterns[row]) for value, row in best], examined[i] + matched)
+        return results
+
+    @staticmethod
+    def _brute_force(queries: np.ndarray, unit: np.ndarray, scale: Optional[np.ndarray], alive: np.ndarray,
+                     start: int, stop: int, top_k: int, min_score: float) -> List[Tuple[Scored, int]]:
+        # Exact top_k over rows start..stop per query, and how many live rows reached min_score
+        best: List[Scored] = [[] for _ in range(len(queries))]
+        matched = np.zeros(len(queries), dtype=np.int64)
+        for block in range(start, stop, BLOCK_ROWS):
+            end = min(block + BLOCK_ROWS, stop)
+            scores = unit[block:end] @ queries.T  # Rows x queries
+            if scale is not None:
+                scores *= scale[block:end, None]
+            scores[~alive[block:end]] = -np.inf
+            keep = scores >= min_score
+            matched += keep.sum(axis=0)
+            for i in range(len(queries)):
+                column = scores[:, i]
+                rows = np.flatnonzero(keep[:, i])
+                if len(rows) > top_k:
+                    rows = rows[np.argpartition(-column[rows], top_k - 1)[:top_k]]
+                best[i] += zip(column[rows].tolist(), (rows + block).tolist())
+        return [(scored, int(count)) for scored, count in zip(best, matched)]
+
+    def _schedule(self) -> None:
+        if self._count < self.ann_threshold or self._graph.state[2] >= self._count:
+            return
+        self._changed.set()
+        if self._thread is None or not self._thread.is_alive():
+            # Also restarts the builder in processes forked after it started
+            self._thread = threading.Thread(target=self._run, name="VectorIndex-graph", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            try:
+                self.build_graph()
+            except Exception as e:
+                logger.error(f"Vector graph build failed: {e}")
+
+    def build_graph(self) -> int:
+        """Link every row the graph does not cover yet, now; return how many were linked."""
+        with self._build_lock:
+            started = time.perf_counter()
+            linked = 0
+            while self._graph.state[2] < self._count:
+                # The count is read before the matrix, so the matrix holds that row
+                self._graph.insert(self._graph.state[2], self._unit)
+                linked += 1
+            if linked:
+                self.graph_seconds += time.perf_counter() - started
+                logger.info(f"Linked {linked} vectors into the graph in {time.perf_counter() - started:.1f}s")
+            return linked
+
+    def export(self, state: Optional[Tuple] = None) -> Dict[str, np.ndarray]:
+        """Arrays of state (or the current one) for restore() (see server.snapshot).
+
+        Patterns are JSON [id, labels, metadata], null for removed rows.
+        """
+        count, unit, norms, alive, _ = state or self._state
+        patterns = [[pattern.id, pattern.labels, pattern.metadata] if live else None
+                    for pattern, live in zip(self._patterns[:count], alive[:count].tolist())]
+        arrays = {
+            "unit": unit[:count],
+            "norms": norms[:count].copy(),
+            "alive": alive[:count].copy(),
+            "patterns": np.frombuffer(json.dumps(patterns).encode("utf-8"), dtype=np.uint8),
+        }
+        arrays.update(self._graph.export(count))
+        return arrays
+
+    def restore(self, arrays: Dict[str, np.ndarray], pattern: Callable[[str, List[str], Dict[str, str]], Any]) -> None:
+        """Adopt arrays from export(), building stored patterns with pattern(id, labels, metadata).
+
+        The matrix stays memory-mapped until the next addition. A graph saved
+        with another m is dropped and rebuilt in the background.
+        """
+        self._unit = arrays["unit"]
+        self._norms = np.array(arrays["norms"])
+        self._alive = np.array(arrays["alive"])
+        self._count = len(self._norms)
+        self._patterns = [pattern(*entry) if entry is not None else None
+                          for entry in json.loads(bytes(arrays["patterns"]).decode("utf-8"))]
+        self._rows = {stored.id: row for row, stored in enumerate(self._patterns) if stored is not None}
+        self._publish()
+        if not self._graph.restore(arrays):
+            logger.info("Snapshot vector graph was built with other parameters; rebuilding it")
+        self._schedule()
+
+    def stats(self) -> Dict[str, int]:
+        entry, top, inserted = self._graph.state
+        return {
+            "vector_patterns": len(self._rows),
+            "vector_dimensions": self.dimensions or 0,
+            "vector_rows": self._count,
+            "vector_graph_nodes": inserted,
+            "vector_graph_layers": top + 1,
+        }
@@ -0,0 +1,38 @@
+"""Shared fixtures; also makes the server package and the generated protobuf modules importable."""
+import os
+import sys
+from concurrent import futures
+
+import grpc
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starweave_pb2_grpc  # noqa: E402
+from server.pattern_server import PatternService  # noqa: E402
+from server.recognition import PatternIndex  # noqa: E402
+from server.rpc_metrics import MetricsInterceptor, RpcMetrics  # noqa: E402
+
+
+@pytest.fixture
+def pattern_index():
+    index = PatternIndex()
+    index.add("greeting", "hello world", labels=["greeting"])
+    index.add("farewell", "goodbye world", labels=["farewell"])
+    return index
+
+
+@pytest.fixture
+def pattern_server(pattern_index):
+    """A threaded PatternService on a free local port; yields (stub, service)."""
+    metrics = RpcMetrics(workers=4)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4), interceptors=[MetricsInterceptor(metrics)])
+    service = PatternService(pattern_index=pattern_index, rpc_metrics=metrics)
+    starweave_pb2_grpc.add_PatternServiceServicer_to_server(service, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+    yield starweave_pb2_grpc.PatternServiceStub(channel), service
+    channel.close()
+    server.stop(None)
+    service.shutdown()
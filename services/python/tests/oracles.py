@@ -0,0 +1,94 @@
+"""Brute-force answers to the recognition strategies, for tests to compare the indexes against.
+
+Each oracle takes the live corpus as {pattern id: data} and returns {pattern id: score} of
+every match; results are compared without their order among equal scores.
+"""
+import math
+import random
+from collections import Counter
+from typing import Dict, List
+
+from server.recognition import Match, tokenize, words
+from server.suffix_array import count_occurrences
+
+WORDS = ["alpha", "beta", "gamma", "delta", "omega", "sigma", "kappa", "theta"]
+
+
+def random_text(rng: random.Random, low: int = 1, high: int = 5) -> str:
+    """A few words of a small vocabulary, so patterns share tokens and substrings."""
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def random_corpus(rng: random.Random, size: int, prefix: str = "p") -> Dict[str, str]:
+    return {f"{prefix}{number}": random_text(rng) for number in range(size)}
+
+
+def exact(corpus: Dict[str, str], query: str) -> Dict[str, float]:
+    return {pattern_id: 1.0 for pattern_id, data in corpus.items() if data == query}
+
+
+def contains(corpus: Dict[str, str], query: str) -> Dict[str, float]:
+    return {pattern_id: len(query) / len(data) for pattern_id, data in corpus.items() if query and query in data}
+
+
+def occurrences(corpus: Dict[str, str], query: str) -> Dict[str, int]:
+    """Occurrences of query per pattern that contains it, overlapping ones included."""
+    return {pattern_id: count_occurrences(data, query) for pattern_id, data in corpus.items()
+            if query and query in data}
+
+
+def jaccard(corpus: Dict[str, str], query: str, min_score: float) -> Dict[str, float]:
+    query_tokens = tokenize(query)
+    scores = {}
+    for pattern_id, data in corpus.items():
+        tokens = tokenize(data)
+        union = len(query_tokens | tokens)
+        score = len(query_tokens & tokens) / union if union else 0.0
+        if score > 0 and score >= min_score:
+            scores[pattern_id] = score
+    return scores
+
+
+def tfidf(corpus: Dict[str, str], query: str, min_score: float) -> Dict[str, float]:
+    """Cosine of dense TF-IDF vectors: tf = 1 + ln(count), idf = ln(1 + N) + 1 - ln(1 + df)."""
+    frequencies = Counter(token for data in corpus.values() for token in tokenize(data))
+
+    def weights(text: str) -> Dict[str, float]:
+        idf = math.log(1 + len(corpus)) + 1
+        return {token: (1 + math.log(count)) * (idf - math.log(1 + frequencies[token]))
+                for token, count in Counter(words(text)).items()}
+
+    def norm(vector: Dict[str, float]) -> float:
+        return math.sqrt(sum(value * value for value in vector.values()))
+
+    query_vector = weights(query)
+    scores = {}
+    for pattern_id, data in corpus.items():
+        vector = weights(data)
+        denominator = norm(query_vector) * norm(vector)
+        score = sum(value * vector.get(token, 0.0) for token, value in query_vector.items()) / denominator \
+            if denominator else 0.0
+        if score > 0 and score >= min_score:
+            scores[pattern_id] = score
+    return scores
+
+
+def scan(corpus: Dict[str, str], query: str) -> Dict[str, List[tuple]]:
+    """Positions of every occurrence of each pattern that occurs in query."""
+    found = {}
+    for pattern_id, data in corpus.items():
+        positions = [(start, start + len(data)) for start in range(len(query) - len(data) + 1)
+                     if query.startswith(data, start)]
+        if data and positions:
+            found[pattern_id] = positions
+    return found
+
+
+def scores(matches: List[Match]) -> Dict[str, float]:
+    """{pattern id: score} of an index's matches."""
+    return {match.pattern.id: match.score for match in matches}
+
+
+def best_scores(expected: Dict[str, float], top_k: int) -> List[float]:
+    """The top_k scores of an oracle's matches, best first."""
+    return sorted(expected.values(), reverse=True)[:top_k]
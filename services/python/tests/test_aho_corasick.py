@@ -0,0 +1,87 @@
+"""Tests for server.aho_corasick and the scan strategy."""
+import random
+
+import pytest
+
+from oracles import random_text, scan
+from server.aho_corasick import Automaton, FlatAutomaton
+from server.recognition import PatternIndex, StoredPattern
+
+
+def _naive(patterns, text):
+    """Every (pattern number, start, end) occurrence, overlapping ones included."""
+    return sorted((doc, start, start + len(pattern)) for pattern, doc in patterns if pattern
+                  for start in range(len(text) - len(pattern) + 1) if text.startswith(pattern, start))
+
+
+def _patterns(rng: random.Random, count: int):
+    """Short texts over a small alphabet, so patterns nest in and overlap each other."""
+    return [("".join(rng.choice("abc") for _ in range(rng.randint(1, 5))), doc) for doc in range(count)]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_automaton_finds_every_occurrence(seed):
+    rng = random.Random(seed)
+    patterns = _patterns(rng, 60) + [("", 60), ("ab", 61), ("ab", 62)]
+    automaton = Automaton(patterns)
+    flat = FlatAutomaton(automaton.export())
+    assert automaton.patterns == flat.patterns == 62
+    assert automaton.nodes == flat.nodes
+    for _ in range(30):
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 40)))
+        assert sorted(automaton.scan(text)) == _naive(patterns, text)
+        assert sorted(flat.scan(text)) == _naive(patterns, text)
+
+
+def test_automaton_handles_code_points_beyond_ascii():
+    patterns = [("ünï", 0), ("ï", 1), ("中文", 2), ("😀😀", 3)]
+    text = "ünïcode 中文 😀😀😀"
+    automaton = Automaton(patterns)
+    assert sorted(automaton.scan(text)) == _naive(patterns, text)
+    assert sorted(FlatAutomaton(automaton.export()).scan(text)) == _naive(patterns, text)
+
+
+def _check(index: PatternIndex, corpus, queries) -> None:
+    for query in queries:
+        matches, _ = index.search(query, "scan", 1000)
+        expected = scan(corpus, query)
+        assert {match.pattern.id: match.positions for match in matches} == expected
+        for match in matches:
+            assert match.score == pytest.approx(len(match.pattern.data) / len(query))
+
+
+def test_scan_strategy_matches_brute_force():
+    rng = random.Random(4)
+    corpus = {f"p{number}": random_text(rng, 1, 2) for number in range(80)}
+    corpus.update({f"s{number}": rng.choice(["ta", "a", "alpha", "ma gam"]) for number in range(8)})
+    index = PatternIndex(tfidf=False)
+    index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in corpus.items()], rebuild=True)
+    queries = [random_text(rng, 3, 10) for _ in range(30)]
+    _check(index, corpus, queries)
+
+    # Added patterns are found from the delta until a rebuild compiles them in
+    index.defer_rebuilds()
+    added = {f"n{number}": random_text(rng, 1, 2) for number in range(20)}
+    replaced = {pattern_id: random_text(rng, 1, 2) for pattern_id in rng.sample(sorted(corpus), 10)}
+    index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in {**added, **replaced}.items()])
+    corpus.update(added)
+    corpus.update(replaced)
+    removed = rng.sample(sorted(corpus), 15)
+    index.remove_many(removed)
+    for pattern_id in removed:
+        del corpus[pattern_id]
+    assert index.stats()["scanner_delta"] > 0
+    _check(index, corpus, queries)
+
+    index.resume_rebuilds()
+    index.rebuild()
+    assert index.stats()["scanner_delta"] == 0
+    _check(index, corpus, queries)
+
+
+def test_scan_ranks_longer_patterns_first():
+    index = PatternIndex(tfidf=False)
+    index.add_many([StoredPattern("short", "beta"), StoredPattern("long", "alpha beta")], rebuild=True)
+    matches, _ = index.search("alpha beta gamma", "scan", 1)
+    assert [match.pattern.id for match in matches] == ["long"]
+    assert matches[0].positions == [(0, 10)]
@@ -0,0 +1,100 @@
+"""Tests for server.minhash and the minhash strategy."""
+import random
+
+import numpy as np
+import pytest
+
+from oracles import jaccard, scores
+from server.minhash import MinHashLSH
+from server.recognition import PatternIndex, StoredPattern, tokenize
+
+VOCABULARY = [f"w{number}" for number in range(60)]
+
+
+def _text(rng: random.Random, size: int = 10) -> str:
+    return " ".join(rng.sample(VOCABULARY, size))
+
+
+def _near(rng: random.Random, text: str) -> str:
+    """text with one token swapped for another: Jaccard 9/11 against a 10-token text."""
+    tokens = text.split()
+    tokens[rng.randrange(len(tokens))] = rng.choice([word for word in VOCABULARY if word not in tokens])
+    return " ".join(tokens)
+
+
+def test_signature_agreement_estimates_jaccard():
+    lsh = MinHashLSH(bands=64, rows=4)
+    rng = random.Random(1)
+    errors = []
+    for _ in range(50):
+        first = frozenset(rng.sample(VOCABULARY, 20))
+        second = frozenset(rng.sample(sorted(first), rng.randint(1, 20)) + rng.sample(VOCABULARY, rng.randint(0, 10)))
+        signatures = lsh.signatures([first, second])
+        agreement = float(np.mean(signatures[0] == signatures[1]))
+        errors.append(agreement - len(first & second) / len(first | second))
+    # 256 values per signature: a standard error of at most 1/32 per pair
+    assert abs(np.mean(errors)) < 0.02
+    assert max(abs(error) for error in errors) < 0.15
+
+
+def test_signatures_are_stable_across_instances():
+    tokens = [frozenset({"alpha", "beta"}), frozenset({"gamma"})]
+    assert np.array_equal(MinHashLSH(seed=3).signatures(tokens), MinHashLSH(seed=3).signatures(tokens))
+    assert not np.array_equal(MinHashLSH(seed=3).signatures(tokens), MinHashLSH(seed=4).signatures(tokens))
+
+
+@pytest.mark.parametrize("merge_threshold", [8, 65536])
+def test_matches_are_exact_and_recall_near_duplicates(merge_threshold):
+    rng = random.Random(merge_threshold)
+    index = PatternIndex(minhash=MinHashLSH(merge_threshold=merge_threshold), scan=False, tfidf=False)
+    corpus = {f"p{number}": _text(rng) for number in range(300)}
+    patterns = [StoredPattern(pattern_id, data) for pattern_id, data in corpus.items()]
+    for start in range(0, len(patterns), 25):
+        index.add_many(patterns[start:start + 25])
+    removed = rng.sample(sorted(corpus), 60)
+    index.remove_many(removed)
+    for pattern_id in removed:
+        del corpus[pattern_id]
+    replaced = {pattern_id: _text(rng) for pattern_id in rng.sample(sorted(corpus), 30)}
+    index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in replaced.items()])
+    corpus.update(replaced)
+
+    queries = [_near(rng, text) for text in rng.sample(sorted(corpus.values()), 80)]
+    queries += [text for text in rng.sample(sorted(corpus.values()), 20)]
+    for query in queries:
+        matches, _ = index.search(query, "minhash", 1000, 0.2)
+        expected = jaccard(corpus, query, 0.2)
+        # Candidates are re-scored exactly, so every match is a true match with its true score
+        assert set(scores(matches)) <= set(expected)
+        assert scores(matches) == pytest.approx({pattern_id: expected[pattern_id] for pattern_id in scores(matches)})
+        # Above the LSH threshold a miss is vanishingly unlikely: 1 - (1 - 0.8 ** 4) ** 32 > 1 - 1e-7
+        assert {pattern_id for pattern_id, score in expected.items() if score >= 0.8} <= set(scores(matches))
+
+
+def test_removed_patterns_are_not_candidates():
+    lsh = MinHashLSH(merge_threshold=4)
+    tokens = frozenset({"alpha", "beta", "gamma"})
+    lsh.add(list(range(10)), [tokens] * 10)
+    state = lsh.state
+    lsh.remove_many([2, 5])
+    assert lsh.candidates(tokens).tolist() == [0, 1, 3, 4, 6, 7, 8, 9]
+    assert len(lsh) == 8
+    # A state taken earlier still answers as it did
+    assert lsh.candidates(tokens, state).tolist() == list(range(10))
+    lsh.merge()
+    assert lsh.candidates(tokens).tolist() == [0, 1, 3, 4, 6, 7, 8, 9]
+
+
+def test_export_restore_keeps_candidates():
+    rng = random.Random(7)
+    lsh = MinHashLSH(merge_threshold=16)
+    token_sets = [tokenize(_text(rng)) for _ in range(50)]
+    lsh.add(list(range(50)), token_sets)
+    lsh.remove_many([3, 30])
+
+    restored = MinHashLSH(merge_threshold=16)
+    assert restored.restore(lsh.export())
+    assert len(restored) == len(lsh) == 48
+    for tokens in token_sets:
+        assert restored.candidates(tokens).tolist() == lsh.candidates(tokens).tolist()
+    assert not MinHashLSH(bands=16).restore(lsh.export())
@@ -0,0 +1,71 @@
+"""Tests for the PatternService RPCs."""
+import asyncio
+
+import grpc
+import pytest
+
+import starweave_pb2
+import starweave_pb2_grpc
+from server.pattern_server import AsyncPatternService, PatternService
+
+
+def _request(pattern_id: str, data: bytes, *context: str) -> starweave_pb2.PatternRequest:
+    return starweave_pb2.PatternRequest(pattern=starweave_pb2.Pattern(id=pattern_id, data=data), context=context)
+
+
+def test_trends_count_only_recognized_stream_requests(pattern_server):
+    stub, _ = pattern_server
+    requests = [_request("ok-1", b"hello world"), _request("bad-1", b"hello world", "strategy=bogus"),
+                _request("ok-2", b"goodbye world"), _request("bad-2", b"junk", "top_k=many")]
+    responses = {response.metadata["pattern_id"]: response for response in stub.StreamPatterns(iter(requests))}
+    assert not responses["ok-1"].error and not responses["ok-2"].error
+    assert responses["bad-1"].error and responses["bad-2"].error
+
+    trends = stub.GetTrends(starweave_pb2.TrendRequest(keys=["hello world", "junk"]))
+    assert trends.total == 2
+    assert {hitter.key for hitter in trends.hitters} == {"hello world", "goodbye world"}
+    assert trends.estimates["junk"] == 0
+    assert {label.label: label.count for label in trends.labels} == {"greeting": 1, "farewell": 1}
+
+
+@pytest.mark.parametrize("option, message", [
+    ("top_k=many", "Option top_k must be an integer, got 'many'"),
+    ("min_score=high", "Option min_score must be a number, got 'high'"),
+    ("context_weight=half", "Option context_weight must be a number, got 'half'"),
+])
+def test_malformed_numeric_option_is_invalid_argument(pattern_server, option, message):
+    stub, _ = pattern_server
+    with pytest.raises(grpc.RpcError) as raised:
+        stub.RecognizePattern(_request("p", b"hello world", option))
+    assert raised.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert raised.value.details() == message
+
+    # On a stream, only that request fails, with the same message
+    responses = list(stub.StreamPatterns(iter([_request("bad", b"hello world", option),
+                                                 _request("ok", b"hello world")])))
+    errors = {response.metadata["pattern_id"]: response.error for response in responses}
+    assert errors == {"bad": message, "ok": ""}
+
+
+def test_malformed_numeric_option_is_invalid_argument_on_aio(pattern_index):
+    async def recognize():
+        server = grpc.aio.server()
+        service = AsyncPatternService(PatternService(pattern_index=pattern_index))
+        starweave_pb2_grpc.add_PatternServiceServicer_to_server(service, server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                stub = starweave_pb2_grpc.PatternServiceStub(channel)
+                with pytest.raises(grpc.RpcError) as raised:
+                    await stub.RecognizePattern(_request("p", b"hello world", "top_k=many"))
+                response = await stub.RecognizePattern(_request("p", b"hello world", "top_k=1"))
+        finally:
+            await server.stop(None)
+            service.shutdown()
+        return raised.value, response
+
+    error, response = asyncio.run(recognize())
+    assert error.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert error.details() == "Option top_k must be an integer, got 'many'"
+    assert list(response.labels) == ["greeting"]
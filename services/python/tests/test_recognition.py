@@ -0,0 +1,101 @@
+"""Tests for the exact, contains and jaccard strategies of server.recognition."""
+import random
+
+import pytest
+
+from oracles import best_scores, contains, exact, jaccard, occurrences, random_corpus, random_text, scores
+from server.recognition import PatternIndex, StoredPattern
+
+ALL = 10_000  # top_k above the corpus size, so every match is returned
+
+
+def _queries(rng: random.Random, corpus, count: int = 40):
+    """Stored texts, random word runs and substrings of stored texts, short ones included."""
+    texts = list(corpus.values())
+    queries = [rng.choice(texts) for _ in range(count // 4)]
+    queries += [random_text(rng, 1, 3) for _ in range(count // 4)]
+    for _ in range(count // 2):
+        text = rng.choice(texts)
+        start = rng.randrange(len(text))
+        queries.append(text[start:start + rng.randint(1, 12)])
+    return queries + ["", "zzz"]
+
+
+def _mutate(rng: random.Random, index: PatternIndex, corpus, rounds: int = 5) -> None:
+    """Add, replace and remove patterns in small batches, keeping corpus in step with the index."""
+    for number in range(rounds):
+        added = {f"new{number}-{i}": random_text(rng) for i in range(10)}
+        replaced = {pattern_id: random_text(rng) for pattern_id in rng.sample(sorted(corpus), 5)}
+        index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in {**added, **replaced}.items()])
+        corpus.update(added)
+        corpus.update(replaced)
+        removed = rng.sample(sorted(corpus), 5)
+        assert index.remove_many(removed + ["missing"]) == 5
+        for pattern_id in removed:
+            del corpus[pattern_id]
+
+
+def _check(index: PatternIndex, corpus, queries) -> None:
+    assert len(index) == len(corpus)
+    for query in queries:
+        matches, _ = index.search(query, "exact", ALL)
+        assert scores(matches) == exact(corpus, query)
+
+        matches, _ = index.search(query, "contains", ALL)
+        assert scores(matches) == pytest.approx(contains(corpus, query))
+        assert {match.pattern.id: match.count for match in matches} == occurrences(corpus, query)
+
+        for min_score in (0.0, 0.2, 0.5):
+            matches, _ = index.search(query, "jaccard", ALL, min_score)
+            assert scores(matches) == pytest.approx(jaccard(corpus, query, min_score))
+
+        # Truncated results keep the best scores
+        for strategy, expected in (("contains", contains(corpus, query)), ("jaccard", jaccard(corpus, query, 0.2))):
+            matches, _ = index.search(query, strategy, 3, 0.2)
+            assert [match.score for match in matches] == pytest.approx(best_scores(expected, 3))
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_strategies_match_brute_force(seed):
+    rng = random.Random(seed)
+    corpus = random_corpus(rng, 120)
+    index = PatternIndex(tfidf=False)
+    patterns = [StoredPattern(pattern_id, data) for pattern_id, data in corpus.items()]
+    for start in range(0, len(patterns), 10):
+        index.add_many(patterns[start:start + 10])  # Several segments
+    queries = _queries(rng, corpus)
+    _check(index, corpus, queries)
+
+    _mutate(rng, index, corpus)
+    _check(index, corpus, queries)
+    index.rebuild()
+    _check(index, corpus, queries)
+
+
+def test_contains_counts_overlapping_occurrences():
+    index = PatternIndex()
+    index.add("a", "aaaa")
+    index.add("b", "abab ab")
+    matches, _ = index.search("aa", "contains")
+    assert {match.pattern.id: match.count for match in matches} == {"a": 3}
+    matches, _ = index.search("ab", "contains")
+    assert {match.pattern.id: match.count for match in matches} == {"b": 3}
+
+
+def test_every_write_publishes_a_new_version():
+    index = PatternIndex()
+    versions = [index.version]
+    index.add("a", "alpha beta")
+    versions.append(index.version)
+    index.add("a", "alpha gamma")
+    versions.append(index.version)
+    index.remove("a")
+    versions.append(index.version)
+    assert len(set(versions)) == len(versions)
+
+    # A view keeps answering from its version
+    index.add("b", "beta")
+    view = index.view()
+    index.remove("b")
+    assert [match.pattern.id for match in view.search("beta", "exact")[0]] == ["b"]
+    assert index.search("beta", "exact")[0] == []
@@ -0,0 +1,92 @@
+"""Tests for server.result_cache and result caching in RecognizePattern."""
+import types
+
+import pytest
+
+import starweave_pb2
+from server import result_cache
+from server.result_cache import ResultCache, result_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable monotonic clock for the cache module."""
+    now = [1000.0]
+    monkeypatch.setattr(result_cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_newer_index_version_drops_every_entry():
+    cache = ResultCache()
+    cache.put(b"a", "A", version=1)
+    cache.put(b"b", "B", version=1)
+    assert cache.get(b"a", version=1) == "A"
+
+    assert cache.get(b"a", version=2) is None
+    assert len(cache) == 0
+    assert cache.stats()["result_cache_invalidations"] == 1
+    # Results computed against an older version than the cache's are not stored
+    cache.put(b"a", "stale", version=1)
+    assert cache.get(b"a", version=2) is None
+    assert cache.get(b"a", version=1) is None
+    cache.put(b"a", "fresh", version=2)
+    assert cache.get(b"a", version=2) == "fresh"
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResultCache(ttl=10)
+    cache.put(b"a", "A", version=1)
+    clock[0] += 9.9
+    assert cache.get(b"a", version=1) == "A"
+    clock[0] += 0.2
+    assert cache.get(b"a", version=1) is None
+    assert cache.stats()["result_cache_expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=3)
+    for key in (b"a", b"b", b"c"):
+        cache.put(key, key.decode(), version=1)
+    assert cache.get(b"a", version=1) == "a"  # Now the most recently used
+    cache.put(b"d", "d", version=1)
+    assert cache.get(b"b", version=1) is None
+    assert [cache.get(key, version=1) for key in (b"a", b"c", b"d")] == ["a", "c", "d"]
+    assert len(cache) == 3
+    assert cache.stats()["result_cache_evictions"] == 1
+
+
+def test_zero_entries_disables_the_cache():
+    cache = ResultCache(max_entries=0)
+    cache.put(b"a", "A", version=1)
+    assert cache.get(b"a", version=1) is None
+    assert len(cache) == 0
+
+
+def test_keys_cover_data_options_and_context():
+    options = ("contains", 10, 0.2, 0.3, None)
+    key = result_key(b"hello", options, ["topic: x"])
+    assert key == result_key(b"hello", options, [" topic: x "])
+    assert key != result_key(b"hello!", options, ["topic: x"])
+    assert key != result_key(b"hello", ("contains", 5, 0.2, 0.3, None), ["topic: x"])
+    assert key != result_key(b"hello", options, ["topic: y"])
+    assert key != result_key(b"hello", options, [])
+    assert len(key) == 16
+
+
+def test_recognize_serves_cached_results_until_the_index_changes(pattern_server, pattern_index):
+    stub, _ = pattern_server
+    request = starweave_pb2.PatternRequest(pattern=starweave_pb2.Pattern(id="q", data=b"world"))
+    first = stub.RecognizePattern(request)
+    assert "cached" not in first.metadata
+    assert set(first.metadata["matched_ids"].split(",")) == {"greeting", "farewell"}
+    second = stub.RecognizePattern(request)
+    assert second.metadata["cached"] == "true"
+    assert second.metadata["index_version"] == first.metadata["index_version"]
+
+    pattern_index.add("planet", "world", labels=["planet"])
+    third = stub.RecognizePattern(request)
+    assert "cached" not in third.metadata
+    assert int(third.metadata["index_version"]) > int(first.metadata["index_version"])
+    assert third.metadata["matched_ids"].split(",")[0] == "planet"
+    assert stub.RecognizePattern(request).metadata["cached"] == "true"
@@ -0,0 +1,59 @@
+"""Tests for server.rpc_metrics."""
+import threading
+import time
+
+import grpc
+
+import starweave_pb2
+from server.rpc_metrics import RpcMetrics
+
+STREAM_METHOD = "/starweave.PatternService/StreamPatterns"
+
+
+def _record(metrics: RpcMetrics, method: str = "/test.Service/Call") -> None:
+    metrics.received(method, 10)
+    started = metrics.start(method)
+    metrics.sent(method, 20)
+    metrics.finish(method, started, grpc.StatusCode.OK)
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_counts_of_exited_threads_are_kept_without_their_tables():
+    metrics = RpcMetrics()
+    for _ in range(100):
+        thread = threading.Thread(target=_record, args=(metrics,))
+        thread.start()
+        thread.join()
+    _record(metrics)
+
+    assert _wait_for(lambda: len(metrics._tables) == 1)
+    counts = metrics.snapshot()["/test.Service/Call"]
+    assert (counts.started, counts.finished, counts.in_flight) == (101, 101, 0)
+    assert (counts.request_messages, counts.request_bytes) == (101, 1010)
+    assert (counts.response_messages, counts.response_bytes) == (101, 2020)
+    assert counts.codes == {"OK": 101}
+    assert sum(counts.buckets) == 101
+
+
+def test_streams_do_not_leave_tables_behind(pattern_server):
+    stub, service = pattern_server
+    metrics = service.rpc_metrics
+    streams = 100
+    for number in range(streams):
+        requests = [starweave_pb2.PatternRequest(pattern=starweave_pb2.Pattern(id=f"p{number}", data=b"hello"))]
+        assert len(list(stub.StreamPatterns(iter(requests), timeout=10))) == 1
+
+    # One table per server, stream worker and reader thread still alive, not one per stream
+    assert _wait_for(lambda: len(metrics._tables) < 20), len(metrics._tables)
+    counts = metrics.snapshot()[STREAM_METHOD]
+    assert counts.finished == streams
+    assert counts.request_messages == streams
+    assert counts.response_messages == streams
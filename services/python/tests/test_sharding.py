@@ -0,0 +1,167 @@
+"""Tests for server.sharding: results against one index, shard restarts and timeouts."""
+import os
+import random
+import signal
+import time
+
+import pytest
+
+from oracles import random_corpus, random_text
+from server.recognition import PatternIndex, StoredPattern
+from server.sharding import SHARD_KEY, ShardedIndex, ShardTimeout, ShardUnavailable, shard_of
+
+STRATEGIES = ("exact", "contains", "jaccard", "scan")
+
+
+@pytest.fixture
+def sharded():
+    """Starts ShardedIndexes (without TF-IDF, to start faster) and closes them after the test."""
+    started = []
+
+    def start(shards: int = 2, **kwargs) -> ShardedIndex:
+        index = (ShardedIndex.load(kwargs.pop("directory"), shards, tfidf=False, **kwargs) if "directory" in kwargs
+                 else ShardedIndex(shards, tfidf=False, **kwargs))
+        started.append(index)
+        return index
+
+    yield start
+    for index in started:
+        index.close()
+
+
+def _wait_for(condition, timeout: float = 60.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _patterns(corpus):
+    # Every fifth pattern is kept with others of its tenant
+    return [StoredPattern(pattern_id, data, metadata={SHARD_KEY: f"tenant-{number % 3}"} if number % 5 == 0 else {})
+            for number, (pattern_id, data) in enumerate(corpus.items())]
+
+
+def _queries(rng: random.Random, corpus):
+    texts = sorted(corpus.values())
+    return [rng.choice(texts) for _ in range(10)] + [rng.choice(texts)[1:6] for _ in range(10)] + \
+        [random_text(rng, 3, 8) for _ in range(10)]
+
+
+def _same_results(index, reference: PatternIndex, queries) -> None:
+    for strategy in STRATEGIES:
+        for (found, _), (expected, _) in zip(index.search_many(queries, strategy, 1000, 0.2),
+                                             reference.search_many(queries, strategy, 1000, 0.2)):
+            assert {match.pattern.id: (match.score, match.count, match.positions) for match in found} == \
+                {match.pattern.id: (match.score, match.count, match.positions) for match in expected}
+        for (found, _), (expected, _) in zip(index.search_many(queries, strategy, 3, 0.2),
+                                             reference.search_many(queries, strategy, 3, 0.2)):
+            assert [match.score for match in found] == [match.score for match in expected]
+
+
+def _reference(corpus) -> PatternIndex:
+    reference = PatternIndex(tfidf=False)
+    reference.add_many(_patterns(corpus), rebuild=True)
+    return reference
+
+
+def test_sharded_results_equal_one_index(sharded):
+    rng = random.Random(10)
+    corpus = random_corpus(rng, 200)
+    index = sharded(3)
+    index.add_many(_patterns(corpus), rebuild=True)
+    queries = _queries(rng, corpus)
+    assert len(index) == 200
+    _same_results(index, _reference(corpus), queries)
+
+    # A shard_key search reads only that key's shard, which holds all of the key's patterns
+    tenant = {pattern.id for pattern in _patterns(corpus) if pattern.metadata.get(SHARD_KEY) == "tenant-1"}
+    number = shard_of("tenant-1", 3)
+    for query in queries:
+        matches, _ = index.search(query, "contains", 1000, shard_key="tenant-1")
+        ids = {match.pattern.id for match in matches}
+        assert {pattern_id for pattern_id in tenant if query in corpus[pattern_id]} <= ids
+        assert all(index.shard_of_pattern(index.get(pattern_id)) == number for pattern_id in ids)
+
+    # Changing a pattern's shard_key moves it; it is not left behind in its old shard
+    moved = next(pattern for pattern in _patterns(corpus) if pattern.metadata)
+    index.add(moved.id, moved.data, metadata={SHARD_KEY: "elsewhere"})
+    assert len(index) == 200
+    assert index.get(moved.id).metadata == {SHARD_KEY: "elsewhere"}
+    assert index.remove(moved.id) and len(index) == 199
+
+
+def _kill(index: ShardedIndex, number: int) -> None:
+    shard = index._shards[number]
+    os.kill(shard.process.pid, signal.SIGKILL)
+    assert _wait_for(lambda: not shard.available or shard.restarts, 10)
+
+
+@pytest.mark.parametrize("saved", [False, True])
+def test_killed_shard_restarts_with_its_writes(sharded, tmp_path, saved):
+    rng = random.Random(11)
+    corpus = random_corpus(rng, 150)
+    index = sharded(2)
+    index.add_many(_patterns(corpus), rebuild=True)
+    if saved:
+        index.save(str(tmp_path))
+        assert index._journal == [[], []]
+    # Writes after the snapshot (or all of them) are replayed from the journal
+    replaced = {pattern_id: random_text(rng) for pattern_id in rng.sample(sorted(corpus), 20)}
+    added = {f"n{number}": random_text(rng) for number in range(20)}
+    index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in {**replaced, **added}.items()])
+    corpus.update(replaced)
+    corpus.update(added)
+    removed = rng.sample(sorted(corpus), 25)
+    assert index.remove_many(removed) == 25
+    for pattern_id in removed:
+        del corpus[pattern_id]
+    assert all(index._journal)
+
+    stats = index.shard_stats()
+    counts = [stats["shard_0_patterns"], stats["shard_1_patterns"]]
+    version = index.version
+    index.defer_rebuilds()
+    _kill(index, 0)
+    with pytest.raises(ShardUnavailable):
+        index.search("alpha", "contains")
+    late = next(f"late{number}" for number in range(100) if shard_of(f"late{number}", 2) == 0)
+    with pytest.raises(ShardUnavailable):
+        index.add(late, "alpha")
+
+    assert _wait_for(lambda: index._shards[0].available)
+    stats = index.shard_stats()
+    assert (stats["shard_0_up"], stats["shard_0_restarts"], stats["shard_1_restarts"]) == (1, 1, 0)
+    assert [stats["shard_0_patterns"], stats["shard_1_patterns"]] == counts
+    assert index.version != version
+    _same_results(index, _reference(corpus), _queries(rng, corpus))
+
+    # The restarted shard still holds its rebuilds for the server's defer_rebuilds()
+    delta = index.stats()["scanner_delta"]
+    time.sleep(1)  # Past the rebuild delay
+    index.add_many([StoredPattern(f"d{number}", random_text(rng)) for number in range(20)])
+    assert index.stats()["scanner_delta"] == delta + 20
+    index.resume_rebuilds()
+    assert _wait_for(lambda: index.stats()["scanner_delta"] == 0, 10)
+
+
+def test_stuck_shard_times_out(sharded):
+    index = sharded(2, timeout=1.0)
+    index.add_many([StoredPattern(f"p{number}", f"alpha {number}") for number in range(20)])
+    pid = index._shards[1].process.pid
+    os.kill(pid, signal.SIGSTOP)
+    try:
+        started = time.monotonic()
+        with pytest.raises(ShardTimeout):
+            index.search("alpha", "contains")
+        assert time.monotonic() - started < 5
+        stats = index.shard_stats()
+        assert (stats["shard_0_up"], stats["shard_1_up"]) == (1, 0)
+        assert "shard_1_patterns" not in stats
+    finally:
+        os.kill(pid, signal.SIGCONT)
+    matches, _ = index.search("alpha", "contains", 100)
+    assert len(matches) == 20
+    assert index._shards[1].restarts == 0
@@ -0,0 +1,137 @@
+"""Tests for server.snapshot: save/load round trips of a PatternIndex."""
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+from oracles import contains, exact, jaccard, occurrences, random_corpus, random_text, scan, scores, tfidf
+from server.minhash import MinHashLSH
+from server.recognition import PatternIndex, StoredPattern
+
+TEXT_STRATEGIES = ("exact", "contains", "jaccard", "minhash", "scan", "tfidf")
+
+
+def _index(suffix_array: bool) -> PatternIndex:
+    return PatternIndex(minhash=MinHashLSH(merge_threshold=16), suffix_array=suffix_array)
+
+
+def _load(directory, suffix_array: bool) -> PatternIndex:
+    return PatternIndex.load(str(directory), minhash=MinHashLSH(merge_threshold=16), suffix_array=suffix_array)
+
+
+def _results(index: PatternIndex, query):
+    found = {}
+    for strategy in TEXT_STRATEGIES:
+        matches, _ = index.search(query, strategy, 1000, 0.2)
+        found[strategy] = {match.pattern.id: (round(match.score, 6), match.count, match.positions)
+                           for match in matches}
+    return found
+
+
+def _vector(rng: random.Random) -> np.ndarray:
+    return np.array([rng.uniform(-1, 1) for _ in range(8)], dtype=np.float32)
+
+
+def _check_oracles(index: PatternIndex, corpus, queries) -> None:
+    for query in queries:
+        assert scores(index.search(query, "exact", 1000)[0]) == exact(corpus, query)
+        matches, _ = index.search(query, "contains", 1000)
+        assert scores(matches) == pytest.approx(contains(corpus, query))
+        assert {match.pattern.id: match.count for match in matches} == occurrences(corpus, query)
+        assert scores(index.search(query, "jaccard", 1000, 0.2)[0]) == pytest.approx(jaccard(corpus, query, 0.2))
+        assert set(scores(index.search(query, "minhash", 1000, 0.2)[0])) <= set(jaccard(corpus, query, 0.2))
+        matches, _ = index.search(query, "scan", 1000)
+        assert {match.pattern.id: match.positions for match in matches} == scan(corpus, query)
+        assert scores(index.search(query, "tfidf", 1000, 0.2)[0]) == pytest.approx(
+            tfidf(corpus, query, 0.2), rel=1e-4)
+
+
+@pytest.mark.parametrize("suffix_array", [False, True])
+def test_round_trip_answers_like_the_saved_index(tmp_path, suffix_array):
+    rng = random.Random(8)
+    corpus = random_corpus(rng, 120)
+    index = _index(suffix_array)
+    index.add_many([StoredPattern(pattern_id, data, labels=[pattern_id[-1]], metadata={"n": pattern_id})
+                    for pattern_id, data in corpus.items()], rebuild=True)
+    vectors = {f"v{number}": _vector(rng) for number in range(20)}
+    index.add_many([StoredPattern(pattern_id, "", vector=vector) for pattern_id, vector in vectors.items()])
+    # Removed patterns leave dead slots; later additions sit in the background indexes' deltas
+    removed = rng.sample(sorted(corpus), 15) + ["v0"]
+    index.remove_many(removed)
+    index.defer_rebuilds()
+    added = {f"n{number}": random_text(rng) for number in range(10)}
+    index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in added.items()])
+    for pattern_id in removed:
+        corpus.pop(pattern_id, None)
+        vectors.pop(pattern_id, None)
+    corpus.update(added)
+
+    index.save(str(tmp_path))
+    loaded = _load(tmp_path, suffix_array)
+    assert len(loaded) == len(index) == len(corpus) + len(vectors)
+    assert loaded.version != index.version
+    for pattern_id in list(corpus)[:20]:
+        assert loaded.get(pattern_id) == index.get(pattern_id)
+    assert loaded.get(removed[0]) is None
+
+    texts = sorted(corpus.values())
+    queries = [text[2:9] for text in texts[:20]] + texts[:20] + [random_text(rng, 2, 8) for _ in range(20)]
+    for query in queries:
+        assert _results(loaded, query) == _results(index, query)
+    for metric in ("cosine", "dot"):
+        query = _vector(rng)
+        expected, _ = index.search(query, metric, 5, -10.0)
+        found, _ = loaded.search(query, metric, 5, -10.0)
+        assert [match.pattern.id for match in found] == [match.pattern.id for match in expected]
+        assert [match.score for match in found] == pytest.approx([match.score for match in expected])
+    _check_oracles(loaded, corpus, queries)
+
+    # Writes after load: snapshot patterns are replaced and removed through tombstones
+    replaced = {pattern_id: random_text(rng) for pattern_id in rng.sample(sorted(corpus), 15)}
+    more = {f"m{number}": random_text(rng) for number in range(15)}
+    loaded.add_many([StoredPattern(pattern_id, data) for pattern_id, data in {**replaced, **more}.items()])
+    corpus.update(replaced)
+    corpus.update(more)
+    gone = rng.sample(sorted(corpus), 20)
+    assert loaded.remove_many(gone) == 20
+    for pattern_id in gone:
+        del corpus[pattern_id]
+    assert len(loaded) == len(corpus) + len(vectors)
+    _check_oracles(loaded, corpus, queries)
+    loaded.rebuild()
+    _check_oracles(loaded, corpus, queries)
+
+    # A snapshot of the loaded index, base and writes together, answers the same again
+    loaded.save(str(tmp_path / "again"))
+    again = _load(tmp_path / "again", suffix_array)
+    _check_oracles(again, corpus, queries)
+
+
+def test_missing_components_are_built_on_load(tmp_path):
+    rng = random.Random(9)
+    corpus = random_corpus(rng, 50)
+    index = PatternIndex(scan=False, tfidf=False)
+    index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in corpus.items()])
+    index.remove("p1")
+    del corpus["p1"]
+    index.save(str(tmp_path))
+
+    loaded = _load(tmp_path, suffix_array=True)
+    _check_oracles(loaded, corpus, [random_text(rng, 1, 6) for _ in range(20)] + ["ta", "mma"])
+
+
+def test_load_rejects_missing_and_unsupported_snapshots(tmp_path):
+    assert PatternIndex.load(str(tmp_path)) is None
+    index = PatternIndex()
+    index.add("a", "alpha")
+    index.save(str(tmp_path))
+    path = os.path.join(tmp_path, "manifest.json")
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest["version"] += 1
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError, match="Unsupported snapshot"):
+        PatternIndex.load(str(tmp_path))
@@ -0,0 +1,159 @@
+"""Tests for server.suffix_array, server.background_index and contains over a suffix array."""
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from oracles import best_scores, contains, occurrences, random_corpus, random_text, scores
+from server.background_index import BackgroundIndex
+from server.recognition import PatternIndex, StoredPattern
+from server.suffix_array import SuffixArray, count_occurrences
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_find_matches_naive_counts(seed):
+    rng = random.Random(seed)
+    texts = ["".join(rng.choice("abé") for _ in range(rng.randint(0, 12))) for _ in range(40)]
+    array = SuffixArray.build([(text, 100 + doc) for doc, text in enumerate(texts)])
+    queries = {text[start:start + length] for text in texts for start in range(len(text)) for length in (1, 2, 4)}
+    for query in sorted(queries) + ["z", "abé" * 5]:
+        slots, counts = array.find(query.encode("utf-8"))
+        found = dict(zip(array.docs[slots].tolist(), counts.tolist()))
+        assert found == {100 + doc: count_occurrences(text, query) for doc, text in enumerate(texts)
+                         if query in text}
+    assert len(array.find(b"")[0]) == 0
+    assert len(array.find(b"a\x00")[0]) == 0
+
+
+def _check(index: PatternIndex, corpus, queries) -> None:
+    for query in queries:
+        matches, _ = index.search(query, "contains", 1000)
+        assert scores(matches) == pytest.approx(contains(corpus, query))
+        assert {match.pattern.id: match.count for match in matches} == occurrences(corpus, query)
+        matches, _ = index.search(query, "contains", 3)
+        assert [match.score for match in matches] == pytest.approx(best_scores(contains(corpus, query), 3))
+
+
+def _queries(rng: random.Random, corpus):
+    texts = sorted(corpus.values())
+    queries = []
+    for _ in range(40):
+        text = rng.choice(texts)
+        start = rng.randrange(len(text))
+        queries.append(text[start:start + rng.randint(1, 10)])
+    return queries + [random_text(rng, 1, 2) for _ in range(10)] + ["zzz"]
+
+
+def test_contains_over_suffix_array_matches_brute_force(tmp_path):
+    rng = random.Random(3)
+    corpus = random_corpus(rng, 150)
+    index = PatternIndex(suffix_array_dir=str(tmp_path / "sa"), scan=False, tfidf=False)
+    index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in corpus.items()], rebuild=True)
+    queries = _queries(rng, corpus)
+    _check(index, corpus, queries)
+
+    # Writes while rebuilds are held: additions are searched in the delta, removals filtered out
+    index.defer_rebuilds()
+    added = {f"n{number}": random_text(rng) for number in range(20)}
+    replaced = {pattern_id: random_text(rng) for pattern_id in rng.sample(sorted(corpus), 10)}
+    index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in {**added, **replaced}.items()])
+    corpus.update(added)
+    corpus.update(replaced)
+    removed = rng.sample(sorted(corpus), 20)
+    index.remove_many(removed)
+    for pattern_id in removed:
+        del corpus[pattern_id]
+    assert index.stats()["suffix_array_delta"] == 30
+    _check(index, corpus, queries)
+
+    index.resume_rebuilds()
+    index.rebuild()
+    assert index.stats()["suffix_array_delta"] == 0
+    _check(index, corpus, queries)
+
+    # A new index over the same patterns memory-maps the saved array instead of building one
+    saved = os.stat(tmp_path / "sa" / "text.npy").st_mtime_ns
+    reopened = PatternIndex(suffix_array_dir=str(tmp_path / "sa"), scan=False, tfidf=False)
+    reopened.add_many([StoredPattern(pattern_id, data) for pattern_id, data in corpus.items()], rebuild=True)
+    assert os.stat(tmp_path / "sa" / "text.npy").st_mtime_ns == saved
+    _check(reopened, corpus, queries)
+
+
+class _Sorted(BackgroundIndex):
+    """Sorted texts as the built index."""
+
+    def __init__(self, patterns, **kwargs):
+        self.patterns = patterns
+        super().__init__(lambda: (list(self.patterns), len(self.patterns)), **kwargs)
+
+    def build(self, patterns):
+        return tuple(sorted(text for text, _ in patterns))
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_background_index_rebuilds_after_changes_settle():
+    patterns = []
+    index = _Sorted(patterns, rebuild_delay=0.05, max_delta=1000)
+    for doc, text in enumerate(["b", "a", "c"]):
+        patterns.append((text, doc))
+        index.add([(text, doc)])
+    assert _wait_for(lambda: index.state == (("a", "b", "c"), ()))
+    assert index.rebuilds == 1
+
+
+def test_background_index_defers_rebuilds_until_resumed():
+    patterns = []
+    index = _Sorted(patterns, rebuild_delay=0.01, max_delta=2)
+    index.defer()
+    index.defer()
+    for doc in range(5):
+        patterns.append((f"t{doc}", doc))
+        index.add([(f"t{doc}", doc)])
+    time.sleep(0.1)
+    assert index.rebuilds == 0 and len(index.state[1]) == 5
+    index.resume()
+    time.sleep(0.1)
+    assert index.rebuilds == 0  # One hold remains
+    index.resume()
+    assert _wait_for(lambda: index.rebuilds == 1)
+    assert index.state == (("t0", "t1", "t2", "t3", "t4"), ())
+
+
+def test_swap_keeps_additions_above_the_watermark():
+    index = _Sorted([], rebuild_delay=60)
+    index.defer()
+    index.add([("a", 0), ("b", 1), ("c", 2)])
+    index.swap(("a", "b"), 2)
+    assert index.state == (("a", "b"), (("c", 2),))
+
+
+def test_queries_never_wait_for_a_rebuild():
+    release = threading.Event()
+
+    class Slow(_Sorted):
+        def build(self, patterns):
+            if patterns:
+                release.wait(5)
+            return super().build(patterns)
+
+    index = Slow([("a", 0)], rebuild_delay=60)
+    rebuild = threading.Thread(target=index.rebuild)
+    rebuild.start()
+    started = time.monotonic()
+    index.add([("b", 1)])
+    assert index.state == ((), (("b", 1),))
+    assert time.monotonic() - started < 1
+    release.set()
+    rebuild.join()
+    # The rebuild covered pattern 0 only, so pattern 1 stays in the delta
+    assert index.state == (("a",), (("b", 1),))
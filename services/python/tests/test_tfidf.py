@@ -0,0 +1,63 @@
+"""Tests for server.tfidf and the tfidf strategy."""
+import random
+
+import pytest
+
+from oracles import best_scores, random_corpus, random_text, scores, tfidf
+from server.recognition import PatternIndex, StoredPattern, words
+from server.tfidf import HashedTfidf
+
+
+def _check(index: PatternIndex, corpus, queries) -> None:
+    for min_score in (0.0, 0.3):
+        batch = index.search_many(queries, "tfidf", 1000, min_score)
+        for query, (matches, candidates) in zip(queries, batch):
+            expected = tfidf(corpus, query, min_score)
+            assert scores(matches) == pytest.approx(expected, rel=1e-4)
+            assert candidates == len(expected)
+            # One query alone scores as it does in the batch
+            single, _ = index.search(query, "tfidf", 1000, min_score)
+            assert scores(single) == pytest.approx(scores(matches), rel=1e-6)
+    for query in queries:
+        matches, _ = index.search(query, "tfidf", 3, 0.0)
+        assert [match.score for match in matches] == pytest.approx(best_scores(tfidf(corpus, query, 0.0), 3), rel=1e-4)
+
+
+def test_tfidf_matches_dense_cosine_as_document_frequencies_change():
+    rng = random.Random(5)
+    corpus = random_corpus(rng, 100)
+    index = PatternIndex(scan=False)
+    patterns = [StoredPattern(pattern_id, data) for pattern_id, data in corpus.items()]
+    for start in range(0, len(patterns), 20):
+        index.add_many(patterns[start:start + 20])
+    queries = [random_text(rng, 1, 6) for _ in range(20)] + ["alpha unseen", "unseen", ""]
+    _check(index, corpus, queries)
+
+    # Replacements and removals move the document frequencies, and so every pattern's norm
+    for number in range(3):
+        replaced = {pattern_id: random_text(rng) for pattern_id in rng.sample(sorted(corpus), 10)}
+        added = {f"n{number}-{i}": "omega " * rng.randint(1, 4) + random_text(rng) for i in range(10)}
+        index.add_many([StoredPattern(pattern_id, data) for pattern_id, data in {**replaced, **added}.items()])
+        corpus.update(replaced)
+        corpus.update(added)
+        removed = rng.sample(sorted(corpus), 15)
+        index.remove_many(removed)
+        for pattern_id in removed:
+            del corpus[pattern_id]
+        _check(index, corpus, queries)
+
+
+def test_export_restore_keeps_scores():
+    rng = random.Random(6)
+    texts = [random_text(rng) for _ in range(40)]
+    source = HashedTfidf(words, n_features=2 ** 12)
+    source.add(list(range(40)), texts)
+    source.remove_many([4, 7], [texts[4], texts[7]])
+    source.publish()
+
+    restored = HashedTfidf(words, n_features=2 ** 12)
+    assert restored.restore(source.export())
+    queries = texts[:10]
+    for (expected, _), (found, _) in zip(source.search(queries, 100), restored.search(queries, 100)):
+        assert {doc: score for score, doc in found} == pytest.approx({doc: score for score, doc in expected})
+    assert not HashedTfidf(words, n_features=2 ** 10).restore(source.export())
@@ -0,0 +1,113 @@
+"""Tests for server.trends: window expiry and the sketches against exact counts."""
+import math
+import random
+from collections import Counter
+
+from server.trends import CountMinSketch, TrendWindow, key_hash
+
+NOW = 1_000_000.0  # A slice boundary for windows of 10-second slices
+
+
+def _zipf_stream(rng: random.Random, events: int, keys: int):
+    weights = [1 / rank for rank in range(1, keys + 1)]
+    return rng.choices([f"k{rank}" for rank in range(keys)], weights, k=events)
+
+
+def test_old_slices_expire_from_the_window():
+    trends = TrendWindow(window=60, slices=6)
+    trends.observe_many([("a", NOW + 1, ["x"])] * 3, now=NOW + 1)
+    trends.observe_many([("b", NOW + 41, ["x"])] * 2, now=NOW + 41)
+
+    result = trends.query(now=NOW + 45)
+    assert result.total == 5
+    assert result.estimates == {} and result.window_seconds == 60
+    assert trends.query(keys=["a", "b"], now=NOW + 45).estimates == {"a": 3, "b": 2}
+    # A shorter window covers whole slices back from the current one
+    recent = trends.query(window=15, keys=["a", "b"], now=NOW + 45)
+    assert (recent.total, recent.window_seconds, recent.estimates) == (2, 20, {"a": 0, "b": 2})
+
+    # The first slice is still in the window at +59s and gone at +60s
+    assert trends.query(now=NOW + 59).total == 5
+    expired = trends.query(keys=["a"], now=NOW + 60)
+    assert (expired.total, expired.estimates["a"]) == (2, 0)
+    assert [hitter.key for hitter in expired.hitters] == ["b"]
+    assert [(label.label, label.count) for label in expired.labels] == [("x", 2)]
+    assert trends.query(now=NOW + 100).total == 0
+
+
+def test_reused_slices_drop_the_old_period():
+    trends = TrendWindow(window=60, slices=6)
+    trends.observe("a", NOW + 1)
+    # Six slices later the ring comes back to the same slot for a new period
+    trends.observe_many([("b", NOW + 61, ())], now=NOW + 61)
+    result = trends.query(keys=["a", "b"], now=NOW + 61)
+    assert (result.total, result.estimates) == (1, {"a": 0, "b": 1})
+
+
+def test_late_events_are_counted_not_kept():
+    trends = TrendWindow(window=60, slices=6)
+    trends.observe_many([("a", NOW + 70, ())], now=NOW + 70)
+    trends.observe_many([("old", NOW - 10, ()), ("edge", NOW + 10, ()), ("new", NOW + 65, ())], now=NOW + 70)
+    result = trends.query(keys=["old", "edge", "new"], now=NOW + 70)
+    assert result.late == 2
+    assert result.estimates == {"old": 0, "edge": 0, "new": 1}
+    assert trends.stats() == {"trend_events": 4, "trend_late_events": 2, "trend_dropped_labels": 0}
+
+
+def test_unset_and_future_timestamps_count_as_now():
+    trends = TrendWindow(window=60, slices=6)
+    trends.observe_many([("a", 0.0, ()), ("b", NOW + 500, ())], now=NOW + 5)
+    assert trends.query(window=10, keys=["a", "b"], now=NOW + 5).estimates == {"a": 1, "b": 1}
+
+
+def test_heavy_hitters_bound_the_exact_counts():
+    rng = random.Random(12)
+    stream = _zipf_stream(rng, 20000, 2000)
+    trends = TrendWindow(window=100, slices=4, capacity=100)
+    # Spread over every slice, so the query merges four summaries
+    trends.observe_many([(key, NOW + 100 * position / len(stream), ()) for position, key in enumerate(stream)],
+                        now=NOW + 99.9)
+    exact = Counter(stream)
+    result = trends.query(top_k=10_000, now=NOW + 99.9)
+    assert result.total == len(stream)
+    for hitter in result.hitters:
+        assert hitter.count - hitter.error <= exact[hitter.key] <= hitter.count
+    # A key above events / capacity overall is above it in some slice, so it is kept there
+    reported = {hitter.key for hitter in result.hitters}
+    assert {key for key, count in exact.items() if count > len(stream) / 100} <= reported
+    top = trends.query(top_k=5, now=NOW + 99.9).hitters
+    assert [hitter.key for hitter in top] == [key for key, _ in exact.most_common(5)]
+
+
+def test_count_min_never_underestimates():
+    rng = random.Random(13)
+    stream = _zipf_stream(rng, 20000, 5000)
+    sketch = CountMinSketch(width=512, depth=4)
+    sketch.add(sketch.columns([key_hash(key) for key in stream]))
+    exact = Counter(stream)
+    keys = sorted(exact) + ["never-seen"]
+    estimates = dict(zip(keys, sketch.estimate([key_hash(key) for key in keys]).tolist()))
+    assert all(estimates[key] >= exact[key] for key in keys)
+    # Within e/width of the events, but for a fraction of about e^-depth of the keys
+    bound = math.e / 512 * len(stream)
+    within = sum(estimates[key] - exact[key] <= bound for key in keys)
+    assert within >= 0.95 * len(keys)
+
+
+def test_label_counts_are_exact_and_distinct_keys_estimated():
+    trends = TrendWindow(window=60, slices=6, precision=10)
+    events = [(f"k{number % 1000}", NOW + number % 60, ["even" if number % 2 == 0 else "odd", "all"])
+              for number in range(6000)]
+    trends.observe_many(events, now=NOW + 59)
+    labels = {label.label: label for label in trends.query(now=NOW + 59).labels}
+    assert {name: label.count for name, label in labels.items()} == {"all": 6000, "even": 3000, "odd": 3000}
+    # 1.04 / sqrt(1024) is about 3% relative error
+    assert abs(labels["all"].distinct - 1000) < 100
+    assert abs(labels["even"].distinct - 500) < 50
+
+
+def test_labels_beyond_the_limit_are_dropped():
+    trends = TrendWindow(window=60, slices=1, max_labels=2)
+    trends.observe_many([("a", NOW, ["x", "y", "z"])], now=NOW)
+    assert [label.label for label in trends.query(now=NOW).labels] == ["x", "y"]
+    assert trends.stats()["trend_dropped_labels"] == 1
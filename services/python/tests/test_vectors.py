@@ -0,0 +1,129 @@
+"""Tests for server.vectors and the cosine and dot strategies."""
+import numpy as np
+import pytest
+
+from server.recognition import PatternIndex, StoredPattern
+from server.vectors import VectorIndex, decode_vector
+
+
+def _oracle(vectors, query: np.ndarray, metric: str, min_score: float):
+    """{pattern id: score} over every stored vector."""
+    scores = {}
+    for pattern_id, vector in vectors.items():
+        score = float(vector @ query)
+        if metric == "cosine":
+            score /= float(np.linalg.norm(vector) * np.linalg.norm(query))
+        if score >= min_score:
+            scores[pattern_id] = score
+    return scores
+
+
+def _scores(matches):
+    return {match.pattern.id: match.score for match in matches}
+
+
+@pytest.mark.parametrize("metric", ["cosine", "dot"])
+def test_brute_force_matches_numpy(metric):
+    rng = np.random.default_rng(1)
+    vectors = {f"v{number}": rng.normal(size=12).astype(np.float32) * rng.uniform(0.5, 3) for number in range(300)}
+    index = PatternIndex()
+    index.add_many([StoredPattern(pattern_id, "", vector=vector) for pattern_id, vector in vectors.items()])
+    # Replacements, removals, and a vector pattern replaced by a text one
+    replaced = {pattern_id: rng.normal(size=12).astype(np.float32) for pattern_id in ("v1", "v2", "v3")}
+    index.add_many([StoredPattern(pattern_id, "", vector=vector) for pattern_id, vector in replaced.items()])
+    vectors.update(replaced)
+    assert index.remove_many(["v4", "v5"]) == 2
+    index.add("v6", "now text")
+    for pattern_id in ("v4", "v5", "v6"):
+        del vectors[pattern_id]
+    assert len(index) == len(vectors) + 1
+
+    for _ in range(20):
+        query = rng.normal(size=12).astype(np.float32)
+        for min_score in (-100.0, 0.0, 0.3):
+            matches, _ = index.search(query, metric, 1000, min_score)
+            assert _scores(matches) == pytest.approx(_oracle(vectors, query, metric, min_score), rel=1e-4, abs=1e-5)
+        matches, candidates = index.search(query.tobytes(), metric, 5, 0.0)
+        expected = sorted(_oracle(vectors, query, metric, 0.0).values(), reverse=True)
+        assert [match.score for match in matches] == pytest.approx(expected[:5], rel=1e-4)
+        assert candidates == len(expected)
+
+
+def test_graph_search_recalls_the_exact_neighbors():
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(2000, 16)).astype(np.float32)
+    patterns = [StoredPattern(f"v{number}", "") for number in range(len(vectors))]
+    index = VectorIndex(ann_threshold=500, ef_search=64)
+    index.add(patterns[:1800], vectors[:1800])
+    index.build_graph()  # Or the background builder already did
+    assert index._graph.state[2] == 1800
+    # Rows added after the graph was built are scored by brute force until linked
+    index.add(patterns[1800:], vectors[1800:])
+    index.remove_many(["v0", "v1", "v2"])
+    alive = np.ones(len(vectors), dtype=bool)
+    alive[:3] = False
+
+    unit = vectors / np.linalg.norm(vectors, axis=1)[:, None]
+    queries = rng.normal(size=(50, 16)).astype(np.float32)
+    found = 0
+    for query, (scored, _) in zip(queries, index.search(list(queries), "cosine", 10, -1.0)):
+        exact = np.argsort(-np.where(alive, unit @ (query / np.linalg.norm(query)), -np.inf))[:10]
+        ids = {pattern.id for _, pattern in scored}
+        assert not ids & {"v0", "v1", "v2"}
+        found += len(ids & {f"v{row}" for row in exact.tolist()})
+    assert found / (10 * len(queries)) >= 0.9
+
+    # The newest rows are found exactly, graph or not
+    for row in range(1990, 2000):
+        (scored, _), = index.search([vectors[row]], "cosine", 1, -1.0)
+        assert scored[0][1].id == f"v{row}"
+
+
+def test_export_restore_keeps_results():
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(600, 8)).astype(np.float32)
+    index = VectorIndex(ann_threshold=200)
+    index.add([StoredPattern(f"v{number}", "", labels=["x"]) for number in range(600)], vectors)
+    index.build_graph()
+    index.remove_many(["v7"])
+
+    restored = VectorIndex(ann_threshold=200)
+    restored.restore(index.export(), lambda pattern_id, labels, metadata: StoredPattern(pattern_id, "", labels))
+    assert len(restored) == 599 and "v7" not in restored
+    queries = list(rng.normal(size=(10, 8)).astype(np.float32))
+    for metric in ("cosine", "dot"):
+        for (expected, _), (found, _) in zip(index.search(queries, metric, 5, -10.0),
+                                             restored.search(queries, metric, 5, -10.0)):
+            assert [pattern.id for _, pattern in found] == [pattern.id for _, pattern in expected]
+            assert [score for score, _ in found] == pytest.approx([score for score, _ in expected])
+
+
+def test_lengths_must_agree():
+    index = VectorIndex()
+    index.add([StoredPattern("a", "")], [np.ones(4)])
+    with pytest.raises(ValueError, match="4 values in this index, got 3"):
+        index.add([StoredPattern("b", "")], [np.ones(3)])
+    with pytest.raises(ValueError, match="same length"):
+        index.add([StoredPattern("b", ""), StoredPattern("c", "")], [np.ones(4), np.ones(3)])
+    with pytest.raises(ValueError, match="4 values in this index, got 5"):
+        index.search([np.ones(5, dtype=np.float32)], "cosine", 1, 0.0)
+    assert len(index) == 1
+
+
+@pytest.mark.parametrize("data, encoding, message", [
+    ("1234", "float32", "bytes, not text"),
+    (b"\0" * 8, "float64", "Unknown vector encoding"),
+    (b"", "float32", "positive multiple of 4 bytes, got 0"),
+    (b"\0" * 6, "float32", "positive multiple of 4 bytes, got 6"),
+    (np.array([1.0, np.nan], dtype=np.float32).tobytes(), "float32", "finite"),
+])
+def test_decode_vector_rejects_malformed_payloads(data, encoding, message):
+    with pytest.raises(ValueError, match=message):
+        decode_vector(data, encoding)
+
+
+def test_decode_vector_views_the_bytes():
+    data = np.array([1.5, -2.0], dtype="<f4").tobytes()
+    vector = decode_vector(data)
+    assert vector.tolist() == [1.5, -2.0]
+    assert not vector.flags.owndata
@@ -81,8 +81,8 @@ serve()
       assert is_list(response.labels)
       assert is_map(response.confidences)
       assert is_map(response.metadata)
-      assert response.labels == ["mock_label_1", "mock_label_2"]
-      assert Map.has_key?(response.confidences, "mock_label_1")
+      assert response.metadata["processed_by"] == "python-server"
+      assert Enum.all?(response.labels, &Map.has_key?(response.confidences, &1))
     end
     
     test "handles invalid patterns" do